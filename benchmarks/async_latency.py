@@ -0,0 +1,99 @@
+import argparse,asyncio,os,random,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.AsyncSimpleDB import AsyncSimpleDB
+
+
+'''
+Benchmark the latency of an event loop serving writes: concurrent writer tasks set random keys while a probe task
+asks to wake up every millisecond and records how late it runs. The blocking mode calls SimpleDB from the tasks,
+so every WAL write, fsync and save runs on the loop, the async mode awaits AsyncSimpleDB, which commits the writes
+queued meanwhile as one batch on its I/O thread. A reader task measures get latency alongside.
+'''
+async def probe(stop, interval, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def reader(db, stop, keys, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        if isinstance(db, AsyncSimpleDB):
+            await db.get(f"key{random.randrange(keys)}")
+        else:
+            db.get(f"key{random.randrange(keys)}")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.001)
+
+
+async def writer(db, stop, keys, latencies):
+    value = 0
+    while not stop.is_set():
+        value += 1
+        start = time.perf_counter()
+        if isinstance(db, AsyncSimpleDB):
+            await db.set(f"key{random.randrange(keys)}", str(value))
+        else:
+            db.set(f"key{random.randrange(keys)}", str(value))
+            # Let the other tasks run between two writes, as a request handler returning to the loop would.
+            await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000 if samples else 0.0
+
+
+'''
+Run one mode against a fresh database.
+    Returns:
+        tuple: (writes/s, write p50 and p99 ms, get p99 ms, loop lag p50, p99 and max ms, fsyncs)
+'''
+async def run(directory, mode, args):
+    db = SimpleDB(os.path.join(directory, f"async_{mode}"), durability=args.durability, persistence=args.persistence)
+    with db.batch():
+        for i in range(args.keys):
+            db.set(f"key{i}", "0")
+    fsyncs = db.wal.fsync_count
+    client = AsyncSimpleDB(db) if mode == "async" else db
+    stop = asyncio.Event()
+    lags, writes, reads = [], [], []
+    tasks = [asyncio.create_task(probe(stop, 0.001, lags)), asyncio.create_task(reader(client, stop, args.keys, reads))]
+    tasks += [asyncio.create_task(writer(client, stop, args.keys, writes)) for _ in range(args.writers)]
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    if mode == "async":
+        await client.close()
+    fsyncs = db.wal.fsync_count - fsyncs
+    db.wait_bgsave()
+    db.drop()
+    return (len(writes) / args.seconds, percentile(writes, 0.5), percentile(writes, 0.99), percentile(reads, 0.99),
+            percentile(lags, 0.5), percentile(lags, 0.99), max(lags, default=0.0) * 1000, fsyncs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop latency under write load, blocking SimpleDB vs AsyncSimpleDB")
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=50, help="concurrent writer tasks")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--durability", default="always", choices=("always", "group", "everysec", "none"))
+    parser.add_argument("--persistence", default="background", choices=("sync", "background"))
+    args = parser.parse_args()
+
+    print(f"durability {args.durability}, persistence {args.persistence}, {args.writers} writers, {args.keys} keys")
+    print(f"{'mode':<10}{'writes/s':>10}{'set p50 ms':>12}{'set p99 ms':>12}{'get p99 ms':>12}"
+          f"{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}{'fsyncs':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("blocking", "async"):
+            rate, set_p50, set_p99, get_p99, lag_p50, lag_p99, lag_max, fsyncs = asyncio.run(run(directory, mode, args))
+            print(f"{mode:<10}{rate:>10.0f}{set_p50:>12.3f}{set_p99:>12.3f}{get_p99:>12.3f}"
+                  f"{lag_p50:>12.3f}{lag_p99:>12.3f}{lag_max:>12.3f}{fsyncs:>8}")
+
+
+if __name__ == "__main__":
+    main()
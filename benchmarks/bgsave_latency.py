@@ -0,0 +1,46 @@
+import argparse,os,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB, PERSISTENCE_MODES
+
+
+'''
+Benchmark foreground write latency against database size with sync and background persistence.
+Sync persistence rewrites the whole file on every write, background persistence only logs the write and leaves the
+file to a forked snapshot, so its latency should stay flat as the database grows.
+'''
+def run_mode(directory, persistence, keys, writes, value_size):
+    db = SimpleDB(os.path.join(directory, f"bench_{persistence}_{keys}"), "txt", persistence=persistence,
+                  snapshot_changes=max(writes // 4, 1))
+    value = "v" * value_size
+    with db.batch():
+        for i in range(keys):
+            db.set(f"key{i}", value)
+    latencies = []
+    for i in range(writes):
+        start = time.perf_counter()
+        db.set(f"key{i % keys}", value)
+        latencies.append(time.perf_counter() - start)
+    db.wait_bgsave()
+    db.drop()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write latency with sync and background persistence")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--value-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'keys':>8}{'p50 us':>10}{'p99 us':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for persistence in PERSISTENCE_MODES:
+            for keys in args.sizes:
+                p50, p99 = run_mode(directory, persistence, keys, args.writes, args.value_size)
+                print(f"{persistence:<12}{keys:>8}{p50 * 1e6:>10.0f}{p99 * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse,os,random,resource,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.BTreeSimpleDB import BTreeSimpleDB
+
+
+'''
+Benchmark the B+tree storage with a buffer pool much smaller than the data: load databases of growing size in
+random key order, then time random gets. With the pool fixed, lookups only get slower with the height of the tree,
+while the file grows with the data and the memory of the process does not.
+'''
+def run(directory, keys, value_size, buffer_pool, batch_size, reads):
+    name = os.path.join(directory, f"btree_{keys}")
+    order = list(range(keys))
+    random.Random(42).shuffle(order)
+    value = "v" * value_size
+    db = BTreeSimpleDB(name, buffer_pool=buffer_pool)
+    start = time.perf_counter()
+    for first in range(0, keys, batch_size):
+        with db.batch():
+            for i in order[first:first + batch_size]:
+                db.set(f"key{i:010d}", value)
+    load_rate = keys / (time.perf_counter() - start)
+    db.close()
+    db.wal.close_log_file()
+    db = BTreeSimpleDB(name, buffer_pool=buffer_pool)
+    samples = []
+    for _ in range(reads):
+        key = f"key{random.randrange(keys):010d}"
+        start = time.perf_counter()
+        found = db.get(key)
+        samples.append(time.perf_counter() - start)
+        assert found == value
+    samples.sort()
+    info = db.info()["btree"]
+    file_mb = os.path.getsize(name + ".btree") / 1024 / 1024
+    db.drop()
+    return (load_rate, samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6,
+            info["height"], info["hit_rate"], file_mb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B+tree storage with a small buffer pool")
+    parser.add_argument("--keys", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--buffer-pool", default="4mb")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"buffer pool {args.buffer_pool}")
+    print(f"{'keys':>10}{'load keys/s':>13}{'get p50 us':>12}{'get p99 us':>12}{'height':>8}{'hit rate':>10}{'file MB':>10}{'max RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for keys in args.keys:
+            load_rate, p50, p99, height, hit_rate, file_mb = run(directory, keys, args.value_size, args.buffer_pool,
+                                                                  args.batch_size, args.reads)
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{keys:>10}{load_rate:>13.0f}{p50:>12.1f}{p99:>12.1f}{height:>8}{hit_rate:>10.3f}{file_mb:>10.1f}{rss_mb:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse,os,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB}
+
+
+'''
+Benchmark loading keys one set call at a time against a single mset batch.
+Every set persists the whole database, so the per-key load grows with the database size while the batch persists once.
+'''
+def load(db_class, directory, keys, batch, value_size, durability):
+    db = db_class(os.path.join(directory, f"bulk_{batch}"), False, durability)
+    value = "v" * value_size
+    start = time.perf_counter()
+    if batch:
+        db.mset({f"key{i}": value for i in range(keys)})
+    else:
+        for i in range(keys):
+            db.set(f"key{i}", value)
+    elapsed = time.perf_counter() - start
+    db.drop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load benchmark")
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--value-size", type=int, default=64)
+    parser.add_argument("--storage", choices=sorted(STORAGES), default="txt")
+    parser.add_argument("--durability", default="none", choices=("always", "group", "everysec", "none"))
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for batch in (False, True):
+            results[batch] = load(STORAGES[args.storage], directory, args.keys, batch, args.value_size, args.durability)
+
+    print(f"{'mode':<10}{'keys/s':>14}{'seconds':>10}")
+    for batch, elapsed in results.items():
+        print(f"{'mset' if batch else 'set':<10}{args.keys / elapsed:>14.0f}{elapsed:>10.2f}")
+    print(f"batch speedup: {results[False] / results[True]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
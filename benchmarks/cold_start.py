@@ -0,0 +1,68 @@
+import argparse,os,random,sys,tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB}
+
+
+def open_db(storage, name):
+    if storage == "bitcask":
+        return BitcaskSimpleDB(name, merge_interval=None, max_file_size=16 * 1024 * 1024)
+    return STORAGES[storage](name)
+
+
+def close_db(db):
+    if isinstance(db, BitcaskSimpleDB):
+        db.close()
+    db.wal.close_log_file()
+
+
+'''
+Benchmark cold start: time to reopen a database of the given number of keys, as reported by info()['server'].
+Keys are written in random order, in batches, then the database is reopened twice. The first reopen of a Bitcask
+database scans its segments and writes their hint files, the second one loads the keydir from the hints.
+'''
+def run_storage(directory, storage, keys, value_size, batch_size):
+    name = os.path.join(directory, f"bench_{storage}")
+    order = list(range(keys))
+    random.Random(42).shuffle(order)
+    value = "v" * value_size
+    db = open_db(storage, name)
+    for start in range(0, keys, batch_size):
+        with db.batch():
+            for i in order[start:start + batch_size]:
+                db.set(f"key{i:010d}", value, [3600] if i % 10 == 0 else None)
+    close_db(db)
+    startups = []
+    for _ in range(2):
+        db = open_db(storage, name)
+        startups.append(db.info()["server"]["startup_seconds"])
+        assert db.dbsize() == keys
+        close_db(db)
+    db = open_db(storage, name)
+    db.drop()
+    return startups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--keys", type=int, default=1000000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=100000)
+    parser.add_argument("--storages", nargs="+", default=list(STORAGES), choices=list(STORAGES))
+    args = parser.parse_args()
+
+    print(f"{'storage':<10}{'first s':>10}{'second s':>10}{'keys/s':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for storage in args.storages:
+            first, second = run_storage(directory, storage, args.keys, args.value_size, args.batch_size)
+            print(f"{storage:<10}{first:>10.2f}{second:>10.2f}{args.keys / second:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse,os,random,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.ReadOnlySimpleDB import ReadOnlySimpleDB
+from utilities.logger.wal import wal
+from utilities.serializer.Compression import CODECS
+
+
+STORAGES = {"txt": (SimpleDB, ".txt"), "json": (JsonSimpleDB, ".json"), "binary": (BinarySimpleDB, ".bin")}
+
+
+'''
+Build a repetitive JSON-like value, the kind of value block compression is meant for.
+'''
+def make_value(rng, i):
+    return ('{"id": %d, "name": "user%d", "email": "user%d@example.com", "active": %s, "plan": "%s", "tags": ["a", "b"]}'
+            % (i, i, i, "true" if i % 3 else "false", rng.choice(("free", "pro", "team"))))
+
+
+'''
+Benchmark the snapshot of one storage with one codec: size, compression ratio, save and load throughput in MB of
+uncompressed data per second, and for txt and binary the latency of a random get on a read-only snapshot, which
+only decompresses the block holding the key.
+'''
+def run_snapshot(directory, storage, codec, keys, gets):
+    cls, extension = STORAGES[storage]
+    name = os.path.join(directory, f"bench_{storage}_{codec}")
+    rng = random.Random(42)
+    db = cls(name, compression=codec, persistence="background", snapshot_changes=keys * 2)
+    with db.batch():
+        for i in range(keys):
+            db.set(f"key{i:08d}", make_value(rng, i))
+    start = time.perf_counter()
+    db.save()
+    save_seconds = time.perf_counter() - start
+    db.wal.checkpoint()
+    db.wal.close_log_file()
+    size = os.path.getsize(name + extension)
+    start = time.perf_counter()
+    db = cls(name, compression=codec)
+    load_seconds = time.perf_counter() - start
+    db.wal.close_log_file()
+    get_us = None
+    if storage != "json":
+        snapshot = ReadOnlySimpleDB(name, storage)
+        snapshot.get("key00000000")
+        start = time.perf_counter()
+        for _ in range(gets):
+            snapshot.get(f"key{rng.randrange(keys):08d}")
+        get_us = (time.perf_counter() - start) / gets * 1e6
+        snapshot.close()
+    db = cls(name)
+    db.drop()
+    return size, save_seconds, load_seconds, get_us
+
+
+'''
+Benchmark the compression of closed WAL segments: ratio and throughput of the background compression.
+'''
+def run_wal(directory, codec, records):
+    log = wal(os.path.join(directory, f"bench_wal_{codec}.log"), False, segment_size=1 << 20, compression=codec)
+    rng = random.Random(42)
+    for i in range(records):
+        log.write_log("set", f"key{i:08d}", make_value(rng, i))
+    log.close_log_file()
+    closed = log.segments()[:-1]
+    size = sum(os.path.getsize(log.segment_name(segment)) for segment in closed)
+    counters = log.metrics.snapshot()["counters"]
+    latency = log.metrics.snapshot()["latency"].get("wal_compress", {})
+    log.remove_log_files()
+    return size, counters.get("wal_compressed_in", 0), latency.get("count", 0) * latency.get("avg_ms", 0) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot and WAL compression benchmark")
+    parser.add_argument("--keys", type=int, default=200000)
+    parser.add_argument("--gets", type=int, default=20000)
+    parser.add_argument("--wal-records", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'storage':<8}{'codec':<6}{'MB':>8}{'ratio':>8}{'save MB/s':>11}{'load MB/s':>11}{'get us':>8}")
+        for storage in STORAGES:
+            raw = None
+            for codec in CODECS:
+                size, save_seconds, load_seconds, get_us = run_snapshot(directory, storage, codec, args.keys, args.gets)
+                raw = raw or size
+                print(f"{storage:<8}{codec:<6}{size / 1e6:>8.1f}{raw / size:>8.2f}{raw / 1e6 / save_seconds:>11.1f}"
+                      f"{raw / 1e6 / load_seconds:>11.1f}{get_us if get_us is not None else float('nan'):>8.1f}")
+        print(f"\n{'wal':<8}{'codec':<6}{'MB':>8}{'ratio':>8}{'MB/s':>11}  (closed segments, compressed in the background)")
+        for codec in CODECS[1:]:
+            size, raw, seconds = run_wal(directory, codec, args.wal_records)
+            print(f"{'wal':<8}{codec:<6}{size / 1e6:>8.1f}{raw / size:>8.2f}{raw / 1e6 / seconds:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse,json,os,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utilities.parser.JsonParser import JsonParser
+
+
+'''
+Benchmark writing a JsonSimpleDB-style file with the streaming JsonParser.dump_data and the stdlib json module,
+then loading it with JsonParser.load_data, the streaming JsonParser.iterparse and the stdlib json module.
+'''
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON parser benchmark")
+    parser.add_argument("--keys", type=int, default=200000)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    # Mostly plain strings, with some counters, strings that need escaping, hashes and lists.
+    data = {}
+    for i in range(args.keys):
+        if i % 10 == 0:
+            data[f"key{i}"] = i
+        elif i % 10 == 1:
+            data[f"key{i}"] = f'"quoted"\tvalue\n{i}'
+        elif i % 50 == 2:
+            data[f"key{i}"] = {"field": f"value {i}", "count": str(i)}
+        elif i % 50 == 3:
+            data[f"key{i}"] = [f"item {i}", f"item {i + 1}"]
+        else:
+            data[f"key{i}"] = f"value {i} " * (args.value_size // 8)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.json")
+        writes = {}
+        writes["JsonParser.dump_data"] = timed(lambda: JsonParser().dump_data(data, path))
+        writes["stdlib json.dump"] = timed(lambda: json.dump(data, open(path, 'w')))
+        writes["stdlib json.dumps"] = timed(lambda: open(path, 'w').write(json.dumps(data)))
+        JsonParser().dump_data(data, path)
+        size = os.path.getsize(path)
+
+        results = {}
+        results["JsonParser.load_data"] = timed(lambda: JsonParser().load_data(path))
+        results["JsonParser.iterparse"] = timed(lambda: dict(JsonParser().iterparse(path)))
+        results["stdlib json.load"] = timed(lambda: json.load(open(path)))
+
+    print(f"file size: {size / 1e6:.1f} MB")
+    print(f"{'writer':<24}{'seconds':>10}{'MB/s':>10}")
+    for name, (elapsed, _) in writes.items():
+        print(f"{name:<24}{elapsed:>10.3f}{size / 1e6 / elapsed:>10.1f}")
+    print(f"{'parser':<24}{'seconds':>10}{'MB/s':>10}")
+    for name, (elapsed, result) in results.items():
+        assert result == data, name
+        print(f"{name:<24}{elapsed:>10.3f}{size / 1e6 / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse,multiprocessing,os,random,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.ReplicaSimpleDB import ReplicaSimpleDB
+
+
+'''
+Body of a follower process: sync from the leader, read random keys while the leader writes, then wait until the
+final position of the leader's log is applied and report reads/s, replication lag, catch-up time and the data.
+'''
+def follower(address, conn, keys, seconds):
+    replica = ReplicaSimpleDB(address)
+    replica.wait_synced()
+    conn.send("synced")
+    conn.recv()
+    reads = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        replica.get(f"key{random.randrange(keys)}")
+        reads += 1
+    elapsed = time.perf_counter() - start
+    position = conn.recv()
+    start = time.perf_counter()
+    replica.wait_for_position(position)
+    catch_up = time.perf_counter() - start
+    lag = replica.info()["latency"].get("replication_lag", {})
+    conn.send((reads / elapsed, lag, catch_up, replica.export()))
+    replica.close()
+
+
+'''
+Run a leader with the given number of follower processes on localhost.
+    Returns:
+        tuple: (leader writes/s, follower reads/s in total, worst p50 and p99 lag in ms, worst catch-up in ms, converged)
+'''
+def run(directory, followers, keys, seconds, value_size):
+    db = SimpleDB(os.path.join(directory, f"leader_{followers}"), persistence="background", snapshot_changes=50000)
+    value = "v" * value_size
+    with db.batch():
+        for i in range(keys):
+            db.set(f"key{i}", value)
+    leader = db.start_replication()
+    pipes, processes = [], []
+    for _ in range(followers):
+        conn, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=follower, args=(leader.address, child, keys, seconds))
+        process.start()
+        pipes.append(conn)
+        processes.append(process)
+    for conn in pipes:
+        conn.recv()
+    for conn in pipes:
+        conn.send("go")
+    writes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        db.set(f"key{random.randrange(keys)}", f"{writes}")
+        writes += 1
+    write_rate = writes / (time.perf_counter() - start)
+    position = db.wal.position()
+    for conn in pipes:
+        conn.send(position)
+    results = [conn.recv() for conn in pipes]
+    for process in processes:
+        process.join()
+    expected = sorted(db.export())
+    db.stop_replication()
+    db.wait_bgsave()
+    db.drop()
+    return (write_rate, sum(result[0] for result in results),
+            max(result[1].get("p50_ms", 0.0) for result in results), max(result[1].get("p99_ms", 0.0) for result in results),
+            max(result[2] for result in results) * 1000, all(sorted(result[3]) == expected for result in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leader/follower replication on localhost")
+    parser.add_argument("--followers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of the concurrent writes and reads")
+    parser.add_argument("--value-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'followers':>10}{'writes/s':>12}{'reads/s':>12}{'lag p50 ms':>12}{'lag p99 ms':>12}{'catch-up ms':>13}{'converged':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for followers in args.followers:
+            writes, reads, p50, p99, catch_up, converged = run(directory, followers, args.keys, args.seconds, args.value_size)
+            print(f"{followers:>10}{writes:>12.0f}{reads:>12.0f}{p50:>12.3f}{p99:>12.3f}{catch_up:>13.1f}{str(converged):>11}")
+
+
+if __name__ == "__main__":
+    main()
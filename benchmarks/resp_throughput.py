@@ -0,0 +1,96 @@
+import argparse,asyncio,os,sys,tempfile,threading,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from utilities.network.RespServer import RespServer, encode_reply
+
+
+'''
+Throughput benchmark of the RESP server.
+The server runs on its own event loop in a background thread, the clients open many connections from the
+main loop and send SET/GET commands in pipelined batches, so the cost of a round trip is paid once per batch.
+'''
+def start_server(db):
+    server = RespServer(db, "127.0.0.1", 0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    return server, loop
+
+
+async def client(port, client_id, requests, pipeline, value, write_every):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    sent = 0
+    while sent < requests:
+        batch = min(pipeline, requests - sent)
+        payload = []
+        for i in range(sent, sent + batch):
+            key = f"c{client_id}:k{i % 1000}"
+            if i % write_every == 0:
+                payload.append(encode_reply([b"SET", key.encode(), value]))
+            else:
+                payload.append(encode_reply([b"GET", key.encode()]))
+        writer.write(b"".join(payload))
+        await writer.drain()
+        # Every reply ends with a single CRLF except bulk strings, which carry a second one after the payload
+        pending = batch
+        buffer = b""
+        while pending:
+            buffer += await reader.read(65536)
+            while pending:
+                line_end = buffer.find(b"\r\n")
+                if line_end == -1:
+                    break
+                if buffer[:1] == b"$" and buffer[1:2] != b"-":
+                    end = line_end + 2 + int(buffer[1:line_end]) + 2
+                    if len(buffer) < end:
+                        break
+                else:
+                    end = line_end + 2
+                buffer = buffer[end:]
+                pending -= 1
+        sent += batch
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_clients(port, clients, requests, pipeline, value, write_every):
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, c, requests, pipeline, value, write_every) for c in range(clients)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RESP server throughput benchmark")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per client")
+    parser.add_argument("--pipeline", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--value-size", type=int, default=32)
+    parser.add_argument("--write-every", type=int, default=10, help="one SET per this many requests, the rest are GETs")
+    args = parser.parse_args()
+
+    value = b"v" * args.value_size
+    print(f"{'pipeline':<10}{'clients':>10}{'requests':>12}{'ops/s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        db = SimpleDB(os.path.join(directory, "bench"))
+        server, loop = start_server(db)
+        for pipeline in args.pipeline:
+            elapsed = asyncio.run(run_clients(server.port, args.clients, args.requests, pipeline, value, args.write_every))
+            total = args.clients * args.requests
+            print(f"{pipeline:<10}{args.clients:>10}{total:>12}{total / elapsed:>12.0f}")
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        db.drop()
+
+
+if __name__ == "__main__":
+    main()
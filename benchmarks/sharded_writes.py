@@ -0,0 +1,52 @@
+import argparse,os,sys,tempfile,threading,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.ShardedSimpleDB import ShardedSimpleDB, STORAGES
+
+
+'''
+Benchmark concurrent writes to a single database against a sharded one, in-process and with worker processes.
+Every write persists the database it lands in, so a shard holding 1/n of the keys rewrites 1/n of the bytes, and
+writes landing on different shards run in parallel.
+'''
+def run(db, threads, writes):
+    def writer(thread_id):
+        for i in range(writes):
+            db.set(f"t{thread_id}_{i}", "v" * 64)
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * writes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded write benchmark")
+    parser.add_argument("--keys", type=int, default=20000, help="keys loaded before the measurement")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=100, help="writes per thread")
+    parser.add_argument("--storage", choices=sorted(STORAGES), default="txt")
+    args = parser.parse_args()
+
+    preload = {f"key{i}": "v" * 64 for i in range(args.keys)}
+    setups = {
+        "single": lambda name: STORAGES[args.storage](name),
+        "sharded": lambda name: ShardedSimpleDB(name, shards=args.shards, storage=args.storage),
+        "sharded+processes": lambda name: ShardedSimpleDB(name, shards=args.shards, storage=args.storage, processes=True),
+    }
+    print(f"{'setup':<20}{'writes/s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for label, setup in setups.items():
+            db = setup(os.path.join(directory, label.replace("+", "_")))
+            db.mset(preload)
+            throughput = run(db, args.threads, args.writes)
+            db.drop()
+            print(f"{label:<20}{throughput:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse,os,sys,tempfile,threading,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB}
+
+
+'''
+Multi-threaded stress test and read scaling benchmark.
+The stress phase runs writers incrementing a shared counter and writing their own keys next to readers checking
+a fixed set of keys, then verifies the final state both in memory and after reopening from disk.
+The scaling phase measures get throughput for growing thread counts, alone and next to a writer.
+'''
+def open_db(db_class, name):
+    if db_class is BitcaskSimpleDB:
+        return db_class(name, merge_interval=None)
+    return db_class(name)
+
+
+def close_db(db):
+    if isinstance(db, BitcaskSimpleDB):
+        db.close()
+    db.wal.close_log_file()
+
+
+def run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def stress(db_class, name, writers, readers, iterations):
+    errors = []
+    db = open_db(db_class, name)
+    db.mset({f"r{i}": f"value{i}" for i in range(100)})
+    db.set("counter", "0")
+    done = threading.Event()
+
+    def writer(writer_id):
+        try:
+            for i in range(iterations):
+                db.incr("counter")
+                db.set(f"w{writer_id}_{i}", str(i))
+                if i % 3 == 0:
+                    db.delete(f"w{writer_id}_{i}")
+        except Exception as e:
+            errors.append(f"writer {writer_id}: {e!r}")
+
+    def reader(reader_id):
+        last = 0
+        try:
+            while not done.is_set():
+                for i in range(100):
+                    if db.get(f"r{i}") != f"value{i}":
+                        errors.append(f"reader {reader_id}: wrong value for r{i}")
+                counter = int(db.get("counter"))
+                if counter < last:
+                    errors.append(f"reader {reader_id}: counter went back from {last} to {counter}")
+                last = counter
+        except Exception as e:
+            errors.append(f"reader {reader_id}: {e!r}")
+
+    reader_threads = [threading.Thread(target=reader, args=(r,)) for r in range(readers)]
+    for thread in reader_threads:
+        thread.start()
+    run_threads([lambda w=w: writer(w) for w in range(writers)])
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+
+    def check(db, where):
+        if int(db.get("counter")) != writers * iterations:
+            errors.append(f"{where}: counter is {db.get('counter')}, expected {writers * iterations}")
+        for w in range(writers):
+            for i in range(iterations):
+                expected = None if i % 3 == 0 else str(i)
+                value = db.get(f"w{w}_{i}")
+                if (None if value is None else str(value)) != expected:
+                    errors.append(f"{where}: w{w}_{i} is {value!r}, expected {expected!r}")
+
+    check(db, "memory")
+    close_db(db)
+    reopened = open_db(db_class, name)
+    check(reopened, "reopened")
+    reopened.drop()
+    return errors
+
+
+def read_scaling(db_class, name, threads, reads, with_writer):
+    db = open_db(db_class, name)
+    db.mset({f"k{i}": "v" * 64 for i in range(1000)})
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            db.set(f"k{i % 1000}", "v" * 64)
+            i += 1
+
+    def reader():
+        for i in range(reads):
+            db.get(f"k{i % 1000}")
+
+    background = threading.Thread(target=writer) if with_writer else None
+    if background:
+        background.start()
+    start = time.perf_counter()
+    run_threads([reader] * threads)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if background:
+        background.join()
+    db.drop()
+    return threads * reads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-threaded stress test and read scaling benchmark")
+    parser.add_argument("--storage", choices=sorted(STORAGES), default="txt")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=100, help="operations per writer in the stress phase")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--reads", type=int, default=20000, help="gets per reader in the scaling phase")
+    args = parser.parse_args()
+
+    db_class = STORAGES[args.storage]
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.join(directory, "stress")
+        errors = stress(db_class, name, args.writers, args.readers, args.iterations)
+        if errors:
+            print(f"stress: FAILED, {len(errors)} error(s)")
+            for error in errors[:20]:
+                print(f"  {error}")
+            sys.exit(1)
+        print(f"stress: OK ({args.writers} writers x {args.iterations} iterations, {args.readers} readers)")
+
+        print(f"{'threads':<10}{'gets/s':>14}{'gets/s with writer':>22}")
+        for threads in args.threads:
+            alone = read_scaling(db_class, name, threads, args.reads, False)
+            mixed = read_scaling(db_class, name, threads, args.reads, True)
+            print(f"{threads:<10}{alone:>14.0f}{mixed:>22.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse,os,sys,tempfile,threading,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utilities.logger.wal import wal, DURABILITY_MODES
+
+
+'''
+Benchmark the WAL commit throughput of every durability mode.
+Each mode is driven by a number of writer threads committing records concurrently,
+the result is the number of commits per second and the number of fsyncs issued.
+'''
+def run_mode(directory, durability, threads, commits):
+    log = wal(os.path.join(directory, f"bench_{durability}.log"), False, durability)
+
+    def writer(thread_id):
+        for i in range(commits):
+            log.write_log("set", f"key{thread_id}_{i}", "value")
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    fsyncs = log.fsync_count
+    log.close_log_file()
+    return threads * commits / elapsed, fsyncs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAL durability mode benchmark")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--commits", type=int, default=500, help="commits per thread")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for durability in DURABILITY_MODES:
+            results[durability] = run_mode(directory, durability, args.threads, args.commits)
+
+    print(f"{'mode':<10}{'commits/s':>14}{'fsyncs':>10}")
+    for durability, (rate, fsyncs) in results.items():
+        print(f"{durability:<10}{rate:>14.0f}{fsyncs:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse,os,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utilities.logger.wal import wal, LOG_FORMATS
+
+
+'''
+Benchmark WAL replay speed of the text and binary record formats.
+The same records are written in both formats, then the log is reopened and read back with read_records, like at
+recovery, where opening the log checks the tail of the segment it continues.
+'''
+def run_format(directory, log_format, records, value_size):
+    name = os.path.join(directory, f"bench_{log_format}.log")
+    log = wal(name, True, log_format=log_format, segment_size=1 << 40)
+    value = "v" * (value_size - 1) + " "
+    for i in range(records):
+        log.write_log("set", f"key{i}", value, 60 if i % 4 == 0 else None)
+    size = sum(os.path.getsize(log.segment_name(segment)) for segment in log.segments())
+    log.close_log_file()
+    start = time.perf_counter()
+    log = wal(name, True, log_format=log_format, segment_size=1 << 40)
+    replayed = sum(1 for _ in log.read_records())
+    elapsed = time.perf_counter() - start
+    log.close_log_file()
+    return replayed, elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAL replay benchmark")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--value-size", type=int, default=64)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for log_format in LOG_FORMATS:
+            results[log_format] = run_format(directory, log_format, args.records, args.value_size)
+
+    print(f"{'format':<10}{'records/s':>14}{'MB':>10}")
+    for log_format, (replayed, elapsed, size) in results.items():
+        print(f"{log_format:<10}{replayed / elapsed:>14.0f}{size / 1e6:>10.1f}")
+    print(f"binary replay speedup: {results['text'][1] / results['binary'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse,datetime as dt,itertools,json,os,platform,random,subprocess,sys,tempfile,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB}
+
+'''
+Operation mix of every workload, modeled on the YCSB core workloads.
+    read              - get of an existing key
+    update            - set of an existing key
+    update-ttl        - set of an existing key with a TTL, so reads keep hitting expired keys
+    read-modify-write - get of a counter followed by incr of the same counter
+'''
+WORKLOADS = {
+    "read-heavy": {"read": 0.95, "update": 0.05},
+    "update-heavy": {"read": 0.5, "update": 0.5},
+    "read-modify-write": {"read": 0.5, "read-modify-write": 0.5},
+    "ttl-heavy": {"read": 0.5, "update-ttl": 0.5},
+}
+
+RECOVERY_STORAGES = ("txt", "json", "binary")
+
+
+class KeyChooser:
+
+    '''
+    Draws key indexes from a uniform or zipfian distribution.
+        Args:
+            keys (int): Size of the keyspace.
+            distribution (str): 'uniform' or 'zipfian'.
+            theta (float): Skew of the zipfian distribution, 0.99 like YCSB.
+    '''
+    def __init__(self, keys, distribution, theta=0.99, seed=42):
+        self.keys = keys
+        self.random = random.Random(seed)
+        self.cum_weights = None
+        if distribution == "zipfian":
+            self.cum_weights = list(itertools.accumulate(1 / (rank ** theta) for rank in range(1, keys + 1)))
+            # Spread the hot ranks over the keyspace instead of the first keys
+            self.order = list(range(keys))
+            self.random.shuffle(self.order)
+
+    def sample(self, count):
+        if self.cum_weights is None:
+            return [self.random.randrange(self.keys) for _ in range(count)]
+        return [self.order[rank] for rank in self.random.choices(range(self.keys), cum_weights=self.cum_weights, k=count)]
+
+
+def open_db(storage, name, custom_wal):
+    if storage == "bitcask":
+        return BitcaskSimpleDB(name, custom_wal, merge_interval=None)
+    return STORAGES[storage](name, custom_wal)
+
+
+def close_db(db):
+    db.stop_active_expiry()
+    if isinstance(db, BitcaskSimpleDB):
+        db.close()
+    if db.wal.log_file is not None:
+        db.wal.close_log_file()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies, elapsed):
+    latencies.sort()
+    return {
+        "ops": len(latencies),
+        "seconds": round(elapsed, 6),
+        "ops_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "p999_ms": round(percentile(latencies, 0.999) * 1000, 4),
+    }
+
+
+def summarize_startup(count, elapsed):
+    result = summarize([elapsed], elapsed)
+    result.update(ops=count, ops_per_sec=round(count / elapsed, 1) if elapsed else 0.0)
+    return result
+
+
+def run_workload(db, workload, args):
+    mix = WORKLOADS[workload]
+    chooser = KeyChooser(args.keys, args.distribution, seed=args.seed)
+    rng = random.Random(args.seed)
+    operations = rng.choices(list(mix), weights=list(mix.values()), k=args.operations)
+    targets = chooser.sample(args.operations)
+    value = "v" * args.value_size
+    ttl = [str(args.ttl)]
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    for operation, target in zip(operations, targets):
+        before = clock()
+        if operation == "read":
+            db.get(f"key{target}")
+        elif operation == "update":
+            db.set(f"key{target}", value)
+        elif operation == "update-ttl":
+            db.set(f"key{target}", value, ttl)
+        else:
+            db.get(f"counter{target}")
+            db.incr(f"counter{target}")
+        latencies.append(clock() - before)
+    return summarize(latencies, clock() - start)
+
+
+def preload(db, args, counters=False):
+    value = "v" * args.value_size
+    db.mset({f"key{i}": value for i in range(args.keys)})
+    if counters:
+        db.mset({f"counter{i}": "0" for i in range(args.keys)})
+
+
+def run_storage(storage, custom_wal, directory, args):
+    results = []
+    for workload in args.workloads:
+        name = os.path.join(directory, f"{storage}_{int(custom_wal)}_{workload}")
+        db = open_db(storage, name, custom_wal)
+        preload(db, args, counters=workload == "read-modify-write")
+        result = run_workload(db, workload, args)
+        db.drop()
+        results.append({"storage": storage, "custom_wal": custom_wal, "workload": workload, **result})
+
+    name = os.path.join(directory, f"{storage}_{int(custom_wal)}_start")
+    db = open_db(storage, name, custom_wal)
+    preload(db, args)
+    close_db(db)
+    start = time.perf_counter()
+    db = open_db(storage, name, custom_wal)
+    results.append({"storage": storage, "custom_wal": custom_wal, "workload": "cold-start",
+                    **summarize_startup(args.keys, time.perf_counter() - start)})
+
+    if storage in RECOVERY_STORAGES:
+        # Log writes that never reached the data file, as after a crash between the WAL append and the save
+        value = "r" * args.value_size
+        for i in range(args.recovery_records):
+            db.wal.write_log("set", f"key{i % args.keys}", value)
+        close_db(db)
+        start = time.perf_counter()
+        db = open_db(storage, name, custom_wal)
+        elapsed = time.perf_counter() - start
+        results.append({"storage": storage, "custom_wal": custom_wal, "workload": "recovery",
+                        **summarize_startup(args.recovery_records, elapsed)})
+    db.drop()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, parameters, baseline_file):
+    with open(baseline_file) as f:
+        report = json.load(f)
+    baseline = {(r["storage"], r["custom_wal"], r["workload"]): r for r in report["results"]}
+    print(f"\nCompared with {baseline_file} (commit {report.get('commit')}):")
+    for key, value in parameters.items():
+        if key in report["parameters"] and report["parameters"][key] != value:
+            print(f"  warning: {key} was {report['parameters'][key]}, now {value}")
+    print(f"{'storage':<9}{'custom':<8}{'workload':<20}{'ops/s before':>14}{'ops/s after':>14}{'change':>9}")
+    for r in results:
+        old = baseline.get((r["storage"], r["custom_wal"], r["workload"]))
+        if old and old["ops_per_sec"]:
+            change = (r["ops_per_sec"] / old["ops_per_sec"] - 1) * 100
+            print(f"{r['storage']:<9}{str(r['custom_wal']):<8}{r['workload']:<20}"
+                  f"{old['ops_per_sec']:>14.1f}{r['ops_per_sec']:>14.1f}{change:>8.1f}%")
+
+
+'''
+YCSB-style benchmark suite.
+Runs the workloads against every selected storage with the custom WAL on and off, plus cold start and WAL recovery,
+and reports ops/s with p50/p99/p999 latencies. Results are written as JSON so runs can be compared across commits:
+    python benchmarks/ycsb.py --output before.json
+    python benchmarks/ycsb.py --output after.json --compare before.json
+'''
+def main():
+    parser = argparse.ArgumentParser(description="YCSB-style benchmark suite")
+    parser.add_argument("--storages", nargs="+", choices=sorted(STORAGES), default=["txt", "json", "binary"])
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--custom-wal", choices=("on", "off", "both"), default="both")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--distribution", choices=("uniform", "zipfian"), default="zipfian")
+    parser.add_argument("--ttl", type=int, default=1, help="TTL in seconds of the ttl-heavy writes")
+    parser.add_argument("--recovery-records", type=int, default=5000, help="WAL records replayed by the recovery run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    custom_wal_modes = {"on": [True], "off": [False], "both": [False, True]}[args.custom_wal]
+    results = []
+    print(f"{'storage':<9}{'custom':<8}{'workload':<20}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'p999 ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for storage in args.storages:
+            for custom_wal in custom_wal_modes:
+                rows = run_storage(storage, custom_wal, directory, args)
+                for r in rows:
+                    print(f"{r['storage']:<9}{str(r['custom_wal']):<8}{r['workload']:<20}{r['ops_per_sec']:>12.1f}"
+                          f"{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['p999_ms']:>10.3f}")
+                results.extend(rows)
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = {
+        "timestamp": dt.datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, parameters, args.compare)
+
+
+if __name__ == "__main__":
+    main()
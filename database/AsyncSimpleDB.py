@@ -0,0 +1,189 @@
+from utilities.logger.Log import get_logger
+import asyncio,functools,threading,time
+
+
+logger = get_logger("async")
+
+
+'''
+Settle the future of a write on its event loop, unless the awaiting task gave up on it.
+'''
+def settle(future, ok, result):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(result)
+    else:
+        future.set_exception(result)
+
+
+"""
+    AsyncSimpleDB is an asyncio facade of a SimpleDB (or JSON, binary, Bitcask, B+tree) database, for services that
+    run on an event loop and must not stall it with the file writes of every call.
+    Reads run inline on the event loop when the read side of the lock is free, they only touch memory. While a
+    writer holds the lock they run on the default executor instead of waiting on the loop.
+    Writes are queued to a dedicated I/O thread and the caller awaits a future. The I/O thread takes every write
+    queued meanwhile and runs them in one batch, so their WAL records are synced once and the database is persisted
+    once at commit, see SimpleDB.batch. The futures are resolved once the commit returned, that is once the
+    durability mode of the WAL and the persistence mode of the database consider the writes durable, so concurrent
+    awaiters share one flush instead of queueing for one each.
+"""
+class AsyncSimpleDB:
+
+    '''
+    Wrap an open database and start its I/O thread.
+        Args:
+            db (SimpleDB): The database, it keeps being usable from other threads, writes take its lock as usual.
+            inline_reads (bool): Read on the event loop when the lock is free. Storages reading values from disk,
+                                 such as bitcask and btree, should pass False so every read runs on the executor.
+            max_group (int): Most writes committed in one batch.
+    '''
+    def __init__(self, db, inline_reads=True, max_group=1000):
+        self.db = db
+        self.inline_reads = inline_reads
+        self.max_group = max_group
+        self.condition = threading.Condition()
+        self.pending = []
+        self.closed = False
+        self.thread = threading.Thread(target=self.io_loop, name=f"simpledb-io {db.db_name}", daemon=True)
+        self.thread.start()
+
+
+    '''
+    Open a database on the default executor, loading it does not block the event loop, and wrap it.
+        Args:
+            storage (type): The database class, e.g. SimpleDB or JsonSimpleDB.
+            args, kwargs: Arguments of the database class.
+            inline_reads (bool): See __init__.
+        Returns:
+            AsyncSimpleDB: The facade of the opened database.
+    '''
+    @classmethod
+    async def open(cls, storage, *args, inline_reads=True, **kwargs):
+        db = await asyncio.get_running_loop().run_in_executor(None, functools.partial(storage, *args, **kwargs))
+        return cls(db, inline_reads)
+
+
+    '''
+    Get the value associated with a key, see SimpleDB.get.
+    '''
+    async def get(self, key):
+        return (await self.mget([key]))[0]
+
+
+    '''
+    Get the values of several keys, see SimpleDB.mget.
+    The read runs inline if the lock is free for readers and no key is found expired, else on the executor.
+    '''
+    async def mget(self, keys):
+        if self.inline_reads:
+            values = self.db.mget(keys, blocking=False)
+            if values is not None:
+                return values
+        return await asyncio.get_running_loop().run_in_executor(None, self.db.mget, keys)
+
+
+    '''
+    Check if a key exists, see SimpleDB.exists.
+    '''
+    async def exists(self, key):
+        return await self.get(key) is not None
+
+
+    '''
+    Set a key-value pair, see SimpleDB.set.
+    '''
+    async def set(self, key, value, ttl=None):
+        return await self.write("set", key, value, ttl)
+
+
+    '''
+    Increment the value of a key by one, see SimpleDB.incr.
+    '''
+    async def incr(self, key):
+        return await self.write("incr", key)
+
+
+    '''
+    Add an amount to the integer value of a key, see SimpleDB.incrby.
+    '''
+    async def incrby(self, key, amount=1):
+        return await self.write("incrby", key, amount)
+
+
+    '''
+    Delete a key, see SimpleDB.delete.
+    '''
+    async def delete(self, key):
+        return await self.write("delete", key)
+
+
+    '''
+    Queue a write method of the database to the I/O thread.
+        Args:
+            method (str): Name of the method, e.g. 'set', 'hset' or 'rpush'.
+            args, kwargs: Arguments of the method.
+        Returns:
+            asyncio.Future: Resolved with the result of the method once its batch committed, or with the exception it
+                            raised. A write that raises fails alone, the other writes of its batch still commit.
+        Raises:
+            RuntimeError: If the facade is closed.
+    '''
+    def write(self, method, *args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError(f"AsyncSimpleDB of '{self.db.db_name}' is closed")
+            self.pending.append((getattr(self.db, method), args, kwargs, future))
+            self.condition.notify()
+        return future
+
+
+    '''
+    Body of the I/O thread, commits the queued writes group by group until the facade is closed and the queue empty.
+    '''
+    def io_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                group = self.pending[:self.max_group]
+                del self.pending[:self.max_group]
+            self.commit_group(group)
+
+
+    '''
+    Run a group of writes in one batch and resolve their futures on their event loops.
+    If the commit itself fails, every write of the group fails with its error.
+    '''
+    def commit_group(self, group):
+        start = time.perf_counter()
+        results = []
+        try:
+            with self.db.batch():
+                for method, args, kwargs, _ in group:
+                    try:
+                        results.append((True, method(*args, **kwargs)))
+                    except Exception as e:
+                        results.append((False, e))
+        except Exception as e:
+            logger.error("Committing %d writes to '%s' failed: %s", len(group), self.db.db_name, e)
+            results = [(False, e)] * len(group)
+        self.db.metrics.observe("async_commit", time.perf_counter() - start, async_groups=1, async_writes=len(group))
+        for (_, _, _, future), (ok, result) in zip(group, results):
+            try:
+                future.get_loop().call_soon_threadsafe(settle, future, ok, result)
+            except RuntimeError:
+                # The event loop of the caller is closed, nobody is waiting for the result.
+                pass
+
+
+    '''
+    Commit the writes still queued and stop the I/O thread, the database stays open.
+    '''
+    async def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        await asyncio.get_running_loop().run_in_executor(None, self.thread.join)
@@ -0,0 +1,297 @@
+from database.SimpleDB import SimpleDB
+from utilities.btree.BTree import BTree
+from utilities.index.SortedKeys import PAGE_SIZE
+from utilities.logger.Log import get_logger
+from collections.abc import MutableMapping
+import os,time,heapq,datetime as dt
+
+
+logger = get_logger("btree")
+
+
+"""
+    Dictionary view over the keys and values of a BTree, every access reads the tree through its buffer pool.
+    Assigning a value keeps the expiry of the key, like assigning to the data dictionary of SimpleDB does.
+"""
+class TreeData(MutableMapping):
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __getitem__(self, key):
+        entry = self.tree.find(key)
+        if entry is None:
+            raise KeyError(key)
+        return self.tree.value(entry)
+
+    def __setitem__(self, key, value):
+        self.tree.put(key, value)
+
+    def __delitem__(self, key):
+        if not self.tree.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.tree.find(key) is not None
+
+    def __iter__(self):
+        for key, _ in self.tree.items():
+            yield key
+
+    def __len__(self):
+        return self.tree.keys
+
+    def clear(self):
+        self.tree.clear()
+
+
+"""
+    Dictionary view over the expiry times stored in the entries of a BTree, as datetimes like SimpleDB.expiry.
+    Every key of the tree is in it, with None when it has no TTL, and its length is the number of keys with a TTL.
+"""
+class TreeExpiry(MutableMapping):
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __getitem__(self, key):
+        entry = self.tree.find(key)
+        if entry is None:
+            raise KeyError(key)
+        return dt.datetime.fromtimestamp(entry[1]) if entry[1] else None
+
+    def __setitem__(self, key, expiry_time):
+        self.tree.set_expiry(key, expiry_time.timestamp() if expiry_time else 0.0)
+
+    def __delitem__(self, key):
+        if self.tree.find(key) is None:
+            raise KeyError(key)
+        self.tree.set_expiry(key, 0.0)
+
+    def __contains__(self, key):
+        return self.tree.find(key) is not None
+
+    def __iter__(self):
+        for key, entry in self.tree.items():
+            if entry[1]:
+                yield key
+
+    def __len__(self):
+        return self.tree.ttl_keys
+
+
+"""
+    Key index of a BTreeSimpleDB, the tree itself keeps the keys in order so adding and removing is a no-op.
+"""
+class TreeIndex:
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def add(self, key):
+        pass
+
+    def remove(self, key):
+        pass
+
+    def __len__(self):
+        return self.tree.keys
+
+    def __iter__(self):
+        return iter(TreeData(self.tree))
+
+    def page(self, start=None, end=None, count=PAGE_SIZE, after=False):
+        return self.tree.page(start, end, count, after)
+
+
+"""
+    BTreeSimpleDB is a subclass of SimpleDB storing its data in a B+tree of fixed-size pages in a single file, for
+    databases larger than memory. Only the pages in the buffer pool are held in memory, a lookup reads one page per
+    level of the tree that is not cached, and the size of the pool is set independently of the size of the database.
+    Writes are logged to the WAL as with the other storages, then applied to the pages in the pool. A checkpoint
+    every checkpoint_changes writes writes the changed pages and checkpoints the WAL, so a save costs the pages
+    changed since the last one and not a rewrite of the file, see BufferPool for how the file stays consistent.
+    Keys are limited to a quarter of a page, larger values are stored in overflow pages.
+    The expiry heap only holds the TTLs set since the database was opened, keys whose TTL was set before expire
+    when they are read.
+"""
+class BTreeSimpleDB(SimpleDB):
+
+    '''
+    Initialize the B+tree database.
+        Args:
+            db_name (str): The name of the database, the page file is '<db_name>.btree'.
+            custom_wal (bool): A flag indicating whether to use a custom WAL implementation.
+            durability (str): When WAL records are fsynced, one of 'always', 'group', 'everysec' or 'none'.
+            buffer_pool (int or str): Memory of the page cache in bytes, or a size such as '64mb'.
+            page_size (int): Size of the pages of a new file in bytes, an existing file keeps its page size.
+            checkpoint_changes (int): Writes after which the changed pages are written and the WAL is checkpointed.
+            wal_format (str): 'text' or 'binary' WAL records, see SimpleDB.
+    '''
+    def __init__(self, db_name, custom_wal=False, durability="none", buffer_pool="64mb", page_size=4096,
+                 checkpoint_changes=10000, wal_format="text"):
+        self.buffer_pool = buffer_pool
+        self.page_size = page_size
+        self.checkpoint_changes = checkpoint_changes
+        self.tree = None
+        super().__init__(db_name, custom_wal, durability, wal_format=wal_format)
+
+
+    '''
+    Set a key-value pair, see SimpleDB.set.
+        Raises:
+            ValueError: If the key does not fit in a page, checked before anything is logged.
+    '''
+    def set(self, key, value, ttl=None):
+        self.tree.check_key(key)
+        super().set(key, value, ttl)
+
+
+    '''
+    Run a typed write, see SimpleDB.write_value.
+        Raises:
+            ValueError: If the key does not fit in a page, checked before anything is logged.
+    '''
+    def write_value(self, operation, key, log_value, current, update, growth=0, command=None):
+        self.tree.check_key(key)
+        return super().write_value(operation, key, log_value, current, update, growth, command)
+
+
+    '''
+    Check whether a key is present but past its TTL with a single lookup in the tree, the caller holds the lock.
+    '''
+    def is_expired(self, key):
+        entry = self.tree.find(key)
+        return bool(entry and entry[1] and entry[1] <= time.time())
+
+
+    '''
+    The tree keeps the keys in order, there is no separate index to build.
+    '''
+    def build_index(self):
+        pass
+
+
+    '''
+    Drop the stale entries from the expiry heap, the TTLs of the whole tree are not gathered into it.
+    '''
+    def index_expiry(self):
+        self.expiry_heap = [(expiry_time, key) for expiry_time, key in self.expiry_heap if self.expiry.get(key) == expiry_time]
+        heapq.heapify(self.expiry_heap)
+
+
+    '''
+    Return the number of keys with a TTL, kept by the tree.
+    '''
+    def keys_with_ttl(self):
+        return self.tree.ttl_keys
+
+
+    '''
+    Make the pages changed since the last checkpoint durable, without checkpointing the WAL.
+    '''
+    def save(self, sync=False):
+        self.tree.checkpoint()
+
+
+    '''
+    Count a write and checkpoint once checkpoint_changes writes accumulated.
+        Returns:
+            bool: False, the WAL record is what makes a write durable until the next checkpoint.
+    '''
+    def persist(self):
+        self.changes += 1
+        if self.changes >= self.checkpoint_changes:
+            self.checkpoint()
+        return False
+
+
+    '''
+    Write the pages changed since the last checkpoint and checkpoint the WAL at the position they reflect.
+    The caller holds the lock and no batch is open, so the pages hold exactly the writes logged so far.
+    '''
+    def checkpoint(self):
+        start = time.perf_counter()
+        position = self.wal.position()
+        self.tree.checkpoint()
+        self.wal.checkpoint(position)
+        self.changes = 0
+        self.last_save = time.time()
+        self.metrics.observe("checkpoint", time.perf_counter() - start, checkpoints=1)
+
+
+    '''
+    Checkpoint in the foreground, it only writes the changed pages so there is nothing to fork for.
+        Returns:
+            bool: True once the checkpoint is written, False if a batch is open.
+    '''
+    def bgsave(self):
+        with self.lock:
+            if self.batch_undo is not None:
+                return False
+            self.checkpoint()
+            self.last_bgsave_ok = True
+            return True
+
+
+    '''
+    Report the state of the database, see SimpleDB.info, with the buffer pool and the tree in a 'btree' section.
+    '''
+    def info(self, slowlog_count=10):
+        info = super().info(slowlog_count)
+        info["persistence"]["mode"] = "checkpoint"
+        with self.lock.read():
+            info["btree"] = dict(self.tree.pool.info(), height=self.tree.height(), checkpoint_changes=self.checkpoint_changes)
+        return info
+
+
+    '''
+    Open the page file and replay the WAL written after the last checkpoint on top of it.
+    The tree is opened while the WAL is read on a worker thread, only the meta page and the free list are read.
+    '''
+    def load(self):
+        logger.info("Loading database '%s'...", self.db_name)
+        start = time.perf_counter()
+        self.replay_log(self.load_files(self.open_tree))
+        self.metrics.observe("load", time.perf_counter() - start)
+        self.expire_keys()
+
+
+    '''
+    Open the page file and point the data, expiry and index views at the tree.
+    '''
+    def open_tree(self):
+        self.tree = BTree(self.db_name + '.btree', self.page_size, self.buffer_pool)
+        self.data = TreeData(self.tree)
+        self.expiry = TreeExpiry(self.tree)
+        self.index = TreeIndex(self.tree)
+
+
+    '''
+    Checkpoint and close the page file.
+    '''
+    def close(self):
+        with self.lock:
+            if self.tree.pool.fd is not None:
+                if self.batch_undo is None and self.wal.log_file is not None:
+                    self.checkpoint()
+                self.tree.close()
+
+
+    '''
+    Drop the database by deleting the page file and the log file.
+    '''
+    def drop(self):
+        try:
+            self.stop_active_expiry()
+            self.data.clear()
+            self.wal.write_log("drop", self.db_name + '.btree')
+            self.stop_replication()
+            self.wal.close_log_file()
+            self.wal.remove_log_files()
+            self.tree.close()
+            os.remove(self.db_name + '.btree')
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error deleting database '%s': %s", self.db_name, e)
@@ -1,47 +1,147 @@
 from database.SimpleDB import SimpleDB
-import pickle,os
+from utilities.serializer.BinaryFormat import BinaryReader, write_database, encode_value
+from collections.abc import MutableMapping
+import os,time,datetime as dt
+
 
-# Todo- implement serialization and deserialization from scratch
 """
-    BinarySimpleDB is a subclass of SimpleDB that uses binary serialization for data storage.
-    It inherits all methods from SimpleDB and overrides the save and load methods
-    to use binary serialization.
+    Dictionary view over a memory-mapped database file.
+    Keys loaded from the file only remember their position in the file index and their value is decoded from the
+    mapping each time it is read, keys written since the file was loaded hold their value in memory.
+"""
+class MappedData(MutableMapping):
+
+    def __init__(self, reader=None):
+        self.reader = reader
+        self.index = {}
+        self.loaded = {}
+
+    def __getitem__(self, key):
+        if key in self.loaded:
+            return self.loaded[key]
+        position = self.index[key]
+        return self.reader.value(position)
+
+    def __setitem__(self, key, value):
+        self.loaded[key] = value
+        self.index.pop(key, None)
+
+    def __delitem__(self, key):
+        if key in self.loaded:
+            del self.loaded[key]
+        else:
+            del self.index[key]
+
+    def __contains__(self, key):
+        return key in self.loaded or key in self.index
+
+    def __iter__(self):
+        yield from self.loaded
+        yield from self.index
+
+    def __len__(self):
+        return len(self.loaded) + len(self.index)
+
+    def clear(self):
+        self.loaded.clear()
+        self.index.clear()
+
+
+    '''
+    Yield the records to write, values still in the file are copied as raw bytes without being decoded.
+        Args:
+            expiry (dict): Key to expiry datetime mapping of the database.
+    '''
+    def records(self, expiry):
+        for key, value in self.loaded.items():
+            expiry_time = expiry.get(key)
+            yield (key, *encode_value(value), expiry_time.timestamp() if expiry_time else 0.0)
+        for key, position in self.index.items():
+            expiry_time = expiry.get(key)
+            yield (key, *self.reader.raw_value(position), expiry_time.timestamp() if expiry_time else 0.0)
+
+
+    '''
+    Close the mapped file.
+    '''
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+"""
+    BinarySimpleDB is a subclass of SimpleDB that uses a custom binary format for data storage.
+    It inherits all methods from SimpleDB and overrides the save and load methods.
+    The file holds a sorted index of key -> (offset, length, expiry) followed by the values, see BinaryFormat.
+    Loading only reads the index, values are sliced out of a memory mapping when they are read,
+    and no pickle is involved so loading a file cannot execute code.
 """
 class BinarySimpleDB(SimpleDB):
 
     '''
         Save the database to a binary file.
+        The file is written next to the current one and swapped in with os.replace, fsynced first when sync is set,
+        then mapped again.
+        With compression set the values are stored as compressed blocks, the index stays uncompressed.
     '''
-    def save(self):
-        with open(self.db_name + '.bin', 'wb') as f:
-            pickle.dump(self.data, f)
-        with open(self.db_name + '_expiry.bin', 'wb') as f:
-            pickle.dump(self.expiry, f)
+    def save(self, sync=False):
+        file_name = self.db_name + '.bin'
+        write_database(file_name + self.temp_suffix, self.data.records(self.expiry), self.compression, sync)
+        os.replace(file_name + self.temp_suffix, file_name)
+        self.data.close()
+        self.data = self.map_database(BinaryReader(file_name), load_expiry=False)
 
 
     '''
-        Load the database from a binary file.
+        Load the database from a binary file and replay the WAL written after the last checkpoint.
+        Only the index is read, together with the expiry times it holds, while the WAL is read on a worker thread.
+        Keys that expired while the database was closed are deleted once it is loaded.
     '''
     def load(self):
-    # Add Wal Support
+        start = time.perf_counter()
+        self.replay_log(self.load_files(self.load_mapping))
+        self.metrics.observe("load", time.perf_counter() - start)
+        self.expire_keys()
+
+
+    '''
+        Map the binary file, or start from an empty view if there is none yet.
+    '''
+    def load_mapping(self):
         try:
-            with open(self.db_name + '.bin', 'rb') as f:
-                self.data = pickle.load(f)
-            with open(self.db_name + '_expiry.bin', 'rb') as f:
-                self.expiry = pickle.load(f)
+            self.data = self.map_database(BinaryReader(self.db_name + '.bin'))
         except FileNotFoundError:
-            self.data = {}
-            
+            self.data = MappedData()
+
+
+    '''
+        Build the data view of a mapped file, taking over the expiry times from its index when load_expiry is set.
+    '''
+    def map_database(self, reader, load_expiry=True):
+        data = MappedData(reader)
+        keys = reader.keys()
+        data.index = dict(zip(keys, range(len(keys))))
+        if load_expiry:
+            for position, expiry in reader.expiries():
+                self.expiry[keys[position]] = dt.datetime.fromtimestamp(expiry)
+            self.index_expiry()
+        return data
+
+
     '''
         Drop the database by deleting the binary file.
     '''
     def drop(self):
         try:
+            self.stop_active_expiry()
+            self.wait_bgsave()
             self.data.clear()
+            self.data.close()
             self.wal.write_log("drop", self.db_name + '.bin')
+            self.stop_replication()
             self.wal.close_log_file()
+            self.wal.remove_log_files()
             os.remove(self.db_name + '.bin')
-            os.remove(self.log_file_name)
-            os.remove(self.db_name + '_expiry.bin')
         except FileNotFoundError:
-            pass
\ No newline at end of file
+            pass
@@ -0,0 +1,719 @@
+from database.SimpleDB import SimpleDB
+from utilities.logger.Log import get_logger
+from utilities.index.SortedKeys import SortedKeys
+from utilities.serializer.TypedValue import encode_text, decode_text
+import os,struct,zlib,threading,time,glob,math,contextlib,concurrent.futures
+
+
+logger = get_logger("bitcask")
+
+
+'''
+On-disk record layout of a data segment.
+    crc32 (I) | expiry epoch seconds, 0 for no TTL (d) | value kind << 24 | key size (I) | value size, -1 for a tombstone (i) | key | value
+The crc covers everything after itself, so a torn tail left by a crash is detected while loading.
+The value kind is the index of the value's type tag in VALUE_KINDS, 0 for a plain string, so records written before
+typed values read as strings. Counters, hashes and lists are stored in the text encoding of TypedValue.
+A batch is enclosed in marker records with an empty key and a negative value size, the records of a batch
+are only applied on load once its commit marker is found.
+'''
+HEADER = struct.Struct("<IdIi")
+TOMBSTONE = -1
+BATCH_BEGIN = -2
+BATCH_COMMIT = -3
+BATCH_ROLLBACK = -4
+VALUE_KINDS = "sihl"
+KIND_SHIFT = 24
+KEY_SIZE_MASK = (1 << KIND_SHIFT) - 1
+
+'''
+On-disk layout of a hint file, written next to a closed data segment so the keydir can be rebuilt without reading
+the values of the segment.
+    crc32 (I) | size of the segment (Q) | bytes of batch markers and rolled back records in the segment (Q)
+followed by one entry per record applied on load, in segment order:
+    expiry epoch seconds, 0 for no TTL (d) | value kind << 24 | key size (I) | value offset (Q) | value size, -1 for a tombstone (i) | key
+The crc covers everything after itself. A hint is only used while its segment still has the size it records,
+otherwise the segment is scanned as if there was no hint.
+'''
+HINT_HEADER = struct.Struct("<IQQ")
+HINT_ENTRY = struct.Struct("<dIQi")
+
+# Durability modes of the data segments, see __init__.
+DURABILITY_MODES = ("always", "none")
+
+# Threads reading data segments or their hint files during load.
+LOAD_WORKERS = 4
+
+
+'''
+Encode a value for a data record.
+    Returns:
+        tuple: (value kind, value bytes).
+'''
+def encode_record_value(value):
+    if isinstance(value, str):
+        return 0, value.encode()
+    tag, text = encode_text(value)
+    if tag == "s":
+        return 0, str(value).encode()
+    return VALUE_KINDS.index(tag), text.encode()
+
+
+"""
+    BitcaskSimpleDB is a subclass of SimpleDB that uses a Bitcask-style log-structured storage engine.
+    Every write is appended to the active data segment and an in-memory keydir maps each key to the
+    location of its latest value, so a write costs only the appended bytes regardless of database size.
+    Stale records left behind by updates and deletes are compacted by a background merge thread.
+    The data segments are the log of this engine, no data record goes to the '<db_name>.log' WAL. It is still opened
+    by SimpleDB, as the wal object holds the durability mode append_record fsyncs by and the fsync count info
+    reports. It only ever gets an init record per open and a drop record, and drop removes it with the segments.
+"""
+class BitcaskSimpleDB(SimpleDB):
+
+    '''
+    Initialize the Bitcask database.
+        Args:
+            db_name (str): The name of the database, used as prefix of the data segments.
+            custom_wal (bool): A flag indicating whether to use a custom WAL implementation.
+            durability (str): 'always' fsyncs every appended record (a batch once, at its commit marker), 'none' leaves
+                              flushing to the OS. The group commit and everysec modes of the WAL only fsync the log
+                              file, which holds no data here, so they are rejected.
+            max_file_size (int): Size in bytes after which the active segment is closed and a new one is started.
+            merge_interval (float): Seconds between two checks of the background merge thread, None disables it.
+            merge_threshold (float): Ratio of stale bytes in the closed segments that triggers a merge.
+    '''
+    def __init__(self, db_name, custom_wal=False, durability="none", max_file_size=64 * 1024 * 1024, merge_interval=60, merge_threshold=0.5):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Durability mode '{durability}' is not supported by the bitcask storage, expected one of {DURABILITY_MODES}")
+        self.keydir = {}
+        self.max_file_size = max_file_size
+        self.merge_threshold = merge_threshold
+        self.readers = {}
+        self.active_file = None
+        self.active_id = 0
+        self.active_size = 0
+        self.stale_bytes = 0
+        self.total_bytes = 0
+        self.merging = False
+        super().__init__(db_name, custom_wal, durability)
+        self.stop_event = threading.Event()
+        self.merge_thread = None
+        if merge_interval:
+            self.merge_thread = threading.Thread(target=self.merge_loop, args=(merge_interval,), daemon=True)
+            self.merge_thread.start()
+
+
+    '''
+    Return the file name of the data segment with the given id.
+    '''
+    def segment_name(self, file_id):
+        return f"{self.db_name}_{file_id:06d}.data"
+
+
+    '''
+    Return the file name of the hint file of the data segment with the given id.
+    '''
+    def hint_name(self, file_id):
+        return f"{self.db_name}_{file_id:06d}.hint"
+
+
+    '''
+    Return the ids of all data segments of this database in ascending order.
+    '''
+    def segment_ids(self):
+        ids = []
+        for name in glob.glob(glob.escape(self.db_name) + "_[0-9][0-9][0-9][0-9][0-9][0-9].data"):
+            ids.append(int(name[len(self.db_name) + 1:-len(".data")]))
+        return sorted(ids)
+
+
+    '''
+    Append a record to the active segment.
+    The active segment is rotated first if it has grown past max_file_size, a batch never spans two segments.
+    Inside a batch the record is not fsynced, the commit marker is.
+        Returns:
+            tuple: (offset of the value, size of the value, value kind).
+    '''
+    def append_record(self, key, value, expiry, value_size=None):
+        batching = self.batch_undo is not None
+        # The commit marker of a batch goes to the segment holding the batch, a batch never spans two segments.
+        if self.active_size >= self.max_file_size and not batching and value_size != BATCH_COMMIT:
+            self.rotate()
+        key_bytes = key.encode()
+        kind, value_bytes = (0, b"") if value is None else encode_record_value(value)
+        if value_size is None:
+            value_size = TOMBSTONE if value is None else len(value_bytes)
+        body = HEADER.pack(0, expiry or 0.0, len(key_bytes) | kind << KIND_SHIFT, value_size)[4:] + key_bytes + value_bytes
+        record = struct.pack("<I", zlib.crc32(body)) + body
+        offset = self.active_size
+        self.active_file.write(record)
+        self.active_file.flush()
+        if self.wal.durability == "always" and not batching:
+            os.fsync(self.active_file.fileno())
+            self.metrics.incr("data_fsyncs")
+        self.active_size += len(record)
+        self.total_bytes += len(record)
+        return offset + HEADER.size + len(key_bytes), len(value_bytes), kind
+
+
+    '''
+    Close the active segment and start appending to a new one.
+    '''
+    def rotate(self):
+        if self.active_file is not None:
+            self.active_file.close()
+        self.active_id += 1
+        self.active_file = open(self.segment_name(self.active_id), 'ab')
+        self.active_size = 0
+
+
+    '''
+    Read the value stored at the given keydir entry.
+    Reads use pread on a shared handle per segment, so concurrent readers do not race on a file position.
+    '''
+    def read_value(self, entry):
+        file_id, offset, size, _, kind = entry
+        reader = self.readers.get(file_id)
+        if reader is None:
+            reader = open(self.segment_name(file_id), 'rb')
+            if self.readers.setdefault(file_id, reader) is not reader:
+                reader.close()
+                reader = self.readers[file_id]
+        text = os.pread(reader.fileno(), size, offset).decode()
+        return text if kind == 0 else decode_text(VALUE_KINDS[kind], text)
+
+
+    '''
+    Account for a keydir entry that has been superseded by a newer record or a tombstone.
+    '''
+    def mark_stale(self, key):
+        old = self.keydir.get(key)
+        if old:
+            self.stale_bytes += HEADER.size + len(key.encode()) + old[2]
+
+
+    '''
+    Check if a key has a TTL in the past, deleting it if so.
+        Returns:
+            bool: True if the key was expired and removed, False otherwise.
+    '''
+    def expire_key(self, key):
+        entry = self.keydir.get(key)
+        if entry and entry[3] and entry[3] <= time.time():
+            self.delete(key)
+            self.metrics.incr("expired_keys")
+            logger.debug("Key '%s' has expired and has been deleted.", key)
+            return True
+        return False
+
+
+    '''
+    Set a key-value pair in the database by appending it to the active segment.
+        Args:
+            key (str): The key to set.
+            value (str): The value to associate with the key.
+            ttl (list, optional): A single element list holding the TTL in seconds.
+    '''
+    def set(self, key, value, ttl=None):
+        expiry = time.time() + int(ttl[0]) if ttl else None
+        with self.lock:
+            with self.metrics.timer("set", key) as timer:
+                if self.batch_undo is not None:
+                    self.batch_undo.append(self.undo_entry(key))
+                offset, size, kind = self.append_record(key, value, expiry)
+                timer.phase("append")
+                self.mark_stale(key)
+                if key not in self.keydir:
+                    self.index.add(key)
+                self.keydir[key] = (self.active_id, offset, size, expiry, kind)
+                timer.phase("mutate")
+
+
+    '''
+    Apply a typed write by appending the whole new value of the key, its TTL is kept, see SimpleDB.write_value.
+    A record holds a whole value, so a field update of a hash or list appends the whole hash or list.
+    '''
+    def write_value(self, operation, key, log_value, current, update, growth=0, command=None):
+        with self.lock:
+            with self.metrics.timer(command or operation, key) as timer:
+                value = update(current)
+                if isinstance(value, (dict, list)) and not value:
+                    return self.delete(key)
+                entry = self.keydir.get(key)
+                if self.batch_undo is not None:
+                    self.batch_undo.append(self.undo_entry(key))
+                expiry = entry[3] if entry else None
+                offset, size, kind = self.append_record(key, value, expiry)
+                timer.phase("append")
+                self.mark_stale(key)
+                if entry is None:
+                    self.index.add(key)
+                self.keydir[key] = (self.active_id, offset, size, expiry, kind)
+                timer.phase("mutate")
+                return True
+
+
+    '''
+    Check whether a key is present but past its TTL, the caller holds the lock.
+    '''
+    def is_expired(self, key):
+        entry = self.keydir.get(key)
+        return bool(entry and entry[3] and entry[3] <= time.time())
+
+
+    '''
+    Read the value of a key from its data segment without checking its TTL, the caller holds the lock.
+    '''
+    def read_key(self, key):
+        entry = self.keydir.get(key)
+        return None if entry is None else self.read_value(entry)
+
+
+    '''
+    Export every live key as (key, value, remaining TTL in whole seconds rounded up or None) tuples.
+    '''
+    def export(self):
+        with self.lock.read():
+            now = time.time()
+            return [(key, self.read_value(entry), math.ceil(entry[3] - now) if entry[3] else None)
+                    for key, entry in list(self.keydir.items()) if not (entry[3] and entry[3] <= now)]
+
+
+    '''
+    Rebuild the ordered key index from the keydir.
+    '''
+    def build_index(self):
+        self.index = SortedKeys(self.keydir)
+
+
+    '''
+    Return the number of keys in the keydir.
+    '''
+    def dbsize(self):
+        return len(self.keydir)
+
+
+    '''
+    Report the state and the metrics of the database, see SimpleDB.info, with a section on the data segments.
+    '''
+    def info(self, slowlog_count=10):
+        info = super().info(slowlog_count)
+        with self.lock.read():
+            info["server"]["keys_with_ttl"] = sum(1 for entry in self.keydir.values() if entry[3])
+            info["segments"] = {
+                "count": len(self.segment_ids()),
+                "active_id": self.active_id,
+                "total_bytes": self.total_bytes,
+                "stale_bytes": self.stale_bytes,
+                "stale_ratio": round(self.stale_bytes / self.total_bytes, 4) if self.total_bytes else 0.0,
+            }
+        return info
+
+
+    '''
+    Delete a key from the database by appending a tombstone record.
+        Returns:
+            bool: True if the key existed and was deleted, False otherwise.
+    '''
+    def delete(self, key):
+        with self.lock:
+            with self.metrics.timer("delete", key) as timer:
+                if key not in self.keydir:
+                    logger.debug("delete of missing key '%s'", key)
+                    return False
+                if self.batch_undo is not None:
+                    self.batch_undo.append(self.undo_entry(key))
+                self.append_record(key, None, None)
+                timer.phase("append")
+                self.mark_stale(key)
+                self.stale_bytes += HEADER.size + len(key.encode())
+                del self.keydir[key]
+                self.index.remove(key)
+                timer.phase("mutate")
+                return True
+
+
+    '''
+    Clear all entries in the database.
+    '''
+    def clear(self):
+        for key in list(self.keydir.keys()):
+            self.delete(key)
+
+
+    '''
+    Start a batch by appending its begin marker, rotating first so the whole batch lands in one segment.
+    '''
+    def begin_batch(self):
+        self.metrics.incr("batches")
+        if self.active_size >= self.max_file_size:
+            self.rotate()
+        self.batch_undo = []
+        self.append_record("", None, None, BATCH_BEGIN)
+
+
+    '''
+    Commit the current batch by appending its commit marker, fsynced once when durability is 'always'.
+    '''
+    def commit_batch(self):
+        self.batch_undo = None
+        self.append_record("", None, None, BATCH_COMMIT)
+
+
+    '''
+    Restore the keydir entries changed by the current batch and append a rollback marker.
+    '''
+    def rollback_batch(self):
+        self.metrics.incr("batch_rollbacks")
+        undo = self.batch_undo
+        for entry in reversed(undo):
+            self.restore_undo_entry(entry)
+        self.append_record("", None, None, BATCH_ROLLBACK)
+        self.batch_undo = None
+
+
+    '''
+    Capture the keydir entry of a key before a batched write changes it.
+    '''
+    def undo_entry(self, key):
+        return key, self.keydir.get(key)
+
+
+    '''
+    Restore a keydir entry captured by undo_entry.
+    '''
+    def restore_undo_entry(self, entry):
+        key, old = entry
+        if old is None:
+            self.keydir.pop(key, None)
+            self.index.remove(key)
+        else:
+            self.keydir[key] = old
+            self.index.add(key)
+
+
+    '''
+    Delete every key whose TTL has passed.
+    '''
+    def expire_keys(self):
+        with self.lock:
+            for key in list(self.keydir.keys()):
+                self.expire_key(key)
+
+
+    '''
+    Records are persisted as they are appended and there is no database file to snapshot, merge compacts the segments.
+        Returns:
+            bool: Always False, no snapshot is started.
+    '''
+    def bgsave(self):
+        return False
+
+
+    '''
+    Writes go to the data segments and not to the WAL, so there is no log to ship to followers.
+        Raises:
+            ValueError: Always, replication needs a WAL-based storage.
+    '''
+    def start_replication(self, *args, **kwargs):
+        raise ValueError("Replication is not supported by the bitcask storage")
+
+
+    '''
+    Flush the active segment, every record is already persisted when it is appended.
+    '''
+    def save(self, sync=False):
+        with self.lock:
+            if self.active_file is not None:
+                self.active_file.flush()
+
+
+    '''
+    Rebuild the keydir from all data segments in order.
+    Segments are read by a pool of worker threads, from their hint file when they have one, while the records of the
+    segments already read are applied to the keydir, so reading the files overlaps with building the keydir.
+    '''
+    def load(self):
+        logger.info("Loading database '%s'...", self.db_name)
+        start = time.perf_counter()
+        for pattern in ("_*.data.merge", "_*.hint.tmp"):
+            for name in glob.glob(glob.escape(self.db_name) + pattern):
+                os.remove(name)
+        for name in glob.glob(glob.escape(self.db_name) + "_[0-9][0-9][0-9][0-9][0-9][0-9].data.merged"):
+            target = int(name[len(self.db_name) + 1:-len(".data.merged")])
+            logger.warning("Finishing the merge into segment %s interrupted by a crash", self.segment_name(target))
+            self.finish_merge(target)
+        ids = self.segment_ids()
+        with concurrent.futures.ThreadPoolExecutor(LOAD_WORKERS) as pool:
+            segments = pool.map(self.read_segment, ids, [file_id != ids[-1] for file_id in ids])
+            for file_id, (records, size, stale) in zip(ids, segments):
+                self.total_bytes += size
+                self.stale_bytes += stale
+                for record in records:
+                    self.load_record(file_id, *record)
+        self.active_id = ids[-1] if ids else 1
+        self.active_file = open(self.segment_name(self.active_id), 'ab')
+        self.active_size = self.active_file.tell()
+        self.metrics.observe("load", time.perf_counter() - start)
+
+
+    '''
+    Read the records of a data segment, from its hint file if it has a valid one.
+    A closed segment that had to be scanned gets a hint file, so the next load does not read its values again.
+        Args:
+            file_id (int): Id of the segment.
+            closed (bool): False for the newest segment, which becomes the active one and keeps growing.
+        Returns:
+            tuple: (records to apply in order, size of the segment, bytes of its batch markers and rolled back records).
+    '''
+    def read_segment(self, file_id, closed):
+        segment = self.read_hint(file_id)
+        if segment is not None:
+            self.metrics.incr("hint_files_loaded")
+            return segment
+        segment = self.scan_segment(file_id)
+        if closed:
+            self.write_hint(file_id, *segment)
+        return segment
+
+
+    '''
+    Scan a single data segment and return the records to apply to the keydir.
+    Records of a batch are held back until its commit marker, a batch left open by a crash is truncated away.
+    A record failing its crc check marks a torn tail, the segment is truncated at that point.
+        Returns:
+            tuple: See read_segment.
+    '''
+    def scan_segment(self, file_id):
+        with open(self.segment_name(file_id), 'rb') as f:
+            content = f.read()
+        position = 0
+        stale = 0
+        records = []
+        batch = None
+        while position + HEADER.size <= len(content):
+            crc, expiry, key_size, value_size = HEADER.unpack_from(content, position)
+            key_size, kind = key_size & KEY_SIZE_MASK, key_size >> KIND_SHIFT
+            end = position + HEADER.size + key_size + max(value_size, 0)
+            if end > len(content) or zlib.crc32(content[position + 4:end]) != crc:
+                break
+            if value_size == BATCH_BEGIN:
+                batch = (position, [])
+            elif value_size in (BATCH_COMMIT, BATCH_ROLLBACK):
+                stale += end - position
+                if batch is not None:
+                    stale += HEADER.size
+                    if value_size == BATCH_COMMIT:
+                        records.extend(batch[1])
+                    else:
+                        stale += sum(record[-1] for record in batch[1])
+                batch = None
+            else:
+                key = content[position + HEADER.size:position + HEADER.size + key_size].decode()
+                record = (key, position + HEADER.size + key_size, value_size, expiry, kind, end - position)
+                if batch is not None:
+                    batch[1].append(record)
+                else:
+                    records.append(record)
+            position = end
+        if batch is not None:
+            logger.warning("Discarding uncommitted batch at offset %d of segment %s", batch[0], self.segment_name(file_id))
+            position = batch[0]
+        if position < len(content):
+            logger.warning("Truncating torn tail of segment %s at offset %d", self.segment_name(file_id), position)
+            with open(self.segment_name(file_id), 'r+b') as f:
+                f.truncate(position)
+        return records, position, stale
+
+
+    '''
+    Read the hint file of a data segment.
+        Returns:
+            tuple: See read_segment, None if the segment has no hint file or it does not match the segment.
+    '''
+    def read_hint(self, file_id):
+        try:
+            with open(self.hint_name(file_id), 'rb') as f:
+                content = f.read()
+            segment_size = os.path.getsize(self.segment_name(file_id))
+        except FileNotFoundError:
+            return None
+        if len(content) < HINT_HEADER.size:
+            return None
+        crc, size, stale = HINT_HEADER.unpack_from(content)
+        if size != segment_size or zlib.crc32(content[4:]) != crc:
+            logger.warning("Ignoring outdated hint file %s", self.hint_name(file_id))
+            return None
+        position = HINT_HEADER.size
+        records = []
+        while position < len(content):
+            expiry, key_size, value_offset, value_size = HINT_ENTRY.unpack_from(content, position)
+            key_size, kind = key_size & KEY_SIZE_MASK, key_size >> KIND_SHIFT
+            position += HINT_ENTRY.size
+            key = content[position:position + key_size].decode()
+            position += key_size
+            records.append((key, value_offset, value_size, expiry, kind, HEADER.size + key_size + max(value_size, 0)))
+        return records, size, stale
+
+
+    '''
+    Write the hint file of a data segment, through a temp file swapped in with os.replace.
+    A hint only speeds up loading, it is not fsynced, a torn one fails its crc and the segment is scanned instead.
+        Args:
+            records (list): (key, value offset, value size, expiry, kind, record length) of the records applied on load.
+            size (int): Size of the segment.
+            stale (int): Bytes of batch markers and rolled back records in the segment.
+    '''
+    def write_hint(self, file_id, records, size, stale):
+        body = bytearray(HINT_HEADER.pack(0, size, stale)[4:])
+        for key, value_offset, value_size, expiry, kind, _ in records:
+            key_bytes = key.encode()
+            body += HINT_ENTRY.pack(expiry or 0.0, len(key_bytes) | kind << KIND_SHIFT, value_offset, value_size)
+            body += key_bytes
+        temp_name = self.hint_name(file_id) + ".tmp"
+        with open(temp_name, 'wb') as f:
+            f.write(struct.pack("<I", zlib.crc32(body)))
+            f.write(body)
+        os.replace(temp_name, self.hint_name(file_id))
+
+
+    '''
+    Apply a single loaded record to the keydir.
+    '''
+    def load_record(self, file_id, key, value_offset, value_size, expiry, kind, length):
+        self.mark_stale(key)
+        if value_size == TOMBSTONE:
+            self.stale_bytes += length
+            self.keydir.pop(key, None)
+        else:
+            self.keydir[key] = (file_id, value_offset, value_size, expiry or None, kind)
+
+
+    '''
+    Periodically merge the closed segments while the stale ratio is above merge_threshold.
+    '''
+    def merge_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            if self.total_bytes and self.stale_bytes / self.total_bytes >= self.merge_threshold:
+                self.merge()
+
+
+    '''
+    Compact all closed segments into a single segment holding only their live records.
+    The active segment is rotated first so writes keep going to a fresh segment while the merge runs.
+    The merged segment takes the id of the newest closed segment, so on reload it still precedes the active one,
+    and gets a hint file written outside the lock.
+    Tombstones are left out of the merged segment, so it must never sit next to the segments it replaces. It is
+    written and fsynced as '.merge', then published by renaming it to '.merged', and only then are the merged
+    segments removed, see finish_merge. A crash before the rename leaves the merged segments as they were, and load
+    finishes a merge that was published.
+    '''
+    def merge(self):
+        with self.lock:
+            if self.merging:
+                return
+            self.merging = True
+            self.rotate()
+            closed = [file_id for file_id in self.segment_ids() if file_id < self.active_id]
+        try:
+            if not closed:
+                return
+            target = closed[-1]
+            temp_name = self.segment_name(target) + ".merge"
+            moved = {}
+            hints = []
+            now = time.time()
+            with open(temp_name, 'wb') as out:
+                position = 0
+                for file_id in closed:
+                    with open(self.segment_name(file_id), 'rb') as f:
+                        content = f.read()
+                    offset = 0
+                    while offset + HEADER.size <= len(content):
+                        _, expiry, key_size, value_size = HEADER.unpack_from(content, offset)
+                        key_size, kind = key_size & KEY_SIZE_MASK, key_size >> KIND_SHIFT
+                        end = offset + HEADER.size + key_size + max(value_size, 0)
+                        if end > len(content):
+                            break
+                        key = content[offset + HEADER.size:offset + HEADER.size + key_size].decode()
+                        value_offset = offset + HEADER.size + key_size
+                        with self.lock.read():
+                            live = self.keydir.get(key) == (file_id, value_offset, value_size, expiry or None, kind)
+                        if live and not (expiry and expiry <= now):
+                            out.write(content[offset:end])
+                            moved[key] = ((file_id, value_offset, value_size, expiry or None, kind),
+                                          (target, position + HEADER.size + key_size, value_size, expiry or None, kind))
+                            hints.append((key, position + HEADER.size + key_size, value_size, expiry, kind, end - offset))
+                            position += end - offset
+                        offset = end
+                out.flush()
+                os.fsync(out.fileno())
+            with self.lock:
+                for file_id in closed:
+                    reader = self.readers.pop(file_id, None)
+                    if reader:
+                        reader.close()
+                os.replace(temp_name, self.segment_name(target) + ".merged")
+                self.finish_merge(target)
+                for key, (old, new) in moved.items():
+                    if self.keydir.get(key) == old:
+                        self.keydir[key] = new
+                self.total_bytes = position + self.active_size
+                self.stale_bytes = 0
+            self.write_hint(target, hints, position, 0)
+            self.metrics.incr("merges")
+            logger.info("Merged %d segment(s) into %s", len(closed), self.segment_name(target))
+        finally:
+            self.merging = False
+
+
+    '''
+    Replace the segments up to target with the published merge of them, '<target segment>.merged'.
+    Every segment older than target was merged into it, they are removed before the merged segment takes the name of
+    target, so a crash in between finds the published merge again and repeats what is left.
+    '''
+    def finish_merge(self, target):
+        for file_id in self.segment_ids():
+            if file_id > target:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.hint_name(file_id))
+            if file_id < target:
+                os.remove(self.segment_name(file_id))
+        os.replace(self.segment_name(target) + ".merged", self.segment_name(target))
+
+
+    '''
+    Stop the merge thread and close every open segment.
+    '''
+    def close(self):
+        self.stop_event.set()
+        if self.merge_thread is not None:
+            self.merge_thread.join()
+        with self.lock:
+            for reader in self.readers.values():
+                reader.close()
+            self.readers.clear()
+            if self.active_file is not None:
+                self.active_file.close()
+                self.active_file = None
+
+
+    '''
+    Drop the database by deleting every data segment and the log file.
+    '''
+    def drop(self):
+        try:
+            self.close()
+            self.keydir.clear()
+            self.wal.write_log("drop", self.db_name)
+            self.wal.close_log_file()
+            for file_id in self.segment_ids():
+                os.remove(self.segment_name(file_id))
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.hint_name(file_id))
+            self.wal.remove_log_files()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error deleting database '%s': %s", self.db_name, e)
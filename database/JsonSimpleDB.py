@@ -1,6 +1,6 @@
 from database.SimpleDB import SimpleDB
-from utilities.parser.JsonParser import JsonParser as parser
-import json,os,datetime as dt
+from utilities.parser.JsonParser import JsonParser as parser, EXPIRY_MEMBER
+import os,time,datetime as dt
 
 
 # Todo- implement serialization and deserialization from scratch
@@ -10,61 +10,86 @@ import json,os,datetime as dt
     to use JSON serialization.
 """
 class JsonSimpleDB(SimpleDB):
-    
+
+    """
+        Set a key-value pair, see SimpleDB.set.
+        Raises:
+            ValueError: If the key is EXPIRY_MEMBER, the member the file keeps the TTLs under, or the value is None,
+                        which JSON writes as null and get could not tell from a missing key.
+    """
+    def set(self, key, value, ttl=None):
+        self.check_key(key)
+        if value is None:
+            raise ValueError(f"Cannot store None for key '{key}' in a JSON database")
+        super().set(key, value, ttl)
+
+
+    """
+        Run a typed write, see SimpleDB.write_value.
+        Raises:
+            ValueError: If the key is EXPIRY_MEMBER.
+    """
+    def write_value(self, operation, key, log_value, current, update, growth=0, command=None):
+        self.check_key(key)
+        return super().write_value(operation, key, log_value, current, update, growth, command)
+
+
+    """
+        Reject EXPIRY_MEMBER as a key, the file could not tell its value from the expiry times.
+    """
+    def check_key(self, key):
+        if key == EXPIRY_MEMBER:
+            raise ValueError(f"Key {key!r} is reserved for the expiry times of a JSON database")
+
+
     """
         Save the database to a JSON file.
+        The file is written next to the current one and swapped in with os.replace, fsynced first when sync is set.
+        With compression set the JSON text is written as compressed blocks, load detects it.
+        Values keep their JSON types and the expiry times of the keys with a TTL are written in the same file as
+        epoch milliseconds, read straight from the expiry dictionary without copying it, see JsonParser.dump_data.
     """
-    def save(self): 
+    def save(self, sync=False): 
         
         json_parser = parser()
-        
-        # with open(self.db_name + '.json', 'w') as f:
-            # json.dump(self.data, f)
-        json_parser.dump_data(self.data,self.db_name + '.json')
-            
-        # Overhead of copying dictionary for making data serializable (optimize later)
-        # temp=self.expiry.copy()
-        # for key, value in temp.items():
-        #     if value:
-        #         temp[key] = value.isoformat() 
-        #     else:
-        #         temp[key] = 'None'
-                     
-        # # with open(self.db_name + '_expiry.json', 'w') as f:
-        #     # json.dump(temp, f)
-        #     # json_parser.dump_data(temp, f)
-        # json_parser.dump_data(temp, self.db_name + '_expiry.json')
-            
-        
-        # temp.clear()
+        expiry = ((key, int(expiry_time.timestamp() * 1000)) for key, expiry_time in self.expiry.items() if expiry_time)
+        json_parser.dump_data(self.data, self.db_name + '.json' + self.temp_suffix, self.compression, expiry, sync)
+        os.replace(self.db_name + '.json' + self.temp_suffix, self.db_name + '.json')
 
 
     """
-        Load the database from a JSON file.
+        Load the database from a JSON file and replay the WAL written after the last checkpoint.
+        The WAL is read on a worker thread while the file is parsed.
     """
     def load(self):
 
-    # Add Wal Support
+        start = time.perf_counter()
+        self.replay_log(self.load_files(self.load_json))
+        self.metrics.observe("load", time.perf_counter() - start)
+        self.expire_keys()
+
+
+    """
+        Parse the JSON file into the data dictionary, an empty one if there is no file yet.
+        The expiry times written after the data are taken out of it into the expiry dictionary, files written before
+        they were saved have none and their TTLs only survive in the WAL.
+        set refuses None, but a null member of a file written elsewhere loads as None. get and exists report such a
+        key as missing while it still counts in dbsize, until it is deleted or set again.
+    """
+    def load_json(self):
+
         json_parser = parser()
         try:
-            # with open(self.db_name + '.json', 'r') as f:
-                # self.data = json.load(f)
-            self.data = json_parser.load_data(self.db_name + '.json')
-                
-            # with open(self.db_name + '_expiry.json', 'r') as f:
-                # self.expiry = json.load(f) 
-                # self.expiry = json_parser.load_data(f)
-            # self.expiry=json_parser.load_data(self.db_name + '_expiry.json')
-
-             
-            # for key, value in self.expiry.items():
-            #     if value == 'None':
-            #         self.expiry[key] = None
-            #     else:
-            #         self.expiry[key] = dt.datetime.fromisoformat(str(value)) 
-            
+            # Stream the members straight into a fresh dict instead of holding the raw text in memory.
+            self.data = dict(json_parser.iterparse(self.db_name + '.json'))
         except FileNotFoundError:
             self.data = {}
+            return
+        expiry = self.data.pop(EXPIRY_MEMBER, None)
+        if expiry:
+            for key, expiry_ms in expiry.items():
+                self.expiry[key] = dt.datetime.fromtimestamp(expiry_ms / 1000)
+            self.index_expiry()
        
        
     """
@@ -72,11 +97,13 @@ class JsonSimpleDB(SimpleDB):
     """       
     def drop(self):
         try:
+            self.stop_active_expiry()
+            self.wait_bgsave()
             self.data.clear()
             self.wal.write_log("drop", self.db_name + '.json')
+            self.stop_replication()
             self.wal.close_log_file()
+            self.wal.remove_log_files()
             os.remove(self.db_name + '.json')
-            os.remove(self.log_file_name)
-            os.remove(self.db_name + '_expiry.json')
         except FileNotFoundError:
             pass
\ No newline at end of file
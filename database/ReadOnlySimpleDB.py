@@ -0,0 +1,220 @@
+from database.SimpleDB import SimpleDB, TEXT_HEADER
+from utilities.serializer.BinaryFormat import BinaryReader
+from utilities.serializer.TypedValue import unescape, decode_text, check_type
+from utilities.serializer.Compression import BlockFile, open_file, header_codec, FILE_HEADER
+import mmap,os,time,datetime as dt
+
+
+# Times load reads the data and expiry files of a txt database again when it caught a save in the middle.
+LOAD_ATTEMPTS = 50
+
+
+"""
+    ReadOnlySimpleDB opens an existing SimpleDB (txt) or BinarySimpleDB database as a read-only snapshot.
+    The data file is memory-mapped and values are decoded only when get touches them. No WAL is opened and
+    nothing is written, so opening costs next to nothing and any number of processes can share the same
+    page-cache-backed snapshot. Writers replace the data file atomically, so a snapshot keeps seeing the file
+    it mapped until refresh() is called.
+"""
+class ReadOnlySimpleDB(SimpleDB):
+
+    '''
+    Open a read-only snapshot of a database.
+        Args:
+            db_name (str): The name of the database.
+            storage (str): 'txt' for a SimpleDB database or 'binary' for a BinarySimpleDB database.
+    '''
+    def __init__(self, db_name, storage="txt"):
+        if storage not in ("txt", "binary"):
+            raise ValueError(f"Unsupported storage '{storage}' for a read-only snapshot, expected 'txt' or 'binary'")
+        self.db_name = db_name
+        self.storage = storage
+        self.wal = None
+        self.reader = None
+        self.file = None
+        self.map = None
+        self.blocks = None
+        self.offsets = None
+        self.expiry = None
+        self.load()
+
+
+    '''
+    Map the data file. For txt databases the expiry file is read along with it and the key index is built lazily
+    on first access from the mapping, so the snapshot holds the data and the TTLs of the same save.
+    save replaces the data file and then the expiry file. A data file replaced while the expiry file was read, or an
+    expiry file older than the data file, means a save was caught between the two and both are read again.
+    A compressed txt file is read through its blocks, a value read decompresses the block holding it.
+    '''
+    def load(self):
+        if self.storage == "binary":
+            self.reader = BinaryReader(self.db_name + '.bin')
+            return
+        for attempt in range(LOAD_ATTEMPTS):
+            self.file = open(self.db_name + '.txt', 'rb')
+            data_stat = os.fstat(self.file.fileno())
+            expiry_stat = self.read_expiry()
+            current = os.stat(self.db_name + '.txt')
+            if (current.st_ino == data_stat.st_ino and current.st_dev == data_stat.st_dev
+                    and (expiry_stat is None or expiry_stat.st_mtime_ns >= data_stat.st_mtime_ns)):
+                break
+            if attempt < LOAD_ATTEMPTS - 1:
+                # A crash between the two renames leaves an older expiry file behind for good, it is used in the end.
+                self.file.close()
+                time.sleep(0.01)
+        if data_stat.st_size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if header_codec(self.map[:FILE_HEADER.size]) != "none":
+                self.blocks = BlockFile(self.map)
+
+
+    '''
+    Read the key -> expiry epoch seconds map of a txt database from its expiry file.
+        Returns:
+            os.stat_result: The stat of the expiry file taken before it was read, None if there is none.
+    '''
+    def read_expiry(self):
+        expiry = {}
+        stat = None
+        try:
+            stat = os.stat(self.db_name + '_expiry.txt')
+            with open_file(self.db_name + '_expiry.txt', 'r', newline='\n') as f:
+                typed = f.readline() == TEXT_HEADER
+                if not typed:
+                    f.seek(0)
+                for line in f:
+                    if typed:
+                        key, value = line.rstrip('\n').rsplit('\t', 1)
+                        key = unescape(key)
+                    else:
+                        key, value = line.strip().split(':', 1)
+                    if value != 'None':
+                        expiry[key] = dt.datetime.fromisoformat(value).timestamp()
+        except FileNotFoundError:
+            pass
+        self.expiry = expiry
+        return stat
+
+
+    '''
+    Unmap the current data file and map the latest one.
+    '''
+    def refresh(self):
+        self.close()
+        self.offsets = None
+        self.expiry = None
+        self.load()
+
+
+    '''
+    Build the key -> (type tag, value start, value end) index of a txt database with one pass over the mapping.
+    Files written before typed values hold 'key:value' lines, their values are all strings.
+    '''
+    def index_text(self):
+        offsets = {}
+        view = self.map
+        if self.blocks is not None:
+            # Indexing reads every line anyway, the blocks are decompressed once and only the offsets are kept.
+            view = b"".join(content for _, content in self.blocks.blocks())
+        if view is not None:
+            header = TEXT_HEADER.encode()
+            typed = view[:len(header)] == header
+            position = len(header) if typed else 0
+            end = len(view)
+            while position < end:
+                line_end = view.find(b"\n", position)
+                if line_end == -1:
+                    line_end = end
+                if typed:
+                    tab = view.find(b"\t", position + 2, line_end)
+                    if tab != -1:
+                        offsets[unescape(view[position + 2:tab].decode())] = (chr(view[position]), tab + 1, line_end)
+                else:
+                    colon = view.find(b":", position, line_end)
+                    if colon != -1:
+                        offsets[view[position:colon].decode()] = ("", colon + 1, line_end)
+                position = line_end + 1
+        self.offsets = offsets
+
+
+    '''
+    Get the value associated with a key in the snapshot.
+        Returns:
+            The value, or None if the key does not exist or has expired.
+    '''
+    def get(self, key):
+        if self.storage == "binary":
+            position = self.reader.find(key)
+            if position is None:
+                return None
+            expiry = self.reader.expiry(position)
+            if expiry and expiry <= time.time():
+                return None
+            return self.reader.value(position)
+        if self.offsets is None:
+            self.index_text()
+        location = self.offsets.get(key)
+        if location is None:
+            return None
+        expiry = self.expiry.get(key)
+        if expiry and expiry <= time.time():
+            return None
+        tag, start, end = location
+        text = (self.map[start:end] if self.blocks is None else self.blocks.read(start, end)).decode()
+        return decode_text(tag, text) if tag else text
+
+
+    '''
+    Get the values of several keys in the snapshot, None for keys that do not exist or have expired.
+    '''
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+
+    '''
+    Read part of a typed value of the snapshot, see SimpleDB.read_typed.
+    '''
+    def read_typed(self, operation, key, expected, read):
+        value = self.get(key)
+        if expected is not None:
+            check_type(value, expected)
+        return None if value is None else read(value)
+
+
+    '''
+    Check if a key exists in the snapshot.
+    '''
+    def exists(self, key):
+        return self.get(key) is not None
+
+
+    '''
+    Reject a write on the snapshot.
+    '''
+    def read_only(self, *args, **kwargs):
+        raise PermissionError(f"Database '{self.db_name}' is opened read-only")
+
+    set = incr = incrby = decrby = hset = hdel = lpush = rpush = delete = clear = drop = save = persist = read_only
+
+
+    '''
+    Expiry needs no bookkeeping, expired keys are hidden by get.
+    '''
+    def expire_keys(self):
+        pass
+
+
+    '''
+    Unmap and close the data file.
+    '''
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.blocks = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
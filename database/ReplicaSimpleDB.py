@@ -0,0 +1,288 @@
+from database.SimpleDB import SimpleDB
+from utilities.replication.Replication import AUTHKEY, format_position
+from utilities.index.SortedKeys import SortedKeys
+from utilities.concurrency.RWLock import RWLock
+from utilities.metrics.Metrics import Metrics
+from utilities.logger.Log import get_logger
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import threading,time
+
+
+logger = get_logger("replica")
+
+
+"""
+    ReplicaSimpleDB is a read-only follower of a replication leader, a SimpleDB (txt), JsonSimpleDB or BinarySimpleDB
+    database that called start_replication, usually in another process.
+    It keeps its own in-memory copy of the leader's data, filled by a full sync and then kept up to date with the
+    leader's WAL records, and serves get, exists and the other reads from it. A background thread applies what the
+    leader sends, the records of a batch are applied together once its COMMIT record arrives, so reads never see
+    half of a batch. When the connection drops the replica keeps serving what it has, reconnects and catches up from
+    the position it applied up to. Nothing is written to disk, expired keys are hidden by reads and removed when
+    the leader's delete arrives.
+"""
+class ReplicaSimpleDB(SimpleDB):
+
+    '''
+    Connect to a replication leader, the data is filled in in the background, see wait_synced.
+        Args:
+            leader: Address the leader listens on, ('host', port) or the path of a Unix socket.
+            authkey (bytes): Secret shared with the leader.
+            db_name (str, optional): Name reported by info(), defaults to one made from the leader address.
+            reconnect_interval (float): Seconds between two connection attempts.
+    '''
+    def __init__(self, leader, authkey=AUTHKEY, db_name=None, reconnect_interval=1.0):
+        self.db_name = db_name or f"replica of {leader}"
+        self.leader = leader
+        self.authkey = authkey
+        self.reconnect_interval = reconnect_interval
+        self.wal = None
+        self.eviction = None
+        self.active_expiry = None
+        self.replication = None
+        self.batch_undo = None
+        self.data = {}
+        self.expiry = {}
+        self.expiry_heap = []
+        self.index = SortedKeys()
+        self.lock = RWLock()
+        self.metrics = Metrics()
+        self.applied = threading.Condition()
+        self.state = "connecting"
+        self.position = None
+        self.leader_position = None
+        self.caught_up_at = time.time()
+        self.last_message = None
+        self.group = None
+        self.pending_sync = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.replicate, daemon=True)
+        self.thread.start()
+
+
+    '''
+    Connect to the leader and apply what it sends, reconnecting until closed.
+    '''
+    def replicate(self):
+        while not self.stop_event.is_set():
+            try:
+                conn = Client(self.leader, authkey=self.authkey)
+            except (OSError, AuthenticationError) as e:
+                logger.debug("Connecting to leader %s failed: %s", self.leader, e)
+                self.stop_event.wait(self.reconnect_interval)
+                continue
+            self.group = None
+            self.pending_sync = None
+            self.state = "sync"
+            try:
+                conn.send(("sync", self.position))
+                logger.info("Connected to leader %s from position %s", self.leader, format_position(self.position))
+                while not self.stop_event.is_set():
+                    if conn.poll(0.1):
+                        self.receive(conn.recv())
+            except (EOFError, OSError) as e:
+                logger.warning("Connection to leader %s lost: %s", self.leader, e)
+            finally:
+                conn.close()
+            self.state = "connecting"
+            if not self.stop_event.is_set():
+                self.metrics.incr("replication_reconnects")
+                self.stop_event.wait(self.reconnect_interval)
+
+
+    '''
+    Handle one message of the leader, see Replication for the protocol.
+    '''
+    def receive(self, message):
+        self.last_message = time.time()
+        kind = message[0]
+        if kind == "log":
+            self.apply_log(*message[1:])
+        elif kind == "snapshot":
+            self.pending_sync = (message[1], {}, {})
+            self.state = "sync"
+        elif kind == "rows":
+            _, data, expiry = self.pending_sync
+            for key, value, expiry_time in message[1]:
+                data[key] = value
+                if expiry_time:
+                    expiry[key] = expiry_time
+        elif kind == "synced":
+            self.finish_sync()
+
+
+    '''
+    Swap in the data of a completed full sync, reads keep seeing the previous copy until then.
+    '''
+    def finish_sync(self):
+        position, data, expiry = self.pending_sync
+        self.pending_sync = None
+        with self.lock:
+            self.data = data
+            self.expiry = expiry
+            self.index_expiry()
+            self.build_index()
+            self.position = position
+        self.metrics.incr("full_syncs")
+        logger.info("Full sync of %d keys from leader %s done", len(data), self.leader)
+        with self.applied:
+            self.applied.notify_all()
+
+
+    '''
+    Apply WAL records shipped by the leader.
+    The applied position only moves past records outside a batch, so after a reconnect an unfinished batch is
+    shipped again from its BEGIN record.
+        Args:
+            records (list): (position after the record, entry) pairs, see wal.read_since.
+            position (tuple): The position the leader read up to.
+            end (tuple): The end of the leader's log when the records were read.
+    '''
+    def apply_log(self, records, position, end):
+        start = time.perf_counter()
+        with self.lock:
+            for record_position, (timestamp, state, operation, key, value, ttl) in records:
+                if operation == "init" or state == "success":
+                    pass
+                elif operation == "begin":
+                    self.group = (key, [])
+                elif operation == "rollback":
+                    self.group = None
+                elif operation == "commit":
+                    if self.group is not None and self.group[0] == key:
+                        for entry in self.group[1]:
+                            self.apply_log_entry(*entry)
+                    self.group = None
+                elif self.group is not None:
+                    self.group[1].append((timestamp, operation, key, value, ttl))
+                else:
+                    self.apply_log_entry(timestamp, operation, key, value, ttl)
+                if self.group is None:
+                    self.position = record_position
+            if self.group is None:
+                self.position = position
+        now = time.time()
+        self.state = "online"
+        self.leader_position = end
+        if self.position >= end:
+            self.caught_up_at = now
+        if records:
+            self.metrics.observe("replication_apply", time.perf_counter() - start, replicated_records=len(records))
+            self.metrics.observe("replication_lag", max(now - records[-1][1][0], 0.0))
+        with self.applied:
+            self.applied.notify_all()
+
+
+    '''
+    Apply a single WAL entry and keep the key index in step with it, a dropped or cleared leader empties the replica.
+    '''
+    def apply_log_entry(self, timestamp, operation, key, value, ttl):
+        if operation in ("drop", "clear"):
+            self.data = {}
+            self.expiry = {}
+            self.expiry_heap = []
+            self.index = SortedKeys()
+            return
+        super().apply_log_entry(timestamp, operation, key, value, ttl)
+        if key in self.data:
+            self.index.add(key)
+        else:
+            self.index.remove(key)
+
+
+    '''
+    Wait until the first full sync is done.
+        Returns:
+            bool: False if it did not finish within timeout seconds.
+    '''
+    def wait_synced(self, timeout=None):
+        with self.applied:
+            return self.applied.wait_for(lambda: self.position is not None, timeout)
+
+
+    '''
+    Wait until the replica applied the leader's log up to a position, e.g. the leader's db.wal.position() after a
+    write, to read that write back from the replica.
+        Returns:
+            bool: False if the position was not reached within timeout seconds.
+    '''
+    def wait_for_position(self, position, timeout=None):
+        position = tuple(position)
+        with self.applied:
+            return self.applied.wait_for(lambda: self.position is not None and self.position >= position, timeout)
+
+
+    '''
+    Report the state and the metrics of the replica, see SimpleDB.info.
+        Returns:
+            dict: Sections 'server', 'stats', 'latency' (with replication_lag, the delay between a record being
+                  written by the leader and applied here), 'replication' and 'slowlog'. lag_seconds in 'replication'
+                  is 0 while the replica has the end of the leader's log, else how long ago it last had it.
+    '''
+    def info(self, slowlog_count=10):
+        snapshot = self.metrics.snapshot()
+        counters = snapshot["counters"]
+        hits, misses = counters.get("keyspace_hits", 0), counters.get("keyspace_misses", 0)
+        stats = dict(counters)
+        stats["hit_rate"] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+        now = time.time()
+        with self.lock.read():
+            keys = self.dbsize()
+            keys_with_ttl = sum(1 for expiry_time in self.expiry.values() if expiry_time)
+            caught_up = self.state == "online" and self.position >= self.leader_position
+        return {
+            "server": {
+                "db_name": self.db_name,
+                "storage": type(self).__name__,
+                "uptime_seconds": round(now - self.metrics.started, 3),
+                "keys": keys,
+                "keys_with_ttl": keys_with_ttl,
+            },
+            "stats": stats,
+            "latency": snapshot["latency"],
+            "replication": {
+                "role": "follower",
+                "leader": str(self.leader),
+                "state": self.state,
+                "position": format_position(self.position),
+                "leader_position": format_position(self.leader_position),
+                "lag_seconds": 0.0 if caught_up else round(now - self.caught_up_at, 3),
+                "last_message_seconds_ago": round(now - self.last_message, 3) if self.last_message else -1,
+            },
+            "slowlog": self.metrics.slowlog(slowlog_count),
+        }
+
+
+    '''
+    Reject a write on the replica, writes go to the leader.
+    '''
+    def read_only(self, *args, **kwargs):
+        raise PermissionError(f"Database '{self.db_name}' is a read-only replica")
+
+    set = incr = incrby = decrby = hset = hdel = lpush = rpush = delete = clear = drop = save = persist = read_only
+    batch = bgsave = lastsave = start_active_expiry = start_replication = read_only
+
+
+    '''
+    Expired keys are hidden by reads and deleted by the leader, whose delete is replicated.
+    '''
+    def expire_key(self, key):
+        return False
+
+
+    '''
+    Expiry needs no bookkeeping, see expire_key.
+    '''
+    def expire_keys(self):
+        pass
+
+
+    '''
+    Disconnect from the leader and stop the replication thread, the data stays readable.
+    '''
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,619 @@
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.BTreeSimpleDB import BTreeSimpleDB
+from utilities.sharding.HashRing import HashRing
+from utilities.concurrency.RWLock import RWLock
+from utilities.index.SortedKeys import iterate_pages, scan_page, prefix_end, PAGE_SIZE
+from utilities.logger.Log import get_logger
+import os,contextlib,multiprocessing,threading
+
+
+logger = get_logger("sharding")
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB, "btree": BTreeSimpleDB}
+
+# Last line of the manifest while add_shard has copied keys to a new shard but not yet deleted them from the old ones.
+MOVING = "moving"
+
+
+'''
+Open the database of a shard.
+'''
+def open_shard_db(storage, name, custom_wal, durability):
+    return STORAGES[storage](name, custom_wal, durability)
+
+
+'''
+Stop the background workers of a shard database and close its files.
+'''
+def close_shard_db(db):
+    db.stop_active_expiry()
+    if isinstance(db, (BitcaskSimpleDB, BTreeSimpleDB)):
+        db.close()
+    if db.wal.log_file is not None:
+        db.wal.close_log_file()
+
+
+'''
+Main loop of a shard worker process, runs the method calls received on the pipe against its own database.
+Replies are ('ok', result) or ('error', exception), a 'close' call closes the database and ends the loop.
+'''
+def serve_shard(conn, storage, name, custom_wal, durability):
+    db = open_shard_db(storage, name, custom_wal, durability)
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            close_shard_db(db)
+            break
+        if method == "close":
+            close_shard_db(db)
+            conn.send(("ok", None))
+            break
+        try:
+            conn.send(("ok", getattr(db, method)(*args)))
+        except Exception as e:
+            conn.send(("error", e))
+    conn.close()
+
+
+'''
+Shard living in the calling process.
+send runs the call right away and returns a function handing back its result, the same interface as ProcessShard.
+'''
+class LocalShard:
+
+    def __init__(self, storage, name, custom_wal, durability):
+        self.name = name
+        self.db = open_shard_db(storage, name, custom_wal, durability)
+
+    def send(self, method, *args):
+        try:
+            result = getattr(self.db, method)(*args)
+        except Exception as e:
+            error = e
+            def wait():
+                raise error
+            return wait
+        return lambda: result
+
+    def call(self, method, *args):
+        return getattr(self.db, method)(*args)
+
+    def close(self):
+        close_shard_db(self.db)
+
+
+'''
+Shard living in its own worker process, so shards use separate cores and do not share a GIL.
+A call holds the pipe from send until its result is received, send to several shards before waiting on any of them
+to run the calls in parallel.
+'''
+class ProcessShard:
+
+    def __init__(self, storage, name, custom_wal, durability):
+        self.name = name
+        self.lock = threading.Lock()
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve_shard, args=(child, storage, name, custom_wal, durability),
+                                               daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, method, *args):
+        self.lock.acquire()
+        try:
+            self.conn.send((method, args))
+        except BaseException:
+            self.lock.release()
+            raise
+        def wait():
+            try:
+                status, value = self.conn.recv()
+            finally:
+                self.lock.release()
+            if status == "error":
+                raise value
+            return value
+        return wait
+
+    def call(self, method, *args):
+        return self.send(method, *args)()
+
+    def close(self):
+        if self.process.is_alive():
+            self.call("close")
+        self.process.join()
+        self.conn.close()
+
+
+"""
+    ShardedSimpleDB partitions the keyspace over several shards by consistent hashing.
+    Every shard is a complete SimpleDB (or JSON, binary, Bitcask, B+tree) database named '<db_name>_shardNNN' with its own
+    data files and WAL, so a write only persists the shard owning the key and writes to different shards run in
+    parallel. With processes=True every shard runs in its own worker process.
+    The shard ids are kept in the manifest '<db_name>.shards', add_shard adds a shard and moves only the keys the
+    new shard takes over on the ring.
+"""
+class ShardedSimpleDB:
+
+    '''
+    Open or create a sharded database.
+        Args:
+            db_name (str): The name of the database, used as prefix of the shard files.
+            custom_wal (bool): A flag indicating whether the shards use the custom WAL implementation.
+            durability (str): Durability mode of the shard WALs.
+            shards (int): Number of shards of a new database, an existing database keeps the shards of its manifest.
+            storage (str): Storage format of the shards, 'txt', 'json', 'binary', 'bitcask' or 'btree'.
+            processes (bool): Run every shard in its own worker process.
+            replicas (int): Virtual points per shard on the hash ring.
+    '''
+    def __init__(self, db_name, custom_wal=False, durability="none", shards=4, storage="txt", processes=False, replicas=64):
+        if storage not in STORAGES:
+            raise ValueError(f"Unknown storage '{storage}', expected one of {tuple(STORAGES)}")
+        self.db_name = db_name
+        self.custom_wal = custom_wal
+        self.durability = durability
+        self.storage = storage
+        self.processes = processes
+        self.manifest_file_name = f"{db_name}.shards"
+        self.lock = RWLock()
+        shard_ids, moving = self.read_manifest()
+        shard_ids = shard_ids or list(range(shards))
+        self.shards = {shard_id: self.open_shard(shard_id) for shard_id in shard_ids}
+        self.ring = HashRing(shard_ids, replicas)
+        if moving:
+            logger.warning("Removing the keys an interrupted resharding of '%s' left on their old shards", db_name)
+            self.remove_moved_keys()
+        self.write_manifest()
+
+
+    '''
+    Return the name of the database of a shard.
+    '''
+    def shard_name(self, shard_id):
+        return f"{self.db_name}_shard{shard_id:03d}"
+
+
+    '''
+    Open a shard in this process or in a worker process.
+    '''
+    def open_shard(self, shard_id):
+        shard_class = ProcessShard if self.processes else LocalShard
+        return shard_class(self.storage, self.shard_name(shard_id), self.custom_wal, self.durability)
+
+
+    '''
+    Read the shard ids from the manifest.
+        Returns:
+            tuple: (shard ids, empty if the database has no manifest yet, whether a MOVING line marks a resharding
+                   whose moved keys may still be on their old shards).
+    '''
+    def read_manifest(self):
+        try:
+            with open(self.manifest_file_name, 'r') as f:
+                lines = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return [], False
+        return [int(line) for line in lines if line != MOVING], MOVING in lines
+
+
+    '''
+    Write the shard ids to the manifest, through a temp file swapped in with os.replace.
+        Args:
+            moving (bool): Add the MOVING line, until the keys moved by add_shard are deleted from their old shards.
+    '''
+    def write_manifest(self, moving=False):
+        with open(self.manifest_file_name + '.tmp', 'w') as f:
+            for shard_id in sorted(self.shards):
+                f.write(f"{shard_id}\n")
+            if moving:
+                f.write(f"{MOVING}\n")
+        os.replace(self.manifest_file_name + '.tmp', self.manifest_file_name)
+
+
+    '''
+    Delete from every shard the keys the ring assigns to another shard, the copies an interrupted add_shard left.
+    '''
+    def remove_moved_keys(self):
+        exports = self.scatter({shard_id: ("export", ()) for shard_id in self.shards})
+        orphans = {shard_id: [key for key, _, _ in rows if self.ring.get(key) != shard_id] for shard_id, rows in exports.items()}
+        self.scatter({shard_id: ("mdelete", (keys,)) for shard_id, keys in orphans.items() if keys})
+
+
+    '''
+    Return the shard owning a key.
+    '''
+    def shard_for(self, key):
+        return self.shards[self.ring.get(key)]
+
+
+    '''
+    Run one call on each of several shards, all calls are sent before any result is awaited.
+        Args:
+            calls (dict): Shard id -> (method name, argument tuple).
+        Returns:
+            dict: Shard id -> result of its call.
+    '''
+    def scatter(self, calls):
+        # Shards are always addressed in id order, so concurrent scatters cannot wait on each other's pipes.
+        waits = {shard_id: self.shards[shard_id].send(method, *args) for shard_id, (method, args) in sorted(calls.items())}
+        results = {}
+        error = None
+        for shard_id, wait in waits.items():
+            try:
+                results[shard_id] = wait()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+
+    '''
+    Group keys by the shard owning them.
+        Returns:
+            dict: Shard id -> list of keys.
+    '''
+    def group_keys(self, keys):
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.ring.get(key), []).append(key)
+        return groups
+
+
+    '''
+    Set a key-value pair on the shard owning the key.
+    '''
+    def set(self, key, value, ttl=None):
+        with self.lock.read():
+            return self.shard_for(key).call("set", key, value, ttl)
+
+
+    '''
+    Increment the value of a key on the shard owning the key.
+        Returns:
+            bool: True if the key exists and was incremented, False otherwise.
+    '''
+    def incr(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("incr", key)
+
+
+    '''
+    Add an amount to the counter of a key on the shard owning the key, see SimpleDB.incrby.
+    '''
+    def incrby(self, key, amount=1):
+        with self.lock.read():
+            return self.shard_for(key).call("incrby", key, amount)
+
+
+    '''
+    Subtract an amount from the counter of a key on the shard owning the key.
+    '''
+    def decrby(self, key, amount=1):
+        return self.incrby(key, -int(amount))
+
+
+    '''
+    Set fields of a hash on the shard owning the key, see SimpleDB.hset.
+    '''
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.lock.read():
+            return self.shard_for(key).call("hset", key, field, value, mapping)
+
+
+    '''
+    Get a field of a hash from the shard owning the key.
+    '''
+    def hget(self, key, field):
+        with self.lock.read():
+            return self.shard_for(key).call("hget", key, field)
+
+
+    '''
+    Get every field of a hash from the shard owning the key.
+    '''
+    def hgetall(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("hgetall", key)
+
+
+    '''
+    Delete fields of a hash on the shard owning the key.
+    '''
+    def hdel(self, key, *fields):
+        with self.lock.read():
+            return self.shard_for(key).call("hdel", key, *fields)
+
+
+    '''
+    Insert values at the head of a list on the shard owning the key.
+    '''
+    def lpush(self, key, *values):
+        with self.lock.read():
+            return self.shard_for(key).call("lpush", key, *values)
+
+
+    '''
+    Append values at the tail of a list on the shard owning the key.
+    '''
+    def rpush(self, key, *values):
+        with self.lock.read():
+            return self.shard_for(key).call("rpush", key, *values)
+
+
+    '''
+    Get a range of a list from the shard owning the key.
+    '''
+    def lrange(self, key, start=0, stop=-1):
+        with self.lock.read():
+            return self.shard_for(key).call("lrange", key, start, stop)
+
+
+    '''
+    Get the length of a list from the shard owning the key.
+    '''
+    def llen(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("llen", key)
+
+
+    '''
+    Get the type of the value of a key from the shard owning the key.
+    '''
+    def key_type(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("key_type", key)
+
+
+    '''
+    Get the value of a key from the shard owning the key.
+    '''
+    def get(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("get", key)
+
+
+    '''
+    Delete a key from the shard owning the key.
+    '''
+    def delete(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("delete", key)
+
+
+    '''
+    Check if a key exists on the shard owning the key.
+    '''
+    def exists(self, key):
+        with self.lock.read():
+            return self.shard_for(key).call("exists", key)
+
+
+    '''
+    Set several key-value pairs, every shard involved writes its part as one batch.
+    '''
+    def mset(self, mapping, ttl=None):
+        with self.lock.read():
+            groups = self.group_keys(mapping)
+            self.scatter({shard_id: ("mset", ({key: mapping[key] for key in keys}, ttl))
+                          for shard_id, keys in groups.items()})
+
+
+    '''
+    Get the values of several keys, the shards involved are read in parallel.
+        Returns:
+            list: The values in the order of keys, None for keys that do not exist.
+    '''
+    def mget(self, keys):
+        with self.lock.read():
+            groups = self.group_keys(keys)
+            results = self.scatter({shard_id: ("mget", (shard_keys,)) for shard_id, shard_keys in groups.items()})
+            values = {}
+            for shard_id, shard_keys in groups.items():
+                values.update(zip(shard_keys, results[shard_id]))
+            return [values[key] for key in keys]
+
+
+    '''
+    Delete several keys, every shard involved deletes its part as one batch.
+        Returns:
+            int: The number of keys that were deleted.
+    '''
+    def mdelete(self, keys):
+        with self.lock.read():
+            groups = self.group_keys(keys)
+            return sum(self.scatter({shard_id: ("mdelete", (shard_keys,)) for shard_id, shard_keys in groups.items()}).values())
+
+
+    '''
+    Return a page of live keys in key order over every shard, see SimpleDB.key_page.
+    Every shard returns its own page, the merged page stops at the smallest last key of the shards that have more,
+    so no shard can still hold a key that sorts before the end of the page.
+    '''
+    def key_page(self, start=None, end=None, count=PAGE_SIZE, after=False):
+        with self.lock.read():
+            pages = self.scatter({shard_id: ("key_page", (start, end, count, after)) for shard_id in self.shards})
+        lasts = [last for _, last in pages.values() if last is not None]
+        last = min(lasts) if lasts else None
+        keys = sorted(key for shard_keys, _ in pages.values() for key in shard_keys if last is None or key <= last)
+        return keys, last
+
+
+    '''
+    Incrementally iterate the keys of every shard, see SimpleDB.scan.
+    '''
+    def scan(self, cursor=0, match=None, count=10):
+        return scan_page(self.key_page, cursor, match, count)
+
+
+    '''
+    Lazily iterate the keys starting with a prefix in key order, over every shard.
+    '''
+    def keys(self, prefix=""):
+        for keys in iterate_pages(self.key_page, prefix or None, prefix_end(prefix)):
+            yield from keys
+
+
+    '''
+    Lazily iterate the (key, value) pairs with start <= key < end in key order, over every shard.
+    '''
+    def range(self, start=None, end=None):
+        for keys in iterate_pages(self.key_page, start, end):
+            for key, value in zip(keys, self.mget(keys)):
+                if value is not None:
+                    yield key, value
+
+
+    '''
+    Clear every shard.
+    '''
+    def clear(self):
+        with self.lock.read():
+            self.scatter({shard_id: ("clear", ()) for shard_id in self.shards})
+
+
+    '''
+    Delete the expired keys of every shard.
+    '''
+    def expire_keys(self):
+        with self.lock.read():
+            self.scatter({shard_id: ("expire_keys", ()) for shard_id in self.shards})
+
+
+    '''
+    Return the number of keys over every shard.
+    '''
+    def dbsize(self):
+        with self.lock.read():
+            return sum(self.scatter({shard_id: ("dbsize", ()) for shard_id in self.shards}).values())
+
+
+    '''
+    Report the state and the metrics of every shard, see SimpleDB.info.
+    The 'stats' and 'wal' counters are summed over the shards, latencies stay per shard in 'shards' and the
+    slow logs are merged, slowest first.
+    '''
+    def info(self, slowlog_count=10):
+        with self.lock.read():
+            infos = self.scatter({shard_id: ("info", (slowlog_count,)) for shard_id in self.shards})
+        stats = {}
+        wal = {}
+        for info in infos.values():
+            for name, value in info["stats"].items():
+                if name != "hit_rate":
+                    stats[name] = stats.get(name, 0) + value
+            for name in ("records", "bytes", "fsyncs"):
+                wal[name] = wal.get(name, 0) + info["wal"][name]
+        hits, misses = stats.get("keyspace_hits", 0), stats.get("keyspace_misses", 0)
+        stats["hit_rate"] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+        slowlog = sorted((dict(entry, shard=shard_id) for shard_id, info in infos.items() for entry in info["slowlog"]),
+                         key=lambda entry: entry["duration_ms"], reverse=True)
+        return {
+            "server": {
+                "db_name": self.db_name,
+                "storage": f"{type(self).__name__}({self.storage})",
+                "shards": len(infos),
+                "processes": self.processes,
+                "keys": sum(info["server"]["keys"] for info in infos.values()),
+                "keys_with_ttl": sum(info["server"]["keys_with_ttl"] for info in infos.values()),
+            },
+            "stats": stats,
+            "wal": wal,
+            "slowlog": slowlog[:slowlog_count],
+            "shards": infos,
+        }
+
+
+    '''
+    Start a background snapshot on every shard, see SimpleDB.bgsave.
+        Returns:
+            bool: True if at least one shard started a snapshot.
+    '''
+    def bgsave(self):
+        with self.lock.read():
+            return any(self.scatter({shard_id: ("bgsave", ()) for shard_id in self.shards}).values())
+
+
+    '''
+    Return the time of the oldest last save over the shards as epoch seconds.
+    '''
+    def lastsave(self):
+        with self.lock.read():
+            return min(self.scatter({shard_id: ("lastsave", ()) for shard_id in self.shards}).values())
+
+
+    '''
+    Return the slowest operations over every shard, slowest first.
+    '''
+    def slowlog(self, count=None):
+        return self.info(count)["slowlog"]
+
+
+    '''
+    Hold the database exclusively for a group of writes.
+    A batch is atomic within each shard it touches through mset and mdelete, but not across shards.
+    '''
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            yield self
+
+
+    '''
+    Add a shard and move the keys it takes over from the other shards.
+    The keys are copied to the new shard before the manifest lists it, and only deleted from their old shard
+    afterwards, so an interrupted resharding never loses a key. The manifest is marked MOVING until they are
+    deleted, a database opened after a crash in between deletes the old copies, see remove_moved_keys.
+        Returns:
+            int: The number of keys that were moved.
+    '''
+    def add_shard(self):
+        with self.lock:
+            shard_id = max(self.shards) + 1
+            shard = self.open_shard(shard_id)
+            # Leftovers of an interrupted add_shard, the manifest never listed this shard.
+            shard.call("clear")
+            ring = HashRing(list(self.shards) + [shard_id], self.ring.replicas)
+            exports = self.scatter({old_id: ("export", ()) for old_id in self.shards})
+            moved = {}
+            by_ttl = {}
+            for old_id, rows in exports.items():
+                rows = [row for row in rows if ring.get(row[0]) == shard_id]
+                if rows:
+                    moved[old_id] = [key for key, _, _ in rows]
+                for key, value, ttl in rows:
+                    by_ttl.setdefault(ttl, {})[key] = value
+            for ttl, mapping in by_ttl.items():
+                shard.call("mset", mapping, [str(ttl)] if ttl else None)
+            self.shards[shard_id] = shard
+            self.ring = ring
+            self.write_manifest(moving=True)
+            self.scatter({old_id: ("mdelete", (keys,)) for old_id, keys in moved.items()})
+            self.write_manifest()
+            return sum(len(keys) for keys in moved.values())
+
+
+    '''
+    Close every shard, stopping the worker processes.
+    '''
+    def close(self):
+        with self.lock:
+            for shard in self.shards.values():
+                shard.close()
+
+
+    '''
+    Drop every shard and remove the manifest.
+    '''
+    def drop(self):
+        with self.lock:
+            self.scatter({shard_id: ("drop", ()) for shard_id in self.shards})
+            for shard in self.shards.values():
+                shard.close()
+            self.shards.clear()
+            if os.path.exists(self.manifest_file_name):
+                os.remove(self.manifest_file_name)
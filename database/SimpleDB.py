@@ -1,5 +1,35 @@
-import datetime as dt,os
+import datetime as dt,os,heapq,functools,contextlib,time,math,sys,threading,logging,concurrent.futures
 from utilities.logger.wal import wal
+from utilities.logger.Log import get_logger
+from utilities.metrics.Metrics import Metrics
+from utilities.expiry.ActiveExpiry import ActiveExpiry
+from utilities.replication.Replication import ReplicationLeader, AUTHKEY
+from utilities.eviction.MemoryLimit import MemoryLimit, size_change
+from utilities.serializer.Compression import open_file, check_codec
+from utilities.serializer.TypedValue import (WrongTypeError, check_type, type_name, escape, unescape, encode_fields,
+                                             decode_fields, encode_text, decode_text, copy_value, list_slice)
+from utilities.index.SortedKeys import SortedKeys, iterate_pages, scan_page, prefix_end, PAGE_SIZE
+from utilities.concurrency.RWLock import RWLock
+
+
+logger = get_logger("db")
+
+# First line of a txt database or expiry file written with typed values, files without it hold 'key:value' lines.
+TEXT_HEADER = "#SimpleDB 2\n"
+
+PERSISTENCE_MODES = ("sync", "background")
+
+
+'''
+Decorator running a method while holding the write side of the database lock, so background workers and callers do not interleave.
+Reads take the read side instead and run concurrently with each other.
+'''
+def synchronized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 ''' 
@@ -14,38 +44,107 @@ class SimpleDB:
         Args:
             db_name (str): The name of the database file.
             custom_wal (bool): A flag indicating whether to use a custom WAL implementation.
+            durability (str): When WAL records are fsynced, one of 'always', 'group', 'everysec' or 'none'.
+            segment_size (int): Size in bytes after which the WAL rotates into a new numbered segment.
+            archive_wal (bool): Archive WAL segments older than the last checkpoint instead of deleting them.
+            wal_format (str): 'text' for human readable WAL records or 'binary' for length-prefixed, checksummed ones.
+            maxmemory (int or str, optional): Approximate memory limit of the data in bytes, or a size such as '100mb'.
+            maxmemory_policy (str): What a write does at the limit, 'noeviction', 'allkeys-lru', 'allkeys-lfu' or 'volatile-ttl'.
+            maxmemory_samples (int): Number of random keys compared per LRU or LFU eviction.
+            persistence (str): 'sync' saves the database file after every write, 'background' only logs writes to the WAL
+                               and saves with background snapshots, see bgsave.
+            snapshot_changes (int): With background persistence, writes after which a snapshot is started.
+            snapshot_interval (float): With background persistence, seconds after which a write starts a snapshot.
+            compression (str): Codec of the database files and the closed WAL segments, 'none', 'zlib' or 'lzma',
+                               see Compression. Files written with another codec, or none, are still read.
     ''' 
-    def __init__(self, db_name,custom_wal=False):
+    def __init__(self, db_name,custom_wal=False,durability="none",segment_size=4 * 1024 * 1024,archive_wal=False,wal_format="text",
+                 maxmemory=None,maxmemory_policy="noeviction",maxmemory_samples=5,
+                 persistence="sync",snapshot_changes=1000,snapshot_interval=60.0,compression="none"):
+        if persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"Unknown persistence mode '{persistence}', expected one of {PERSISTENCE_MODES}")
+        check_codec(compression)
         self.db_name = db_name
+        self.compression = compression
+        self.persistence = persistence
+        self.snapshot_changes = snapshot_changes
+        self.snapshot_interval = snapshot_interval
+        self.changes = 0
+        self.last_save = time.time()
+        self.bgsave_thread = None
+        self.last_bgsave_ok = None
+        self.temp_suffix = ".tmp"
         self.data = {}
         self.expiry={}
+        self.expiry_heap=[]
+        self.lock = RWLock()
+        self.active_expiry = None
+        self.replication = None
+        self.batch_id = None
+        self.batch_undo = None
+        self.eviction = None
+        self.index = SortedKeys()
+        self.metrics = Metrics()
         self.log_file_name = f"{db_name}.log"
-        self.wal = wal(self.log_file_name,custom_wal)
+        self.wal = wal(self.log_file_name,custom_wal,durability,segment_size=segment_size,archive=archive_wal,log_format=wal_format,
+                       metrics=self.metrics,compression=compression)
         self.wal.write_log("init", db_name)
+        start = time.perf_counter()
         self.load()
+        self.build_index()
+        self.startup_seconds = time.perf_counter() - start
+        self.metrics.observe("startup", self.startup_seconds)
+        logger.info("Database '%s' loaded %d keys in %.3fs", db_name, self.dbsize(), self.startup_seconds)
+        if maxmemory is not None:
+            self.eviction = MemoryLimit(self, maxmemory, maxmemory_policy, maxmemory_samples)
 
 
     '''
     Set a key-value pair in the database.
         Args:
             key (str): The key to set.
-            value (str): The value to associate with the key.
+            value (str): The value to associate with the key, an int, dict or list value is stored as a counter, hash or list.
     If the operation is successful, the data is saved to the database file and a log entry is written.
-    If the operation fails, an error message is printed.
+    Keys whose TTL is due are expired afterwards, reads only check the key they access.
+    Inside a batch the change is only logged and applied in memory, the batch persists once at commit.
+    With maxmemory set, keys are evicted first if the write does not fit, MaxMemoryError is raised if none can be.
+    If the operation fails, a warning is logged.
     '''
+    @synchronized
     def set(self, key, value, ttl=None):
-        if self.wal.write_log( "set", key, value, ttl[0] if ttl else None):
-            self.data[key] = value
-            if ttl:
-                expiry_time = dt.datetime.now() + dt.timedelta(seconds=int(ttl[0]))
-                self.expiry[key] = expiry_time
+        with self.metrics.timer("set", key) as timer:
+            evicted = ()
+            if self.eviction:
+                old_value = self.data.get(key)
+                evicted = self.eviction.make_room(key, size_change(key, old_value, value))
+                timer.phase("evict")
+            batching = self.batch_undo is not None
+            if batching:
+                self.batch_undo.append(self.undo_entry(key))
+            # A typed value is logged with its type tag, replay restores it as it was.
+            operation, log_value = ("set", value) if isinstance(value, str) else ("restore", "".join(encode_text(value)))
+            if self.wal.write_log(operation, key, log_value, ttl[0] if ttl else None, sync=not batching):
+                timer.phase("wal")
+                if key not in self.data:
+                    self.index.add(key)
+                self.data[key] = value
+                if self.eviction:
+                    self.eviction.account(key, old_value, value)
+                if ttl:
+                    self.set_expiry(key, dt.datetime.now() + dt.timedelta(seconds=int(ttl[0])))
+                else:
+                    self.set_expiry(key, None)
+                timer.phase("mutate")
+                if batching:
+                    return
+                if self.persist() and self.wal.custom_wal:
+                    self.wal.write_log(operation, key, log_value, ttl[0] if ttl else None, state="SUCCESS")
+                    for victim in evicted:
+                        self.wal.write_log("delete", victim, state="SUCCESS")
+                timer.phase("persist")
+                self.expire_keys()
             else:
-                self.expiry[key] = None
-            self.save()
-            if self.wal.custom_wal:
-                self.wal.write_log("set", key, value, ttl[0] if ttl else None, state="SUCCESS")
-        else:
-            print("operation failed")
+                logger.warning("set of '%s' failed", key)
     
     
     '''
@@ -54,23 +153,320 @@ class SimpleDB:
             key (str): The key to increment.
         Returns:
             bool: True if the key exists and was incremented, False otherwise.
-    If the key exists, it's value is incremented by 1.
-    If the operation is successful, the data is saved to the database file and a log entry is written.
-    If the operation fails, an error message is printed.
+    If the key exists, it's value is incremented by 1, see incrby.
+    If the value is not an integer, a warning is logged.
     '''
+    @synchronized
     def incr(self,key):
-        self.expire_keys()
-        if key in self.data:
-            try:
-                self.wal.write_log("incr", key, self.data[key])
-                self.data[key] = int(self.data[key]) + 1
-                self.save() 
-                if self.wal.custom_wal:
-                    self.wal.write_log("incr", key, self.data[key]-1, state="SUCCESS")
+        self.expire_key(key)
+        value = self.read_key(key)
+        if value is None:
+            return False
+        try:
+            self.update_counter(key, value, 1, "incr")
+            return True
+        except (ValueError, WrongTypeError):
+            logger.warning("Value for key '%s' is not an integer.", key)
+            return False
+
+
+    '''
+    Add an amount to the integer value of a key, a missing key starts at 0.
+        Args:
+            key (str): The counter to change.
+            amount (int): The amount to add, negative to subtract.
+        Returns:
+            int: The new value.
+        Raises:
+            ValueError: If the key holds a string that is not an integer.
+            WrongTypeError: If the key holds a hash or a list.
+    The counter is kept as an int, so once it holds one an increment neither parses nor formats a string.
+    The WAL records the resulting value, which recovery sets as is.
+    '''
+    @synchronized
+    def incrby(self, key, amount=1):
+        self.expire_key(key)
+        return self.update_counter(key, self.read_key(key), int(amount), "incrby")
+
+
+    '''
+    Subtract an amount from the integer value of a key, see incrby.
+    '''
+    def decrby(self, key, amount=1):
+        return self.incrby(key, -int(amount))
+
+
+    '''
+    Write the new value of a counter, shared by incr and incrby, the caller holds the lock.
+        Args:
+            key (str): The counter.
+            value: Its current value, None if it does not exist.
+            amount (int): The amount to add.
+            command (str): The command recorded in the metrics.
+        Returns:
+            int: The new value.
+    '''
+    def update_counter(self, key, value, amount, command):
+        if isinstance(value, (dict, list)):
+            raise WrongTypeError()
+        try:
+            counter = (0 if value is None else int(value)) + amount
+        except ValueError:
+            raise ValueError(f"Value for key '{key}' is not an integer") from None
+        self.write_value("incrby", key, str(counter), value, lambda current: counter, size_change(key, value, counter), command)
+        return counter
+
+
+    '''
+    Set fields of a hash, creating it if the key does not exist.
+        Args:
+            key (str): The key of the hash.
+            field (str, optional): The field to set.
+            value (str, optional): The value of field.
+            mapping (dict, optional): Several fields and values to set at once.
+        Returns:
+            int: The number of fields that were added, fields that already existed are updated.
+        Raises:
+            WrongTypeError: If the key holds a string or a list.
+    Only the written fields are logged to the WAL, whatever the size of the hash.
+    '''
+    @synchronized
+    def hset(self, key, field=None, value=None, mapping=None):
+        fields = {str(name): str(item) for name, item in (mapping or {}).items()}
+        if field is not None:
+            fields[str(field)] = str(value)
+        if not fields:
+            raise ValueError("hset needs at least one field")
+        self.expire_key(key)
+        current = self.read_key(key)
+        check_type(current, dict)
+        existing = current if current is not None else {}
+        added = sum(1 for name in fields if name not in existing)
+        growth = sum(sys.getsizeof(item) - sys.getsizeof(existing[name]) if name in existing
+                     else sys.getsizeof(name) + sys.getsizeof(item) for name, item in fields.items())
+
+        def update(hash_value):
+            hash_value = {} if hash_value is None else hash_value
+            hash_value.update(fields)
+            return hash_value
+
+        self.write_value("hset", key, encode_fields(item for pair in fields.items() for item in pair),
+                         current, update, growth)
+        return added
+
+
+    '''
+    Get the value of a field of a hash.
+        Returns:
+            str: The value, or None if the key or the field does not exist.
+        Raises:
+            WrongTypeError: If the key holds a string or a list.
+    '''
+    def hget(self, key, field):
+        return self.read_typed("hget", key, dict, lambda hash_value: hash_value.get(str(field)))
+
+
+    '''
+    Get every field and value of a hash.
+        Returns:
+            dict: A copy of the hash, empty if the key does not exist.
+        Raises:
+            WrongTypeError: If the key holds a string or a list.
+    '''
+    def hgetall(self, key):
+        return self.read_typed("hgetall", key, dict, dict.copy) or {}
+
+
+    '''
+    Delete fields of a hash, the key is deleted with its last field.
+        Returns:
+            int: The number of fields that were deleted.
+        Raises:
+            WrongTypeError: If the key holds a string or a list.
+    '''
+    @synchronized
+    def hdel(self, key, *fields):
+        self.expire_key(key)
+        current = self.read_key(key)
+        check_type(current, dict)
+        fields = [name for name in dict.fromkeys(map(str, fields)) if current is not None and name in current]
+        if not fields:
+            return 0
+        growth = -sum(sys.getsizeof(name) + sys.getsizeof(current[name]) for name in fields)
+
+        def update(hash_value):
+            for name in fields:
+                hash_value.pop(name, None)
+            return hash_value
+
+        self.write_value("hdel", key, encode_fields(fields), current, update, growth)
+        return len(fields)
+
+
+    '''
+    Insert values at the head of a list, creating it if the key does not exist.
+    Like Redis, the values are inserted one after the other, so the last one ends up first.
+        Returns:
+            int: The length of the list after the push.
+        Raises:
+            WrongTypeError: If the key holds a string or a hash.
+    '''
+    @synchronized
+    def lpush(self, key, *values):
+        return self.push("lpush", key, values)
+
+
+    '''
+    Append values at the tail of a list, creating it if the key does not exist.
+        Returns:
+            int: The length of the list after the push.
+        Raises:
+            WrongTypeError: If the key holds a string or a hash.
+    '''
+    @synchronized
+    def rpush(self, key, *values):
+        return self.push("rpush", key, values)
+
+
+    '''
+    Push values to a list, shared by lpush and rpush, the caller holds the lock.
+    The WAL record holds the pushed values and the resulting length. Lists only grow until the key is set or deleted
+    whole, so recovery applies a push only to a list that is still shorter than that length and replaying a record
+    on top of a database file that already has it changes nothing.
+    '''
+    def push(self, operation, key, values):
+        if not values:
+            raise ValueError(f"{operation} needs at least one value")
+        values = [str(value) for value in values]
+        self.expire_key(key)
+        current = self.read_key(key)
+        check_type(current, list)
+        length = len(values) + (len(current) if current is not None else 0)
+
+        def update(list_value):
+            list_value = [] if list_value is None else list_value
+            if operation == "lpush":
+                list_value[:0] = reversed(values)
+            else:
+                list_value.extend(values)
+            return list_value
+
+        self.write_value(operation, key, encode_fields([length, *values]), current, update,
+                         sum(map(sys.getsizeof, values)))
+        return length
+
+
+    '''
+    Get a range of a list, like the Redis LRANGE command.
+        Args:
+            key (str): The key of the list.
+            start (int): Index of the first item, negative indexes count from the end.
+            stop (int): Index of the last item, included, -1 for the last item.
+        Returns:
+            list: The items, empty if the key does not exist.
+        Raises:
+            WrongTypeError: If the key holds a string or a hash.
+    '''
+    def lrange(self, key, start=0, stop=-1):
+        return self.read_typed("lrange", key, list,
+                               lambda list_value: list_value[list_slice(len(list_value), int(start), int(stop))]) or []
+
+
+    '''
+    Get the length of a list, 0 if the key does not exist.
+        Raises:
+            WrongTypeError: If the key holds a string or a hash.
+    '''
+    def llen(self, key):
+        return self.read_typed("llen", key, list, len) or 0
+
+
+    '''
+    Get the type of the value of a key: 'string', 'hash', 'list', or 'none' if the key does not exist.
+    '''
+    def key_type(self, key):
+        return self.read_typed("type", key, None, type_name) or "none"
+
+
+    '''
+    Read part of a typed value under the read side of the lock, expired keys read as missing.
+        Args:
+            operation (str): The command recorded in the metrics.
+            key (str): The key to read.
+            expected (type): dict or list, None to accept any type.
+            read (callable): read(value) -> the result, only called if the key exists.
+        Returns:
+            The result of read, None if the key does not exist.
+        Raises:
+            WrongTypeError: If the key holds another type than expected.
+    '''
+    def read_typed(self, operation, key, expected, read):
+        start = time.perf_counter()
+        with self.lock.read():
+            value = None if self.is_expired(key) else self.read_key(key)
+            if expected is not None:
+                check_type(value, expected)
+            result = None if value is None else read(value)
+            if value is not None and self.eviction and self.eviction.sampling:
+                self.eviction.touch(key)
+        self.metrics.record_read(operation, time.perf_counter() - start, 1, int(value is not None))
+        return result
+
+
+    '''
+    Run a typed write the way set does: evict if needed, log the change to the WAL, apply it and persist.
+    The caller holds the lock and has checked the type of the key.
+        Args:
+            operation (str): The WAL operation, e.g. 'hset'.
+            key (str): The written key.
+            log_value (str): The value of the WAL record, only the change and not the whole value.
+            current: The current value of the key, None if it does not exist.
+            update (callable): update(current) -> the new value, a hash or list may be updated in place and is
+                               deleted if it is left empty.
+            growth (int): Memory the write adds, used with maxmemory.
+            command (str, optional): The command recorded in the metrics, defaults to operation.
+        Returns:
+            bool: True if the write was logged and applied, False otherwise.
+    '''
+    def write_value(self, operation, key, log_value, current, update, growth=0, command=None):
+        with self.metrics.timer(command or operation, key) as timer:
+            evicted = ()
+            if self.eviction and growth > 0:
+                evicted = self.eviction.make_room(key, growth)
+                timer.phase("evict")
+            batching = self.batch_undo is not None
+            if batching:
+                self.batch_undo.append(self.undo_entry(key))
+            if not self.wal.write_log(operation, key, log_value, sync=not batching):
+                logger.warning("%s of '%s' failed", operation, key)
+                return False
+            timer.phase("wal")
+            value = update(current)
+            if isinstance(value, (dict, list)) and not value:
+                if self.eviction:
+                    self.eviction.resize(key, growth)
+                    self.eviction.account(key, value, None)
+                del self.data[key]
+                self.index.remove(key)
+                self.expiry.pop(key, None)
+            else:
+                if self.eviction:
+                    if value is current:
+                        self.eviction.resize(key, growth)
+                    else:
+                        self.eviction.account(key, current, value)
+                if current is None:
+                    self.index.add(key)
+                self.data[key] = value
+            timer.phase("mutate")
+            if batching:
                 return True
-            except ValueError:
-                print(f"Value for key '{key}' is not an integer.")
-        return False
+            if self.persist() and self.wal.custom_wal:
+                self.wal.write_log(operation, key, log_value, state="SUCCESS")
+                for victim in evicted:
+                    self.wal.write_log("delete", victim, state="SUCCESS")
+            timer.phase("persist")
+            return True
     
 
     '''
@@ -81,8 +477,7 @@ class SimpleDB:
             str: The value associated with the key, or None if the key does not exist.
     '''
     def get(self, key):
-        self.expire_keys()
-        return self.data.get(key, None)
+        return self.mget([key])[0]
  
  
     '''    
@@ -90,21 +485,33 @@ class SimpleDB:
         Args:   
             key (str): The key to delete.
     If the operation is successful, the key is removed from the data dictionary and the database file is updated and a log entry is written.
-    If the operation fails, an error message is printed.        
+    If the key does not exist, False is returned.
     '''
+    @synchronized
     def delete(self, key):
-        if key in self.data:
-            self.wal.write_log("delete", key)
-            del self.data[key]
-            if key in self.expiry:
-                del self.expiry[key]
-            self.save()
-            if self.wal.custom_wal:
-                self.wal.write_log("delete", key, state="SUCCESS")
-            return True
-        else:
-            print("operation failed")
-            return False
+        with self.metrics.timer("delete", key) as timer:
+            if key in self.data:
+                batching = self.batch_undo is not None
+                if batching:
+                    self.batch_undo.append(self.undo_entry(key))
+                self.wal.write_log("delete", key, sync=not batching)
+                timer.phase("wal")
+                if self.eviction:
+                    self.eviction.account(key, self.data[key], None)
+                del self.data[key]
+                self.index.remove(key)
+                if key in self.expiry:
+                    del self.expiry[key]
+                timer.phase("mutate")
+                if batching:
+                    return True
+                if self.persist() and self.wal.custom_wal:
+                    self.wal.write_log("delete", key, state="SUCCESS")
+                timer.phase("persist")
+                return True
+            else:
+                logger.debug("delete of missing key '%s'", key)
+                return False
         
         
     ''' 
@@ -115,8 +522,7 @@ class SimpleDB:
             bool: True if the key exists, False otherwise.
     '''
     def exists(self, key):
-        self.expire_keys()
-        return key in self.data
+        return self.get(key) is not None
     
     
     ''' 
@@ -125,45 +531,700 @@ class SimpleDB:
     If the operation is successful, a log entry is written.
     If the operation fails, an error message is printed.
     '''
+    @synchronized
     def clear(self):
         for key in list(self.data.keys()):
             self.delete(key)
-        
-        
+
+
+    '''
+    Set several key-value pairs as a single batch.
+        Args:
+            mapping (dict): The keys and values to set.
+            ttl (list, optional): A single element list holding the TTL in seconds, applied to every key.
+    '''
+    def mset(self, mapping, ttl=None):
+        with self.batch():
+            for key, value in mapping.items():
+                self.set(key, value, ttl)
+
+
+    '''
+    Get the values of several keys.
+        Args:
+            keys (list): The keys to retrieve.
+            blocking (bool): With False, return None instead of waiting for a writer or deleting expired keys,
+                             so a caller that must not block, see AsyncSimpleDB, can retry with a blocking read elsewhere.
+        Returns:
+            list: The values in the order of keys, None for keys that do not exist.
+    The keys are read under the read side of the lock, concurrent reads do not wait for each other.
+    Keys found expired are hidden and deleted afterwards under the write side.
+    '''
+    def mget(self, keys, blocking=True):
+        start = time.perf_counter()
+        if not self.lock.acquire_read(blocking):
+            return None
+        try:
+            expired = {key for key in keys if self.is_expired(key)}
+            values = [None if key in expired else self.read_key(key) for key in keys]
+            if self.eviction and self.eviction.sampling:
+                for key, value in zip(keys, values):
+                    if value is not None:
+                        self.eviction.touch(key)
+        finally:
+            self.lock.release_read()
+        if expired:
+            if not blocking:
+                return None
+            with self.lock:
+                for key in expired:
+                    self.expire_key(key)
+        self.metrics.record_read("get" if len(values) == 1 else "mget", time.perf_counter() - start,
+                                 len(values), len(values) - values.count(None))
+        return values
+
+
+    '''
+    Check whether a key is present but past its TTL, the caller holds the lock.
+    '''
+    def is_expired(self, key):
+        expiry_time = self.expiry.get(key)
+        return bool(expiry_time and expiry_time <= dt.datetime.now() and key in self.data)
+
+
+    '''
+    Return the stored value of a key without checking its TTL, the caller holds the lock.
+    '''
+    def read_key(self, key):
+        return self.data.get(key)
+
+
+    '''
+    Export every live key, used to move keys between databases.
+        Returns:
+            list: (key, value, remaining TTL in whole seconds rounded up or None) tuples.
+    '''
+    def export(self):
+        with self.lock.read():
+            now = dt.datetime.now()
+            rows = []
+            for key in list(self.data):
+                expiry_time = self.expiry.get(key)
+                if expiry_time and expiry_time <= now:
+                    continue
+                ttl = math.ceil((expiry_time - now).total_seconds()) if expiry_time else None
+                rows.append((key, self.data[key], ttl))
+            return rows
+
+
+    '''
+    Rebuild the ordered key index from the loaded data.
+    '''
+    def build_index(self):
+        self.index = SortedKeys(self.data)
+
+
+    '''
+    Return a page of live keys in key order, the building block of scan, keys and range.
+        Args:
+            start (str, optional): First key of the page, None to start at the smallest key.
+            end (str, optional): The page stops before this key, None for no upper bound.
+            count (int): Number of index entries examined, expired keys among them are left out.
+            after (bool): Start after start instead of at it.
+        Returns:
+            tuple: (keys, last key examined to resume after, or None once the range is exhausted).
+    '''
+    def key_page(self, start=None, end=None, count=PAGE_SIZE, after=False):
+        with self.lock.read():
+            keys, last = self.index.page(start, end, count, after)
+            return [key for key in keys if not self.is_expired(key)], last
+
+
+    '''
+    Incrementally iterate the keys, like the Redis SCAN command.
+        Args:
+            cursor (int): 0 to start, then the cursor returned by the previous call.
+            match (str, optional): Glob pattern the returned keys match, e.g. 'user:123:*'.
+            count (int): Number of keys examined per call.
+        Returns:
+            tuple: (next cursor, 0 once every key was seen, list of keys).
+    A key present for the whole scan is returned exactly once, whatever is written meanwhile.
+    '''
+    def scan(self, cursor=0, match=None, count=10):
+        return scan_page(self.key_page, cursor, match, count)
+
+
+    '''
+    Lazily iterate the keys starting with a prefix in key order.
+    '''
+    def keys(self, prefix=""):
+        for keys in iterate_pages(self.key_page, prefix or None, prefix_end(prefix)):
+            yield from keys
+
+
+    '''
+    Lazily iterate the (key, value) pairs with start <= key < end in key order.
+        Args:
+            start (str, optional): First key, None to start at the smallest key.
+            end (str, optional): The iteration stops before this key, None for no upper bound.
+    '''
+    def range(self, start=None, end=None):
+        for keys in iterate_pages(self.key_page, start, end):
+            for key, value in zip(keys, self.mget(keys)):
+                if value is not None:
+                    yield key, value
+
+
+    '''
+    Delete several keys as a single batch.
+        Args:
+            keys (list): The keys to delete, missing keys are skipped.
+        Returns:
+            int: The number of keys that were deleted.
+    '''
+    def mdelete(self, keys):
+        with self.batch():
+            return sum(1 for key in keys if self.exists(key) and self.delete(key))
+
+
+    '''
+    Group writes into one atomic batch.
+    Writes made inside the block are enclosed in BEGIN/COMMIT WAL records that are synced once, and the database file
+    is persisted once at commit. Recovery replays a batch only if its COMMIT record made it to the log.
+    If the block raises, the in-memory changes are undone and the batch is logged as rolled back.
+    The database lock is held for the whole block, nested batches join the outer one.
+        with db.batch():
+            db.set("a", "1")
+            db.delete("b")
+    '''
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            if self.batch_undo is not None:
+                yield self
+                return
+            self.begin_batch()
+            try:
+                yield self
+            except BaseException:
+                self.rollback_batch()
+                raise
+            self.commit_batch()
+
+
+    '''
+    Start a batch, writes are recorded in the undo log until commit_batch or rollback_batch.
+    '''
+    def begin_batch(self):
+        self.metrics.incr("batches")
+        self.batch_id = str(time.time_ns())
+        self.batch_undo = []
+        self.wal.write_log("begin", self.batch_id, sync=False)
+
+
+    '''
+    Commit the current batch with one WAL sync and one persist.
+    A batch that wrote nothing only closes its BEGIN record, without a sync or a persist.
+    '''
+    def commit_batch(self):
+        batch_id, undo = self.batch_id, self.batch_undo
+        self.batch_id = None
+        self.batch_undo = None
+        if not undo:
+            self.wal.write_log("commit", batch_id, sync=False)
+            return
+        with self.metrics.timer("commit", batch_id) as timer:
+            self.wal.write_log("commit", batch_id)
+            timer.phase("wal")
+            if self.persist() and self.wal.custom_wal:
+                self.wal.write_log("commit", batch_id, state="SUCCESS")
+            timer.phase("persist")
+        self.expire_keys()
+
+
+    '''
+    Undo the in-memory changes of the current batch, newest first, and log the batch as rolled back.
+    '''
+    def rollback_batch(self):
+        self.metrics.incr("batch_rollbacks")
+        batch_id, undo = self.batch_id, self.batch_undo
+        self.batch_id = None
+        self.batch_undo = None
+        for entry in reversed(undo):
+            self.restore_undo_entry(entry)
+        self.wal.write_log("rollback", batch_id, sync=False)
+
+
+    '''
+    Capture the state of a key before a batched write changes it, a hash or list is copied as it is updated in place.
+        Returns:
+            tuple: (key, whether the key existed, its value, its expiry time).
+    '''
+    def undo_entry(self, key):
+        if key in self.data:
+            return key, True, copy_value(self.data[key]), self.expiry.get(key)
+        return key, False, None, None
+
+
+    '''
+    Restore a key to the state captured by undo_entry.
+    '''
+    def restore_undo_entry(self, entry):
+        key, existed, value, expiry_time = entry
+        if self.eviction:
+            self.eviction.account(key, self.data.get(key), value if existed else None)
+        if existed:
+            self.data[key] = value
+            self.index.add(key)
+            self.set_expiry(key, expiry_time)
+        else:
+            self.data.pop(key, None)
+            self.index.remove(key)
+            self.expiry.pop(key, None)
+
+
     '''
     Save the current state of the database to the database file.
     This method writes all key-value pairs in the data dictionary to the database file.
+    Every line is '<type tag>\t<key>\t<value>' with tabs, newlines and backslashes escaped, see TypedValue, so keys
+    may hold any character and counters, hashes and lists are written in their own encoding instead of as strings.
+    Each file is written to a temp file first and swapped in with os.replace, so readers never see a half-written file.
+    The temp files end in temp_suffix, a snapshot child uses its own so it never shares them with the parent.
+    Keys are written in the order of the key index, so the index is rebuilt at load without sorting the keys again.
+    With compression set both files are written as compressed blocks, see Compression.
+        Args:
+            sync (bool): fsync the temp files before they replace the current ones, so a crash cannot leave a
+                         renamed but empty file behind. Snapshots that let the WAL be truncated use it.
     '''
-    def save(self):
-        with open(self.db_name + '.txt','w') as f:
-            for key, value in self.data.items():
-                f.write(f"{key}:{value}\n")
-        with open(self.db_name + '_expiry.txt', 'w') as f:
+    def save(self, sync=False):
+        # The index only lags behind the data while the WAL is replayed at load, it is rebuilt then.
+        if len(self.index) != len(self.data):
+            self.build_index()
+        data = self.data
+        with open_file(self.db_name + '.txt' + self.temp_suffix,'w',self.compression) as f:
+            f.write(TEXT_HEADER)
+            for key in self.index:
+                tag, text = encode_text(data[key])
+                f.write(f"{tag}\t{escape(key)}\t{text}\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(self.db_name + '.txt' + self.temp_suffix, self.db_name + '.txt')
+        with open_file(self.db_name + '_expiry.txt' + self.temp_suffix, 'w', self.compression) as f:
+            f.write(TEXT_HEADER)
+            # Keys without a TTL are left out, the expiry file only grows with the keys that can expire.
             for key, value in self.expiry.items():
-                f.write(f"{key}:{value.isoformat() if value else 'None'}\n")
+                if value:
+                    f.write(f"{escape(key)}\t{value.isoformat()}\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(self.db_name + '_expiry.txt' + self.temp_suffix, self.db_name + '_expiry.txt')
+    
+    
+    '''
+    Persist the database file after a write and checkpoint the WAL when enough records accumulated.
+    Everything logged so far is reflected in the saved file, so older WAL segments can be truncated.
+    While a background snapshot runs, and with background persistence, the write is only counted, the WAL record is what makes it durable, and a
+    snapshot is started once snapshot_changes writes accumulated or snapshot_interval seconds passed since the last one.
+        Returns:
+            bool: True if the database file reflects the write, custom WAL SUCCESS records are only written then.
+    '''
+    def persist(self):
+        if self.bgsave_thread is not None:
+            # A snapshot child is writing the files, a save now could be renamed over by its older view, after the
+            # WAL was checkpointed past it. The write stays in the WAL and finish_bgsave saves again.
+            self.changes += 1
+            return False
+        if self.persistence == "background":
+            self.changes += 1
+            if self.changes >= self.snapshot_changes or time.time() - self.last_save >= self.snapshot_interval:
+                self.bgsave()
+            return False
+        start = time.perf_counter()
+        # The checkpoint truncates the WAL, the file it relies on must be on disk first unless nothing is fsynced.
+        self.save(sync=self.wal.durability != "none" and self.wal.checkpoint_due())
+        self.metrics.observe("save", time.perf_counter() - start)
+        self.last_save = time.time()
+        self.wal.maybe_checkpoint()
+        return True
+
+
+    '''
+    Start writing a snapshot of the database in the background, like the Redis BGSAVE command.
+    The process forks and the child saves its copy-on-write view of the data to temp files, fsyncs them and swaps them
+    in with os.replace, while the parent keeps serving. Pages are only copied when the parent writes to them, so the
+    writes going on meanwhile pay for what they touch and not for the size of the database.
+    Once the child exited cleanly the WAL is checkpointed at its position at the fork, so it only covers the writes
+    made since the snapshot. A failed snapshot leaves the previous file and the WAL as they were.
+    Where os.fork is not available the snapshot is written in the foreground.
+        Returns:
+            bool: True if a snapshot was started, False if one is already running or a batch is open.
+    '''
+    def bgsave(self):
+        with self.lock:
+            if self.bgsave_thread is not None or self.batch_undo is not None:
+                return False
+            position = self.wal.position()
+            changes = self.changes
+            start = time.perf_counter()
+            if not hasattr(os, "fork"):
+                try:
+                    self.save(sync=True)
+                    saved = True
+                except OSError as e:
+                    logger.error("Saving database '%s' failed: %s", self.db_name, e)
+                    saved = False
+                self.finish_bgsave(position, changes, start, saved)
+                return True
+            pid = os.fork()
+            if pid == 0:
+                self.write_snapshot()
+            self.metrics.observe("fork", time.perf_counter() - start)
+            self.bgsave_thread = threading.Thread(target=self.wait_bgsave_child, args=(pid, position, changes, start),
+                                                  daemon=True)
+            self.bgsave_thread.start()
+            logger.info("Background saving of '%s' started by pid %d", self.db_name, pid)
+            return True
+
+
+    '''
+    Body of the snapshot child, it never returns. Nothing but the save runs here, the locks of the parent's other
+    threads may have been held at the fork. The temp files carry the pid of the child.
+    '''
+    def write_snapshot(self):
+        code = 1
+        try:
+            self.temp_suffix = f".{os.getpid()}.tmp"
+            self.save(sync=True)
+            code = 0
+        finally:
+            os._exit(code)
+
+
+    '''
+    Wait for the snapshot child in a helper thread and finish the snapshot.
+    '''
+    def wait_bgsave_child(self, pid, position, changes, start):
+        _, status = os.waitpid(pid, 0)
+        self.finish_bgsave(position, changes, start, os.waitstatus_to_exitcode(status) == 0)
+
+
+    '''
+    Checkpoint the WAL at the position of a snapshot that succeeded and record its outcome.
+    With sync persistence the writes made while the snapshot ran were not saved, the database file is saved now.
+        Args:
+            position (tuple): The WAL position when the snapshot was taken.
+            changes (int): The writes the snapshot holds, writes made meanwhile still count towards the next one.
+            start (float): perf_counter when the snapshot started.
+            saved (bool): Whether the snapshot was written.
+    '''
+    def finish_bgsave(self, position, changes, start, saved):
+        with self.lock:
+            self.bgsave_thread = None
+            self.last_bgsave_ok = saved
+            if saved:
+                self.wal.checkpoint(position)
+                self.changes -= changes
+                self.last_save = time.time()
+            if self.persistence == "sync" and self.changes:
+                self.changes = 0
+                self.persist()
+        self.metrics.observe("bgsave", time.perf_counter() - start, bgsaves=1, bgsave_failures=0 if saved else 1)
+        if saved:
+            logger.info("Background saving of '%s' done", self.db_name)
+        else:
+            logger.error("Background saving of '%s' failed, the previous snapshot and the WAL are kept", self.db_name)
+
+
+    '''
+    Wait until the running background snapshot, if any, is finished.
+    '''
+    def wait_bgsave(self):
+        thread = self.bgsave_thread
+        if thread is not None:
+            thread.join()
+
+
+    '''
+    Return the time of the last successful save as epoch seconds, like the Redis LASTSAVE command.
+    '''
+    def lastsave(self):
+        return int(self.last_save)
     
     
     '''
         This method checks for keys that have expired based on their TTL (Time To Live).
-        If a key has a TTL and the current time exceeds the TTL, the key is deleted from the database.
+        Deadlines are kept in a min-heap, so only the keys that are due are looked at and deleted.
+        Heap entries whose key was deleted or got a new TTL are stale and are skipped.
     '''
+    @synchronized
     def expire_keys(self):
         current_time = dt.datetime.now()
-        keys_to_delete = []
-        for key, value in self.expiry.items():
-            if value and value <= current_time:
-                keys_to_delete.append(key)
-        for key in keys_to_delete:
-            if key in self.data:
+        while self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+            expiry_time, key = heapq.heappop(self.expiry_heap)
+            if self.expiry.get(key) == expiry_time and key in self.data:
                 self.delete(key)  
-                print(f"Key '{key}' has expired and has been deleted.")
-        self.save()  
+                self.metrics.incr("expired_keys")
+                logger.debug("Key '%s' has expired and has been deleted.", key)
+    
+    
+    '''
+    Lazily expire a single key on access.
+        Args:
+            key (str): The key about to be accessed.
+        Returns:
+            bool: True if the key had expired and was deleted, False otherwise.
+    '''
+    def expire_key(self, key):
+        if self.is_expired(key):
+            self.delete(key)
+            self.metrics.incr("expired_keys")
+            logger.debug("Key '%s' has expired and has been deleted.", key)
+            return True
+        return False
+    
+    
+    '''
+    Evict a key to make room under maxmemory, the caller holds the write side of the lock.
+    The eviction is logged as a delete that is synced together with the write that needed the room, so recovery
+    does not bring the key back. Inside a batch it is undone with the batch.
+    '''
+    def evict_key(self, key):
+        if self.batch_undo is not None:
+            self.batch_undo.append(self.undo_entry(key))
+        self.wal.write_log("delete", key, sync=False)
+        self.eviction.account(key, self.data.pop(key), None)
+        self.index.remove(key)
+        self.expiry.pop(key, None)
+        self.metrics.incr("evicted_keys")
+        logger.debug("Key '%s' has been evicted by the %s policy.", key, self.eviction.policy)
+
+
+    '''
+    Take up to sample_size entries from the due end of the expiry heap.
+        Args:
+            sample_size (int): Maximum number of heap entries to check.
+        Returns:
+            tuple: (number of entries checked, list of keys that are expired and still present).
+    '''
+    @synchronized
+    def sample_expired(self, sample_size):
+        current_time = dt.datetime.now()
+        sampled = 0
+        due = []
+        while sampled < sample_size and self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+            expiry_time, key = heapq.heappop(self.expiry_heap)
+            sampled += 1
+            if self.expiry.get(key) == expiry_time and key in self.data:
+                due.append(key)
+        return sampled, due
+    
+    
+    '''
+    Delete a batch of expired keys with a single WAL sync and a single persist.
+        Args:
+            keys (list): The keys to delete.
+    '''
+    @synchronized
+    def expire_batch(self, keys):
+        keys = [key for key in keys if key in self.data]
+        if not keys:
+            return
+        for key in keys:
+            self.wal.write_log("delete", key, sync=False)
+        self.wal.sync(self.wal.written_seq)
+        for key in keys:
+            if self.eviction:
+                self.eviction.account(key, self.data[key], None)
+            del self.data[key]
+            self.index.remove(key)
+            self.expiry.pop(key, None)
+        if self.persist() and self.wal.custom_wal:
+            for key in keys:
+                self.wal.write_log("delete", key, state="SUCCESS")
+        self.metrics.incr("expired_keys", len(keys))
+        logger.debug("Expired %d key(s) in the background.", len(keys))
+    
+    
+    '''
+    Start the background active expiry worker, see ActiveExpiry for the arguments.
+        Returns:
+            ActiveExpiry: The running worker, its stats() expose the expiry counters.
+    '''
+    def start_active_expiry(self, **kwargs):
+        if self.active_expiry is None:
+            self.active_expiry = ActiveExpiry(self, **kwargs)
+            self.active_expiry.start()
+        return self.active_expiry
+    
+    
+    '''
+    Stop the background active expiry worker if it is running.
+    '''
+    def stop_active_expiry(self):
+        if self.active_expiry is not None:
+            self.active_expiry.stop()
+            self.active_expiry = None
+    
+    
+    '''
+    Make this database a replication leader, followers (see ReplicaSimpleDB) connect to the address and receive a
+    full sync followed by the WAL records written afterwards, see ReplicationLeader.
+        Args:
+            address: ('host', port) to listen on, port 0 picks a free port, or the path of a Unix socket.
+            authkey (bytes): Secret the followers authenticate with.
+            kwargs: batch_size and heartbeat_interval of ReplicationLeader.
+        Returns:
+            ReplicationLeader: The running leader, its address holds the bound address.
+    '''
+    def start_replication(self, address=("127.0.0.1", 0), authkey=AUTHKEY, **kwargs):
+        if self.replication is None:
+            self.replication = ReplicationLeader(self, address, authkey, **kwargs)
+            self.replication.start()
+        return self.replication
+    
+    
+    '''
+    Stop the replication leader if it is running, the log written so far is shipped to the connected followers first.
+    '''
+    def stop_replication(self):
+        if self.replication is not None:
+            self.replication.stop()
+            self.replication = None
+    
+    
+    '''
+    Set the expiry time of a key and index it in the expiry heap.
+        Args:
+            key (str): The key to set the expiry for.
+            expiry_time (datetime): The moment the key expires, None for no TTL.
+    '''
+    def set_expiry(self, key, expiry_time):
+        self.expiry[key] = expiry_time
+        if expiry_time:
+            heapq.heappush(self.expiry_heap, (expiry_time, key))
+            # Overwritten TTLs leave stale entries behind, rebuild once they dominate the heap.
+            if len(self.expiry_heap) > 2 * len(self.expiry) + 64:
+                self.index_expiry()
+    
+    
+    '''
+    Rebuild the expiry heap from the expiry dictionary.
+    '''
+    def index_expiry(self):
+        self.expiry_heap = [(expiry_time, key) for key, expiry_time in self.expiry.items() if expiry_time]
+        heapq.heapify(self.expiry_heap)
+        
+        
+    '''
+    Return the number of keys in the database, expired keys that were not deleted yet included.
+    '''
+    def dbsize(self):
+        return len(self.data)
+
+
+    '''
+    Return the number of keys with a TTL, the caller holds the lock.
+    '''
+    def keys_with_ttl(self):
+        return sum(1 for expiry_time in self.expiry.values() if expiry_time)
+
+
+    '''
+    Report the state and the metrics of the database, like the Redis INFO command.
+        Returns:
+            dict: Sections 'server' (with startup_seconds, the time loading the files and replaying the WAL took),
+                  'stats', 'latency' (count, average and percentiles in ms per operation), 'wal', 'persistence',
+                  'memory', 'replication' and 'slowlog' (the slowest operations with their per-phase durations).
+    '''
+    def info(self, slowlog_count=10):
+        snapshot = self.metrics.snapshot()
+        counters = snapshot["counters"]
+        hits, misses = counters.get("keyspace_hits", 0), counters.get("keyspace_misses", 0)
+        stats = dict(counters)
+        stats["hit_rate"] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+        with self.lock.read():
+            keys = self.dbsize()
+            keys_with_ttl = self.keys_with_ttl()
+        return {
+            "server": {
+                "db_name": self.db_name,
+                "storage": type(self).__name__,
+                "uptime_seconds": round(time.time() - self.metrics.started, 3),
+                "startup_seconds": round(self.startup_seconds, 3),
+                "keys": keys,
+                "keys_with_ttl": keys_with_ttl,
+            },
+            "stats": stats,
+            "latency": snapshot["latency"],
+            "wal": {
+                "custom_wal": self.wal.custom_wal,
+                "durability": self.wal.durability,
+                "format": self.wal.log_format,
+                "compression": self.wal.compression,
+                "records": counters.get("wal_records", 0),
+                "bytes": counters.get("wal_bytes", 0),
+                "fsyncs": self.wal.fsync_count,
+            },
+            "persistence": {
+                "mode": self.persistence,
+                "compression": self.compression,
+                "changes_since_last_save": self.changes,
+                "last_save_time": self.lastsave(),
+                "bgsave_in_progress": self.bgsave_thread is not None,
+                "last_bgsave_status": {None: "none", True: "ok", False: "err"}[self.last_bgsave_ok],
+            },
+            "memory": self.eviction.info() if self.eviction else {"maxmemory": 0, "maxmemory_policy": "noeviction"},
+            "replication": self.replication.info() if self.replication else {"role": "standalone"},
+            "slowlog": self.metrics.slowlog(slowlog_count),
+        }
+
+
+    '''
+    Return the slowest operations, slowest first, see Metrics.slowlog.
+    '''
+    def slowlog(self, count=None):
+        return self.metrics.slowlog(count)
+
+
+    '''
+    Load the database from the database file and replay the WAL written after the last checkpoint.
+    If the files do not exist, they are ignored.
+    '''
+    def load(self):
+        
+        logger.info("Loading database '%s'...", self.db_name)
+        start = time.perf_counter()
+        self.replay_log(self.load_files(self.load_expiry, self.load_database))
+        self.metrics.observe("load", time.perf_counter() - start)
+        self.expire_keys()
+
+
+    '''
+    Run the loaders of the database files in parallel while the WAL tail is read on another worker thread.
+    The loaders and the WAL reader fill separate structures, and file reads release the GIL, so reading
+    one file overlaps with parsing the others. The WAL records are applied once the files are loaded.
+        Args:
+            loaders (callable): Functions loading one database file each.
+        Returns:
+            list: The WAL operations to replay, see read_log.
+    '''
+    def load_files(self, *loaders):
+        with concurrent.futures.ThreadPoolExecutor(len(loaders) + 1) as pool:
+            log = pool.submit(self.read_log)
+            for future in [pool.submit(loader) for loader in loaders]:
+                future.result()
+            return log.result()
+        
     
     '''
-    Load the database from the log file.
-    This method reads the log file and processes each entry to update the data dictionary.
-    If the log file does not exist, it is ignored.
-    If an error occurs while reading the log file, an error message is printed.
+    Replay the WAL entries written after the last checkpoint on top of the loaded database file.
+    Startup cost therefore depends on the activity since the last checkpoint, not on the whole history.
+    With background persistence the database file is not rewritten before the first request, the replayed
+    records count as changes towards the next snapshot, which checkpoints the WAL.
+        Args:
+            ops (list, optional): Operations already read by read_log, the WAL is read when not given.
     '''
     '''
     custom_wal==True
@@ -175,105 +1236,186 @@ class SimpleDB:
         This processes each log entry and updates the database accordingly.
         It is memory efficient as the log file maintains a single log of operations rather than storing the success of operations also.
     '''
-    def load(self):
+    def replay_log(self, ops=None):
         
-        print("Loading database...")
+        if ops is None:
+            ops = self.read_log()
+        self.metrics.incr("wal_replayed", len(ops))
+        for timestamp, operation, key, value, ttl in ops:
+            if operation == "drop":
+                self.drop()
+                return
+            if operation == "commit":
+                for entry in value:
+                    self.apply_log_entry(*entry)
+            else:
+                self.apply_log_entry(timestamp, operation, key, value, ttl)
+                
+        if ops and self.persistence == "background":
+            # The replayed records stay in the WAL, the next snapshot saves them and checkpoints it.
+            self.changes += len(ops)
+            return
+        if ops:
+            self.save(sync=self.wal.durability != "none")
+        ops.clear()
+        self.wal.checkpoint()
+
+
+    '''
+    Read the WAL written after the last checkpoint and return the operations replay_log has to apply.
+    Only the log is read, so it can run while the database files are loaded.
+        Returns:
+            list: (timestamp, operation, key, value, ttl) tuples in log order, a committed batch is a single
+                  'commit' tuple holding the entries of the batch as value.
+    '''
+    def read_log(self):
         
         ops=[]
+        group=None
+        # Checked once, a disabled debug call still costs as much as decoding a binary record.
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        self.load_expiry() 
-        if self.wal.custom_wal:
-            self.load_database() #Think on this (Compute Overhead)
-            self.save() 
-            return
+        for timestamp, state, operation, key, value, ttl in self.wal.read_records(self.wal.read_checkpoint()):
+            if debug:
+                logger.debug("Processing log entry: %s %s", operation, key)
+            if operation == "init":
+                continue
+            # Records between BEGIN and COMMIT are held back, a batch without its COMMIT record is discarded.
+            if operation == "begin":
+                group = (key, [])
+            elif operation == "rollback":
+                group = None
+            elif operation == "commit" and state != "success":
+                if group is not None and group[0] == key:
+                    ops.append((timestamp, operation, key, group[1], None))
+                group = None
+            elif group is not None:
+                group[1].append((timestamp, operation, key, value, ttl))
+            elif state is None or state == "start":
+                ops.append((timestamp, operation, key, value, ttl))
+            elif state == "success":
+                for i in range(len(ops) - 1, -1, -1):
+                    if ops[i][1] == operation and ops[i][2] == key:
+                        del ops[i]
+                        break
+        return ops
         
-        try:
-            with open(self.log_file_name, 'r') as f:
-                for line in f:
-                    if self.wal.custom_wal:
-                        _, _, _, _, state, operation, key, *extra = line.strip().split(" ")
-                    else:
-                        _, _, _, state, operation, key, *extra = line.strip().split(" ")
-                    operation = operation.lower()
-                    state = state.lower()
-                    state = state.replace("[", "").replace("]", "")
-                    # print(state,operation,key,value)
-                    value=extra[0] if extra else None
-                    value = ' '.join(value) if value else None
-                    print(f"Processing log entry: {line.strip()}")
-                    if self.wal.custom_wal:
-                        if state == "start" and operation != "init":
-                            ops.append((operation, key, value))
-                        elif state == "success" and len(ops)>0:
-                             ops.pop()
-                    elif state == "task" and operation != "init":
-                        ops.append((operation, key, value))
-        except FileNotFoundError:
-            pass
-                    
-        for operation, key, value in ops:
-            if operation == "set":
-                self.data[key] = ' '.join(value)
-            elif operation == "delete":
-                del self.data[key]
-            elif operation == "clear":
-                for k in list(self.data.keys()):
-                    del self.data[k]
-            elif operation == "incr":
-                self.data[key] = int(value)+1
-            elif operation == "drop":
-                self.drop()
-                
-        self.save()
-        ops.clear()
-        self.expire_keys() 
+    
+    '''
+    Apply a single replayed WAL entry to the in-memory data.
+    '''
+    def apply_log_entry(self, timestamp, operation, key, value, ttl):
+        if operation in ("set", "restore"):
+            self.data[key] = value if operation == "set" else decode_text(value[0], value[1:])
+            self.set_expiry(key, dt.datetime.fromtimestamp(timestamp + int(ttl)) if ttl else None)
+        elif operation == "delete":
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        elif operation == "clear":
+            for k in list(self.data.keys()):
+                del self.data[k]
+        elif operation == "incr":
+            self.data[key] = int(value)+1
+        elif operation == "incrby":
+            self.data[key] = int(value)
+        elif operation == "hset":
+            fields = decode_fields(value)
+            hash_value = self.data.get(key)
+            hash_value = hash_value if isinstance(hash_value, dict) else {}
+            hash_value.update(zip(fields[::2], fields[1::2]))
+            self.data[key] = hash_value
+        elif operation == "hdel":
+            hash_value = self.data.get(key)
+            if isinstance(hash_value, dict):
+                for field in decode_fields(value):
+                    hash_value.pop(field, None)
+                if hash_value:
+                    self.data[key] = hash_value
+                else:
+                    del self.data[key]
+                    self.expiry.pop(key, None)
+        elif operation in ("lpush", "rpush"):
+            length, *items = decode_fields(value)
+            list_value = self.data.get(key)
+            list_value = list_value if isinstance(list_value, list) else []
+            if len(list_value) < int(length):
+                list_value = items[::-1] + list_value if operation == "lpush" else list_value + items
+            self.data[key] = list_value
         
     
     '''
     Drop the database and remove the log file.
     This method clears the data dictionary, closes the log file, and removes both the log file and the database file.
-    If an error occurs during deletion, an error message is printed.
+    If an error occurs during deletion, an error is logged.
     '''
     def drop(self):
         try:
+            self.stop_active_expiry()
+            self.wait_bgsave()
             self.data.clear()
             self.wal.write_log("drop", self.db_name + '.txt')
+            self.stop_replication()
             self.wal.close_log_file()
-            os.remove(self.log_file_name) #order matters (don't know why but first remove log file then database file) maybe because after init if no entry is there, then database file is not created at first place so how can we remove it
+            self.wal.remove_log_files() #order matters (don't know why but first remove log file then database file) maybe because after init if no entry is there, then database file is not created at first place so how can we remove it
             os.remove(self.db_name+ '.txt')
             os.remove(self.db_name + '_expiry.txt')
         except FileNotFoundError:
             pass
         except Exception as e:
-            print(f"Error deleting database: {e}")
+            logger.error("Error deleting database '%s': %s", self.db_name, e)
     
     
     '''
     It is used to load the data from database file.
+    Files written before typed values have no header and hold 'key:value' lines, they are still read.
+    The file is read in one go and split into lines, plain string lines without escapes skip decode_text.
     '''
     def load_database(self):
         try:
-            with open(self.db_name + '.txt', 'r') as f:
-                for line in f:
-                    key, value = line.strip().split(':', 1)
-                    self.data[key] = value
+            with open_file(self.db_name + '.txt', 'r', newline='\n') as f:
+                content = f.read()
         except FileNotFoundError:
-            pass
+            return
+        typed = content.startswith(TEXT_HEADER)
+        lines = content[len(TEXT_HEADER):].split('\n') if typed else content.split('\n')
+        data = self.data
+        if not typed:
+            for line in lines:
+                if line.strip():
+                    key, value = line.strip().split(':', 1)
+                    data[key] = value
+            return
+        for line in lines:
+            if not line:
+                continue
+            tag, key, text = line.split('\t', 2)
+            if tag == 's' and '\\' not in line:
+                data[key] = text
+            else:
+                data[unescape(key)] = decode_text(tag, text)
     
     
     '''
     It is used to load the expiry time from database_expiry file.
+    The expiry heap is built once at the end instead of pushing every key.
     '''
     def load_expiry(self):
         try:
-            with open(self.db_name + '_expiry.txt', 'r') as f:
-                for line in f:
-                    key, value = line.strip().split(':', 1)
-                    if value == 'None':
-                        self.expiry[key] = None
-                    else:
-                        self.expiry[key] = dt.datetime.fromisoformat(value)
+            with open_file(self.db_name + '_expiry.txt', 'r', newline='\n') as f:
+                content = f.read()
         except FileNotFoundError:
-            pass
-        
-    
+            return
+        typed = content.startswith(TEXT_HEADER)
+        lines = content[len(TEXT_HEADER):].split('\n') if typed else content.split('\n')
+        expiry = self.expiry
+        for line in lines:
+            if not line.strip():
+                continue
+            if typed:
+                key, value = line.rsplit('\t', 1)
+                if '\\' in key:
+                    key = unescape(key)
+            else:
+                key, value = line.strip().split(':', 1)
+            expiry[key] = None if value == 'None' else dt.datetime.fromisoformat(value)
+        self.index_expiry()
@@ -1,28 +1,88 @@
 from database.SimpleDB import SimpleDB
 from database.JsonSimpleDB import JsonSimpleDB
 from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.BTreeSimpleDB import BTreeSimpleDB
+from database.ShardedSimpleDB import ShardedSimpleDB
+from utilities.logger.Log import enable_logging
+from utilities.serializer.TypedValue import WrongTypeError
+import json,os
+
+
+TYPED_COMMANDS = ("incrby", "decrby", "hset", "hget", "hdel", "hgetall", "lpush", "rpush", "lrange", "llen", "type")
+
+
+'''
+Run a command on a counter, hash or list and print its result.
+    Args:
+        db (SimpleDB): The database.
+        name (str): One of TYPED_COMMANDS.
+        args (list): The arguments of the command.
+'''
+def typed_command(db, name, args):
+    try:
+        if name in ("incrby", "decrby") and len(args) == 2:
+            amount = int(args[1])
+            print(f"{args[0]} = {db.incrby(args[0], amount if name == 'incrby' else -amount)}")
+        elif name == "hset" and len(args) >= 3 and len(args) % 2:
+            print(f"Added {db.hset(args[0], mapping=dict(zip(args[1::2], args[2::2])))} fields to {args[0]}")
+        elif name == "hget" and len(args) == 2:
+            print(f"{args[0]}.{args[1]} = {db.hget(args[0], args[1])}")
+        elif name == "hdel" and len(args) >= 2:
+            print(f"Deleted {db.hdel(args[0], *args[1:])} fields from {args[0]}")
+        elif name == "hgetall" and len(args) == 1:
+            for field, value in db.hgetall(args[0]).items():
+                print(f"{field} = {value}")
+        elif name in ("lpush", "rpush") and len(args) >= 2:
+            print(f"{args[0]} has {getattr(db, name)(args[0], *args[1:])} items")
+        elif name == "lrange" and len(args) in (1, 3):
+            for index, item in enumerate(db.lrange(args[0], *map(int, args[1:]))):
+                print(f"{index}) {item}")
+        elif name == "llen" and len(args) == 1:
+            print(f"{args[0]} has {db.llen(args[0])} items")
+        elif name == "type" and len(args) == 1:
+            print(db.key_type(args[0]))
+        else:
+            print(f"Wrong number of arguments for {name}")
+    except WrongTypeError as e:
+        print(f"WRONGTYPE {e}")
+    except ValueError as e:
+        print(e)
 
 
 '''
 Main function to interact with the simpleDB.
 Prompts the user for commands to set, get, delete, check existence, clear, or drop the database.
+Diagnostics are off by default, set SIMPLEDB_LOG_LEVEL (e.g. DEBUG or INFO) to print them to stderr.
 '''
 def main():
+    enable_logging(os.environ.get("SIMPLEDB_LOG_LEVEL", "off"))
     print("\n\n\t\t\t\t\tWelcome to SimpleDB!\n\n")
-    print("What kind of storage you need (txt/json/binary)?")
-    storage_type = input("Enter 'json' for JSON storage or 'binary' for Binary storage (default is txt): ").strip().lower()
+    print("What kind of storage you need (txt/json/binary/bitcask/btree/sharded)?")
+    storage_type = input("Enter 'json' for JSON storage, 'binary' for Binary storage, 'bitcask' for append-only storage, 'btree' for larger-than-memory storage or 'sharded' for txt shards (default is txt): ").strip().lower()
     if storage_type == "json":
         db_class = JsonSimpleDB
     elif storage_type == "binary":
         db_class = BinarySimpleDB
+    elif storage_type == "bitcask":
+        db_class = BitcaskSimpleDB
+    elif storage_type == "btree":
+        db_class = BTreeSimpleDB
+    elif storage_type == "sharded":
+        db_class = ShardedSimpleDB
     else:
         db_class = SimpleDB
     db_name = input("Enter database name: ").strip()
     custom_wal = input("Use custom WAL(Compute Efficient)  (y/n)? ").strip().lower() == 'y'
-    db = db_class(db_name,custom_wal)
+    durability = input("Durability mode (always/group/everysec/none, default is none): ").strip().lower() or "none"
+    db = db_class(db_name,custom_wal,durability)
     print(f"Database {db_name} initialized.")
     while True:
-        command = input("Enter command (set/incr/get/delete/exists/clear/drop/exit): ").strip().lower()
+        # Only the command name is case-insensitive, keys and values are kept as typed.
+        name, _, rest = input("Enter command (set/mset/incr/incrby/decrby/get/mget/delete/mdelete/exists/hset/hget/hdel/hgetall/"
+                              "lpush/rpush/lrange/llen/type/keys/scan/range/bgsave/clear/info/slowlog/drop/exit): ").strip().partition(" ")
+        name = name.lower()
+        command = f"{name} {rest.strip()}" if rest.strip() else name
         if command == "exit":
             print("\nExiting the database.\n")
             print("Database exited successfully.\n")
@@ -35,6 +95,20 @@ def main():
             else:   
                 db.set(key, value)
                 print(f"Set {key} to {value}")
+        elif command.startswith("mset "):
+            args = command.split()[1:]
+            if len(args) % 2:
+                print("MSET expects key value pairs")
+            else:
+                db.mset(dict(zip(args[::2], args[1::2])))
+                print(f"Set {len(args) // 2} keys")
+        elif command.startswith("mget "):
+            keys = command.split()[1:]
+            for key, value in zip(keys, db.mget(keys)):
+                print(f"{key} = {value}")
+        elif command.startswith("mdelete "):
+            keys = command.split()[1:]
+            print(f"Deleted {db.mdelete(keys)} keys")
         elif command.startswith("incr "):
             _, key = command.split(maxsplit=1)
             res = db.incr(key)
@@ -42,6 +116,8 @@ def main():
                 print(f"Incremented {key}")
             else:
                 print(f"Key {key} does not exist, cannot increment")
+        elif name in TYPED_COMMANDS:
+            typed_command(db, name, command.split()[1:])
         elif command.startswith("get "):
             _, key = command.split(maxsplit=1)
             value = db.get(key)
@@ -60,9 +136,34 @@ def main():
                 print(f"{key} exists")
             else:
                 print(f"{key} does not exist")
+        elif command == "keys" or command.startswith("keys "):
+            _, *prefix = command.split(maxsplit=1)
+            for key in db.keys(prefix[0] if prefix else ""):
+                print(key)
+        elif command.startswith("scan "):
+            _, cursor, *match = command.split(maxsplit=2)
+            cursor, keys = db.scan(int(cursor), match[0] if match else None)
+            print(f"next cursor: {cursor}")
+            for key in keys:
+                print(key)
+        elif command.startswith("range "):
+            _, start, *end = command.split(maxsplit=2)
+            for key, value in db.range(start, end[0] if end else None):
+                print(f"{key} = {value}")
+        elif command == "bgsave":
+            print("Background saving started" if db.bgsave() else "Background save already in progress or not supported")
         elif command == "clear":
             db.clear()
             print("Database cleared")
+        elif command == "info":
+            info = db.info()
+            info.pop("shards", None)
+            print(json.dumps(info, indent=2, default=str))
+        elif command == "slowlog" or command.startswith("slowlog "):
+            _, *count = command.split()
+            for entry in db.slowlog(int(count[0]) if count and count[0].isdigit() else 10):
+                phases = " ".join(f"{phase}={duration}ms" for phase, duration in entry["phases"].items())
+                print(f"#{entry['id']} {entry['operation']} {entry['key']} {entry['duration_ms']}ms {phases}")
         elif command == "drop":
             db.drop()
             print("\nExiting the database.\n")
@@ -0,0 +1,99 @@
+import argparse,asyncio
+from database.SimpleDB import SimpleDB, PERSISTENCE_MODES
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.BTreeSimpleDB import BTreeSimpleDB
+from database.ShardedSimpleDB import ShardedSimpleDB
+from database.ReplicaSimpleDB import ReplicaSimpleDB
+from utilities.network.RespServer import RespServer
+from utilities.logger.Log import enable_logging
+from utilities.eviction.MemoryLimit import EVICTION_POLICIES
+from utilities.serializer.Compression import CODECS
+from utilities.replication.Replication import AUTHKEY
+
+
+STORAGES = {"txt": SimpleDB, "json": JsonSimpleDB, "binary": BinarySimpleDB, "bitcask": BitcaskSimpleDB, "btree": BTreeSimpleDB,
+            "sharded": ShardedSimpleDB}
+
+
+'''
+Start the server and print the address it is bound to, --port 0 listens on a free port.
+'''
+async def serve(server, description):
+    await server.start()
+    print(f"{description} listening on {server.host}:{server.port}", flush=True)
+    await server.serve_forever()
+
+
+'''
+Network entry point of SimpleDB.
+Serves a database over the Redis RESP protocol so redis-cli, Redis client libraries and redis-benchmark can drive it.
+    python server.py --name mydb --port 6379
+A leader ships its writes to read-only followers, each one serving reads on its own port:
+    python server.py --name mydb --port 6379 --replication-port 6400
+    python server.py --name mydb_replica --port 6380 --replicaof 127.0.0.1:6400
+'''
+def main():
+    parser = argparse.ArgumentParser(description="SimpleDB RESP server")
+    parser.add_argument("--name", default="simpledb", help="database name")
+    parser.add_argument("--storage", choices=sorted(STORAGES), default="txt")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--custom-wal", action="store_true")
+    parser.add_argument("--durability", default="none", choices=("always", "group", "everysec", "none"))
+    parser.add_argument("--maxmemory", help="memory limit of the data, e.g. 100mb (txt, json and binary storages)")
+    parser.add_argument("--maxmemory-policy", default="noeviction", choices=EVICTION_POLICIES)
+    parser.add_argument("--persistence", default="sync", choices=PERSISTENCE_MODES,
+                        help="'background' logs writes to the WAL only and saves with background snapshots (txt, json and binary storages)")
+    parser.add_argument("--snapshot-changes", type=int, default=1000, help="writes after which a background snapshot starts")
+    parser.add_argument("--compression", default="none", choices=CODECS,
+                        help="codec of the database files and closed WAL segments (txt, json and binary storages)")
+    parser.add_argument("--buffer-pool", default="64mb", help="memory of the page cache, e.g. 512mb (btree storage)")
+    parser.add_argument("--replication-port", type=int,
+                        help="port of --host followers replicate from, makes this server a leader (txt, json, binary and btree storages)")
+    parser.add_argument("--replicaof", metavar="HOST:PORT",
+                        help="run as a read-only follower of the leader replicating on HOST:PORT, storage options are ignored")
+    parser.add_argument("--replication-authkey", help="secret shared by a leader and its followers")
+    parser.add_argument("--log-level", default="warning", choices=("debug", "info", "warning", "error", "off"),
+                        help="level of the diagnostics printed to stderr")
+    args = parser.parse_args()
+
+    enable_logging(args.log_level)
+    options = {}
+    if args.maxmemory:
+        if args.storage not in ("txt", "json", "binary"):
+            parser.error(f"--maxmemory is not supported by the {args.storage} storage")
+        options.update(maxmemory=args.maxmemory, maxmemory_policy=args.maxmemory_policy)
+    if args.persistence != "sync":
+        if args.storage not in ("txt", "json", "binary"):
+            parser.error(f"--persistence {args.persistence} is not supported by the {args.storage} storage")
+        options.update(persistence=args.persistence, snapshot_changes=args.snapshot_changes)
+    if args.compression != "none":
+        if args.storage not in ("txt", "json", "binary"):
+            parser.error(f"--compression is not supported by the {args.storage} storage")
+        options.update(compression=args.compression)
+    if args.storage == "btree":
+        options.update(buffer_pool=args.buffer_pool)
+    authkey = args.replication_authkey.encode() if args.replication_authkey else AUTHKEY
+    if args.replicaof:
+        host, _, port = args.replicaof.rpartition(":")
+        if not host or not port.isdigit():
+            parser.error("--replicaof expects HOST:PORT")
+        db = ReplicaSimpleDB((host, int(port)), authkey, db_name=args.name)
+    else:
+        if args.replication_port is not None and args.storage not in ("txt", "json", "binary", "btree"):
+            parser.error(f"--replication-port is not supported by the {args.storage} storage")
+        db = STORAGES[args.storage](args.name, args.custom_wal, args.durability, **options)
+        if args.replication_port is not None:
+            db.start_replication((args.host, args.replication_port), authkey)
+    server = RespServer(db, args.host, args.port)
+    try:
+        asyncio.run(serve(server, f"SimpleDB '{args.name}' ({args.storage})"))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+'''Defines the main entry point for the script.'''
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio,threading,pytest
+from database.SimpleDB import SimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.AsyncSimpleDB import AsyncSimpleDB
+
+
+@pytest.mark.parametrize("storage", [SimpleDB, BitcaskSimpleDB])
+def test_operations_persist(tmp_path, storage):
+    name = str(tmp_path / "db")
+
+    async def run():
+        db = await AsyncSimpleDB.open(storage, name, inline_reads=storage is SimpleDB)
+        assert await db.set("a", "1") is not False
+        await db.set("counter", "10")
+        await db.set("ttl", "x", ["100"])
+        assert await db.incr("counter") is True
+        assert await db.incrby("counter", 5) == 16
+        assert await db.get("a") == "1"
+        assert await db.mget(["a", "missing", "counter"]) == ["1", None, 16]
+        await db.delete("a")
+        assert not await db.exists("a")
+        await db.close()
+        return db.db
+
+    db = asyncio.run(run())
+    if hasattr(db, "close"):
+        db.close()
+    db.wal.close_log_file()
+    db = storage(name)
+    assert db.get("a") is None
+    assert db.get("counter") == 16
+    assert db.get("ttl") == "x"
+    db.drop()
+
+
+def test_concurrent_writes_share_commits(tmp_path):
+    async def run():
+        db = await AsyncSimpleDB.open(SimpleDB, str(tmp_path / "db"))
+        await asyncio.gather(*(db.set(f"key{i}", str(i)) for i in range(500)))
+        assert await db.mget([f"key{i}" for i in range(500)]) == [str(i) for i in range(500)]
+        await db.close()
+        return db.db
+
+    db = asyncio.run(run())
+    counters = db.metrics.snapshot()["counters"]
+    assert counters["async_writes"] == 500
+    assert counters["async_groups"] < 500
+    db.drop()
+
+
+def test_failed_write_fails_alone(tmp_path):
+    async def run():
+        db = await AsyncSimpleDB.open(SimpleDB, str(tmp_path / "db"))
+        await db.set("text", "abc")
+        results = await asyncio.gather(db.set("a", "1"), db.incrby("text"), db.set("b", "2"), return_exceptions=True)
+        assert isinstance(results[1], ValueError)
+        assert await db.mget(["a", "b", "text"]) == ["1", "2", "abc"]
+        await db.close()
+        with pytest.raises(RuntimeError):
+            await db.set("c", "3")
+        return db.db
+
+    asyncio.run(run()).drop()
+
+
+def test_reads_do_not_block_the_loop_while_a_writer_holds_the_lock(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.set("a", "1")
+    locked, release = threading.Event(), threading.Event()
+
+    def hold():
+        with db.lock:
+            locked.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    locked.wait()
+
+    async def run():
+        facade = AsyncSimpleDB(db)
+        read = asyncio.create_task(facade.get("a"))
+        # The loop keeps running while the read waits for the lock on the executor.
+        await asyncio.sleep(0.05)
+        assert not read.done()
+        release.set()
+        assert await read == "1"
+        await facade.close()
+
+    asyncio.run(run())
+    holder.join()
+    db.drop()
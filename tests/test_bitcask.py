@@ -0,0 +1,142 @@
+import glob,multiprocessing,os,pytest
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+
+
+'''
+Open a Bitcask database with small segments and no merge thread, so tests decide when to merge.
+'''
+def open_db(name):
+    return BitcaskSimpleDB(name, max_file_size=2048, merge_interval=None)
+
+
+'''
+Write, overwrite and delete keys over several segments.
+    Returns:
+        dict: The live keys and values.
+'''
+def fill(db):
+    expected = {}
+    for i in range(200):
+        db.set(f"key{i}", f"value{i}")
+        expected[f"key{i}"] = f"value{i}"
+    for i in range(0, 200, 3):
+        db.set(f"key{i}", "updated")
+        expected[f"key{i}"] = "updated"
+    for i in range(0, 200, 5):
+        db.delete(f"key{i}")
+        expected.pop(f"key{i}")
+    return expected
+
+
+'''
+Write to a database in a child process that exits without closing it, with half a record at the end.
+'''
+def write_and_crash(name):
+    db = open_db(name)
+    fill(db)
+    db.begin_batch()
+    db.set("uncommitted", "x")
+    db.active_file.write(b"\x01\x02\x03")
+    db.active_file.flush()
+    os._exit(0)
+
+
+def test_reopen(tmp_path):
+    name = str(tmp_path / "db")
+    db = open_db(name)
+    expected = fill(db)
+    db.incrby("counter", 3)
+    db.rpush("list", "a", "")
+    db.close()
+    db.wal.close_log_file()
+
+    db = open_db(name)
+    assert {key: db.get(key) for key in db.keys("key")} == expected
+    assert db.get("counter") == 3
+    assert db.lrange("list") == ["a", ""]
+    assert db.get("key0") is None
+    db.drop()
+
+
+def test_crash_recovery(tmp_path):
+    name = str(tmp_path / "db")
+    process = multiprocessing.Process(target=write_and_crash, args=(name,))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+    db = open_db(name)
+    assert db.get("uncommitted") is None
+    assert db.get("key1") == "value1"
+    assert db.get("key3") == "updated"
+    assert db.get("key5") is None
+    assert db.dbsize() == 160
+    db.set("after", "crash")
+    db.close()
+    db.wal.close_log_file()
+
+    db = open_db(name)
+    assert db.get("after") == "crash"
+    assert db.dbsize() == 161
+    db.drop()
+
+
+def test_merge_compacts_and_reopens(tmp_path):
+    name = str(tmp_path / "db")
+    db = open_db(name)
+    expected = fill(db)
+    segments = len(db.segment_ids())
+    stale = db.stale_bytes
+    assert segments > 2 and stale > 0
+    db.merge()
+    assert len(db.segment_ids()) == 2
+    assert db.stale_bytes == 0
+    assert {key: db.get(key) for key in db.keys("key")} == expected
+    db.close()
+    db.wal.close_log_file()
+
+    db = open_db(name)
+    assert {key: db.get(key) for key in db.keys("key")} == expected
+    assert db.metrics.snapshot()["counters"].get("hint_files_loaded", 0) >= 1
+    db.drop()
+
+
+def test_crash_during_merge_does_not_resurrect_deleted_keys(tmp_path, monkeypatch):
+    name = str(tmp_path / "db")
+    db = open_db(name)
+    expected = fill(db)
+
+    # Crash when the first merged segment is removed, after the merged segment was written.
+    remove = os.remove
+
+    def crash(path):
+        if path.endswith(".data"):
+            raise SystemExit("crash")
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", crash)
+    with pytest.raises(SystemExit):
+        db.merge()
+    monkeypatch.setattr(os, "remove", remove)
+    db.close()
+    db.wal.close_log_file()
+
+    db = open_db(name)
+    assert not glob.glob(name + "_*.data.merged")
+    assert {key: db.get(key) for key in db.keys("key")} == expected
+    db.drop()
+
+
+def test_unpublished_merge_is_discarded(tmp_path):
+    name = str(tmp_path / "db")
+    db = open_db(name)
+    expected = fill(db)
+    db.close()
+    db.wal.close_log_file()
+    with open(f"{name}_000001.data.merge", "wb") as f:
+        f.write(b"partial")
+
+    db = open_db(name)
+    assert not os.path.exists(f"{name}_000001.data.merge")
+    assert {key: db.get(key) for key in db.keys("key")} == expected
+    db.drop()
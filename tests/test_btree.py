@@ -0,0 +1,59 @@
+import multiprocessing,os,pytest
+from database.BTreeSimpleDB import BTreeSimpleDB
+
+
+'''
+Write to a B+tree database in a child process that exits without closing it, like a crash: only the pages of the
+last checkpoint and the WAL records written since are on disk.
+'''
+def write_and_crash(name, keys, wal_format):
+    db = BTreeSimpleDB(name, page_size=512, checkpoint_changes=100, wal_format=wal_format)
+    for i in range(keys):
+        db.set(f"key{i:05d}", f"value{i}" * 3)
+    for i in range(0, keys, 7):
+        db.delete(f"key{i:05d}")
+    db.set("ttl", "x", ttl=[100])
+    db.incrby("counter", 41)
+    db.hset("hash", "field", "value")
+    db.rpush("list", "a", "")
+    os._exit(0)
+
+
+@pytest.mark.parametrize("wal_format", ["text", "binary"])
+def test_crash_recovery(tmp_path, wal_format):
+    name = str(tmp_path / "db")
+    keys = 1050
+    process = multiprocessing.Process(target=write_and_crash, args=(name, keys, wal_format))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+    db = BTreeSimpleDB(name, page_size=512, wal_format=wal_format)
+    try:
+        expected = {f"key{i:05d}": f"value{i}" * 3 for i in range(keys) if i % 7}
+        assert {key: db.get(key) for key in db.keys("key")} == expected
+        assert db.get("key00000") is None
+        assert db.get("counter") == 41
+        assert db.hgetall("hash") == {"field": "value"}
+        assert db.lrange("list") == ["a", ""]
+        assert db.expiry["ttl"] is not None
+        assert db.dbsize() == len(expected) + 4
+    finally:
+        db.close()
+
+
+def test_reopen_after_close(tmp_path):
+    name = str(tmp_path / "db")
+    db = BTreeSimpleDB(name, page_size=512)
+    for i in range(300):
+        db.set(f"key{i}", str(i))
+    db.close()
+    db.wal.close_log_file()
+
+    db = BTreeSimpleDB(name, page_size=512)
+    try:
+        assert db.dbsize() == 300
+        assert db.get("key299") == "299"
+        assert list(db.keys("key29")) == ["key29"] + [f"key29{i}" for i in range(10)]
+    finally:
+        db.close()
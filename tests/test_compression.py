@@ -0,0 +1,127 @@
+import io,os,pytest
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.ReadOnlySimpleDB import ReadOnlySimpleDB
+from utilities.serializer.Compression import (BlockWriter, BlockReader, BlockFile, open_file, file_codec, FILE_HEADER,
+                                              BLOCK)
+
+
+STORAGES = {SimpleDB: ".txt", JsonSimpleDB: ".json", BinarySimpleDB: ".bin"}
+CODECS = ["zlib", "lzma"]
+VALUES = {f"key{i}": f"value {i} " * 20 for i in range(500)}
+VALUES.update({"newline": "x\ny", "unicode": "héllo ☃", "empty": ""})
+
+
+'''
+Write chunks into an in-memory compressed file cut into small blocks.
+    Returns:
+        bytes: The compressed file.
+'''
+def compressed(chunks, codec="zlib", block_size=100):
+    file = io.BytesIO()
+    writer = BlockWriter(file, codec, block_size)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.write_block()
+    return file.getvalue()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_blocks_read_back_and_seek(codec):
+    chunks = [f"record {i}\n".encode() * (i % 7 + 1) for i in range(200)]
+    raw = b"".join(chunks)
+    data = compressed(chunks, codec)
+    assert len(data) < len(raw)
+
+    file = io.BytesIO(data)
+    file.seek(FILE_HEADER.size)
+    reader = io.BufferedReader(BlockReader(file, codec))
+    assert reader.read() == raw
+    for offset in (0, 1, 250, len(raw) // 2, len(raw) - 1, len(raw)):
+        reader.seek(offset)
+        assert reader.read(20) == raw[offset:offset + 20]
+
+    blocks = BlockFile(data)
+    assert len(blocks) == len(raw)
+    assert blocks.read(90, 1500) == raw[90:1500]
+    assert b"".join(content for _, content in blocks.blocks()) == raw
+
+
+def test_corrupt_block_is_detected():
+    data = bytearray(compressed([b"abc" * 100]))
+    data[FILE_HEADER.size + BLOCK.size] ^= 0xFF
+    with pytest.raises(ValueError):
+        BlockFile(bytes(data)).read(0, 10)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("storage", STORAGES)
+def test_snapshot_round_trip(tmp_path, storage, codec):
+    plain = storage(str(tmp_path / "plain"))
+    plain.mset(VALUES)
+    plain.wal.close_log_file()
+    name = str(tmp_path / "db")
+    db = storage(name, compression=codec)
+    db.mset(VALUES)
+    db.set("ttl", "x", ["100"])
+    db.wal.close_log_file()
+
+    suffix = STORAGES[storage]
+    assert os.path.getsize(name + suffix) < os.path.getsize(str(tmp_path / "plain") + suffix)
+    if storage is not BinarySimpleDB:
+        # The binary format only compresses its values region, behind its own header.
+        assert file_codec(name + suffix) == codec
+
+    # Reading detects the codec, whatever the database was opened with.
+    db = storage(name)
+    assert {key: db.get(key) for key in VALUES} == VALUES
+    assert db.expiry["ttl"] is not None
+    db.set("key0", "changed")
+    db.wal.close_log_file()
+    db = storage(name, compression=codec)
+    assert db.get("key0") == "changed"
+    db.drop()
+
+
+@pytest.mark.parametrize("storage", ["txt", "binary"])
+def test_read_only_snapshot_of_compressed_file(tmp_path, storage):
+    name = str(tmp_path / "db")
+    db = (SimpleDB if storage == "txt" else BinarySimpleDB)(name, compression="zlib")
+    db.mset(VALUES)
+    db.wal.close_log_file()
+    snapshot = ReadOnlySimpleDB(name, storage)
+    assert snapshot.get("key250") == VALUES["key250"]
+    assert snapshot.get("unicode") == VALUES["unicode"]
+    assert snapshot.get("missing") is None
+
+
+@pytest.mark.parametrize("wal_format", ["text", "binary"])
+def test_compressed_wal_segments_replay(tmp_path, wal_format):
+    name = str(tmp_path / "db")
+    options = dict(wal_format=wal_format, segment_size=2048, compression="zlib", persistence="background",
+                   snapshot_changes=10 ** 9, snapshot_interval=10 ** 9)
+    db = SimpleDB(name, **options)
+    for i in range(300):
+        db.set(f"key{i}", f"value {i} " * 5)
+    db.delete("key3")
+    closed = db.wal.segments()[:-1]
+    assert len(closed) > 2
+    # Closing waits for the compression of the last closed segment.
+    db.wal.close_log_file()
+    assert all(file_codec(db.wal.segment_name(segment)) == "zlib" for segment in closed)
+
+    db = SimpleDB(name, **options)
+    assert db.dbsize() == 299
+    assert db.get("key299") == "value 299 " * 5
+    assert db.get("key3") is None
+    db.drop()
+
+
+def test_plain_file_opened_with_a_codec(tmp_path):
+    name = str(tmp_path / "file")
+    with open_file(name, 'w') as f:
+        f.write("plain\n")
+    assert file_codec(name) == "none"
+    with open_file(name, 'r', "zlib") as f:
+        assert f.read() == "plain\n"
@@ -0,0 +1,111 @@
+import threading,pytest
+from database.SimpleDB import SimpleDB
+from utilities.concurrency.RWLock import RWLock
+
+
+'''
+Run a function on several threads at once and wait for all of them.
+'''
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_readers_share_the_lock():
+    lock = RWLock()
+    barrier = threading.Barrier(4, timeout=5)
+
+    def read(_):
+        with lock.read():
+            # Every reader has to be inside at the same time for the barrier to open.
+            barrier.wait()
+
+    run_threads(read, 4)
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = RWLock()
+    lock.acquire_read()
+    writer_waiting, written = threading.Event(), threading.Event()
+
+    def write():
+        writer_waiting.set()
+        with lock:
+            written.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer_waiting.wait()
+    while not lock.waiting_writers:
+        pass
+    blocked = []
+    reader = threading.Thread(target=lambda: blocked.append(lock.acquire_read(blocking=False)))
+    reader.start()
+    reader.join()
+    assert blocked == [False]
+    assert not written.is_set()
+    lock.release_read()
+    writer.join()
+    assert written.is_set()
+
+
+def test_reentrancy():
+    lock = RWLock()
+    with lock:
+        with lock.read():
+            with lock:
+                pass
+    with lock.read():
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                lock.acquire_write()
+
+
+def test_concurrent_increments_are_not_lost(tmp_path):
+    name = str(tmp_path / "db")
+    db = SimpleDB(name)
+    db.set("counter", "0")
+
+    def increment(worker):
+        for _ in range(200):
+            if worker % 2:
+                db.incr("counter")
+            else:
+                db.incrby("counter", 1)
+
+    run_threads(increment, 8)
+    assert db.get("counter") == 1600
+    db.wal.close_log_file()
+
+    db = SimpleDB(name)
+    assert db.get("counter") == 1600
+    db.drop()
+
+
+def test_concurrent_writers_and_readers(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    errors = []
+
+    def work(worker):
+        try:
+            for i in range(100):
+                key = f"worker{worker}-{i}"
+                if worker % 2:
+                    db.set(key, str(i))
+                    assert db.get(key) == str(i)
+                else:
+                    values = db.mget([f"worker1-{i}", f"worker3-{i}"])
+                    assert all(value in (None, str(i)) for value in values)
+                    keys = list(db.keys("worker"))
+                    assert keys == sorted(set(keys))
+        except Exception as e:
+            errors.append(e)
+
+    run_threads(work, 6)
+    assert errors == []
+    assert db.dbsize() == 300
+    assert len(list(db.keys("worker"))) == 300
+    db.drop()
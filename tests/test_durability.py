@@ -0,0 +1,88 @@
+import threading,time,pytest
+from database.SimpleDB import SimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from utilities.logger.wal import wal, DURABILITY_MODES
+
+
+def test_always_fsyncs_every_commit(tmp_path):
+    log = wal(str(tmp_path / "x.log"), False, "always")
+    for i in range(10):
+        log.write_log("set", f"k{i}", "v")
+    assert log.fsync_count == 10
+    assert log.synced_seq == log.written_seq
+    log.close_log_file()
+
+
+def test_none_never_fsyncs(tmp_path):
+    log = wal(str(tmp_path / "x.log"), False, "none")
+    for i in range(10):
+        log.write_log("set", f"k{i}", "v")
+    assert log.fsync_count == 0
+    log.close_log_file()
+
+
+def test_group_commit_shares_fsyncs(tmp_path):
+    log = wal(str(tmp_path / "x.log"), False, "group", group_commit_window=0.01)
+    barrier = threading.Barrier(8)
+
+    def commit(thread):
+        barrier.wait()
+        for i in range(5):
+            assert log.write_log("set", f"t{thread}-{i}", "v")
+
+    threads = [threading.Thread(target=commit, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert log.synced_seq == log.written_seq == 40
+    assert 0 < log.fsync_count < 40
+    log.close_log_file()
+
+
+def test_everysec_syncs_in_the_background(tmp_path):
+    log = wal(str(tmp_path / "x.log"), False, "everysec", sync_interval=0.05)
+    log.write_log("set", "k", "v")
+    assert log.fsync_count == 0
+    deadline = time.time() + 5
+    while log.synced_seq < log.written_seq and time.time() < deadline:
+        time.sleep(0.01)
+    assert log.synced_seq == log.written_seq
+    assert log.fsync_count >= 1
+    log.close_log_file()
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SimpleDB(str(tmp_path / "db"), durability="sometimes")
+
+
+@pytest.mark.parametrize("durability", DURABILITY_MODES)
+def test_writes_survive_reopen(tmp_path, durability):
+    db = SimpleDB(str(tmp_path / "db"), durability=durability)
+    db.set("a", "1")
+    with db.batch():
+        db.set("b", "2")
+        db.set("c", "3")
+    db.wal.close_log_file()
+
+    db = SimpleDB(str(tmp_path / "db"), durability=durability)
+    assert (db.get("a"), db.get("b"), db.get("c")) == ("1", "2", "3")
+    db.drop()
+
+
+@pytest.mark.parametrize("durability", ["group", "everysec"])
+def test_bitcask_rejects_wal_only_modes(tmp_path, durability):
+    with pytest.raises(ValueError, match="bitcask"):
+        BitcaskSimpleDB(str(tmp_path / "db"), durability=durability, merge_interval=None)
+
+
+def test_bitcask_always_fsyncs_data(tmp_path):
+    db = BitcaskSimpleDB(str(tmp_path / "db"), durability="always", merge_interval=None)
+    db.set("a", "1")
+    db.set("b", "2")
+    with db.batch():
+        db.set("c", "3")
+        db.set("d", "4")
+    assert db.metrics.snapshot()["counters"]["data_fsyncs"] == 3
+    db.drop()
@@ -0,0 +1,125 @@
+import datetime as dt,random,pytest
+from database.SimpleDB import SimpleDB
+from utilities.eviction.MemoryLimit import MemoryLimit, MaxMemoryError, entry_size
+
+
+'''
+Return the memory of the data computed from scratch, what the running total must match.
+'''
+def recomputed(db):
+    return sum(entry_size(key, value) for key, value in db.data.items())
+
+
+def test_accounting_follows_every_write(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"), maxmemory="1mb", maxmemory_policy="allkeys-lru")
+    for i in range(100):
+        db.set(f"key{i}", "v" * i, ["100"] if i % 3 == 0 else None)
+    for i in range(0, 100, 2):
+        db.set(f"key{i}", "overwritten")
+    for i in range(0, 100, 5):
+        db.delete(f"key{i}")
+    db.mset({"m1": "x" * 50, "m2": "y"})
+    db.mdelete(["m2", "missing"])
+    db.set("counter", "7")
+    db.incrby("counter", 1000)
+    db.incr("counter")
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.set("rolled", "back" * 20)
+            db.delete("key1")
+            raise RuntimeError("rollback")
+    db.set_expiry("key3", dt.datetime.now() - dt.timedelta(seconds=1))
+    db.expire_keys()
+    assert db.eviction.used_memory == recomputed(db)
+    db.clear()
+    assert db.eviction.used_memory == 0
+    db.drop()
+
+
+def test_noeviction_rejects_writes_over_the_limit(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"), maxmemory="2kb", maxmemory_policy="noeviction")
+    with pytest.raises(MaxMemoryError):
+        for i in range(100):
+            db.set(f"key{i}", "v" * 100)
+    size = db.dbsize()
+    assert db.get(f"key{size}") is None
+    assert db.eviction.used_memory <= 2048
+    # Writes that free memory still go through.
+    db.delete("key0")
+    db.set("key0", "small")
+    assert db.get("key0") == "small"
+    db.drop()
+
+
+def test_lru_evicts_keys_that_were_not_read(tmp_path):
+    random.seed(7)
+    name = str(tmp_path / "db")
+    db = SimpleDB(name, maxmemory="3kb", maxmemory_policy="allkeys-lru", maxmemory_samples=50)
+    keys = [f"key{i}" for i in range(10)]
+    for key in keys:
+        db.set(key, "v" * 100)
+    for key in keys[:5]:
+        assert db.get(key) is not None
+    for i in range(5):
+        db.set(f"new{i}", "v" * 100)
+    evicted = [key for key in keys if db.data.get(key) is None]
+    assert evicted and set(evicted) <= set(keys[5:])
+    assert db.eviction.used_memory <= db.eviction.maxmemory
+    assert db.info()["stats"]["evicted_keys"] == len(evicted)
+    db.wal.close_log_file()
+
+    # Evictions are logged, recovery does not bring the keys back.
+    db = SimpleDB(name, maxmemory="3kb", maxmemory_policy="allkeys-lru")
+    assert not any(key in db.data for key in evicted)
+    assert db.eviction.used_memory == recomputed(db)
+    db.drop()
+
+
+def test_lfu_evicts_rarely_read_keys(tmp_path):
+    random.seed(7)
+    db = SimpleDB(str(tmp_path / "db"), maxmemory="3kb", maxmemory_policy="allkeys-lfu", maxmemory_samples=50)
+    keys = [f"key{i}" for i in range(10)]
+    for key in keys:
+        db.set(key, "v" * 100)
+    for _ in range(50):
+        db.mget(keys[:5])
+    for i in range(5):
+        db.set(f"new{i}", "v" * 100)
+    evicted = [key for key in keys if key not in db.data]
+    assert evicted and set(evicted) <= set(keys[5:])
+    db.drop()
+
+
+def test_volatile_ttl_evicts_the_nearest_expiry(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"), maxmemory="2kb", maxmemory_policy="volatile-ttl")
+    db.set("persistent", "v" * 100)
+    db.set("late", "v" * 100, ["1000"])
+    db.set("soon", "v" * 100, ["10"])
+    i = 0
+    while "soon" in db.data:
+        db.set(f"key{i}", "v" * 100)
+        i += 1
+    assert "late" in db.data
+    while "late" in db.data:
+        db.set(f"key{i}", "v" * 100)
+        i += 1
+    assert "persistent" in db.data
+    # Only keys with a TTL can be evicted, once they are gone the writes fail.
+    with pytest.raises(MaxMemoryError):
+        db.set("more", "v" * 1000)
+    db.drop()
+
+
+def test_rebuild_after_load(tmp_path):
+    name = str(tmp_path / "db")
+    db = SimpleDB(name)
+    for i in range(50):
+        db.set(f"key{i}", "v" * i)
+    db.hset("hash", mapping={"a": "1", "b": "2"})
+    db.rpush("list", "x", "y")
+    db.wal.close_log_file()
+
+    db = SimpleDB(name, maxmemory="1mb")
+    assert db.eviction.used_memory == recomputed(db)
+    assert isinstance(db.eviction, MemoryLimit)
+    db.drop()
@@ -0,0 +1,109 @@
+import datetime as dt,time
+from database.SimpleDB import SimpleDB
+from utilities.expiry.ActiveExpiry import ActiveExpiry
+
+
+'''
+Move the expiry time of a key into the past, as if its TTL ran out.
+'''
+def expire_now(db, key):
+    db.set_expiry(key, dt.datetime.now() - dt.timedelta(seconds=1))
+
+
+'''
+Write keys with a long TTL and expire every other one, without reading them.
+'''
+def fill_half_expired(db, count=200):
+    for i in range(count):
+        db.set(f"key{i}", "value", ["100"])
+    for i in range(0, count, 2):
+        expire_now(db, f"key{i}")
+
+
+def test_expired_key_is_deleted_on_read(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.set("short", "value", ["100"])
+    db.set("kept", "value", ["100"])
+    expire_now(db, "short")
+    assert db.get("short") is None
+    assert "short" not in db.data
+    assert db.get("kept") == "value"
+    assert db.info()["stats"]["expired_keys"] == 1
+    db.drop()
+
+
+def test_expire_keys_only_pops_due_entries(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    for i in range(100):
+        db.set(f"key{i}", "value", ["100"])
+    expire_now(db, "key7")
+    heap_size = len(db.expiry_heap)
+    db.expire_keys()
+    assert db.dbsize() == 99
+    assert "key7" not in db.data
+    # Only the due entry is popped, the stale entry of the first TTL of key7 waits until it is due too.
+    assert len(db.expiry_heap) == heap_size - 1
+    assert db.expiry_heap[0][0] > dt.datetime.now()
+    db.drop()
+
+
+def test_stale_heap_entries_do_not_expire_keys(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.set("key", "old", ["100"])
+    expire_now(db, "key")
+    # Set again without a TTL, the past heap entry is left behind and must not delete the new value.
+    db.set("key", "new")
+    db.expire_keys()
+    assert db.get("key") == "new"
+    assert db.expiry["key"] is None
+    db.drop()
+
+
+def test_overwritten_ttls_keep_the_heap_bounded(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    for i in range(1000):
+        db.set(f"key{i % 10}", "value", [str(100 + i)])
+    assert len(db.expiry_heap) <= 2 * len(db.expiry) + 64
+    assert db.keys_with_ttl() == 10
+    db.drop()
+
+
+def test_active_expiry_cycle_deletes_unread_keys(tmp_path):
+    name = str(tmp_path / "db")
+    db = SimpleDB(name)
+    fill_half_expired(db)
+    worker = ActiveExpiry(db, sample_size=20, budget=10)
+    assert worker.cycle() == 100
+    assert db.dbsize() == 100
+    assert worker.stats()["expired_keys"] == 100
+    assert worker.stats()["budget_exhausted"] == 0
+    assert db.info()["stats"]["expired_keys"] == 100
+    db.wal.close_log_file()
+
+    db = SimpleDB(name)
+    assert db.dbsize() == 100
+    assert "key0" not in db.data and "key1" in db.data
+    db.drop()
+
+
+def test_active_expiry_cycle_stops_at_its_budget(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    fill_half_expired(db)
+    worker = ActiveExpiry(db, sample_size=20, budget=0)
+    assert worker.cycle() == 20
+    assert worker.stats()["budget_exhausted"] == 1
+    assert db.dbsize() == 180
+    db.drop()
+
+
+def test_active_expiry_runs_in_the_background(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    fill_half_expired(db)
+    worker = db.start_active_expiry(hz=100)
+    deadline = time.monotonic() + 5
+    while db.dbsize() > 100 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db.dbsize() == 100
+    assert worker.stats()["cycles"] >= 1
+    db.drop()
+    assert db.active_expiry is None
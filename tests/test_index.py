@@ -0,0 +1,117 @@
+import datetime as dt,random,pytest
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.BTreeSimpleDB import BTreeSimpleDB
+from utilities.index.SortedKeys import SortedKeys, CHUNK_SIZE, prefix_end
+
+
+STORAGES = [SimpleDB, JsonSimpleDB, BinarySimpleDB, BitcaskSimpleDB, BTreeSimpleDB]
+
+
+'''
+Close a database without dropping it, whatever its storage.
+'''
+def close(db):
+    if hasattr(db, "close"):
+        db.close()
+    db.wal.close_log_file()
+
+
+'''
+Run a scan to completion.
+    Returns:
+        list: The keys of every step, in the order they were returned.
+'''
+def full_scan(db, match=None, count=7, between_steps=None):
+    keys, cursor = [], 0
+    while True:
+        cursor, page = db.scan(cursor, match, count)
+        keys.extend(page)
+        if between_steps:
+            between_steps()
+        if cursor == 0:
+            return keys
+
+
+def test_sorted_keys_follow_random_updates():
+    rng = random.Random(3)
+    index, expected = SortedKeys(), set()
+    for _ in range(20 * CHUNK_SIZE):
+        key = f"{rng.randrange(5 * CHUNK_SIZE):05d}"
+        if rng.random() < 0.7:
+            index.add(key)
+            expected.add(key)
+        else:
+            index.remove(key)
+            expected.discard(key)
+    assert list(index) == sorted(expected)
+    assert len(index) == len(expected)
+    assert len(index.chunks) > 1
+    keys, last = index.page("01000", "02000", 10)
+    assert keys == [key for key in sorted(expected) if "01000" <= key < "02000"][:10]
+    assert last == keys[-1]
+
+
+def test_prefix_end():
+    assert prefix_end("user:") == "user;"
+    assert prefix_end("a\U0010ffff") == "b"
+    assert prefix_end("") is None
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_keys_range_and_scan_in_key_order(tmp_path, storage):
+    name = str(tmp_path / "db")
+    db = storage(name)
+    expected = {f"user:{i:03d}": str(i) for i in range(300)}
+    expected.update({"item:1": "a", "item:2": "b", "zeta": "z"})
+    db.mset(expected)
+    close(db)
+
+    db = storage(name)
+    assert list(db.keys()) == sorted(expected)
+    assert list(db.keys("user:")) == sorted(key for key in expected if key.startswith("user:"))
+    assert list(db.keys("nothing")) == []
+    assert list(db.range("user:100", "user:105")) == [(f"user:{i}", str(i)) for i in range(100, 105)]
+    assert list(db.range("user:299")) == [("user:299", "299"), ("zeta", "z")]
+    assert sorted(full_scan(db)) == sorted(expected)
+    assert sorted(full_scan(db, match="item:*")) == ["item:1", "item:2"]
+    assert sorted(full_scan(db, match="user:1?5")) == [f"user:1{i}5" for i in range(10)]
+    if hasattr(db, "drop"):
+        db.drop()
+
+
+def test_scan_returns_stable_keys_once_while_writing(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    stable = [f"key{i:04d}" for i in range(0, 1000, 2)]
+    db.mset({key: "v" for key in stable})
+    added = iter(f"key{i:04d}" for i in range(1, 1000, 2))
+    rng = random.Random(5)
+
+    def write():
+        db.set(next(added), "v")
+        db.delete(f"key{rng.randrange(1, 1000, 2):04d}")
+
+    keys = full_scan(db, count=10, between_steps=write)
+    assert len(keys) == len(set(keys))
+    assert set(stable) <= set(keys)
+    db.drop()
+
+
+def test_expired_keys_are_hidden(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.mset({"a": "1", "b": "2", "c": "3"})
+    db.set("b", "2", ["100"])
+    db.set_expiry("b", dt.datetime.now() - dt.timedelta(seconds=1))
+    assert list(db.keys()) == ["a", "c"]
+    assert list(db.range()) == [("a", "1"), ("c", "3")]
+    assert full_scan(db) == ["a", "c"]
+    db.drop()
+
+
+def test_invalid_cursor(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    with pytest.raises(ValueError):
+        db.scan(12345)
+    db.drop()
@@ -0,0 +1,74 @@
+import json,pytest
+from database.JsonSimpleDB import JsonSimpleDB
+from utilities.parser.JsonParser import JsonParser, EXPIRY_MEMBER
+
+
+DOCUMENT = {
+    "number": 1234567890, "negative": -12.5e-3, "float": 0.25, "true": True, "false": False, "null": None,
+    "escapes": "quote \" backslash \\ tab \t newline \n \u00e9 \ud83d\ude00",
+    "nested": {"list": [1, [2, {"three": 3}], "four", []], "empty": {}},
+    "long": "x" * 500,
+}
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_lone_surrogates_round_trip(tmp_path, codec):
+    path = str(tmp_path / "data.json")
+    data = {"\ud800": "low \udc00 high", "pair": "\U0001f600", "list": ["\udfff"]}
+    JsonParser().dump_data(data, path, codec, expiry=[("\ud800", 1000)])
+    loaded = dict(JsonParser().iterparse(path))
+    assert loaded.pop(EXPIRY_MEMBER) == {"\ud800": 1000}
+    assert loaded == data
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_files_are_utf8(tmp_path, codec):
+    path = str(tmp_path / "data.json")
+    JsonParser().dump_data({"café": "☃"}, path, codec)
+    assert dict(JsonParser().iterparse(path)) == {"café": "☃"}
+    if codec == "none":
+        with open(path, "rb") as f:
+            assert "café".encode("utf-8") in f.read()
+
+
+def test_reserved_key_and_none(tmp_path):
+    db = JsonSimpleDB(str(tmp_path / "db"))
+    with pytest.raises(ValueError):
+        db.set(EXPIRY_MEMBER, "x")
+    with pytest.raises(ValueError):
+        db.hset(EXPIRY_MEMBER, "field", "x")
+    with pytest.raises(ValueError):
+        db.set("none", None)
+    assert db.dbsize() == 0
+    db.drop()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iterparse_members_across_chunks(tmp_path, chunk_size):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(DOCUMENT, indent=2), encoding="utf-8")
+    members = list(JsonParser().iterparse(str(path), chunk_size))
+    assert [key for key, _ in members] == list(DOCUMENT)
+    assert dict(members) == json.loads(json.dumps(DOCUMENT))
+
+
+def test_parse_json_matches_the_standard_library():
+    text = json.dumps(DOCUMENT)
+    assert JsonParser().parse_json(text) == json.loads(text)
+    with pytest.raises(ValueError):
+        JsonParser().parse_json(text + " {}")
+
+
+@pytest.mark.parametrize("text", ["", "{}", " { } "])
+def test_iterparse_empty(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+    assert list(JsonParser().iterparse(str(path), 2)) == []
+
+
+@pytest.mark.parametrize("text", ['[1, 2]', '{"a": 1, "b": [1, 2', '{"a": 1', '{"a" 1}', '{"a": tru}'])
+def test_iterparse_rejects_invalid_files(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(JsonParser().iterparse(str(path), 3))
@@ -0,0 +1,66 @@
+from database.SimpleDB import SimpleDB
+from utilities.metrics.Metrics import Histogram, Metrics
+from utilities.network.RespServer import RespServer
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.observe(0.0001)
+    histogram.observe(0.5)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["max_ms"] == 500.0
+    # Buckets are powers of two microseconds, a percentile is the upper bound of its bucket.
+    assert 0.1 <= summary["p50_ms"] <= 0.2
+    assert summary["p99_ms"] <= 0.2
+    assert summary["p999_ms"] == 500.0
+
+
+def test_slowlog_keeps_the_slowest_operations():
+    metrics = Metrics(slowlog_size=3)
+    for i in range(1, 11):
+        metrics.record("set", f"key{i}", i / 1000, [("wal", i / 2000)])
+    slowlog = metrics.slowlog()
+    assert [entry["key"] for entry in slowlog] == ["key10", "key9", "key8"]
+    assert slowlog[0]["duration_ms"] == 10.0
+    assert slowlog[0]["phases"] == {"wal": 5.0}
+    assert len(metrics.slowlog(1)) == 1
+    assert metrics.snapshot()["counters"]["cmd_set"] == 10
+    metrics.reset_slowlog()
+    assert metrics.slowlog() == []
+
+
+def test_info_reports_commands_and_keyspace(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.set("a", "1")
+    db.set("b", "2", ["100"])
+    db.get("a")
+    db.mget(["a", "missing"])
+    db.delete("b")
+    info = db.info()
+    assert info["server"]["keys"] == 1
+    assert info["server"]["keys_with_ttl"] == 0
+    stats = info["stats"]
+    assert (stats["cmd_set"], stats["cmd_delete"], stats["cmd_get"]) == (2, 1, 3)
+    assert (stats["keyspace_hits"], stats["keyspace_misses"], stats["hit_rate"]) == (2, 1, 0.6667)
+    assert info["wal"]["records"] >= 3 and info["wal"]["bytes"] > 0
+    assert info["latency"]["set"]["count"] == 2
+    phases = info["slowlog"][0]["phases"]
+    assert {"wal", "mutate", "persist"} <= set(phases)
+    db.drop()
+
+
+def test_info_and_slowlog_commands(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    server = RespServer(db)
+    server.execute([b"SET", b"a", b"1"])
+    server.execute([b"GET", b"a"])
+    info = server.execute([b"INFO", b"stats"])
+    assert info.startswith("# Stats\r\n")
+    assert "keyspace_hits:1\r\n" in info
+    assert "# Server" not in info
+    assert server.execute([b"SLOWLOG", b"LEN"]) == 1
+    entry = server.execute([b"SLOWLOG", b"GET", b"1"])[0]
+    assert entry[3] == ["set", "a"]
+    db.drop()
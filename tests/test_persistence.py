@@ -0,0 +1,57 @@
+import os,time,pytest
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="background snapshots fork")
+@pytest.mark.parametrize("storage", [SimpleDB, JsonSimpleDB, BinarySimpleDB])
+def test_writes_during_bgsave(tmp_path, storage):
+    name = str(tmp_path / "db")
+    db = storage(name)
+    with db.batch():
+        for i in range(20000):
+            db.set(f"key{i}", "v" * 20)
+    assert db.bgsave()
+    for i in range(30):
+        db.set(f"new{i}", str(i))
+    db.wait_bgsave()
+    assert db.info()["persistence"]["last_bgsave_status"] == "ok"
+    assert not [file for file in os.listdir(tmp_path) if file.endswith(".tmp")]
+    db.wal.close_log_file()
+
+    db = storage(name)
+    assert db.dbsize() == 20030
+    assert db.get("new29") == "29"
+    db.drop()
+
+
+
+@pytest.mark.parametrize("storage", [SimpleDB, JsonSimpleDB, BinarySimpleDB])
+def test_save_fsyncs_only_when_asked(tmp_path, monkeypatch, storage):
+    db = storage(str(tmp_path / "db"))
+    db.set("key", "value")
+    fsyncs = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+    db.save()
+    assert fsyncs == []
+    db.save(sync=True)
+    assert fsyncs
+    monkeypatch.undo()
+    db.drop()
+
+
+@pytest.mark.parametrize("storage", [SimpleDB, JsonSimpleDB, BinarySimpleDB])
+def test_keys_expired_while_closed_are_deleted_on_load(tmp_path, storage):
+    name = str(tmp_path / "db")
+    db = storage(name)
+    db.set("kept", "value")
+    db.set("short", "value", ["1"])
+    db.save(sync=True)
+    db.wal.close_log_file()
+    time.sleep(1.1)
+
+    db = storage(name)
+    assert "short" not in db.data
+    assert db.dbsize() == 1
+    db.drop()
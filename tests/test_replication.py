@@ -0,0 +1,77 @@
+import multiprocessing,pytest
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.ReplicaSimpleDB import ReplicaSimpleDB
+
+
+TIMEOUT = 30
+
+
+'''
+Body of the follower process: report the data after the full sync, then after catching up to each position it is sent.
+'''
+def follower(address, conn):
+    replica = ReplicaSimpleDB(address, reconnect_interval=0.1)
+    try:
+        replica.wait_synced(TIMEOUT)
+        conn.send(sorted(replica.export()))
+        while (position := conn.recv()) is not None:
+            replica.wait_for_position(position, TIMEOUT)
+            conn.send(sorted(replica.export()))
+    finally:
+        replica.close()
+
+
+@pytest.mark.parametrize("storage", [SimpleDB, JsonSimpleDB, BinarySimpleDB])
+def test_full_sync_and_catch_up(tmp_path, storage):
+    db = storage(str(tmp_path / "leader"))
+    with db.batch():
+        for i in range(500):
+            db.set(f"key{i}", f"value{i}")
+    db.set("counter", 5)
+    db.hset("hash", mapping={"a": "1", "b": "2"})
+    db.rpush("list", "x", "", "y")
+    leader = db.start_replication()
+    conn, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=follower, args=(leader.address, child), daemon=True)
+    process.start()
+    try:
+        assert conn.poll(TIMEOUT)
+        assert conn.recv() == sorted(db.export())
+
+        for i in range(0, 500, 5):
+            db.set(f"key{i}", "updated")
+        db.delete("key1")
+        db.incrby("counter", 3)
+        db.hdel("hash", "a")
+        with db.batch():
+            db.set("batched", "1")
+            db.lpush("list", "first")
+        conn.send(db.wal.position())
+        assert conn.poll(TIMEOUT)
+        assert conn.recv() == sorted(db.export())
+        conn.send(None)
+        process.join(TIMEOUT)
+        assert process.exitcode == 0
+    finally:
+        if process.is_alive():
+            process.kill()
+        db.stop_replication()
+        db.drop()
+
+
+def test_replica_rejects_writes(tmp_path):
+    db = SimpleDB(str(tmp_path / "leader"))
+    db.set("a", "1")
+    leader = db.start_replication()
+    replica = ReplicaSimpleDB(leader.address, reconnect_interval=0.1)
+    try:
+        assert replica.wait_synced(TIMEOUT)
+        assert replica.get("a") == "1"
+        with pytest.raises(PermissionError):
+            replica.set("a", "2")
+    finally:
+        replica.close()
+        db.stop_replication()
+        db.drop()
@@ -0,0 +1,107 @@
+import asyncio,os,socket,subprocess,sys,threading
+from database.SimpleDB import SimpleDB
+from database.BTreeSimpleDB import BTreeSimpleDB
+from utilities.network.RespServer import RespServer, RespError
+
+
+def test_del(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    server = RespServer(db)
+    db.set("a", "1")
+    db.set("b", "2")
+    records = db.metrics.snapshot()["counters"].get("wal_records", 0)
+    assert server.execute([b"DEL", b"missing"]) == 0
+    assert db.metrics.snapshot()["counters"].get("wal_records", 0) == records
+    assert server.execute([b"DEL", b"a"]) == 1
+    assert server.execute([b"DEL", b"a", b"b", b"c"]) == 1
+    assert db.dbsize() == 0
+    db.drop()
+
+
+def test_unexpected_error_is_a_reply(tmp_path):
+    db = BTreeSimpleDB(str(tmp_path / "db"), page_size=512)
+    server = RespServer(db)
+    reply = server.execute([b"SET", b"k" * 1000, b"v"])
+    assert isinstance(reply, RespError)
+    assert str(reply).startswith("ERR ")
+    assert server.execute([b"SET", b"k", b"v"]) is not None
+    assert db.get("k") == "v"
+    db.close()
+
+
+'''
+Start a server for a database on a free port.
+'''
+async def start_server(db):
+    server = RespServer(db, port=0)
+    await server.start()
+    return server
+
+
+def test_protocol_error_is_replied_after_earlier_commands(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+
+    async def run():
+        server = await start_server(db)
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"SET a 1\r\n*1\r\n$3\r\nGET\r\n*2\r\n$3\r\nGET\r\n$1\r\na\r\n*x\r\n")
+        replies = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        await server.stop()
+        return replies
+
+    replies = asyncio.run(run())
+    assert replies == b"+OK\r\n-ERR wrong number of arguments for 'get' command\r\n$1\r\n1\r\n" \
+                      b"-ERR Protocol error: invalid multibulk length\r\n"
+    db.drop()
+
+
+def test_blocked_command_does_not_stall_other_clients(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with db.lock:
+            locked.set()
+            release.wait(3)
+
+    async def run():
+        server = await start_server(db)
+        blocked_reader, blocked_writer = await asyncio.open_connection(server.host, server.port)
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        blocked_writer.write(b"SET a 1\r\n")
+        await blocked_writer.drain()
+        await asyncio.sleep(0.1)
+        writer.write(b"PING\r\n")
+        assert await asyncio.wait_for(reader.readline(), 5) == b"+PONG\r\n"
+        # Answered while the SET still waits for the lock.
+        assert holder.is_alive()
+        release.set()
+        assert await asyncio.wait_for(blocked_reader.readline(), 5) == b"+OK\r\n"
+        holder.join()
+        for stream in (writer, blocked_writer):
+            stream.close()
+        await server.stop()
+
+    asyncio.run(run())
+    assert db.get("a") == "1"
+    db.drop()
+
+
+def test_server_prints_the_bound_port(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, os.path.join(root, "server.py"), "--name", str(tmp_path / "db"), "--port", "0"],
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        port = int(line.rsplit(":", 1)[1])
+        assert port != 0
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as client:
+            client.sendall(b"PING\r\n")
+            assert client.recv(64) == b"+PONG\r\n"
+    finally:
+        process.terminate()
+        process.wait(10)
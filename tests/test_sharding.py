@@ -0,0 +1,93 @@
+import pytest
+from database.ShardedSimpleDB import ShardedSimpleDB, MOVING
+
+
+'''
+Fill a sharded database with keys, some of them with a TTL.
+    Returns:
+        dict: The keys and values.
+'''
+def fill(db, count=200):
+    expected = {f"key{i:03d}": f"value{i}" for i in range(count)}
+    db.mset({key: value for key, value in expected.items() if not key.endswith("0")})
+    db.mset({key: value for key, value in expected.items() if key.endswith("0")}, ttl=["3600"])
+    return expected
+
+
+'''
+Check that every key is on the shard the ring assigns it to, and on that shard only.
+'''
+def assert_owned(db, expected):
+    assert sorted(db.keys()) == sorted(expected)
+    assert db.dbsize() == len(expected)
+    assert db.mget(list(expected)) == list(expected.values())
+    for shard_id, shard in db.shards.items():
+        assert all(db.ring.get(key) == shard_id for key, _, _ in shard.call("export"))
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_operations_span_shards(tmp_path, processes):
+    db = ShardedSimpleDB(str(tmp_path / "db"), shards=3, processes=processes)
+    expected = fill(db)
+    db.incrby("counter", 5)
+    db.rpush("list", "a", "b")
+    db.hset("hash", mapping={"f": "v"})
+    expected.update({"counter": 5, "list": ["a", "b"], "hash": {"f": "v"}})
+    assert_owned(db, expected)
+    assert all(shard.call("dbsize") > 0 for shard in db.shards.values())
+    assert db.lrange("list") == ["a", "b"]
+    assert db.hget("hash", "f") == "v"
+    assert db.mdelete(["key000", "key001", "missing"]) == 2
+    assert db.get("key001") is None
+    keys, cursor = [], 0
+    while True:
+        cursor, page = db.scan(cursor, match="key*", count=50)
+        keys.extend(page)
+        if cursor == 0:
+            break
+    assert sorted(keys) == [key for key in sorted(expected) if key.startswith("key")][2:]
+    db.drop()
+
+
+def test_add_shard_moves_keys_and_reopens(tmp_path):
+    name = str(tmp_path / "db")
+    db = ShardedSimpleDB(name, shards=2)
+    expected = fill(db)
+    moved = db.add_shard()
+    assert 0 < moved < len(expected)
+    assert db.shards[2].call("dbsize") == moved
+    assert_owned(db, expected)
+    db.close()
+
+    db = ShardedSimpleDB(name, shards=5)
+    assert sorted(db.shards) == [0, 1, 2]
+    assert_owned(db, expected)
+    assert db.shards[2].call("export")[0][2] in (None, 3600)
+    db.drop()
+
+
+def test_interrupted_add_shard_removes_old_copies_on_open(tmp_path, monkeypatch):
+    name = str(tmp_path / "db")
+    db = ShardedSimpleDB(name, shards=2)
+    expected = fill(db)
+
+    # Crash once the new shard is in the manifest, before the moved keys are deleted from their old shards.
+    scatter = db.scatter
+
+    def crash(calls):
+        if any(method == "mdelete" for method, _ in calls.values()):
+            raise SystemExit("crash")
+        return scatter(calls)
+
+    monkeypatch.setattr(db, "scatter", crash)
+    with pytest.raises(SystemExit):
+        db.add_shard()
+    db.close()
+    with open(f"{name}.shards") as f:
+        assert f.read().split() == ["0", "1", "2", MOVING]
+
+    db = ShardedSimpleDB(name)
+    assert_owned(db, expected)
+    with open(f"{name}.shards") as f:
+        assert f.read().split() == ["0", "1", "2"]
+    db.drop()
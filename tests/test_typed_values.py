@@ -0,0 +1,113 @@
+import pytest
+from database.SimpleDB import SimpleDB
+from database.JsonSimpleDB import JsonSimpleDB
+from database.BinarySimpleDB import BinarySimpleDB
+from database.BitcaskSimpleDB import BitcaskSimpleDB
+from database.ReadOnlySimpleDB import ReadOnlySimpleDB
+from utilities.serializer.TypedValue import encode_fields, decode_fields, encode_text, decode_text
+
+
+VALUES = {
+    "string": "plain",
+    "escaped": "tab\there\nnew line \\ backslash",
+    "empty": "",
+    "counter": 42,
+    "negative": -7,
+    "hash": {"a": "1", "": "empty field", "tab\tfield": "x\ny"},
+    "list": ["a", "", "b\tc"],
+    "one empty": [""],
+    "one empty field": {"": ""},
+}
+
+
+'''
+Write every value of VALUES, a list and a counter with the typed commands and a TTL on one key.
+'''
+def fill(db):
+    for key, value in VALUES.items():
+        db.set(key, value)
+    db.incrby("incremented", 5)
+    db.rpush("pushed", "")
+    db.hset("fields", "f", "")
+    db.set("expiring", "soon", ttl=[100])
+
+
+'''
+Check that a database holds what fill wrote.
+'''
+def check(db):
+    for key, value in VALUES.items():
+        assert db.get(key) == value, key
+    assert db.get("incremented") == 5
+    assert db.lrange("pushed") == [""]
+    assert db.hgetall("fields") == {"f": ""}
+    assert db.key_type("one empty") == "list"
+    assert db.get("expiring") == "soon"
+
+
+@pytest.mark.parametrize("fields", [[], [""], ["", ""], ["\\e"], ["a", "b\tc"]])
+def test_fields_round_trip(fields):
+    assert decode_fields(encode_fields(fields)) == fields
+
+
+@pytest.mark.parametrize("value", list(VALUES.values()))
+def test_text_round_trip(value):
+    tag, text = encode_text(value)
+    assert "\n" not in text
+    assert decode_text(tag, text) == value
+
+
+@pytest.mark.parametrize("storage", [SimpleDB, JsonSimpleDB, BinarySimpleDB, BitcaskSimpleDB])
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_save_and_load(tmp_path, storage, compression):
+    name = str(tmp_path / "db")
+    kwargs = {} if storage is BitcaskSimpleDB else {"compression": compression}
+    db = storage(name, **kwargs)
+    fill(db)
+    db.save()
+    db.wal.close_log_file()
+
+    db = storage(name, **kwargs)
+    check(db)
+    assert db.info()["server"]["keys_with_ttl"] == 1
+    db.drop()
+
+
+@pytest.mark.parametrize("wal_format", ["text", "binary"])
+def test_restore_records_replay(tmp_path, wal_format):
+    name = str(tmp_path / "db")
+    db = SimpleDB(name, wal_format=wal_format, persistence="background", snapshot_changes=10 ** 9)
+    fill(db)
+    db.wal.close_log_file()
+
+    db = SimpleDB(name, wal_format=wal_format, persistence="background", snapshot_changes=10 ** 9)
+    check(db)
+    db.drop()
+
+
+@pytest.mark.parametrize("storage", ["txt", "binary"])
+def test_read_only_snapshot(tmp_path, storage):
+    name = str(tmp_path / "db")
+    db = (SimpleDB if storage == "txt" else BinarySimpleDB)(name)
+    fill(db)
+    snapshot = ReadOnlySimpleDB(name, storage)
+    check(snapshot)
+    with pytest.raises(PermissionError):
+        snapshot.set("string", "changed")
+    snapshot.close()
+    db.drop()
+
+
+def test_incr_keeps_used_memory(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"), maxmemory="10kb", maxmemory_policy="noeviction")
+    db.set("counter", "0")
+    db.incr("counter")
+    used = db.info()["memory"]["used_memory"]
+    for _ in range(500):
+        assert db.incr("counter")
+    db.incrby("counter", 10)
+    db.decrby("counter", 10)
+    assert db.get("counter") == 501
+    assert db.info()["memory"]["used_memory"] == used
+    assert list(db.keys()) == ["counter"]
+    db.drop()
@@ -0,0 +1,173 @@
+import os,threading,pytest
+from database.SimpleDB import SimpleDB
+from utilities.logger.wal import wal, LOG_FORMATS, RECORD
+from utilities.serializer.Compression import file_codec
+
+
+'''
+Open a database that only persists through the WAL between snapshots, so reopening it replays the log.
+'''
+def open_db(path, wal_format, **kwargs):
+    return SimpleDB(str(path / "db"), wal_format=wal_format, persistence="background", snapshot_changes=10 ** 9,
+                    snapshot_interval=10 ** 9, **kwargs)
+
+
+'''
+Close the WAL without saving, like a process that stopped right after its last write.
+'''
+def crash(db):
+    db.wal.close_log_file()
+
+
+@pytest.mark.parametrize("wal_format", LOG_FORMATS)
+def test_replay_across_segments(tmp_path, wal_format):
+    db = open_db(tmp_path, wal_format, segment_size=512)
+    for i in range(200):
+        db.set(f"key{i}", f"value{i}")
+    db.delete("key7")
+    db.set("ttl", "x", ttl=[100])
+    assert len(db.wal.segments()) > 1
+    crash(db)
+
+    db = open_db(tmp_path, wal_format, segment_size=512)
+    assert db.dbsize() == 200
+    assert db.get("key199") == "value199"
+    assert db.get("key7") is None
+    assert db.expiry["ttl"] is not None
+    crash(db)
+
+
+@pytest.mark.parametrize("wal_format", LOG_FORMATS)
+def test_replay_keeps_values_intact(tmp_path, wal_format):
+    values = {"suffix": "abc with TTL 5 seconds", "newline": "x\ny", "tab": "a\tb", "backslash": "c:\\n", "empty": "",
+              "with space": "v"}
+    db = open_db(tmp_path, wal_format)
+    for key, value in values.items():
+        db.set(key, value)
+    crash(db)
+
+    db = open_db(tmp_path, wal_format)
+    assert {key: db.get(key) for key in values} == values
+    assert db.expiry.get("suffix") is None
+    crash(db)
+
+
+@pytest.mark.parametrize("wal_format", LOG_FORMATS)
+def test_torn_tail_is_skipped(tmp_path, wal_format):
+    db = open_db(tmp_path, wal_format)
+    db.set("a", "1")
+    db.set("b", "2")
+    segment = db.wal.segment_name(db.wal.active_segment)
+    crash(db)
+    size = os.path.getsize(segment)
+    # Cut the last record short, as a crash in the middle of its write would.
+    with open(segment, "r+b") as f:
+        f.truncate(size - 3)
+
+    db = open_db(tmp_path, wal_format)
+    assert db.get("a") == "1"
+    assert db.get("b") is None
+    assert db.dbsize() == 1
+    db.set("c", "3")
+    crash(db)
+
+    db = open_db(tmp_path, wal_format)
+    assert (db.get("a"), db.get("b"), db.get("c")) == ("1", None, "3")
+    assert db.dbsize() == 2
+    crash(db)
+
+
+@pytest.mark.parametrize("wal_format", LOG_FORMATS)
+def test_batch_without_commit_is_discarded(tmp_path, wal_format):
+    db = open_db(tmp_path, wal_format)
+    db.set("kept", "1")
+    db.begin_batch()
+    db.set("kept", "2")
+    db.set("lost", "x")
+    crash(db)
+
+    db = open_db(tmp_path, wal_format)
+    assert db.get("kept") == "1"
+    assert db.get("lost") is None
+    with db.batch():
+        db.set("batched", "y")
+    crash(db)
+
+    db = open_db(tmp_path, wal_format)
+    assert db.get("batched") == "y"
+    crash(db)
+
+
+def test_rolled_back_batch_is_undone(tmp_path):
+    db = SimpleDB(str(tmp_path / "db"))
+    db.set("a", "1")
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.set("a", "2")
+            db.delete("a")
+            db.set("b", "3")
+            raise RuntimeError("abort")
+    assert (db.get("a"), db.get("b")) == ("1", None)
+    crash(db)
+
+    db = SimpleDB(str(tmp_path / "db"))
+    assert (db.get("a"), db.get("b")) == ("1", None)
+    crash(db)
+
+
+@pytest.mark.parametrize("log_format", LOG_FORMATS)
+def test_read_log_returns_each_record_once(tmp_path, log_format):
+    log = wal(str(tmp_path / "x.log"), False, segment_size=200, log_format=log_format)
+    for i in range(20):
+        log.write_log("set", f"k{i}", "v" * 20)
+    assert len(log.segments()) > 2
+    assert sum(1 for entry in log.read_log() if "SET" in entry) == 20
+    log.close_log_file()
+
+
+def test_concurrent_writers_rotate_once_per_full_segment(tmp_path):
+    log = wal(str(tmp_path / "log"), False, durability="group", group_commit_window=0.002, segment_size=1024)
+
+    def write(worker):
+        for i in range(100):
+            log.write_log("set", f"worker{worker}-{i}", "x" * 20)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    closed = log.segments()[:-1]
+    assert len(log.read_log()) == 800
+    log.close_log_file()
+    assert len(closed) > 5
+    assert all(os.path.getsize(log.segment_name(segment)) >= 1024 for segment in closed)
+
+
+def test_segment_is_compressed_once(tmp_path):
+    log = wal(str(tmp_path / "log"), False, segment_size=1024, compression="zlib")
+    while len(log.segments()) < 2:
+        log.write_log("set", "key", "x" * 100)
+    closed = log.segments()[0]
+    log.start_compression(closed)
+    log.start_compression(closed)
+    log.close_log_file()
+    assert file_codec(log.segment_name(closed)) == "zlib"
+    assert log.metrics.snapshot()["latency"]["wal_compress"]["count"] == 1
+
+
+def test_records_appended_after_open_are_checked(tmp_path):
+    log = wal(str(tmp_path / "log"), False, log_format="binary")
+    log.write_log("set", "a", "1")
+    log.close_log_file()
+
+    log = wal(str(tmp_path / "log"), False, log_format="binary")
+    segment, verified = log.verified_end
+    log.write_log("set", "b", "2")
+    log.write_log("set", "c", "3")
+    # Flip a byte of the value of 'b', a record the open did not check.
+    with open(log.segment_name(segment), "r+b") as f:
+        f.seek(verified + RECORD.size + len("b"))
+        f.write(b"X")
+    assert [entry[3] for entry in log.read_records()] == ["a"]
+    log.close_log_file()
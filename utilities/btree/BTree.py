@@ -0,0 +1,496 @@
+import bisect,struct
+from utilities.btree.BufferPool import BufferPool, PAGE_ID
+from utilities.serializer.BinaryFormat import encode_value, decode_value
+from utilities.index.SortedKeys import PAGE_SIZE
+
+
+'''
+Layout of a tree page, a node of the tree.
+    kind, LEAF or INTERNAL (B) | entries (H)
+A leaf holds its entries in key order:
+    key size (H) | value type, see BinaryFormat (B) | flags (B) | expiry epoch seconds, 0 for no TTL (d) | value size (I) |
+    key | the value, or the first overflow page (Q) when flags has OVERFLOW
+An internal node holds the first child followed by its separator keys, each with the child on its right:
+    first child (Q) | (key size (H) | key | child (Q)) per key
+The keys of child i are at least separator i - 1 and less than separator i.
+'''
+NODE_HEADER = struct.Struct("<BH")
+ENTRY = struct.Struct("<HBBdI")
+KEY_SIZE = struct.Struct("<H")
+LEAF = 0
+INTERNAL = 1
+OVERFLOW = 1
+
+
+"""
+    A page of the tree decoded in memory.
+    keys are the keys of a leaf or the separators of an internal node, values the entries of a leaf as
+    (value type, expiry, value size, value bytes or first overflow page) tuples or the child pages of an internal node.
+    size is the size of the encoded page, kept up to date as the node changes.
+"""
+class Node:
+
+    __slots__ = ("id", "leaf", "keys", "values", "size", "dirty")
+
+    def __init__(self, page_id, leaf, keys, values, size):
+        self.id = page_id
+        self.leaf = leaf
+        self.keys = keys
+        self.values = values
+        self.size = size
+        self.dirty = False
+
+
+    '''
+    Encode the node into a page of the given size.
+    '''
+    def encode(self, page_size):
+        parts = [NODE_HEADER.pack(LEAF if self.leaf else INTERNAL, len(self.keys))]
+        if self.leaf:
+            for key, (value_type, expiry, size, ref) in zip(self.keys, self.values):
+                key_bytes = key.encode()
+                overflow = isinstance(ref, int)
+                parts.append(ENTRY.pack(len(key_bytes), value_type, OVERFLOW if overflow else 0, expiry, size))
+                parts.append(key_bytes)
+                parts.append(PAGE_ID.pack(ref) if overflow else ref)
+        else:
+            parts.append(PAGE_ID.pack(self.values[0]))
+            for key, child in zip(self.keys, self.values[1:]):
+                key_bytes = key.encode()
+                parts.append(KEY_SIZE.pack(len(key_bytes)))
+                parts.append(key_bytes)
+                parts.append(PAGE_ID.pack(child))
+        data = b"".join(parts)
+        return data + bytes(page_size - len(data))
+
+
+'''
+Decode a tree page read from the page file.
+'''
+def decode_node(page_id, data):
+    kind, count = NODE_HEADER.unpack_from(data)
+    position = NODE_HEADER.size
+    keys = []
+    values = []
+    if kind == LEAF:
+        for _ in range(count):
+            key_size, value_type, flags, expiry, size = ENTRY.unpack_from(data, position)
+            position += ENTRY.size
+            keys.append(str(data[position:position + key_size], 'utf-8'))
+            position += key_size
+            if flags & OVERFLOW:
+                ref, = PAGE_ID.unpack_from(data, position)
+                position += PAGE_ID.size
+            else:
+                ref = data[position:position + size]
+                position += size
+            values.append((value_type, expiry, size, ref))
+    else:
+        values.append(PAGE_ID.unpack_from(data, position)[0])
+        position += PAGE_ID.size
+        for _ in range(count):
+            key_size, = KEY_SIZE.unpack_from(data, position)
+            position += KEY_SIZE.size
+            keys.append(str(data[position:position + key_size], 'utf-8'))
+            position += key_size
+            values.append(PAGE_ID.unpack_from(data, position)[0])
+            position += PAGE_ID.size
+    return Node(page_id, kind == LEAF, keys, values, position)
+
+
+'''
+Return the encoded size of a leaf entry.
+'''
+def entry_size(key, entry):
+    return ENTRY.size + len(key.encode()) + (PAGE_ID.size if isinstance(entry[3], int) else entry[2])
+
+
+'''
+Return the encoded size a separator adds to an internal node, its child included.
+'''
+def separator_size(key):
+    return KEY_SIZE.size + len(key.encode()) + PAGE_ID.size
+
+
+'''
+Return the shortest key that is greater than left and not greater than right, the separator of two nodes split
+between them. Short separators keep more children per internal node.
+'''
+def shortest_separator(left, right):
+    i = 0
+    while i < len(left) and left[i] == right[i]:
+        i += 1
+    return right[:i + 1]
+
+
+"""
+    B+tree of keys and typed values stored in the pages of a BufferPool.
+    Values live in the leaves, or in overflow pages when they would take more than a quarter of a page, so a lookup
+    reads one page per level of the tree whatever the size of the database. A node that outgrows its page is split
+    in two halves of equal size, and a node left empty by deletes is freed; like PostgreSQL's nbtree, nodes that are
+    only partly empty are not merged, the space is reused by later inserts.
+    Changes are made to pages of the pool and become durable with checkpoint, the caller logs them before, see
+    BTreeSimpleDB. The tree is not thread-safe, readers may run concurrently with each other but not with a writer.
+"""
+class BTree:
+
+    '''
+    Open the tree of a page file, creating an empty one if the file is new.
+        Args:
+            file_name (str): Path of the page file.
+            page_size (int): Page size of a new file.
+            capacity (int or str): Memory of the buffer pool, see BufferPool.
+    '''
+    def __init__(self, file_name, page_size=4096, capacity="64mb"):
+        self.pool = BufferPool(file_name, decode_node, page_size, capacity)
+        self.page_size = self.pool.page_size
+        self.max_entry = (self.page_size - NODE_HEADER.size - PAGE_ID.size) // 4
+        self.max_key_size = self.max_entry - ENTRY.size - PAGE_ID.size
+        if self.pool.state is None:
+            root = Node(None, True, [], [], NODE_HEADER.size)
+            self.pool.add(root)
+            self.root, self.keys, self.ttl_keys = root.id, 0, 0
+            self.checkpoint()
+        else:
+            self.root, self.keys, self.ttl_keys = self.pool.state
+
+
+    '''
+    Check that a key fits in a page before it is written.
+        Raises:
+            ValueError: If the key is longer than a quarter of a page.
+    '''
+    def check_key(self, key):
+        if len(key.encode()) > self.max_key_size:
+            raise ValueError(f"Key of {len(key.encode())} bytes is longer than {self.max_key_size} bytes, "
+                             f"the limit of {self.page_size} byte pages")
+
+
+    '''
+    Walk from the root to the leaf a key belongs in.
+        Returns:
+            tuple: (nodes from the root to the leaf, index of the child taken in each internal node).
+    '''
+    def path(self, key):
+        node = self.pool.get(self.root)
+        nodes = [node]
+        indexes = []
+        while not node.leaf:
+            i = bisect.bisect_right(node.keys, key)
+            indexes.append(i)
+            node = self.pool.get(node.values[i])
+            nodes.append(node)
+        return nodes, indexes
+
+
+    '''
+    Return the entry of a key, None if it is not in the tree.
+        Returns:
+            tuple: (value type, expiry epoch seconds or 0, value size, value bytes or first overflow page).
+    '''
+    def find(self, key):
+        node = self.pool.get(self.root)
+        while not node.leaf:
+            node = self.pool.get(node.values[bisect.bisect_right(node.keys, key)])
+        i = bisect.bisect_left(node.keys, key)
+        entry = node.values[i] if i < len(node.keys) and node.keys[i] == key else None
+        self.pool.trim()
+        return entry
+
+
+    '''
+    Decode the value of an entry returned by find.
+    '''
+    def value(self, entry):
+        value_type, _, size, ref = entry
+        return decode_value(value_type, self.pool.read_overflow(ref, size) if isinstance(ref, int) else ref)
+
+
+    '''
+    Make the nodes of a path changeable, from the leaf up to the first node allocated since the last checkpoint.
+    Nodes the last checkpoint uses are moved to new pages, which changes the child pointer of their parent.
+    '''
+    def writable(self, nodes, indexes):
+        for depth in range(len(nodes) - 1, -1, -1):
+            node = nodes[depth]
+            node.dirty = True
+            if self.pool.is_fresh(node.id):
+                return
+            self.pool.shadow(node)
+            if depth == 0:
+                self.root = node.id
+            else:
+                nodes[depth - 1].values[indexes[depth - 1]] = node.id
+
+
+    '''
+    Insert or replace a key.
+        Args:
+            key (str): The key, see check_key.
+            value: A str, int, float, bytes, dict or list value.
+            expiry (float, optional): Expiry epoch seconds, 0 for no TTL, None keeps the expiry of the current entry.
+    '''
+    def put(self, key, value, expiry=None):
+        value_type, raw = encode_value(value)
+        nodes, indexes = self.path(key)
+        leaf = nodes[-1]
+        i = bisect.bisect_left(leaf.keys, key)
+        old = leaf.values[i] if i < len(leaf.keys) and leaf.keys[i] == key else None
+        if expiry is None:
+            expiry = old[1] if old else 0.0
+        if ENTRY.size + len(key.encode()) + len(raw) > self.max_entry:
+            entry = (value_type, expiry, len(raw), self.pool.write_overflow(raw))
+        else:
+            entry = (value_type, expiry, len(raw), raw)
+        self.writable(nodes, indexes)
+        if old is None:
+            leaf.keys.insert(i, key)
+            leaf.values.insert(i, entry)
+            leaf.size += entry_size(key, entry)
+            self.keys += 1
+            self.ttl_keys += bool(expiry)
+        else:
+            leaf.values[i] = entry
+            leaf.size += entry_size(key, entry) - entry_size(key, old)
+            self.release_value(old)
+            self.ttl_keys += bool(expiry) - bool(old[1])
+        if leaf.size > self.page_size:
+            self.split(nodes, indexes)
+        self.pool.trim()
+
+
+    '''
+    Change the expiry of a key, nothing happens if the key is not in the tree.
+        Args:
+            expiry (float): Expiry epoch seconds, 0 for no TTL.
+    '''
+    def set_expiry(self, key, expiry):
+        nodes, indexes = self.path(key)
+        leaf = nodes[-1]
+        i = bisect.bisect_left(leaf.keys, key)
+        if i < len(leaf.keys) and leaf.keys[i] == key and leaf.values[i][1] != expiry:
+            old = leaf.values[i]
+            self.writable(nodes, indexes)
+            leaf.values[i] = (old[0], expiry, old[2], old[3])
+            self.ttl_keys += bool(expiry) - bool(old[1])
+        self.pool.trim()
+
+
+    '''
+    Remove a key.
+        Returns:
+            bool: True if the key was in the tree.
+    '''
+    def delete(self, key):
+        nodes, indexes = self.path(key)
+        leaf = nodes[-1]
+        i = bisect.bisect_left(leaf.keys, key)
+        if i == len(leaf.keys) or leaf.keys[i] != key:
+            self.pool.trim()
+            return False
+        self.writable(nodes, indexes)
+        del leaf.keys[i]
+        old = leaf.values.pop(i)
+        leaf.size -= entry_size(key, old)
+        self.release_value(old)
+        self.keys -= 1
+        self.ttl_keys -= bool(old[1])
+        if not leaf.values:
+            self.remove_empty(nodes, indexes)
+        self.pool.trim()
+        return True
+
+
+    '''
+    Free the overflow pages of an entry that is replaced or removed.
+    '''
+    def release_value(self, entry):
+        if isinstance(entry[3], int):
+            self.pool.release_overflow(entry[3], entry[2])
+
+
+    '''
+    Split the overfull node at the end of a path, and its parents as long as the separators overfill them.
+    '''
+    def split(self, nodes, indexes):
+        depth = len(nodes) - 1
+        node = nodes[depth]
+        while node.size > self.page_size:
+            right, separator = self.split_node(node)
+            if depth == 0:
+                root = Node(None, False, [separator], [node.id, right.id],
+                            NODE_HEADER.size + PAGE_ID.size + separator_size(separator))
+                self.pool.add(root)
+                self.root = root.id
+                return
+            parent = nodes[depth - 1]
+            i = indexes[depth - 1]
+            parent.keys.insert(i, separator)
+            parent.values.insert(i + 1, right.id)
+            parent.size += separator_size(separator)
+            parent.dirty = True
+            node = parent
+            depth -= 1
+
+
+    '''
+    Move the upper half of a node, by size, to a new node.
+        Returns:
+            tuple: (the new node, the separator between the two).
+    '''
+    def split_node(self, node):
+        if node.leaf:
+            sizes = [entry_size(key, entry) for key, entry in zip(node.keys, node.values)]
+        else:
+            sizes = [separator_size(key) for key in node.keys]
+        half = sum(sizes) // 2
+        total = 0
+        middle = 0
+        while middle < len(sizes) - 1 and total + sizes[middle] <= half:
+            total += sizes[middle]
+            middle += 1
+        if node.leaf:
+            middle = max(middle, 1)
+            right = Node(None, True, node.keys[middle:], node.values[middle:], NODE_HEADER.size + sum(sizes[middle:]))
+            separator = shortest_separator(node.keys[middle - 1], node.keys[middle])
+            del node.keys[middle:], node.values[middle:]
+            node.size = NODE_HEADER.size + sum(sizes[:middle])
+        else:
+            # The middle separator moves up to the parent, the children on its right go to the new node.
+            middle = min(max(middle, 1), len(sizes) - 2)
+            separator = node.keys[middle]
+            right = Node(None, False, node.keys[middle + 1:], node.values[middle + 1:],
+                         NODE_HEADER.size + PAGE_ID.size + sum(sizes[middle + 1:]))
+            del node.keys[middle:], node.values[middle + 1:]
+            node.size = NODE_HEADER.size + PAGE_ID.size + sum(sizes[:middle])
+        self.pool.add(right)
+        return right, separator
+
+
+    '''
+    Free the empty leaf at the end of a path and the parents it leaves without children, then shorten the tree
+    while its root has a single child.
+    '''
+    def remove_empty(self, nodes, indexes):
+        depth = len(nodes) - 1
+        while depth > 0 and not nodes[depth].values:
+            self.pool.release(nodes[depth].id)
+            parent = nodes[depth - 1]
+            i = indexes[depth - 1]
+            del parent.values[i]
+            parent.size -= PAGE_ID.size
+            parent.dirty = True
+            if parent.keys:
+                # Child i covered [separator i - 1, separator i), its neighbour takes the range over.
+                parent.size -= separator_size(parent.keys.pop(i - 1 if i else 0)) - PAGE_ID.size
+            depth -= 1
+        root = nodes[0]
+        while not root.leaf and len(root.values) == 1:
+            child = self.pool.get(root.values[0])
+            self.pool.release(root.id)
+            self.root = child.id
+            root = child
+        if not root.leaf and not root.values:
+            self.pool.release(root.id)
+            root = Node(None, True, [], [], NODE_HEADER.size)
+            self.pool.add(root)
+            self.root = root.id
+
+
+    '''
+    Remove every key, all pages are freed and the tree is left with an empty root.
+    '''
+    def clear(self):
+        pages = [self.root]
+        while pages:
+            node = self.pool.get(pages.pop())
+            if node.leaf:
+                for entry in node.values:
+                    self.release_value(entry)
+            else:
+                pages.extend(node.values)
+            self.pool.release(node.id)
+            self.pool.trim()
+        root = Node(None, True, [], [], NODE_HEADER.size)
+        self.pool.add(root)
+        self.root, self.keys, self.ttl_keys = root.id, 0, 0
+
+
+    '''
+    Yield (key, entry) pairs in key order.
+    The path to the current leaf is kept on a stack, so moving to the next leaf does not start from the root again.
+        Args:
+            start (str, optional): First key, None to start at the smallest key.
+            after (bool): Start after start instead of at it.
+    '''
+    def items(self, start=None, after=False):
+        stack = []
+        node = self.pool.get(self.root)
+        while not node.leaf:
+            i = 0 if start is None else bisect.bisect_right(node.keys, start)
+            stack.append((node, i))
+            node = self.pool.get(node.values[i])
+        if start is None:
+            i = 0
+        else:
+            i = (bisect.bisect_right if after else bisect.bisect_left)(node.keys, start)
+        while True:
+            for j in range(i, len(node.keys)):
+                yield node.keys[j], node.values[j]
+            while stack and stack[-1][1] + 1 >= len(stack[-1][0].values):
+                stack.pop()
+            if not stack:
+                return
+            parent, j = stack.pop()
+            stack.append((parent, j + 1))
+            node = self.pool.get(parent.values[j + 1])
+            while not node.leaf:
+                stack.append((node, 0))
+                node = self.pool.get(node.values[0])
+            i = 0
+            self.pool.trim()
+
+
+    '''
+    Return a page of keys in key order, with the semantics of SortedKeys.page.
+        Returns:
+            tuple: (keys, last key to resume after, or None once the range is exhausted).
+    '''
+    def page(self, start=None, end=None, count=PAGE_SIZE, after=False):
+        keys = []
+        try:
+            for key, _ in self.items(start, after):
+                if end is not None and key >= end:
+                    return keys, None
+                if len(keys) == count:
+                    return keys, keys[-1]
+                keys.append(key)
+            return keys, None
+        finally:
+            self.pool.trim()
+
+
+    '''
+    Return the number of levels of the tree, 1 for a tree that is a single leaf.
+    '''
+    def height(self):
+        node = self.pool.get(self.root)
+        levels = 1
+        while not node.leaf:
+            node = self.pool.get(node.values[0])
+            levels += 1
+        return levels
+
+
+    '''
+    Make the changes made since the last checkpoint durable, see BufferPool.checkpoint.
+    '''
+    def checkpoint(self):
+        self.pool.checkpoint((self.root, self.keys, self.ttl_keys))
+
+
+    '''
+    Close the page file, changes since the last checkpoint are lost.
+    '''
+    def close(self):
+        self.pool.close()
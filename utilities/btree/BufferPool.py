@@ -0,0 +1,334 @@
+import os,struct,threading,zlib
+from collections import OrderedDict
+from utilities.eviction.MemoryLimit import parse_memory
+
+
+'''
+Layout of a page file.
+Pages 0 and 1 hold two copies of the meta record, a checkpoint writes the one the previous checkpoint did not,
+so a crash while writing it leaves the other one intact:
+    crc32 (I) | magic (8s) | page size (I) | generation (Q) | root page (Q) | page count (Q) |
+    first free list page (Q) | free pages (Q) | keys (Q) | keys with a TTL (Q)
+The crc covers everything after itself, the valid copy with the highest generation is the current one.
+The ids of the free pages are kept in a chain of free list pages:
+    next free list page, 0 at the end (Q) | ids on this page (I) | page ids (Q each)
+An overflow page holds a part of a value too large for a leaf, they are chained the same way:
+    next overflow page, 0 at the end (Q) | value bytes
+'''
+MAGIC = b"SDBTREE1"
+META = struct.Struct("<I8sIQQQQQQQ")
+FREE_HEADER = struct.Struct("<QI")
+OVERFLOW_HEADER = struct.Struct("<Q")
+PAGE_ID = struct.Struct("<Q")
+META_PAGES = 2
+
+# Pages are never cached below this number, the path from the root to a leaf has to fit.
+MIN_CAPACITY = 16
+
+
+"""
+    Page cache of a page file, the storage of BTree.
+    Decoded pages are kept in an LRU of a fixed number of pages, a page read that misses it costs one pread and
+    the least recently used pages are dropped once an operation is done with them, written first if they changed.
+    Pages are never written over while the last checkpoint still refers to them: a page changed for the first time
+    since the checkpoint is copied to a free page (shadow paging), the old one is freed by the next checkpoint.
+    A checkpoint writes the changed pages and the free list, fsyncs, then writes the meta record, so the file always
+    holds the complete tree of the last checkpoint, whatever a crash interrupted.
+"""
+class BufferPool:
+
+    '''
+    Open or create a page file.
+        Args:
+            file_name (str): Path of the page file.
+            decode (callable): decode(page id, page bytes) -> page object, page objects have id and dirty attributes
+                               and an encode(page size) method returning the page bytes.
+            page_size (int): Size of a page in bytes for a new file, an existing file keeps the size it was created with.
+            capacity (int or str): Memory of the cached pages in bytes, or a size such as '64mb'.
+        Raises:
+            ValueError: If the file exists but is not a page file.
+    '''
+    def __init__(self, file_name, decode, page_size=4096, capacity="64mb"):
+        self.file_name = file_name
+        self.decode = decode
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.free = []
+        self.pending = []
+        self.fresh = set()
+        self.list_pages = []
+        self.generation = 0
+        self.page_count = META_PAGES
+        self.state = None
+        self.hits = self.misses = self.evictions = self.reads = self.writes = self.checkpoints = 0
+        exists = os.path.exists(file_name)
+        self.fd = os.open(file_name, os.O_RDWR | os.O_CREAT, 0o644)
+        if exists and os.fstat(self.fd).st_size:
+            self.read_meta()
+        self.capacity = max(parse_memory(capacity) // self.page_size, MIN_CAPACITY)
+
+
+    '''
+    Load the current meta record and the free list.
+        Raises:
+            ValueError: If neither meta record is valid.
+    '''
+    def read_meta(self):
+        first = self.parse_meta(os.pread(self.fd, META.size, 0))
+        # The second copy is one page further, a torn first copy leaves the page size given to the constructor.
+        second = self.parse_meta(os.pread(self.fd, META.size, first[1] if first else self.page_size))
+        metas = [meta for meta in (first, second) if meta is not None]
+        if not metas:
+            os.close(self.fd)
+            raise ValueError(f"'{self.file_name}' is not a btree page file or its meta pages are corrupt")
+        generation, self.page_size, root, self.page_count, free_head, free_count, keys, ttl_keys = max(metas)
+        self.generation = generation
+        self.state = (root, keys, ttl_keys)
+        page = free_head
+        while page:
+            data = os.pread(self.fd, self.page_size, page * self.page_size)
+            page_next, count = FREE_HEADER.unpack_from(data)
+            self.free.extend(struct.unpack_from(f"<{count}Q", data, FREE_HEADER.size))
+            self.list_pages.append(page)
+            page = page_next
+        if len(self.free) != free_count:
+            raise ValueError(f"Free list of '{self.file_name}' holds {len(self.free)} pages instead of {free_count}")
+
+
+    '''
+    Decode a meta record.
+        Returns:
+            tuple: (generation, page size, root, page count, first free list page, free pages, keys, keys with a TTL),
+                   None if the record is torn or not a meta record.
+    '''
+    @staticmethod
+    def parse_meta(data):
+        if len(data) < META.size:
+            return None
+        crc, magic, *fields = META.unpack(data)
+        if magic != MAGIC or zlib.crc32(data[4:]) != crc:
+            return None
+        page_size, generation, *rest = fields
+        return (generation, page_size, *rest)
+
+
+    '''
+    Return the page object of a page, reading it from the file if it is not cached.
+    '''
+    def get(self, page_id):
+        with self.lock:
+            page = self.cache.get(page_id)
+            if page is not None:
+                self.cache.move_to_end(page_id)
+                self.hits += 1
+                return page
+            self.misses += 1
+            self.reads += 1
+            page = self.decode(page_id, os.pread(self.fd, self.page_size, page_id * self.page_size))
+            self.cache[page_id] = page
+            return page
+
+
+    '''
+    Drop the least recently used pages beyond the capacity, changed ones are written first.
+    Called once an operation is done, the pages it holds are not dropped while it still changes them.
+    '''
+    def trim(self):
+        if len(self.cache) <= self.capacity:
+            return
+        with self.lock:
+            while len(self.cache) > self.capacity:
+                _, page = self.cache.popitem(last=False)
+                if page.dirty:
+                    self.write_page(page)
+                self.evictions += 1
+
+
+    '''
+    Write a page at its place in the file.
+    Only pages allocated since the last checkpoint are dirty, so this never overwrites a page the checkpoint uses.
+    '''
+    def write_page(self, page):
+        os.pwrite(self.fd, page.encode(self.page_size), page.id * self.page_size)
+        page.dirty = False
+        self.writes += 1
+
+
+    '''
+    Return whether a page was allocated since the last checkpoint and may be changed in place.
+    '''
+    def is_fresh(self, page_id):
+        return page_id in self.fresh
+
+
+    '''
+    Allocate a page, a free one if there is one, else a new one at the end of the file.
+    '''
+    def allocate(self):
+        if self.free:
+            page_id = self.free.pop()
+        else:
+            page_id = self.page_count
+            self.page_count += 1
+        self.fresh.add(page_id)
+        return page_id
+
+
+    '''
+    Give a new page object a page and cache it.
+    '''
+    def add(self, page):
+        page.id = self.allocate()
+        page.dirty = True
+        with self.lock:
+            self.cache[page.id] = page
+
+
+    '''
+    Free a page, it is reused right away if it was allocated since the last checkpoint, else after the next one.
+    '''
+    def release(self, page_id):
+        with self.lock:
+            self.cache.pop(page_id, None)
+        if page_id in self.fresh:
+            self.fresh.discard(page_id)
+            self.free.append(page_id)
+        else:
+            self.pending.append(page_id)
+
+
+    '''
+    Move a page the last checkpoint uses to a new page before it is changed, the caller updates the parent.
+    '''
+    def shadow(self, page):
+        old_id = page.id
+        self.release(old_id)
+        self.add(page)
+
+
+    '''
+    Write a value to a chain of overflow pages, written right away as nothing refers to them yet.
+        Returns:
+            int: The first page of the chain.
+    '''
+    def write_overflow(self, data):
+        chunk = self.page_size - OVERFLOW_HEADER.size
+        pages = [self.allocate() for _ in range(max((len(data) + chunk - 1) // chunk, 1))]
+        for i, page_id in enumerate(pages):
+            next_page = pages[i + 1] if i + 1 < len(pages) else 0
+            os.pwrite(self.fd, OVERFLOW_HEADER.pack(next_page) + data[i * chunk:(i + 1) * chunk], page_id * self.page_size)
+        self.writes += len(pages)
+        return pages[0]
+
+
+    '''
+    Read a value of the given size from its chain of overflow pages.
+    '''
+    def read_overflow(self, page_id, size):
+        chunk = self.page_size - OVERFLOW_HEADER.size
+        parts = []
+        while size > 0:
+            data = os.pread(self.fd, self.page_size, page_id * self.page_size)
+            page_id, = OVERFLOW_HEADER.unpack_from(data)
+            parts.append(data[OVERFLOW_HEADER.size:OVERFLOW_HEADER.size + min(size, chunk)])
+            size -= chunk
+        with self.lock:
+            self.reads += len(parts)
+        return b"".join(parts)
+
+
+    '''
+    Free the chain of overflow pages of a value of the given size.
+    '''
+    def release_overflow(self, page_id, size):
+        chunk = self.page_size - OVERFLOW_HEADER.size
+        for _ in range(max((size + chunk - 1) // chunk, 1)):
+            next_page, = OVERFLOW_HEADER.unpack(os.pread(self.fd, OVERFLOW_HEADER.size, page_id * self.page_size))
+            self.release(page_id)
+            page_id = next_page
+
+
+    '''
+    Make everything changed since the last checkpoint durable.
+    Changed pages and the free list are written and fsynced before the meta record pointing at them, the pages the
+    previous checkpoint used and this one does not are free from then on.
+        Args:
+            state (tuple): (root page, keys, keys with a TTL) recorded in the meta record.
+    '''
+    def checkpoint(self, state):
+        with self.lock:
+            for page in list(self.cache.values()):
+                if page.dirty:
+                    self.write_page(page)
+        free = list(self.free)
+        per_page = (self.page_size - FREE_HEADER.size) // PAGE_ID.size
+        list_pages = []
+        # The free list is written to free pages, the ones it takes are no longer free.
+        while len(list_pages) * per_page < len(free) + len(self.pending) + len(self.list_pages):
+            if free:
+                list_pages.append(free.pop())
+            else:
+                list_pages.append(self.page_count)
+                self.page_count += 1
+        ids = free + self.pending + self.list_pages
+        for i, page_id in enumerate(list_pages):
+            chunk = ids[i * per_page:(i + 1) * per_page]
+            next_page = list_pages[i + 1] if i + 1 < len(list_pages) else 0
+            os.pwrite(self.fd, FREE_HEADER.pack(next_page, len(chunk)) + struct.pack(f"<{len(chunk)}Q", *chunk),
+                      page_id * self.page_size)
+        os.fsync(self.fd)
+        generation = self.generation + 1
+        root, keys, ttl_keys = state
+        body = META.pack(0, MAGIC, self.page_size, generation, root, self.page_count,
+                         list_pages[0] if list_pages else 0, len(ids), keys, ttl_keys)[4:]
+        os.pwrite(self.fd, struct.pack("<I", zlib.crc32(body)) + body, (generation % META_PAGES) * self.page_size)
+        os.fsync(self.fd)
+        self.generation = generation
+        self.state = state
+        self.free = ids
+        self.pending = []
+        self.list_pages = list_pages
+        self.fresh.clear()
+        self.checkpoints += 1
+
+
+    '''
+    Return the number of cached pages that changed since the last checkpoint.
+    '''
+    def dirty_pages(self):
+        with self.lock:
+            return sum(1 for page in self.cache.values() if page.dirty)
+
+
+    '''
+    Report the state of the pool for info().
+    '''
+    def info(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "page_size": self.page_size,
+                "capacity_pages": self.capacity,
+                "cached_pages": len(self.cache),
+                "dirty_pages": sum(1 for page in self.cache.values() if page.dirty),
+                "file_pages": self.page_count,
+                "free_pages": len(self.free) + len(self.pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "page_reads": self.reads,
+                "page_writes": self.writes,
+                "checkpoints": self.checkpoints,
+            }
+
+
+    '''
+    Close the file, changes since the last checkpoint are lost, see checkpoint.
+    '''
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.cache.clear()
@@ -0,0 +1,129 @@
+import threading,contextlib
+
+
+'''
+Reentrant readers-writer lock.
+Any number of threads may hold the read side at once, the write side is exclusive. Waiting writers block new
+readers so a steady stream of reads cannot starve them, and the readers already waiting when a writer releases
+go before the next writer so a steady stream of writes cannot starve readers either.
+A thread holding the write side may take either side again, a thread holding only the read side may take it
+again but must not ask for the write side.
+Used as a context manager the lock takes the write side, so `with lock:` keeps its exclusive meaning.
+'''
+class RWLock:
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = {}
+        self.writer = None
+        self.write_depth = 0
+        self.waiting_writers = 0
+        self.waiting_readers = 0
+        self.readers_turn = False
+
+
+    '''
+    Acquire the read side, waiting while a writer holds or waits for the lock.
+        Args:
+            blocking (bool): With False, give up instead of waiting.
+        Returns:
+            bool: True once the read side is held, False if blocking is False and the lock is not free for readers.
+    '''
+    def acquire_read(self, blocking=True):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer != me and me not in self.readers:
+                if not blocking and (self.writer is not None or (self.waiting_writers and not self.readers_turn)):
+                    return False
+                self.waiting_readers += 1
+                try:
+                    while self.writer is not None or (self.waiting_writers and not self.readers_turn):
+                        self.condition.wait()
+                finally:
+                    self.waiting_readers -= 1
+                    if not self.waiting_readers:
+                        self.readers_turn = False
+            self.readers[me] = self.readers.get(me, 0) + 1
+            return True
+
+
+    '''
+    Release the read side.
+    '''
+    def release_read(self):
+        me = threading.get_ident()
+        with self.condition:
+            count = self.readers[me] - 1
+            if count:
+                self.readers[me] = count
+            else:
+                del self.readers[me]
+                if not self.readers:
+                    self.condition.notify_all()
+
+
+    '''
+    Acquire the write side, waiting until no other thread holds the lock.
+        Raises:
+            RuntimeError: If the calling thread holds only the read side, upgrading would deadlock.
+    '''
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer == me:
+                self.write_depth += 1
+                return
+            if me in self.readers:
+                raise RuntimeError("Cannot acquire the write lock while holding the read lock")
+            self.waiting_writers += 1
+            try:
+                while self.writer is not None or self.readers or self.readers_turn:
+                    self.condition.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.writer = me
+            self.write_depth = 1
+
+
+    '''
+    Release the write side.
+    '''
+    def release_write(self):
+        with self.condition:
+            self.write_depth -= 1
+            if not self.write_depth:
+                self.writer = None
+                self.readers_turn = self.waiting_readers > 0
+                self.condition.notify_all()
+
+
+    '''
+    Context manager holding the read side.
+    '''
+    @contextlib.contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+
+    '''
+    Context manager holding the write side.
+    '''
+    @contextlib.contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+    def __enter__(self):
+        self.acquire_write()
+        return self
+
+    def __exit__(self, *exc):
+        self.release_write()
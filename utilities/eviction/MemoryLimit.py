@@ -0,0 +1,273 @@
+import heapq,itertools,random,re,sys,time
+from utilities.serializer.TypedValue import value_size
+
+
+EVICTION_POLICIES = ("noeviction", "allkeys-lru", "allkeys-lfu", "volatile-ttl")
+
+# Rough cost of a key beyond its key and value objects: its slots in the data and expiry dicts plus the
+# access metadata kept here.
+ENTRY_OVERHEAD = 64
+
+# Logarithmic access counter of allkeys-lfu, modeled on Redis: new keys start at LFU_INIT, a hit increments the
+# counter with probability 1 / ((counter - LFU_INIT) * LFU_LOG_FACTOR + 1) and it drops by one per idle
+# LFU_DECAY_SECONDS, so keys that used to be hot cool down.
+LFU_INIT = 5
+LFU_MAX = 255
+LFU_LOG_FACTOR = 10
+LFU_DECAY_SECONDS = 60
+
+# Best candidates kept between evictions, so every sample improves on the previous ones.
+POOL_SIZE = 16
+
+MEMORY_UNITS = {"": 1, "b": 1, "k": 1000, "kb": 1024, "m": 1000 ** 2, "mb": 1024 ** 2, "g": 1000 ** 3, "gb": 1024 ** 3}
+
+
+'''
+Raised by a write that needs memory when the limit is reached and nothing can be evicted.
+'''
+class MaxMemoryError(Exception):
+    pass
+
+
+'''
+Parse a memory size such as 1048576, '100mb' or '2gb' into bytes, with the units of the Redis config file.
+'''
+def parse_memory(value):
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+)\s*([a-z]*)\s*", str(value).lower())
+    if not match or match.group(2) not in MEMORY_UNITS:
+        raise ValueError(f"Invalid memory size '{value}', expected e.g. 1048576, '100mb' or '2gb'")
+    return int(match.group(1)) * MEMORY_UNITS[match.group(2)]
+
+
+'''
+Approximate memory used by a key and its value, the items of a hash or list included.
+'''
+def entry_size(key, value):
+    return sys.getsizeof(key) + value_size(value) + ENTRY_OVERHEAD
+
+
+'''
+Return the memory a write adds, negative if it frees memory.
+    Args:
+        key (str): The written key.
+        old_value: Its value before the write, None if it did not exist.
+        new_value: Its value after the write, None if it is removed.
+'''
+def size_change(key, old_value, new_value):
+    growth = entry_size(key, new_value) if new_value is not None else 0
+    if old_value is not None:
+        growth -= entry_size(key, old_value)
+    return growth
+
+
+'''
+Memory accounting and eviction for simpleDB.
+The database reports every change of its data through account, which keeps a running total of entry_size, so the
+accounting costs a couple of getsizeof calls per write instead of a walk over the data.
+When a write would go over maxmemory, keys are evicted by the configured policy:
+    noeviction   - the write fails with MaxMemoryError
+    allkeys-lru  - the least recently used key among a random sample
+    allkeys-lfu  - the least frequently used key among a random sample
+    volatile-ttl - the key with a TTL that expires first, taken from the expiry heap of the database
+Like Redis, the LRU and LFU policies compare `samples` random keys plus a small pool of the best earlier candidates
+instead of keeping every key ordered, so an eviction costs O(samples) whatever the size of the database.
+'''
+class MemoryLimit:
+
+    '''
+    Initialize the limit and account for the keys already in the database.
+        Args:
+            db (SimpleDB): The database whose memory is limited.
+            maxmemory (int or str): Memory limit in bytes, or a size such as '100mb'.
+            policy (str): One of EVICTION_POLICIES.
+            samples (int): Number of random keys compared per LRU or LFU eviction.
+    '''
+    def __init__(self, db, maxmemory, policy="noeviction", samples=5):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}', expected one of {EVICTION_POLICIES}")
+        self.db = db
+        self.maxmemory = parse_memory(maxmemory)
+        self.policy = policy
+        self.samples = samples
+        self.sampling = policy in ("allkeys-lru", "allkeys-lfu")
+        self.clock = itertools.count(1)
+        self.rebuild()
+
+
+    '''
+    Recompute the memory used by every key of the database and reset the access metadata.
+    '''
+    def rebuild(self):
+        self.used_memory = 0
+        self.keys = []
+        self.positions = {}
+        self.access = {}
+        self.pool = {}
+        for key, value in self.db.data.items():
+            self.account(key, None, value)
+
+
+    '''
+    Record a change of a key.
+        Args:
+            key (str): The changed key.
+            old_value: Its value before the change, None if it did not exist.
+            new_value: Its value after the change, None if it was removed.
+    '''
+    def account(self, key, old_value, new_value):
+        self.resize(key, size_change(key, old_value, new_value), new_value is not None)
+
+
+    '''
+    Record a change of a key by the memory it adds, used for a hash or list updated in place.
+    The growth of a field update is estimated from the changed items only, so it costs nothing in the size of the
+    value, the container itself growing is only accounted for when the key is written whole or on rebuild.
+        Args:
+            key (str): The changed key.
+            growth (int): Bytes added, negative if freed.
+            exists (bool): False if the key was removed.
+    '''
+    def resize(self, key, growth, exists=True):
+        self.used_memory += growth
+        if not self.sampling:
+            return
+        if not exists:
+            self.remove_key(key)
+        elif key in self.positions:
+            self.touch(key)
+        else:
+            self.positions[key] = len(self.keys)
+            self.keys.append(key)
+            self.access[key] = (LFU_INIT, time.monotonic()) if self.policy == "allkeys-lfu" else next(self.clock)
+
+
+    '''
+    Forget a key in O(1) by moving the last key of the sample list into its slot.
+    '''
+    def remove_key(self, key):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = self.keys.pop()
+        if last != key:
+            self.keys[position] = last
+            self.positions[last] = position
+        del self.access[key]
+        self.pool.pop(key, None)
+
+
+    '''
+    Record an access to a key, used by the LRU and LFU policies.
+    '''
+    def touch(self, key):
+        if self.policy == "allkeys-lru":
+            self.access[key] = next(self.clock)
+        elif self.policy == "allkeys-lfu":
+            entry = self.access.get(key)
+            if entry is None:
+                return
+            counter = self.decayed(*entry)
+            if counter < LFU_MAX and random.random() < 1 / (max(counter - LFU_INIT, 0) * LFU_LOG_FACTOR + 1):
+                counter += 1
+            self.access[key] = (counter, time.monotonic())
+
+
+    '''
+    Return an LFU counter after the decay for the time since its last access.
+    '''
+    def decayed(self, counter, last_access):
+        return max(counter - int((time.monotonic() - last_access) / LFU_DECAY_SECONDS), 0)
+
+
+    '''
+    Return how strongly a key should be evicted, higher is evicted first.
+    '''
+    def score(self, key):
+        if self.policy == "allkeys-lru":
+            return -self.access[key]
+        return -self.decayed(*self.access[key])
+
+
+    '''
+    Evict keys until a write fits under maxmemory, the caller holds the write side of the database lock.
+        Args:
+            key (str): The key about to be written, it is never evicted itself.
+            growth (int): The memory the write adds, see size_change.
+        Returns:
+            list: The evicted keys.
+        Raises:
+            MaxMemoryError: If the write does not fit and no key can be evicted.
+    '''
+    def make_room(self, key, growth):
+        needed = self.used_memory + growth - self.maxmemory
+        evicted = []
+        while needed > 0:
+            victim = self.pick(key)
+            if victim is None:
+                raise MaxMemoryError(f"command not allowed when used memory would exceed 'maxmemory' "
+                                     f"({self.used_memory} of {self.maxmemory} bytes used, policy '{self.policy}')")
+            before = self.used_memory
+            self.db.evict_key(victim)
+            needed -= before - self.used_memory
+            evicted.append(victim)
+        return evicted
+
+
+    '''
+    Choose the next key to evict.
+        Returns:
+            str: The key, or None if the policy has nothing to evict.
+    '''
+    def pick(self, exclude):
+        if self.policy == "volatile-ttl":
+            return self.pick_volatile(exclude)
+        if not self.sampling or not self.keys:
+            return None
+        for _ in range(self.samples):
+            candidate = random.choice(self.keys)
+            if candidate != exclude:
+                self.pool[candidate] = self.score(candidate)
+        if len(self.pool) > POOL_SIZE:
+            self.pool = dict(heapq.nlargest(POOL_SIZE, self.pool.items(), key=lambda item: item[1]))
+        while self.pool:
+            candidate = max(self.pool, key=self.pool.get)
+            del self.pool[candidate]
+            if candidate != exclude and candidate in self.positions:
+                return candidate
+        return None
+
+
+    '''
+    Return the key with a TTL that expires first, skipping the stale entries of the expiry heap.
+    '''
+    def pick_volatile(self, exclude):
+        heap, expiry, data = self.db.expiry_heap, self.db.expiry, self.db.data
+        held = None
+        victim = None
+        while heap:
+            expiry_time, key = heap[0]
+            if expiry.get(key) != expiry_time or key not in data:
+                heapq.heappop(heap)
+            elif key == exclude:
+                held = heapq.heappop(heap)
+            else:
+                victim = key
+                break
+        if held is not None:
+            heapq.heappush(heap, held)
+        return victim
+
+
+    '''
+    Return the memory settings and usage, reported by info().
+    '''
+    def info(self):
+        return {
+            "used_memory": self.used_memory,
+            "maxmemory": self.maxmemory,
+            "maxmemory_policy": self.policy,
+            "maxmemory_samples": self.samples,
+            "used_memory_ratio": round(self.used_memory / self.maxmemory, 4) if self.maxmemory else 0.0,
+        }
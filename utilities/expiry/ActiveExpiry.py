@@ -0,0 +1,111 @@
+import threading,time
+
+
+'''
+Background active expiry for simpleDB.
+Lazy expiry only reclaims keys that are read again, this worker reclaims the others.
+Every tick it runs a cycle modelled on Redis's active expire cycle: it checks a sample of TTL'd keys,
+deletes the expired ones in one batch and repeats while the sample was mostly expired,
+stopping once the cycle has used up its CPU time budget.
+'''
+class ActiveExpiry:
+
+    '''
+    Initialize the worker.
+        Args:
+            db (SimpleDB): The database whose keys are expired.
+            hz (float): Number of cycles per second.
+            sample_size (int): Number of TTL'd keys checked per round of a cycle.
+            repeat_ratio (float): A cycle does another round while more than this share of the sample was expired.
+            budget (float): CPU seconds a single cycle may use.
+    '''
+    def __init__(self, db, hz=10, sample_size=20, repeat_ratio=0.25, budget=0.025):
+        self.db = db
+        self.hz = hz
+        self.sample_size = sample_size
+        self.repeat_ratio = repeat_ratio
+        self.budget = budget
+        self.expired_keys = 0
+        self.cycles = 0
+        self.budget_exhausted = 0
+        self.last_cycle_time = 0.0
+        self.expired_per_sec = 0.0
+        self.window_start = time.monotonic()
+        self.window_expired = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+
+    '''
+    Start the background thread.
+    '''
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+
+    '''
+    Stop the background thread and wait for the current cycle to finish.
+    '''
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+
+    '''
+    Run a cycle every 1/hz seconds until stopped.
+    '''
+    def run(self):
+        while not self.stop_event.wait(1 / self.hz):
+            self.cycle()
+
+
+    '''
+    Run one active expiry cycle.
+        Returns:
+            int: The number of keys expired by this cycle.
+    '''
+    def cycle(self):
+        start = time.thread_time()
+        expired = 0
+        while True:
+            with self.db.lock:
+                sampled, due = self.db.sample_expired(self.sample_size)
+                if due:
+                    self.db.expire_batch(due)
+            expired += len(due)
+            if not sampled or len(due) <= sampled * self.repeat_ratio:
+                break
+            if time.thread_time() - start >= self.budget:
+                self.budget_exhausted += 1
+                break
+        self.cycles += 1
+        self.last_cycle_time = time.thread_time() - start
+        self.expired_keys += expired
+        self.window_expired += expired
+        now = time.monotonic()
+        if now - self.window_start >= 1:
+            self.expired_per_sec = self.window_expired / (now - self.window_start)
+            self.window_start = now
+            self.window_expired = 0
+        return expired
+
+
+    '''
+    Return the counters of the worker.
+        Returns:
+            dict: Total expired keys, expired keys per second over the last window, cycles run,
+            cycles cut short by the budget and CPU seconds used by the last cycle.
+    '''
+    def stats(self):
+        return {
+            "expired_keys": self.expired_keys,
+            "expired_per_sec": self.expired_per_sec,
+            "cycles": self.cycles,
+            "budget_exhausted": self.budget_exhausted,
+            "last_cycle_time": self.last_cycle_time,
+        }
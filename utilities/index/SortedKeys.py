@@ -0,0 +1,208 @@
+import bisect,fnmatch
+
+
+# Keys a chunk of SortedKeys holds before it is split in two.
+CHUNK_SIZE = 512
+
+# Keys fetched per lock acquisition by the lazy iterators.
+PAGE_SIZE = 256
+
+
+'''
+Ordered index over the keys of a database.
+The keys are kept in a list of sorted chunks of at most 2 * CHUNK_SIZE keys, with the largest key of every chunk in
+a separate sorted list. Finding a position is a bisect over the chunk maxima and a bisect inside one chunk, an
+insert or delete moves at most one chunk's worth of pointers, so every operation is O(log N) plus a small memmove
+and a range of k keys is read in O(log N + k), without the cost of a balanced tree in pure Python.
+'''
+class SortedKeys:
+
+    '''
+    Initialize the index.
+        Args:
+            keys (iterable): Keys to index, sorted once in bulk.
+    '''
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self.chunks = [keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+        self.size = len(keys)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def __contains__(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return False
+        chunk = self.chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        return j < len(chunk) and chunk[j] == key
+
+
+    '''
+    Add a key, adding a key that is already indexed does nothing.
+    '''
+    def add(self, key):
+        if not self.chunks:
+            self.chunks.append([key])
+            self.maxes.append(key)
+            self.size = 1
+            return
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            i -= 1
+        chunk = self.chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if j < len(chunk) and chunk[j] == key:
+            return
+        chunk.insert(j, key)
+        self.maxes[i] = chunk[-1]
+        self.size += 1
+        if len(chunk) > 2 * CHUNK_SIZE:
+            self.chunks[i:i + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+            self.maxes[i:i + 1] = [chunk[CHUNK_SIZE - 1], chunk[-1]]
+
+
+    '''
+    Remove a key, removing a key that is not indexed does nothing.
+    '''
+    def remove(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return
+        chunk = self.chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if j == len(chunk) or chunk[j] != key:
+            return
+        del chunk[j]
+        self.size -= 1
+        if chunk:
+            self.maxes[i] = chunk[-1]
+        else:
+            del self.chunks[i]
+            del self.maxes[i]
+
+
+    '''
+    Return the keys of a range in order, at most count of them.
+        Args:
+            start (str, optional): First key of the range, None to start at the smallest key.
+            end (str, optional): The range stops before this key, None for no upper bound.
+            count (int): Maximum number of keys to return.
+            after (bool): Start after start instead of at it, used to resume from the last key of a page.
+        Returns:
+            tuple: (keys, last) where last is the key to resume after, or None if the range is exhausted.
+    '''
+    def page(self, start=None, end=None, count=PAGE_SIZE, after=False):
+        find = bisect.bisect_right if after else bisect.bisect_left
+        if start is None:
+            i, j = 0, 0
+        else:
+            i = find(self.maxes, start)
+            j = find(self.chunks[i], start) if i < len(self.chunks) else 0
+        keys = []
+        while i < len(self.chunks):
+            chunk = self.chunks[i]
+            stop = min(len(chunk), j + count - len(keys))
+            if end is not None and chunk[stop - 1] >= end:
+                stop = bisect.bisect_left(chunk, end, j, stop)
+                keys.extend(chunk[j:stop])
+                return keys, None
+            keys.extend(chunk[j:stop])
+            if len(keys) == count:
+                more = stop < len(chunk) or i + 1 < len(self.chunks)
+                return keys, keys[-1] if more else None
+            i, j = i + 1, 0
+        return keys, None
+
+
+'''
+Return the smallest string greater than every string starting with prefix, None if there is none.
+'''
+def prefix_end(prefix):
+    while prefix:
+        if ord(prefix[-1]) < 0x10FFFF:
+            return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+'''
+Return the literal part of a glob pattern before its first wildcard, the keys it matches all start with it.
+'''
+def glob_prefix(pattern):
+    for i, char in enumerate(pattern):
+        if char in "*?[\\":
+            return pattern[:i]
+    return pattern
+
+
+'''
+Encode the key a scan resumes after as a positive integer cursor, 0 is reserved for the start and the end.
+Integer cursors keep Redis clients working, they parse the SCAN cursor as a number.
+'''
+def encode_cursor(key):
+    return int.from_bytes(b"\x01" + key.encode(), 'big')
+
+
+'''
+Decode a cursor made by encode_cursor.
+    Raises:
+        ValueError: If the cursor was not made by encode_cursor.
+'''
+def decode_cursor(cursor):
+    data = int(cursor).to_bytes((int(cursor).bit_length() + 7) // 8, 'big')
+    if not data or data[0] != 1:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return data[1:].decode()
+
+
+'''
+Lazily yield the pages of live keys of a range.
+The page function is called without holding anything between pages and every page resumes after the last key of
+the previous one, so keys written or deleted meanwhile never make the iteration skip or repeat other keys.
+    Args:
+        page (callable): page(start, end, count, after) -> (live keys, last key or None), e.g. SimpleDB.key_page.
+'''
+def iterate_pages(page, start=None, end=None, count=PAGE_SIZE):
+    after = False
+    while True:
+        keys, last = page(start, end, count, after)
+        if keys:
+            yield keys
+        if last is None:
+            return
+        start, after = last, True
+
+
+'''
+Run one SCAN step.
+The cursor is the position after the last key examined, not a slot in a hash table, so a key present for the
+whole scan is returned exactly once even while keys are added and removed, and a MATCH pattern with a literal
+prefix only examines the keys under that prefix.
+    Args:
+        page (callable): See iterate_pages.
+        cursor (int): 0 to start a scan, then the cursor returned by the previous step.
+        match (str, optional): Glob pattern the returned keys match.
+        count (int): Number of keys examined by this step.
+    Returns:
+        tuple: (next cursor, 0 once the scan is complete, list of keys).
+'''
+def scan_page(page, cursor=0, match=None, count=10):
+    start = decode_cursor(cursor) if int(cursor) else None
+    after = start is not None
+    end = None
+    if match:
+        prefix = glob_prefix(match)
+        end = prefix_end(prefix)
+        if prefix and (start is None or start < prefix):
+            start, after = prefix, False
+    keys, last = page(start, end, max(int(count), 1), after)
+    if match:
+        keys = [key for key in keys if fnmatch.fnmatchcase(key, match)]
+    return (encode_cursor(last) if last is not None else 0), keys
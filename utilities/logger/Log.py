@@ -0,0 +1,43 @@
+import logging,sys
+
+
+'''
+Diagnostic logging of SimpleDB.
+Every module logs through a child of the 'simpledb' logger, which has no output and does not propagate to the root
+logger, so nothing is printed unless enable_logging is called. Messages are formatted lazily, a disabled
+debug call on a hot path costs a level check only.
+'''
+LOGGER_NAME = "simpledb"
+LOG_FORMAT = "[Timestamp: %(asctime)s] [%(levelname)s] [%(name)s] %(message)s"
+
+root_logger = logging.getLogger(LOGGER_NAME)
+root_logger.addHandler(logging.NullHandler())
+root_logger.propagate = False
+
+
+'''
+Return the logger of a SimpleDB component.
+    Args:
+        name (str): Component name, e.g. 'wal'.
+'''
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+'''
+Print SimpleDB diagnostics at the given level and above.
+    Args:
+        level (str or int): A logging level such as 'DEBUG', 'INFO' or 'WARNING', None or 'off' disables logging again.
+        stream (file, optional): Where to write the messages, defaults to stderr.
+'''
+def enable_logging(level="INFO", stream=None):
+    for handler in list(root_logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            root_logger.removeHandler(handler)
+    if level is None or str(level).lower() == "off":
+        root_logger.setLevel(logging.NOTSET)
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger.addHandler(handler)
+    root_logger.setLevel(level.upper() if isinstance(level, str) else level)
@@ -1,77 +1,676 @@
-import datetime as dt
+import datetime as dt,os,re,shutil,struct,threading,time,glob,zlib
+from utilities.logger.Log import get_logger
+from utilities.metrics.Metrics import Metrics
+from utilities.serializer.Compression import open_file, file_codec, check_codec, BLOCK_SIZE
+from utilities.serializer.TypedValue import encode_fields, decode_fields
+
+
+logger = get_logger("wal")
+
+
+'''
+Durability modes supported by the WAL.
+    always   - fsync after every committed record.
+    group    - concurrent commits wait a short window and share a single fsync.
+    everysec - a background thread fsyncs the log once per sync_interval.
+    none     - records are only flushed to the OS, never fsynced.
+'''
+DURABILITY_MODES = ("always", "group", "everysec", "none")
+
+# TTL of a text record written before the fields were tab-separated, the value ran up to this suffix.
+TTL_SUFFIX = re.compile(r" with TTL (\S+) seconds$")
+
+LOG_FORMATS = ("text", "binary")
+
+
+'''
+Binary record layout, every binary segment starts with BINARY_MAGIC.
+    crc32 (I) | timestamp (d) | op code (B) | state (B) | flags (B) | key length (I) | value length (I) | ttl length (H) | key | value | ttl
+The crc covers everything after itself, a record that is cut short or fails the check marks a torn tail.
+'''
+BINARY_MAGIC = b"SDBWAL1\n"
+RECORD = struct.Struct("<IdBBBIIH")
+OP_CODES = {"init": 1, "set": 2, "incr": 3, "delete": 4, "clear": 5, "drop": 6, "begin": 7, "commit": 8, "rollback": 9,
+            "incrby": 10, "hset": 11, "hdel": 12, "lpush": 13, "rpush": 14, "restore": 15}
+OP_NAMES = {code: name for name, code in OP_CODES.items()}
+STATE_CODES = {None: 0, "start": 1, "success": 2}
+STATE_NAMES = {code: name for name, code in STATE_CODES.items()}
+HAS_VALUE = 1
+VALUE_BYTES = 2
+HAS_TTL = 4
+
 
 '''
 Write-Ahead Log (WAL) System for simpleDB
 This module implements a simple write-ahead log system for a key-value database.
+The log is split into numbered segments '<log_file_name>.000001', '<log_file_name>.000002', ...
+A checkpoint file records the log position already reflected in the persisted database file,
+segments older than the checkpoint are deleted (or archived) and replay starts at the checkpoint.
+The records of a batch are enclosed in BEGIN and COMMIT (or ROLLBACK) records keyed by the batch id.
+With compression set, a segment is compressed in the background once it is closed, see Compression. Offsets
+within a segment are those of its uncompressed records, so checkpoints stay valid once it is compressed.
+Replication followers read the log from their own position with read_since, segments they still need are kept
+past a checkpoint through retain_segment.
 '''
 class wal:
-    
+
     '''
     Initialize the WAL system with a log file name and a custom WAL boolean to mark for custom WAL implementation.
         Args:
            log_file_name (str): The name of the log file to be used.
            custom_wal (bool): A flag indicating whether to use a custom WAL implementation.
+           durability (str): One of DURABILITY_MODES, decides when committed records are fsynced.
+           group_commit_window (float): Seconds a group commit leader waits for other commits to join its fsync, with 0 a leader
+                                        fsyncs right away and the commits arriving meanwhile share the next fsync.
+           sync_interval (float): Seconds between two fsyncs of the background thread in everysec mode.
+           segment_size (int): Size in bytes after which the active segment is closed and a new one is started.
+           checkpoint_interval (int): Number of records after which maybe_checkpoint takes a new checkpoint.
+           archive (bool): Move truncated segments into '<log_file_name>.archive' instead of deleting them.
+           log_format (str): 'text' for human readable lines or 'binary' for length-prefixed, checksummed records.
+           metrics (Metrics, optional): Where record counts, bytes and write latencies are recorded, usually the database's.
+           compression (str): Codec closed segments are compressed with, 'none', 'zlib' or 'lzma'.
     '''
-    def __init__(self,log_file_name,custom_wal):
+    def __init__(self,log_file_name,custom_wal,durability="none",group_commit_window=0.0,sync_interval=1.0,
+                 segment_size=4 * 1024 * 1024,checkpoint_interval=1000,archive=False,log_format="text",metrics=None,
+                 compression="none"):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}', expected one of {DURABILITY_MODES}")
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format '{log_format}', expected one of {LOG_FORMATS}")
+        check_codec(compression)
         self.log_file_name = log_file_name
+        self.compression = compression
+        self.compress_thread = None
+        self.compressed_segment = -1
+        self.metrics = metrics or Metrics()
+        self.log_format = log_format
         self.custom_wal = custom_wal
+        self.durability = durability
+        self.group_commit_window = group_commit_window
+        self.sync_interval = sync_interval
+        self.segment_size = segment_size
+        self.checkpoint_interval = checkpoint_interval
+        self.archive = archive
+        self.checkpoint_file_name = f"{log_file_name}.checkpoint"
+        self.lock = threading.Condition()
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.syncing = False
+        self.fsync_count = 0
+        self.records_since_checkpoint = 0
+        self.tail_waiters = 0
+        self.retain_segment = None
+        self.checkpoint_segment = self.read_checkpoint()[0]
         self.open_log_file()
-    
-    
+        self.sync_thread = None
+        if durability == "everysec":
+            self.stop_event = threading.Event()
+            self.sync_thread = threading.Thread(target=self.sync_loop, daemon=True)
+            self.sync_thread.start()
+
+
+    '''
+    Return the file name of the log segment with the given number.
+    '''
+    def segment_name(self, segment):
+        return f"{self.log_file_name}.{segment:06d}"
+
+
+    '''
+    Return the numbers of all log segments in ascending order.
+    '''
+    def segments(self):
+        segments = []
+        prefix = len(self.log_file_name) + 1
+        for name in glob.glob(glob.escape(self.log_file_name) + ".[0-9][0-9][0-9][0-9][0-9][0-9]"):
+            segments.append(int(name[prefix:]))
+        return sorted(segments)
+
+
     '''
     Open the log file for writing. If the file does not exist, it will be created.
+    The newest segment is reopened for appending, a log from before segmentation is adopted as segment 0.
     If the file cannot be opened, an error message will be printed.
     '''
     def open_log_file(self):
+        # (segment, offset) up to which the records of the segment it continues were checked, replay skips their checksums.
+        self.verified_end = (None, 0)
         try:
-            self.log_file = open(self.log_file_name, 'a+')
-            print(f"[Timestamp: {dt.datetime.now()}] [init] Log file '{self.log_file_name}' opened successfully.")
+            if os.path.exists(self.log_file_name) and not self.segments():
+                os.replace(self.log_file_name, self.segment_name(0))
+            segments = self.segments()
+            self.active_segment = segments[-1] if segments else 1
+            name = self.segment_name(self.active_segment)
+            size = os.path.getsize(name) if os.path.exists(name) else 0
+            # A compressed or differently formatted newest segment is left as it is and the log continues in a new one.
+            if size and (file_codec(name) != "none" or self.segment_format(name) != self.log_format):
+                self.active_segment += 1
+                name = self.segment_name(self.active_segment)
+                size = 0
+            elif size:
+                end = self.valid_binary_end(name) if self.log_format == "binary" else self.valid_text_end(name)
+                if self.log_format == "binary":
+                    self.verified_end = (self.active_segment, end)
+                if end < size:
+                    logger.warning("Truncating torn tail of '%s' at offset %d.", name, end)
+                    with open(name, 'r+b') as f:
+                        f.truncate(end)
+                    size = end
+            self.log_file = open(name, 'ab')
+            if not size and self.log_format == "binary":
+                self.log_file.write(BINARY_MAGIC)
+            logger.info("Log file '%s' opened successfully.", self.segment_name(self.active_segment))
         except IOError as e:
-            print(f"[Timestamp: {dt.datetime.now()}] [Error] Error opening log file '{self.log_file_name}': {e}")
+            logger.error("Error opening log file '%s': %s", self.log_file_name, e)
             self.log_file = None
-    
-    
+
+
     '''
     Write a log entry for a database operation.
         Args:
             operation (str): The operation being logged (e.g., "set", "delete").
             key (str): The key involved in the operation.
             value (str, optional): The value associated with the key, if applicable.
+            sync (bool): Wait for the durability point, callers logging a batch pass False and call sync once at the end.
         Returns:
             bool: True if the log entry was written successfully, False otherwise.
     '''
-    def write_log(self, operation, key, value=None, expiry=None,state="START") -> bool:
+    def write_log(self, operation, key, value=None, expiry=None,state="START",sync=True) -> bool:
         operation = operation.upper()
         if self.log_file is None:
-            print("Log file is not open. Cannot write log.")
+            logger.error("Log file is not open. Cannot write log.")
             return False
-        
+
+        start = time.perf_counter()
         try:
-            if self.custom_wal:
-                if value is not None:
-                    if expiry is not None:
-                        log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] [{state}] {operation} {key} {value} with TTL {expiry} seconds\n"
-                    else:
-                        log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] [{state}] {operation} {key} {value}\n"
-                else:
-                    log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] [{state}] {operation} {key}\n"
+            if self.log_format == "binary":
+                log_entry = self.encode_record(operation, key, value, expiry, state)
             else:
-                if value is not None:
-                    if expiry is not None:
-                        log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] {operation} {key} {value} with TTL {expiry} seconds\n"
-                    else:
-                        log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] {operation} {key} {value}\n"
-                else:
-                    log_entry = f"[Timestamp: {dt.datetime.now()}] [Task] {operation} {key}\n"
-            self.log_file.write(log_entry)
-            self.log_file.flush()
-            print(f"Logged: {log_entry.strip()}")
+                fields = [operation, key] if value is None else [operation, key, value] if expiry is None else [operation, key, value, expiry]
+                task = f"[Task] [{state}]" if self.custom_wal else "[Task]"
+                log_entry = f"[Timestamp: {dt.datetime.now()}] {task} {encode_fields(fields)}\n"
+            if self.log_format != "binary":
+                log_entry = log_entry.encode()
+            closed = None
+            with self.lock:
+                self.log_file.write(log_entry)
+                self.log_file.flush()
+                self.written_seq += 1
+                self.records_since_checkpoint += 1
+                seq = self.written_seq
+                if self.tail_waiters:
+                    self.lock.notify_all()
+                if self.log_file.tell() >= self.segment_size:
+                    closed = self.rotate()
+            if closed is not None and self.compression != "none":
+                self.start_compression(closed)
+            logger.debug("Logged: [%s] %s %s", state, operation, key)
+            # A SUCCESS record only marks completion, losing it just replays an idempotent operation, so it rides on the next fsync.
+            if sync and state != "SUCCESS":
+                self.sync(seq)
+            self.metrics.observe("write_log", time.perf_counter() - start, wal_records=1, wal_bytes=len(log_entry))
             return True
         except IOError as e:
-            print(f"[Timestamp: {dt.datetime.now()}] [Error] Error writing to log file '{self.log_file_name}': {e}")
+            logger.error("Error writing to log file '%s': %s", self.log_file_name, e)
             return False
-    
-    
+
+
+    '''
+    Close the active segment and start appending to the next one, the caller must hold self.lock.
+    A pending group commit fsync is waited for, and the closed segment is fsynced unless durability is none.
+        Returns:
+            int: The closed segment, None if another writer rotated while the lock was released for the wait.
+    '''
+    def rotate(self):
+        while self.syncing:
+            self.lock.wait()
+        # Writers appending meanwhile find the same full segment, the first to get the lock back closes it.
+        if self.log_file.tell() < self.segment_size:
+            return None
+        closed = self.active_segment
+        if self.durability != "none" and self.synced_seq < self.written_seq:
+            self.fsync()
+        self.log_file.close()
+        self.active_segment += 1
+        self.log_file = open(self.segment_name(self.active_segment), 'ab')
+        if self.log_format == "binary":
+            self.log_file.write(BINARY_MAGIC)
+        return closed
+
+
+    '''
+    Compress a closed segment on a background thread, after the previous one is done, so writers never wait on it.
+    A segment is only compressed once, later calls for it or for an older segment are ignored.
+    '''
+    def start_compression(self, segment):
+        with self.lock:
+            if segment <= self.compressed_segment:
+                return
+            self.compressed_segment = segment
+            self.compress_thread = threading.Thread(target=self.compress_after, args=(self.compress_thread, segment),
+                                                    daemon=True)
+            self.compress_thread.start()
+
+
+    '''
+    Wait for the compression thread of the previous segment, then compress a segment.
+    '''
+    def compress_after(self, previous, segment):
+        if previous is not None:
+            previous.join()
+        self.compress_segment(segment)
+
+
+    '''
+    Compress a closed segment into a temp file swapped in with os.replace, readers see either version whole.
+    The swap happens under the lock and only if the segment still exists, so a segment truncated meanwhile stays deleted.
+    '''
+    def compress_segment(self, segment):
+        name = self.segment_name(segment)
+        start = time.perf_counter()
+        try:
+            with open(name, 'rb') as source, open_file(name + ".tmp", 'wb', self.compression) as target:
+                shutil.copyfileobj(source, target, BLOCK_SIZE)
+                target.flush()
+                if self.durability != "none":
+                    os.fsync(target.fileno())
+                size, compressed_size = source.tell(), target.file.tell()
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if os.path.exists(name):
+                os.replace(name + ".tmp", name)
+            else:
+                os.remove(name + ".tmp")
+                return
+        self.metrics.observe("wal_compress", time.perf_counter() - start, wal_compressed_in=size,
+                             wal_compressed_out=compressed_size)
+
+
+    '''
+    Return the current end of the log as a (segment, offset) position.
+    '''
+    def position(self):
+        with self.lock:
+            return self.active_segment, self.log_file.tell() if self.log_file else 0
+
+
+    '''
+    Read the last checkpoint.
+        Returns:
+            tuple: The (segment, offset) position of the checkpoint, (0, 0) if no checkpoint was taken yet.
+    '''
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_file_name, 'r') as f:
+                segment, offset = f.read().split()
+                return int(segment), int(offset)
+        except (FileNotFoundError, ValueError):
+            return 0, 0
+
+
+    '''
+    Record a checkpoint and truncate the log before it.
+    Must only be called once the database file reflects every record before the position.
+        Args:
+            position (tuple, optional): The (segment, offset) to checkpoint, defaults to the current end of the log.
+    '''
+    def checkpoint(self, position=None):
+        if self.log_file is None:
+            return
+        segment, offset = position or self.position()
+        temp_name = self.checkpoint_file_name + ".tmp"
+        with open(temp_name, 'w') as f:
+            f.write(f"{segment} {offset}\n")
+            f.flush()
+            if self.durability != "none":
+                os.fsync(f.fileno())
+        os.replace(temp_name, self.checkpoint_file_name)
+        self.checkpoint_segment = segment
+        self.records_since_checkpoint = 0
+        self.truncate(segment)
+
+
+    '''
+    Return whether maybe_checkpoint would take a checkpoint, so the database file saved before it can be fsynced.
+    '''
+    def checkpoint_due(self):
+        return self.records_since_checkpoint >= self.checkpoint_interval or self.checkpoint_segment < self.active_segment
+
+
+    '''
+    Take a checkpoint if checkpoint_interval records were written or a segment was closed since the last one.
+    '''
+    def maybe_checkpoint(self):
+        if self.checkpoint_due():
+            self.checkpoint()
+
+
+    '''
+    Delete, or archive, every segment older than the given segment.
+    Segments from retain_segment on are kept while replication followers still have to read them.
+    '''
+    def truncate(self, segment):
+        with self.lock:
+            if self.retain_segment is not None:
+                segment = min(segment, self.retain_segment)
+            for old in self.segments():
+                if old >= segment:
+                    break
+                if self.archive:
+                    archive_dir = self.log_file_name + ".archive"
+                    os.makedirs(archive_dir, exist_ok=True)
+                    shutil.move(self.segment_name(old), os.path.join(archive_dir, os.path.basename(self.segment_name(old))))
+                else:
+                    os.remove(self.segment_name(old))
+
+
+    '''
+    Parse a log entry back into its fields.
+    The operation, key, value and TTL of a text record are tab-separated fields escaped like in TypedValue, so values
+    holding spaces, newlines or tabs replay as they were written. Lines of the older space-separated layout are still read.
+        Args:
+            line (str): A single log entry as written by write_log.
+        Returns:
+            tuple: (timestamp, state, operation, key, value, ttl) with timestamp in epoch seconds and state None for entries written without custom WAL,
+            or None if the line is not a valid entry.
+    '''
+    def parse_log_entry(self, line):
+        try:
+            timestamp, rest = line.rstrip("\n").split("] [Task] ", 1)
+            timestamp = dt.datetime.fromisoformat(timestamp[len("[Timestamp: "):]).timestamp()
+            state = None
+            if rest.startswith("["):
+                state, rest = rest[1:].split("] ", 1)
+                state = state.lower()
+            operation, tab, fields = rest.partition("\t")
+            if tab and " " not in operation:
+                key, *value = decode_fields(fields)
+                value, ttl = (value + [None, None])[:2]
+                return timestamp, state, operation.lower(), key, value, ttl
+            operation, key, *value = rest.split(" ", 2)
+        except ValueError:
+            return None
+        value = value[0] if value else None
+        ttl = None
+        if value is not None:
+            match = TTL_SUFFIX.search(value)
+            if match:
+                ttl = match.group(1)
+                value = value[:match.start()]
+        return timestamp, state, operation.lower(), key, value, ttl
+
+
+    '''
+    Encode a log entry as a binary record.
+        Returns:
+            bytes: The record, ready to be appended to a binary segment.
+    '''
+    def encode_record(self, operation, key, value, expiry, state):
+        flags = 0
+        key_bytes = str(key).encode()
+        value_bytes = b""
+        ttl_bytes = b""
+        if value is not None:
+            flags |= HAS_VALUE
+            if isinstance(value, (bytes, bytearray)):
+                flags |= VALUE_BYTES
+                value_bytes = bytes(value)
+            else:
+                value_bytes = str(value).encode()
+        if expiry is not None:
+            flags |= HAS_TTL
+            ttl_bytes = str(expiry).encode()
+        state_code = STATE_CODES[state.lower()] if self.custom_wal else 0
+        body = RECORD.pack(0, time.time(), OP_CODES[operation.lower()], state_code, flags,
+                           len(key_bytes), len(value_bytes), len(ttl_bytes))[4:] + key_bytes + value_bytes + ttl_bytes
+        return struct.pack("<I", zlib.crc32(body)) + body
+
+
+    '''
+    Decode the binary records of a segment, stopping at the first torn or corrupt record.
+        Args:
+            content (bytes): The segment content including BINARY_MAGIC.
+            start (int): Offset of the first record to decode.
+            verified (int): Offset up to which the checksums were already checked, see valid_binary_end.
+        Returns:
+            generator: (end offset, entry) pairs, entry as returned by parse_log_entry.
+    '''
+    def decode_records(self, content, start=0, verified=0):
+        position = max(start, len(BINARY_MAGIC))
+        length = len(content)
+        unpack = RECORD.unpack_from
+        header_size = RECORD.size
+        crc32 = zlib.crc32
+        view = memoryview(content)
+        while position + header_size <= length:
+            crc, timestamp, op_code, state_code, flags, key_length, value_length, ttl_length = unpack(content, position)
+            key_start = position + header_size
+            value_start = key_start + key_length
+            ttl_start = value_start + value_length
+            end = ttl_start + ttl_length
+            if end > verified and (end > length or crc32(view[position + 4:end]) != crc):
+                return
+            value = None
+            if flags & HAS_VALUE:
+                value = content[value_start:ttl_start]
+                if not flags & VALUE_BYTES:
+                    value = value.decode()
+            ttl = content[ttl_start:end].decode() if flags & HAS_TTL else None
+            yield end, (timestamp, STATE_NAMES[state_code], OP_NAMES[op_code],
+                        content[key_start:value_start].decode(), value, ttl)
+            position = end
+
+
+    '''
+    Return the offset right after the last intact record of a binary segment.
+    Only the record headers and checksums are read, the entries are decoded once, when the segment is replayed.
+    '''
+    def valid_binary_end(self, name):
+        with open(name, 'rb') as f:
+            content = f.read()
+        position = len(BINARY_MAGIC)
+        length = len(content)
+        unpack = RECORD.unpack_from
+        header_size = RECORD.size
+        crc32 = zlib.crc32
+        view = memoryview(content)
+        while position + header_size <= length:
+            crc, _, _, _, _, key_length, value_length, ttl_length = unpack(content, position)
+            end = position + header_size + key_length + value_length + ttl_length
+            if end > length or crc32(view[position + 4:end]) != crc:
+                break
+            position = end
+        return position
+
+
+    '''
+    Return the offset right after the last complete line of a text segment.
+    '''
+    def valid_text_end(self, name):
+        with open(name, 'rb') as f:
+            content = f.read()
+        return content.rfind(b"\n") + 1
+
+
+    '''
+    Return the format of an existing segment, detected from its first bytes.
+    '''
+    def segment_format(self, name):
+        with open_file(name, 'rb') as f:
+            return "binary" if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC else "text"
+
+
+    '''
+    Read the log entries starting from a position.
+        Args:
+            start (tuple, optional): The (segment, offset) to start from, defaults to the beginning of the log.
+        Returns:
+            generator: Parsed entries as returned by parse_log_entry, in log order.
+    '''
+    def read_records(self, start=(0, 0)):
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.flush()
+        start_segment, start_offset = start
+        for segment in self.segments():
+            if segment < start_segment:
+                continue
+            offset = start_offset if segment == start_segment else 0
+            with open_file(self.segment_name(segment), 'rb') as f:
+                if self.segment_format(self.segment_name(segment)) == "binary":
+                    content = f.read()
+                    end = max(offset, len(BINARY_MAGIC))
+                    verified = self.verified_end[1] if segment == self.verified_end[0] else 0
+                    for end, entry in self.decode_records(content, offset, verified):
+                        yield entry
+                    if end < len(content):
+                        logger.error("Torn record in '%s' at offset %d, skipping the rest of the segment.", self.segment_name(segment), end)
+                    continue
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        logger.error("Torn record at the end of '%s', skipping it.", self.segment_name(segment))
+                        break
+                    entry = self.parse_log_entry(line.decode())
+                    if entry is not None:
+                        yield entry
+
+
+    '''
+    Read the complete records written after a position, used to ship the log to replication followers.
+    Unlike read_records every record comes with the position right after it, and a record still being appended is
+    left for the next call. Reading goes on into the newer segments until limit records were read.
+        Args:
+            start (tuple): The (segment, offset) to read from.
+            limit (int): Maximum number of records returned.
+        Returns:
+            tuple: (records, position) with records a list of (position after the record, entry) pairs, entry as
+                   returned by parse_log_entry, and position where the next call goes on from, or None if the log
+                   at start is gone, truncated or dropped.
+    '''
+    def read_since(self, start, limit=1000):
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.flush()
+        segments = self.segments()
+        segment, offset = start
+        if not segments or segment < segments[0] or segment > segments[-1]:
+            return [], None
+        records = []
+        for number in segments:
+            if number < segment:
+                continue
+            if number > segment:
+                segment, offset = number, 0
+            name = self.segment_name(number)
+            try:
+                binary = self.segment_format(name) == "binary"
+                with open_file(name, 'rb') as f:
+                    if binary:
+                        # Read from right before the offset, so the buffer looks like a segment with the magic in front.
+                        offset = max(offset, len(BINARY_MAGIC))
+                        f.seek(offset - len(BINARY_MAGIC))
+                    else:
+                        f.seek(offset)
+                    content = f.read()
+            except FileNotFoundError:
+                return (records, (segment, offset)) if records else ([], None)
+            if binary:
+                base = offset - len(BINARY_MAGIC)
+                for end, entry in self.decode_records(content):
+                    offset = base + end
+                    records.append(((segment, offset), entry))
+                    if len(records) >= limit:
+                        return records, (segment, offset)
+                continue
+            position = 0
+            while len(records) < limit:
+                line_end = content.find(b"\n", position)
+                if line_end == -1:
+                    break
+                entry = self.parse_log_entry(content[position:line_end].decode())
+                offset += line_end + 1 - position
+                position = line_end + 1
+                if entry is not None:
+                    records.append(((segment, offset), entry))
+            if len(records) >= limit:
+                break
+        return records, (segment, offset)
+
+
+    '''
+    Wait until a record is written after the one with the given sequence number, or until timeout.
+        Args:
+            seq (int): The last written_seq the caller has seen.
+            timeout (float): Seconds to wait at most.
+        Returns:
+            int: The current written_seq.
+    '''
+    def wait_for_records(self, seq, timeout):
+        with self.lock:
+            self.tail_waiters += 1
+            try:
+                self.lock.wait_for(lambda: self.written_seq != seq or self.log_file is None, timeout)
+            finally:
+                self.tail_waiters -= 1
+            return self.written_seq
+
+
+    '''
+    Make sure the record with the given sequence number is durable according to the durability mode.
+        Args:
+            seq (int): The sequence number returned for the record by write_log.
+    '''
+    def sync(self, seq):
+        if self.durability == "always":
+            with self.lock:
+                if self.synced_seq < seq:
+                    self.fsync()
+        elif self.durability == "group":
+            with self.lock:
+                while self.synced_seq < seq:
+                    if self.syncing:
+                        self.lock.wait()
+                        continue
+                    # Become the leader: let other commits pile up, then fsync all of them outside the lock.
+                    # Records are flushed before written_seq is bumped, so everything up to target is in the OS already.
+                    self.syncing = True
+                    self.lock.release()
+                    try:
+                        if self.group_commit_window:
+                            time.sleep(self.group_commit_window)
+                        target = self.written_seq
+                        os.fsync(self.log_file.fileno())
+                    finally:
+                        self.lock.acquire()
+                        self.syncing = False
+                        self.lock.notify_all()
+                    self.synced_seq = max(self.synced_seq, target)
+                    self.fsync_count += 1
+
+
+    '''
+    Fsync everything written so far, the caller must hold self.lock.
+    '''
+    def fsync(self):
+        target = self.written_seq
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+        self.synced_seq = target
+        self.fsync_count += 1
+
+
+    '''
+    Background loop of the everysec mode, fsyncs the log once per sync_interval if anything new was written.
+    '''
+    def sync_loop(self):
+        while not self.stop_event.wait(self.sync_interval):
+            with self.lock:
+                if self.log_file is not None and self.synced_seq < self.written_seq:
+                    self.fsync()
+
+
     '''
     Read all log entries from the log file.
         Returns:
@@ -79,30 +678,62 @@ class wal:
     '''
     def read_log(self):
         if self.log_file is None:
-            print("Log file is not open. Cannot read log.")
+            logger.error("Log file is not open. Cannot read log.")
             return []
-        
+
         try:
-            self.log_file.seek(0)
-            log_entries = self.log_file.readlines()
-            print(f"Read {len(log_entries)} log entries from '{self.log_file_name}'.")
+            log_entries = []
+            with self.lock:
+                self.log_file.flush()
+            for segment in self.segments():
+                with open_file(self.segment_name(segment), 'rb') as f:
+                    if self.segment_format(self.segment_name(segment)) == "binary":
+                        for _, (timestamp, state, operation, key, value, ttl) in self.decode_records(f.read()):
+                            log_entries.append(f"[Timestamp: {dt.datetime.fromtimestamp(timestamp)}] [Task] [{state}] {operation.upper()} {key} {value} {ttl}")
+                        continue
+                    log_entries.extend(line.decode() for line in f)
+            logger.info("Read %d log entries from '%s'.", len(log_entries), self.log_file_name)
             return [entry.strip() for entry in log_entries]
         except IOError as e:
-            print(f"[Timestamp: {dt.datetime.now()}] [Error] Error reading from log file '{self.log_file_name}': {e}")
+            logger.error("Error reading from log file '%s': %s", self.log_file_name, e)
             return []
-    
-    
+
+
     '''
     Close the log file if it is open.
     If the file is already closed or was never opened, a message will be printed.
     '''
     def close_log_file(self):
+        if self.compress_thread is not None:
+            self.compress_thread.join()
+            self.compress_thread = None
+        if self.sync_thread is not None:
+            self.stop_event.set()
+            self.sync_thread.join()
+            self.sync_thread = None
         if self.log_file is not None:
             try:
+                with self.lock:
+                    if self.durability != "none" and self.synced_seq < self.written_seq:
+                        self.fsync()
                 self.log_file.close()
-                print(f"[Timestamp: {dt.datetime.now()}] [Close] Log file '{self.log_file_name}' closed successfully.")
+                logger.info("Log file '%s' closed successfully.", self.log_file_name)
             except IOError as e:
-                print(f"[Timestamp: {dt.datetime.now()}] [Error] Error closing log file '{self.log_file_name}': {e}")
+                logger.error("Error closing log file '%s': %s", self.log_file_name, e)
             self.log_file = None
         else:
-            print("Log file is already closed or was never opened.")
\ No newline at end of file
+            logger.info("Log file is already closed or was never opened.")
+
+
+    '''
+    Remove every segment, the checkpoint and the archive of this log, the log file must be closed first.
+    '''
+    def remove_log_files(self):
+        for segment in self.segments():
+            os.remove(self.segment_name(segment))
+        for name in glob.glob(glob.escape(self.log_file_name) + ".[0-9][0-9][0-9][0-9][0-9][0-9].tmp"):
+            os.remove(name)
+        for name in (self.checkpoint_file_name, self.log_file_name):
+            if os.path.exists(name):
+                os.remove(name)
+        shutil.rmtree(self.log_file_name + ".archive", ignore_errors=True)
@@ -0,0 +1,203 @@
+import collections,heapq,itertools,threading,time
+
+
+'''
+Latency histogram with power-of-two microsecond buckets.
+Bucket i counts durations in [2^(i-1), 2^i) microseconds, so recording costs a bit_length and percentiles are
+accurate within a factor of two, which is enough to tell a 50us operation from a 5ms one.
+'''
+class Histogram:
+
+    def __init__(self):
+        self.buckets = [0] * 48
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    '''
+    Record a duration in seconds.
+    '''
+    def observe(self, seconds):
+        self.buckets[min(int(seconds * 1e6).bit_length(), 47)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+    '''
+    Return the upper bound in seconds of the bucket holding the given fraction of the recorded durations.
+    '''
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min((1 << index) / 1e6, self.max)
+        return self.max
+
+
+    '''
+    Return count, average, p50, p99, p999 and max, latencies in milliseconds.
+    '''
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 4),
+            "p99_ms": round(self.percentile(0.99) * 1000, 4),
+            "p999_ms": round(self.percentile(0.999) * 1000, 4),
+            "max_ms": round(self.max * 1000, 4),
+        }
+
+
+'''
+Times one operation and the phases it goes through.
+    with metrics.timer("set", key) as timer:
+        ...write the WAL record...
+        timer.phase("wal")
+        ...
+Leaving the block records the total duration in the operation's histogram and offers it to the slow log.
+'''
+class OperationTimer:
+
+    __slots__ = ("metrics", "operation", "key", "start", "last", "phases")
+
+    def __init__(self, metrics, operation, key):
+        self.metrics = metrics
+        self.operation = operation
+        self.key = key
+        self.phases = []
+
+    def __enter__(self):
+        self.start = self.last = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.operation, self.key, time.perf_counter() - self.start, self.phases)
+
+
+    '''
+    Close the current phase, its duration is the time since the previous phase or the start.
+    '''
+    def phase(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+
+'''
+Counters, latency histograms and the slow log of a database.
+All updates take a short lock, so they are safe from concurrent readers and background workers.
+'''
+class Metrics:
+
+    '''
+    Args:
+        slowlog_size (int): Number of slowest operations kept in the slow log.
+    '''
+    def __init__(self, slowlog_size=128):
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.histograms = collections.defaultdict(Histogram)
+        self.slowlog_size = slowlog_size
+        self.slow = []
+        self.slow_ids = itertools.count(1)
+        self.started = time.time()
+
+
+    '''
+    Add to a counter.
+    '''
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+
+    '''
+    Record a duration in seconds in a latency histogram, the keyword arguments are added to counters under the same lock.
+    '''
+    def observe(self, name, seconds, **counters):
+        with self.lock:
+            self.histograms[name].observe(seconds)
+            for counter, amount in counters.items():
+                self.counters[counter] += amount
+
+
+    '''
+    Record a read of several keys: its latency, the keys read and how many of them had a value.
+    Kept apart from observe as it runs on every get, one lock and no keyword handling.
+    '''
+    def record_read(self, name, seconds, keys, hits):
+        with self.lock:
+            self.histograms[name].observe(seconds)
+            counters = self.counters
+            counters["cmd_get"] += keys
+            counters["keyspace_hits"] += hits
+            counters["keyspace_misses"] += keys - hits
+
+
+    '''
+    Return an OperationTimer for a top-level operation, to be used as a context manager.
+    '''
+    def timer(self, operation, key=None):
+        return OperationTimer(self, operation, key)
+
+
+    '''
+    Record a finished operation in its histogram and its 'cmd_<operation>' counter, and keep it if it is among the
+    slowest ones.
+    '''
+    def record(self, operation, key, duration, phases):
+        with self.lock:
+            self.histograms[operation].observe(duration)
+            self.counters["cmd_" + operation] += 1
+            if len(self.slow) < self.slowlog_size or duration > self.slow[0][0]:
+                entry = (duration, next(self.slow_ids), time.time(), operation, key, phases)
+                if len(self.slow) < self.slowlog_size:
+                    heapq.heappush(self.slow, entry)
+                else:
+                    heapq.heapreplace(self.slow, entry)
+
+
+    '''
+    Return the slow log, slowest first.
+        Args:
+            count (int, optional): Maximum number of entries to return.
+        Returns:
+            list: Dicts with id, timestamp, operation, key, duration_ms and the per-phase durations in ms.
+    '''
+    def slowlog(self, count=None):
+        with self.lock:
+            entries = sorted(self.slow, reverse=True)[:count]
+        return [{
+            "id": entry_id,
+            "timestamp": timestamp,
+            "operation": operation,
+            "key": key,
+            "duration_ms": round(duration * 1000, 4),
+            "phases": {name: round(seconds * 1000, 4) for name, seconds in phases},
+        } for duration, entry_id, timestamp, operation, key, phases in entries]
+
+
+    '''
+    Empty the slow log.
+    '''
+    def reset_slowlog(self):
+        with self.lock:
+            self.slow = []
+
+
+    '''
+    Return the counters and the latency summary of every histogram.
+    '''
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "latency": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            }
@@ -0,0 +1,564 @@
+import asyncio,fnmatch
+from utilities.eviction.MemoryLimit import MaxMemoryError
+from utilities.logger.Log import get_logger
+from utilities.index.SortedKeys import glob_prefix
+from utilities.serializer.TypedValue import WrongTypeError
+
+
+logger = get_logger("resp")
+
+
+'''
+Error reply of the RESP protocol, sent as '-<message>'.
+'''
+class RespError(Exception):
+    pass
+
+
+'''
+Simple string reply of the RESP protocol, sent as '+<value>'.
+'''
+class SimpleString(str):
+    pass
+
+
+OK = SimpleString("OK")
+PONG = SimpleString("PONG")
+QUEUED = SimpleString("QUEUED")
+
+
+'''
+Encode a Python value as a RESP reply.
+    None -> null bulk string, int -> integer, str/bytes -> bulk string, list -> array,
+    SimpleString -> simple string, RespError -> error.
+'''
+def encode_reply(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, SimpleString):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bool):
+        return b":1\r\n" if value else b":0\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    if not isinstance(value, (bytes, bytearray)):
+        value = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+'''
+Parse an integer argument.
+    Raises:
+        RespError: If the argument is not an integer.
+'''
+def parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise RespError("ERR value is not an integer or out of range") from None
+
+
+'''
+Turn a stored value into the reply of a string command, counters are sent as bulk strings like in Redis.
+    Raises:
+        WrongTypeError: If the value is a hash or a list.
+'''
+def string_reply(value):
+    if isinstance(value, (dict, list)):
+        raise WrongTypeError()
+    return None if value is None else str(value)
+
+
+'''
+Render the report of db.info() in the text format of the Redis INFO command.
+Every section becomes a '# Section' header followed by 'field:value' lines, latency summaries are flattened into
+'<operation>_<field>' lines. The slow log and per-shard reports are left out, SLOWLOG serves the former.
+    Args:
+        info (dict): The report returned by info().
+        section (str, optional): Only render this section.
+'''
+def format_info(info, section=None):
+    lines = []
+    for name, fields in info.items():
+        if not isinstance(fields, dict) or name == "shards" or section and name != section.lower():
+            continue
+        lines.append(f"# {name.capitalize()}")
+        for field, value in fields.items():
+            if isinstance(value, dict):
+                lines.extend(f"{field}_{inner}:{inner_value}" for inner, inner_value in value.items())
+            else:
+                lines.append(f"{field}:{value}")
+        lines.append("")
+    return "\r\n".join(lines)
+
+
+'''
+Incremental parser for RESP requests.
+Bytes are fed as they arrive from the socket and every complete command is returned, a command that is cut off
+stays buffered until the rest arrives. Both RESP arrays of bulk strings and inline commands are understood.
+'''
+class RespParser:
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.error = None
+
+
+    '''
+    Append received bytes to the buffer.
+    '''
+    def feed(self, data):
+        self.buffer += data
+
+
+    '''
+    Parse every complete command in the buffer.
+    Parsing stops at bytes that are not valid RESP, the commands before them are still returned and the error is
+    left in self.error, the connection has to be closed once they are answered.
+        Returns:
+            list: One list of byte string arguments per command, in arrival order.
+    '''
+    def commands(self):
+        commands = []
+        position = 0
+        try:
+            position = self.parse(commands)
+        except RespError as e:
+            self.error = e
+        del self.buffer[:position]
+        return commands
+
+
+    '''
+    Append the complete commands of the buffer to a list.
+        Returns:
+            int: The position after the last complete command.
+        Raises:
+            RespError: If the buffered bytes are not valid RESP, the list holds the commands before them.
+    '''
+    def parse(self, commands):
+        buffer = self.buffer
+        position = 0
+        length = len(buffer)
+        while position < length:
+            line_end = buffer.find(b"\r\n", position)
+            if line_end == -1:
+                break
+            if buffer[position] != ord('*'):
+                # Inline command, as typed in telnet
+                args = bytes(buffer[position:line_end]).split()
+                position = line_end + 2
+                if args:
+                    commands.append(args)
+                continue
+            try:
+                count = int(buffer[position + 1:line_end])
+            except ValueError:
+                raise RespError("ERR Protocol error: invalid multibulk length")
+            cursor = line_end + 2
+            args = []
+            for _ in range(count):
+                bulk_end = buffer.find(b"\r\n", cursor)
+                if bulk_end == -1:
+                    break
+                if buffer[cursor] != ord('$'):
+                    raise RespError("ERR Protocol error: expected '$'")
+                try:
+                    size = int(buffer[cursor + 1:bulk_end])
+                except ValueError:
+                    raise RespError("ERR Protocol error: invalid bulk length")
+                start = bulk_end + 2
+                if start + size + 2 > length:
+                    break
+                args.append(bytes(buffer[start:start + size]))
+                cursor = start + size + 2
+            if len(args) < count:
+                break
+            position = cursor
+            if args:
+                commands.append(args)
+        return position
+
+
+'''
+asyncio TCP server exposing a SimpleDB instance over the Redis RESP protocol.
+Every connection may pipeline any number of commands, they are executed in order on the default executor and their
+replies are written back with a single write per batch of received bytes.
+'''
+class RespServer:
+
+    '''
+    Initialize the server.
+        Args:
+            db (SimpleDB): The database to serve.
+            host (str): Interface to listen on.
+            port (int): Port to listen on, 0 picks a free port.
+    '''
+    def __init__(self, db, host="127.0.0.1", port=6379):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = 0
+        self.commands_processed = 0
+        self.handlers = {
+            b"SET": self.command_set,
+            b"GET": self.command_get,
+            b"MSET": self.command_mset,
+            b"MGET": self.command_mget,
+            b"INCR": self.command_incr,
+            b"INCRBY": self.command_incrby,
+            b"DECR": self.command_decr,
+            b"DECRBY": self.command_decrby,
+            b"HSET": self.command_hset,
+            b"HGET": self.command_hget,
+            b"HDEL": self.command_hdel,
+            b"HGETALL": self.command_hgetall,
+            b"LPUSH": self.command_lpush,
+            b"RPUSH": self.command_rpush,
+            b"LRANGE": self.command_lrange,
+            b"LLEN": self.command_llen,
+            b"TYPE": self.command_type,
+            b"DEL": self.command_delete,
+            b"DELETE": self.command_delete,
+            b"EXISTS": self.command_exists,
+            b"CLEAR": self.command_clear,
+            b"FLUSHDB": self.command_clear,
+            b"FLUSHALL": self.command_clear,
+            b"PING": self.command_ping,
+            b"ECHO": self.command_echo,
+            b"SCAN": self.command_scan,
+            b"KEYS": self.command_keys,
+            b"INFO": self.command_info,
+            b"DBSIZE": self.command_dbsize,
+            b"SLOWLOG": self.command_slowlog,
+            b"BGSAVE": self.command_bgsave,
+            b"LASTSAVE": self.command_lastsave,
+            b"COMMAND": self.command_empty,
+            b"CONFIG": self.command_empty,
+        }
+
+
+    '''
+    Execute a single command.
+        Args:
+            args (list): The command name followed by its arguments, as byte strings.
+        Returns:
+            The reply value, encoded by encode_reply.
+    '''
+    def execute(self, args):
+        handler = self.handlers.get(args[0].upper())
+        if handler is None:
+            return RespError(f"ERR unknown command '{args[0].decode(errors='replace')}'")
+        try:
+            return handler([arg.decode() for arg in args[1:]])
+        except RespError as e:
+            return e
+        except MaxMemoryError as e:
+            return RespError(f"OOM {e}")
+        except WrongTypeError as e:
+            return RespError(f"WRONGTYPE {e}")
+        except PermissionError as e:
+            return RespError(f"READONLY {e}")
+        except UnicodeDecodeError:
+            return RespError("ERR arguments must be valid UTF-8")
+        except Exception as e:
+            # Any other failure, e.g. an oversized B+tree key or a failed save, fails the command, not the connection.
+            logger.exception("Command '%s' failed", args[0].decode(errors='replace'))
+            return RespError(f"ERR {e}")
+
+
+    def command_set(self, args):
+        if len(args) not in (2, 4):
+            raise RespError("ERR wrong number of arguments for 'set' command")
+        key, value = args[0], args[1]
+        ttl = None
+        if len(args) == 4:
+            if args[2].upper() != "EX" or not args[3].isdigit() or int(args[3]) <= 0:
+                raise RespError("ERR syntax error")
+            ttl = [args[3]]
+        self.db.set(key, value, ttl)
+        return OK
+
+    def command_get(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'get' command")
+        return string_reply(self.db.get(args[0]))
+
+    def command_mset(self, args):
+        if not args or len(args) % 2:
+            raise RespError("ERR wrong number of arguments for 'mset' command")
+        self.db.mset(dict(zip(args[::2], args[1::2])))
+        return OK
+
+    def command_mget(self, args):
+        if not args:
+            raise RespError("ERR wrong number of arguments for 'mget' command")
+        return [None if isinstance(value, (dict, list)) else string_reply(value) for value in self.db.mget(args)]
+
+    def command_incr(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'incr' command")
+        return self.incrby(args[0], 1)
+
+    def command_incrby(self, args):
+        if len(args) != 2:
+            raise RespError("ERR wrong number of arguments for 'incrby' command")
+        return self.incrby(args[0], parse_int(args[1]))
+
+    def command_decr(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'decr' command")
+        return self.incrby(args[0], -1)
+
+    def command_decrby(self, args):
+        if len(args) != 2:
+            raise RespError("ERR wrong number of arguments for 'decrby' command")
+        return self.incrby(args[0], -parse_int(args[1]))
+
+    def incrby(self, key, amount):
+        try:
+            return self.db.incrby(key, amount)
+        except ValueError:
+            raise RespError("ERR value is not an integer or out of range") from None
+
+    def command_hset(self, args):
+        if len(args) < 3 or len(args) % 2 != 1:
+            raise RespError("ERR wrong number of arguments for 'hset' command")
+        return self.db.hset(args[0], mapping=dict(zip(args[1::2], args[2::2])))
+
+    def command_hget(self, args):
+        if len(args) != 2:
+            raise RespError("ERR wrong number of arguments for 'hget' command")
+        return self.db.hget(args[0], args[1])
+
+    def command_hdel(self, args):
+        if len(args) < 2:
+            raise RespError("ERR wrong number of arguments for 'hdel' command")
+        return self.db.hdel(args[0], *args[1:])
+
+    def command_hgetall(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'hgetall' command")
+        return [item for pair in self.db.hgetall(args[0]).items() for item in pair]
+
+    def command_lpush(self, args):
+        if len(args) < 2:
+            raise RespError("ERR wrong number of arguments for 'lpush' command")
+        return self.db.lpush(args[0], *args[1:])
+
+    def command_rpush(self, args):
+        if len(args) < 2:
+            raise RespError("ERR wrong number of arguments for 'rpush' command")
+        return self.db.rpush(args[0], *args[1:])
+
+    def command_lrange(self, args):
+        if len(args) != 3:
+            raise RespError("ERR wrong number of arguments for 'lrange' command")
+        return self.db.lrange(args[0], parse_int(args[1]), parse_int(args[2]))
+
+    def command_llen(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'llen' command")
+        return self.db.llen(args[0])
+
+    def command_type(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'type' command")
+        return SimpleString(self.db.key_type(args[0]))
+
+    def command_delete(self, args):
+        if not args:
+            raise RespError("ERR wrong number of arguments for 'del' command")
+        if len(args) == 1:
+            # A single key skips the batch records and the persist of a write that might not happen.
+            return int(self.db.exists(args[0]) and bool(self.db.delete(args[0])))
+        return self.db.mdelete(args)
+
+    def command_exists(self, args):
+        if not args:
+            raise RespError("ERR wrong number of arguments for 'exists' command")
+        return sum(1 for key in args if self.db.exists(key))
+
+    def command_clear(self, args):
+        self.db.clear()
+        return OK
+
+    def command_ping(self, args):
+        return args[0] if args else PONG
+
+    def command_echo(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'echo' command")
+        return args[0]
+
+    def command_scan(self, args):
+        if not args or len(args) % 2 != 1 or not args[0].isdigit():
+            raise RespError("ERR syntax error")
+        match, count = None, 10
+        for option, value in zip(args[1::2], args[2::2]):
+            if option.upper() == "MATCH":
+                match = value
+            elif option.upper() == "COUNT" and value.isdigit() and int(value) > 0:
+                count = int(value)
+            else:
+                raise RespError("ERR syntax error")
+        try:
+            cursor, keys = self.db.scan(int(args[0]), match, count)
+        except ValueError:
+            raise RespError("ERR invalid cursor")
+        return [str(cursor), keys]
+
+    def command_keys(self, args):
+        if len(args) != 1:
+            raise RespError("ERR wrong number of arguments for 'keys' command")
+        pattern = args[0]
+        return [key for key in self.db.keys(glob_prefix(pattern)) if fnmatch.fnmatchcase(key, pattern)]
+
+    def command_info(self, args):
+        if len(args) > 1:
+            raise RespError("ERR wrong number of arguments for 'info' command")
+        info = self.db.info()
+        info["server"].update(connected_clients=self.connections, commands_processed=self.commands_processed)
+        return format_info(info, args[0] if args else None)
+
+    def command_dbsize(self, args):
+        return self.db.dbsize()
+
+    def command_slowlog(self, args):
+        subcommand = args[0].upper() if args else ""
+        if subcommand == "GET" and len(args) <= 2:
+            if len(args) == 2 and not args[1].isdigit():
+                raise RespError("ERR value is not an integer or out of range")
+            count = int(args[1]) if len(args) == 2 else 10
+            return [[entry["id"], int(entry["timestamp"]), int(entry["duration_ms"] * 1000),
+                     [entry["operation"], entry["key"] or ""],
+                     [f"{phase}={duration}ms" for phase, duration in entry["phases"].items()]]
+                    for entry in self.db.slowlog(count)]
+        if subcommand == "LEN" and len(args) == 1:
+            return len(self.db.slowlog())
+        raise RespError("ERR unknown subcommand or wrong number of arguments for 'slowlog' command, try GET or LEN")
+
+    def command_bgsave(self, args):
+        if not self.db.bgsave():
+            raise RespError("ERR Background save already in progress or not supported by this storage")
+        return SimpleString("Background saving started")
+
+    def command_lastsave(self, args):
+        return self.db.lastsave()
+
+    def command_empty(self, args):
+        return []
+
+
+    '''
+    Run the commands queued by MULTI as one database batch.
+        Returns:
+            list: The reply of every queued command.
+    '''
+    def execute_transaction(self, queue):
+        with self.db.batch():
+            return [self.execute(args) for args in queue]
+
+
+    '''
+    Run the commands parsed from one read of a connection.
+    Between MULTI and EXEC commands are queued, EXEC runs them as a single batch and DISCARD drops them.
+        Args:
+            commands (list): The parsed commands, in arrival order.
+            queue (list): The commands queued since MULTI, None outside of a transaction.
+        Returns:
+            tuple: (encoded replies, queue after the commands, whether QUIT was received)
+    '''
+    def run_commands(self, commands, queue):
+        replies = []
+        for args in commands:
+            name = args[0].upper()
+            if name == b"QUIT":
+                replies.append(encode_reply(OK))
+                return replies, queue, True
+            if name == b"MULTI":
+                reply = RespError("ERR MULTI calls can not be nested") if queue is not None else OK
+                queue = [] if queue is None else queue
+            elif name == b"EXEC":
+                reply = RespError("ERR EXEC without MULTI") if queue is None else self.execute_transaction(queue)
+                queue = None
+            elif name == b"DISCARD":
+                reply = RespError("ERR DISCARD without MULTI") if queue is None else OK
+                queue = None
+            elif queue is not None:
+                queue.append(args)
+                reply = QUEUED
+            else:
+                reply = self.execute(args)
+            replies.append(encode_reply(reply))
+        return replies, queue, False
+
+
+    '''
+    Serve one client connection until it disconnects, sends QUIT or sends bytes that are not valid RESP.
+    The commands run on the default executor, the database calls block on its lock, WAL fsyncs and file writes,
+    and must not stall the other connections. The commands of one connection still run one read at a time and in
+    order, the database lock orders the commands of different connections.
+    A protocol error is replied after the commands parsed before it, then the connection is closed.
+    '''
+    async def handle(self, reader, writer):
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        parser = RespParser()
+        queue = None
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                parser.feed(data)
+                commands = parser.commands()
+                replies, quit = [], False
+                if commands:
+                    replies, queue, quit = await loop.run_in_executor(None, self.run_commands, commands, queue)
+                self.commands_processed += len(replies)
+                if parser.error is not None and not quit:
+                    replies.append(encode_reply(parser.error))
+                    quit = True
+                writer.write(b"".join(replies))
+                await writer.drain()
+                if quit:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+
+    '''
+    Start listening, the bound port is stored in self.port.
+    '''
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+
+    '''
+    Start listening, unless start was already awaited, and serve until cancelled.
+    '''
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+
+    '''
+    Stop accepting connections.
+    '''
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
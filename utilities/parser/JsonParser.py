@@ -1,126 +1,202 @@
+import re,os,math
+from utilities.serializer.Compression import open_file
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER = re.compile(r'(-?(?:0|[1-9][0-9]*))(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+STRING_CHUNK = re.compile(r'([^"\\]*)(["\\])')
+ESCAPE_SEQUENCES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t'
+}
+LITERALS = (('true', True), ('false', False), ('null', None))
+# Lone surrogates cannot be encoded as UTF-8, they are written as \uXXXX escapes like json.dumps does.
+UNSAFE_CHARACTERS = re.compile(r'["\\\x00-\x1f\ud800-\udfff]')
+SHORT_ESCAPES = {value: '\\' + escape for escape, value in ESCAPE_SEQUENCES.items() if escape != '/'}
+# Member of the top-level object dump_data writes the expiry times under, after the data. It starts with a NUL
+# character so it does not clash with ordinary keys, a key equal to it cannot be stored in a JSON file.
+EXPIRY_MEMBER = "\u0000expiry"
+
+
+'''
+Escape a character that cannot appear as is in a JSON string, with the short form where JSON has one.
+'''
+def escape_character(match):
+    char = match.group()
+    return SHORT_ESCAPES.get(char) or f'\\u{ord(char):04x}'
+
+
+'''
+Format a string as a JSON string. Most strings need no escaping, they are only checked and quoted.
+Control characters are not printable, so a printable string without quotes and backslashes is safe, the checks run
+in C and are faster than a regex search. A string failing them is passed through UNSAFE_CHARACTERS, which leaves
+the printable characters alone.
+'''
+def quote(text):
+    if '"' in text or '\\' in text or not text.isprintable():
+        return '"' + UNSAFE_CHARACTERS.sub(escape_character, text) + '"'
+    return '"' + text + '"'
+
+
+'''
+Raised while streaming when the buffered text ends in the middle of a value and more input is needed.
+'''
+class IncompleteJsonError(ValueError):
+    pass
+
 
 '''
 parse json strings into Python objects from scratch.
 This is a basic implementation of a JSON parser that can handle numbers, strings, booleans, arrays, and objects.
+Strings, numbers and whitespace are scanned with regexes and slices instead of character by character,
+and iterparse streams the members of a top-level object from a file read in chunks.
 '''
 class JsonParser:
-    
-    ''' Initializes the JsonParser with a JSON string.'''
+
+    ''' Initializes the JsonParser.'''
     def __init__(self):
         self.counter = 0
-    
-    
+        self.complete = True
+
+
     '''
     Parses a JSON string and returns the corresponding Python object.
     Raises ValueError if the JSON string is invalid or contains extra data after the valid JSON.
     '''
     def parse_json(self,json):
-        length = len(json)
+        self.counter = 0
+        self.complete = True
         res = self.parse(json)
         self.skip_whitespace(json)
-        if self.counter != length:
-            # print(json[self.counter:])
+        if self.counter != len(json):
             raise ValueError("Extra data after valid JSON")
         return res
-    
-    
-    ''' 
+
+
+    '''
+    Signal that the end of the buffered text was reached.
+    While streaming this asks for more input, otherwise the given error is raised.
+    '''
+    def end_of_input(self, message):
+        if not self.complete:
+            raise IncompleteJsonError(message)
+        raise ValueError(message)
+
+
+    '''
     Parses the JSON string and determines the type of the JSON value (object, array, string, number, boolean, or null) to call the appropriate parsing method.
-    Raises ValueError if the JSON string is empty or starts with an invalid character.
+    Raises ValueError if the JSON string starts with an invalid character.
     '''
     def parse(self,json):
-        length = len(json)
         self.skip_whitespace(json)
-        if self.counter >= length:
-            # raise ValueError("Empty JSON string")
+        if self.counter >= len(json):
+            if not self.complete:
+                self.end_of_input("Unexpected end of JSON")
             return
-        
-        if json[self.counter] == '{':
+
+        char = json[self.counter]
+        if char == '{':
             return self.parse_object(json)
-        elif json[self.counter] == '[':
+        elif char == '[':
             return self.parse_array(json)
-        elif json[self.counter] == '"':
+        elif char == '"':
             return self.parse_string(json)
-        elif json[self.counter] in '-0123456789':
+        elif char in '-0123456789':
             return self.parse_number(json)
-        elif json.startswith('true', self.counter):
-            self.counter += 4
-            return True
-        elif json.startswith('false', self.counter):
-            self.counter += 5
-            return False    
-        else:
-            raise ValueError("Invalid JSON format")
-    
-    
+        rest = json[self.counter:self.counter + 5]
+        for literal, value in LITERALS:
+            if rest.startswith(literal):
+                self.counter += len(literal)
+                return value
+            if literal.startswith(rest):
+                self.end_of_input("Invalid JSON format")
+        raise ValueError("Invalid JSON format")
+
+
     '''
     Parses a number from the JSON string.
-    Handles both integers and floating-point numbers.
+    Handles integers, floating-point numbers and exponents.
     '''
     def parse_number(self,json):
-        res = ""
-        length = len(json)
-        if self.counter < length and (json[self.counter] == '-' or json[self.counter].isdigit()):
-            if json[self.counter] == '-':
-                res += '-'
-                self.counter += 1
-            while(self.counter < length and json[self.counter].isdigit()):
-                res += json[self.counter]
-                self.counter += 1
-            if self.counter < length and json[self.counter] == '.':
-                res += '.'
-                self.counter += 1
-                while(self.counter < length and json[self.counter].isdigit()):
-                    res += json[self.counter]
-                    self.counter += 1
-                return float(res)
-            return int(res)
-        else:
+        match = NUMBER.match(json, self.counter)
+        if match is None:
+            if json[self.counter:] == '-':
+                self.end_of_input("Invalid number format")
             raise ValueError("Invalid number format")
-    
-    
-    ''' 
+        if not self.complete and NUMBER_TAIL.match(json, match.end()):
+            self.end_of_input("Number may continue past the buffered text")
+        self.counter = match.end()
+        integer, fraction, exponent = match.groups()
+        if fraction or exponent:
+            return float(match.group())
+        return int(integer)
+
+
+    '''
     Parses a string from the JSON string.
-    Handles escape sequences and checks for unterminated strings.
+    Runs of plain characters are taken as one slice, escape sequences are decoded in between.
     '''
     def parse_string(self,json):
-        res=""
         length = len(json)
         if self.counter >= length or json[self.counter] != '"':
             raise ValueError("String must start with '\"'")
-        self.counter += 1  
-        escape_sequences = {
-            '"': '"',
-            '\\': '\\',
-            '/': '/',
-            'b': '\b',
-            'f': '\f',
-            'n': '\n',
-            'r': '\r',
-            't': '\t'
-        }
-        while(self.counter < length and json[self.counter] != '"'):
-            if json[self.counter] == '\\':
+        self.counter += 1
+        chunks = []
+        while True:
+            match = STRING_CHUNK.match(json, self.counter)
+            if match is None:
+                self.end_of_input("Unterminated string")
+            content, terminator = match.groups()
+            if content:
+                chunks.append(content)
+            self.counter = match.end()
+            if terminator == '"':
+                break
+            if self.counter >= length:
+                self.end_of_input("Unterminated escape sequence")
+            escape = json[self.counter]
+            if escape == 'u':
+                chunks.append(self.parse_unicode_escape(json))
+            elif escape in ESCAPE_SEQUENCES:
+                chunks.append(ESCAPE_SEQUENCES[escape])
                 self.counter += 1
-                if self.counter >= length:
-                    raise ValueError("Unterminated escape sequence")
-                if json[self.counter] in escape_sequences:
-                    res += escape_sequences[json[self.counter]]
-                else:
-                    raise ValueError(f"Invalid escape sequence: \\{json[self.counter]}")
             else:
-                res += json[self.counter]
-            self.counter += 1
-        if self.counter < length and json[self.counter] == '"': 
-            self.counter += 1
-        else: 
-            raise ValueError("Unterminated string")
-        if res == 'null':
-            return None
-        return res
-    
-    
-    ''' 
+                raise ValueError(f"Invalid escape sequence: \\{escape}")
+        return ''.join(chunks)
+
+
+    '''
+    Parses a \\uXXXX escape, the counter points at the 'u'.
+    A high surrogate followed by a low surrogate escape is combined into one character.
+    '''
+    def parse_unicode_escape(self,json):
+        digits = json[self.counter + 1:self.counter + 5]
+        if len(digits) < 4:
+            self.end_of_input("Unterminated unicode escape")
+        try:
+            code = int(digits, 16)
+        except ValueError:
+            raise ValueError(f"Invalid unicode escape: \\u{digits}")
+        self.counter += 5
+        if 0xd800 <= code <= 0xdbff and json.startswith('\\u', self.counter):
+            low = json[self.counter + 2:self.counter + 6]
+            if len(low) < 4:
+                self.end_of_input("Unterminated unicode escape")
+            low_code = int(low, 16)
+            if 0xdc00 <= low_code <= 0xdfff:
+                self.counter += 6
+                return chr(0x10000 + ((code - 0xd800) << 10) + (low_code - 0xdc00))
+        return chr(code)
+
+
+    '''
     Parses an array from the JSON string.
     Handles nested arrays and checks for unterminated arrays.
     '''
@@ -129,28 +205,29 @@ class JsonParser:
         length = len(json)
         if self.counter >= length or json[self.counter] != '[':
             raise ValueError("Array must start with '['")
-        self.counter += 1  
-        while self.counter < length and json[self.counter] != ']':
+        self.counter += 1
+        while True:
             self.skip_whitespace(json)
-            if self.check_null(json):
-                value = None
-            else:
-                value = self.parse(json)
-            res.append(value)
+            if self.counter >= length:
+                self.end_of_input("Unterminated array")
+            if json[self.counter] == ']':
+                self.counter += 1
+                break
+            res.append(self.parse(json))
             self.skip_whitespace(json)
-            if self.counter < length and json[self.counter] == ',':
+            if self.counter >= length:
+                self.end_of_input("Unterminated array")
+            if json[self.counter] == ',':
                 self.counter += 1
-            elif self.counter < length and json[self.counter] == ']':
+            elif json[self.counter] == ']':
                 self.counter += 1
                 break
             else:
                 raise ValueError("Expected ',' or ']' in array")
-        else:
-            raise ValueError("Unterminated array")
         return res
-    
-    
-    ''' 
+
+
+    '''
     Parses an object from the JSON string.
     Handles nested objects and checks for unterminated objects.
     '''
@@ -160,106 +237,207 @@ class JsonParser:
         if self.counter >= length or json[self.counter] != '{':
             raise ValueError("Object must start with '{'")
         self.counter += 1
-        self.skip_whitespace(json)
-        while self.counter < length and json[self.counter] != '}':
+        while True:
             self.skip_whitespace(json)
             if self.counter >= length:
-                raise ValueError("Unterminated object")
+                self.end_of_input("Unterminated object")
+            if json[self.counter] == '}':
+                self.counter += 1
+                break
             if json[self.counter] == ',':
                 self.counter += 1
-                self.skip_whitespace(json)
                 continue
-            key = self.parse_string(json)
-            self.skip_whitespace(json)
-            if self.counter >= length or json[self.counter] != ':':
-                raise ValueError("Expected ':' after key in object")
-            self.counter += 1
-            self.skip_whitespace(json)
-            if self.check_null(json):
-                value = None
-            else:
-                value = self.parse(json)
+            key, value = self.parse_member(json)
             res[key] = value
-            self.skip_whitespace(json)
-        if self.counter < length and json[self.counter] == '}':
-            self.counter += 1
-        else:
-            raise ValueError("Unterminated object")
         return res
-        
-    
-    ''' 
+
+
+    '''
+    Parses a single "key": value member of an object.
+        Returns:
+            tuple: The (key, value) pair.
+    '''
+    def parse_member(self,json):
+        key = self.parse_string(json)
+        self.skip_whitespace(json)
+        if self.counter >= len(json):
+            self.end_of_input("Expected ':' after key in object")
+        if json[self.counter] != ':':
+            raise ValueError("Expected ':' after key in object")
+        self.counter += 1
+        return key, self.parse(json)
+
+
+    '''
     Skips whitespace characters in the JSON string.
-    Increments the counter until a non-whitespace character
+    Moves the counter past the whole run of whitespace with a single regex match.
     '''
     def skip_whitespace(self,json):
-        length = len(json)
-        while(self.counter<length and json[self.counter].isspace()):
-            self.counter += 1
-    
-    
-    ''' 
-    Checks for a null value in the JSON string.
-    If 'null' is found, increments the counter and returns True.
+        self.counter = WHITESPACE.match(json, self.counter).end()
+
+
     '''
-    def check_null(self,json):
-        self.skip_whitespace(json)
-        length = len(json)
-        if self.counter < length and json[self.counter] == 'n':
-            if json.startswith('null', self.counter):
-                self.counter += 4
-                return True
-            else:
-                raise ValueError("Invalid null value")
-            return True
-        return False
-    
-    
-    def dump_data(self,data,db_name):
-        with open(db_name, 'w') as file:
+    Stream the members of the top-level object of a JSON file.
+    The file is read in chunks, whenever a member runs past the buffered text at least as much text again is read,
+    so a member is parsed a bounded number of times and the raw text is never held in memory as a whole.
+        Args:
+            db_name (str): Path of the JSON file.
+            chunk_size (int): Number of characters read at a time.
+        Returns:
+            generator: The (key, value) pairs of the top-level object, in file order.
+    '''
+    def iterparse(self, db_name, chunk_size=1 << 20):
+        with open_file(db_name, 'r') as file:
+            json = file.read(chunk_size)
+            eof = not json
+            started = False
+            self.counter = 0
+            while True:
+                start = self.counter
+                self.complete = eof
+                try:
+                    self.skip_whitespace(json)
+                    if self.counter >= len(json):
+                        if eof and not started:
+                            return
+                        self.end_of_input("Unterminated object")
+                    char = json[self.counter]
+                    if not started:
+                        if char != '{':
+                            raise ValueError("Only a top-level JSON object can be streamed")
+                        self.counter += 1
+                        started = True
+                        continue
+                    if char == '}':
+                        self.counter += 1
+                        return
+                    if char == ',':
+                        self.counter += 1
+                        continue
+                    member = self.parse_member(json)
+                except IncompleteJsonError:
+                    more = file.read(max(chunk_size, len(json) - start))
+                    eof = not more
+                    json = json[start:] + more
+                    self.counter = 0
+                    continue
+                yield member
+                if self.counter >= chunk_size:
+                    json = json[self.counter:]
+                    self.counter = 0
+
+
+    '''
+    Format a value as JSON text. Strings are escaped, ints, floats, bools and None stay numbers, true, false and null,
+    and dicts and lists, the hashes and lists of the database, become objects and arrays, so loading gives back the
+    same types.
+        Raises:
+            ValueError: For NaN and infinite floats, which JSON cannot represent.
+    '''
+    def format_value(self, value):
+        if isinstance(value, str):
+            return quote(value)
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, int):
+            return int.__repr__(value)
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise ValueError(f"Out of range float value {value} cannot be written as JSON")
+            return float.__repr__(value)
+        if isinstance(value, dict):
+            return "{" + ", ".join(f"{quote(str(key))}: {self.format_value(item)}" for key, item in value.items()) + "}"
+        if isinstance(value, (list, tuple)):
+            return "[" + ", ".join(self.format_value(item) for item in value) + "]"
+        if value is None:
+            return "null"
+        return quote(str(value))
+
+
+    '''
+    Write data as JSON to a file, compressed with codec unless it is 'none', see Compression.
+    A dict is streamed without building the whole text: members are formatted into a list that is joined and written
+    every chunk_size members. Keys and strings are checked for characters to escape as in quote, and strings and ints,
+    the bulk of a database, skip the type dispatch of format_value.
+        Args:
+            data: The value to write, usually the dict of a database.
+            db_name (str): Path of the file, it is overwritten.
+            codec (str): Compression codec of the file.
+            expiry (iterable, optional): (key, expiry time) pairs written after the data as an object under
+                                         EXPIRY_MEMBER, only with a dict and only if there is at least one pair.
+            sync (bool): fsync the file before closing it.
+            chunk_size (int): Members formatted before they are written.
+    '''
+    def dump_data(self, data, db_name, codec="none", expiry=None, sync=False, chunk_size=10000):
+        with open_file(db_name, 'w', codec) as file:
             if isinstance(data, dict):
-                file.write("{\n")
+                escape = UNSAFE_CHARACTERS.sub
+                members = []
+                append = members.append
+                separator = "{\n  "
                 for key, value in data.items():
-                    file.write(f'  "{key}": "{value}",\n')
-                file.write("}\n")
-            elif isinstance(data, list):
-                file.write("[\n")
-                for item in data:
-                    file.write(f' "{item}",\n')
-                file.write("]\n")
-            elif isinstance(data, str):
-                file.write(f'"{data}"\n')
-            elif isinstance(data, (int, float, bool)):
-                file.write(f'"{data}"\n')
-            elif data is None:
-                file.write("null\n")
-            # elif isinstance(data, (dict, list)):
-            #     self.dump_data(self,data,db_name)
+                    if type(key) is not str:
+                        key = str(key)
+                    if '"' in key or '\\' in key or not key.isprintable():
+                        key = escape(escape_character, key)
+                    kind = type(value)
+                    if kind is str:
+                        if '"' in value or '\\' in value or not value.isprintable():
+                            value = escape(escape_character, value)
+                        append(f'"{key}": "{value}"')
+                    elif kind is int:
+                        append(f'"{key}": {value}')
+                    else:
+                        append(f'"{key}": {self.format_value(value)}')
+                    if len(members) >= chunk_size:
+                        file.write(separator + ",\n  ".join(members))
+                        members.clear()
+                        separator = ",\n  "
+                if members:
+                    file.write(separator + ",\n  ".join(members))
+                    members.clear()
+                    separator = ",\n  "
+                header = f"{separator}{quote(EXPIRY_MEMBER)}: {{"
+                for key, expiry_time in expiry or ():
+                    append(f"{quote(key)}: {self.format_value(expiry_time)}")
+                    if len(members) >= chunk_size:
+                        file.write(header + ", ".join(members))
+                        members.clear()
+                        header = ", "
+                if members:
+                    file.write(header + ", ".join(members))
+                    header = ", "
+                if header == ", ":
+                    file.write("}\n}\n")
+                else:
+                    file.write("{}\n" if separator == "{\n  " else "\n}\n")
             else:
-                raise ValueError("Unsupported data type for dumping")
-        
-    
+                file.write(self.format_value(data) + "\n")
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+
+
     def load_data(self, db_name):
         data={}
-        with open(db_name, 'r') as file:
+        with open_file(db_name, 'r') as file:
             content = file.read()
             # print("Content read from file:", content)
             data = self.parse_json(content)
         if not data:
             return {}
         return data
-            
-    
+
+
 
 '''Debugging and testing the JsonParser class.'''
 if __name__ == "__main__":
     json__string = input("Enter a JSON string: ")
-    parser = JsonParser(json__string)
+    parser = JsonParser()
     try:
-        parsed_json = parser.parse_json()
+        parsed_json = parser.parse_json(json__string)
         print("Parsed JSON:", parsed_json)
     except ValueError as e:
         print("Error parsing JSON:", e)
     # Example usage:
     # json_string = '{"name": "John", "age": 30, "is_student": false, "courses": ["Math", "Science"], "address": {"city": "New York", "zip": "10001"}, "null_value": null}'
-    
\ No newline at end of file
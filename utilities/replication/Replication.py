@@ -0,0 +1,252 @@
+import threading,time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from utilities.logger.Log import get_logger
+from utilities.serializer.TypedValue import copy_value
+
+
+logger = get_logger("replication")
+
+# Shared secret followers authenticate with by default, pass another one when the leader listens beyond localhost.
+AUTHKEY = b"simpledb-replication"
+
+# Keys sent per message of a full sync.
+SYNC_CHUNK = 10000
+
+
+'''
+Messages of the replication protocol, tuples sent over a multiprocessing connection.
+    follower -> leader, once after connecting:
+        ("sync", position)                 - position the follower applied up to, None to ask for a full sync
+    leader -> follower:
+        ("snapshot", position, keys)       - a full sync follows, it reflects the log up to position
+        ("rows", rows)                     - SYNC_CHUNK (key, value, expiry datetime or None) rows of the snapshot
+        ("synced",)                        - the snapshot is complete
+        ("log", records, position, end)    - WAL records as returned by wal.read_since, the position after them and
+                                             the end of the leader's log when they were read, sent empty as heartbeat
+'''
+
+
+'''
+Return a WAL position as 'segment:offset', the form positions take in info().
+'''
+def format_position(position):
+    return "none" if position is None else f"{position[0]}:{position[1]}"
+
+
+'''
+Leader side of replication for simpleDB.
+Followers connect to a local socket and get a full sync from an in-memory snapshot, then the WAL records written
+after the snapshot, read from the log files from the follower's position, so shipping never slows the writers down.
+A follower that reconnects sends the position it applied up to and only catches up from there, unless the log
+at that position was truncated meanwhile. Segments connected followers still need are not truncated.
+Each follower has its own thread, a slow follower only delays itself.
+'''
+class ReplicationLeader:
+
+    '''
+    Initialize the leader.
+        Args:
+            db (SimpleDB): The database whose writes are shipped.
+            address: ('host', port) to listen on, port 0 picks a free port, or the path of a Unix socket.
+            authkey (bytes): Secret followers authenticate with.
+            batch_size (int): Maximum number of WAL records per message.
+            heartbeat_interval (float): Seconds after which an idle follower is sent an empty message.
+    '''
+    def __init__(self, db, address=("127.0.0.1", 0), authkey=AUTHKEY, batch_size=1000, heartbeat_interval=1.0):
+        self.db = db
+        self.address = address
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.heartbeat_interval = heartbeat_interval
+        self.lock = threading.Lock()
+        self.followers = {}
+        self.next_id = 0
+        self.shipped_records = 0
+        self.full_syncs = 0
+        self.listener = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+
+    '''
+    Start listening for followers, self.address holds the bound address afterwards.
+    '''
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.listener = Listener(self.address, authkey=self.authkey)
+            self.address = self.listener.address
+            self.thread = threading.Thread(target=self.accept_loop, daemon=True)
+            self.thread.start()
+            logger.info("Replication of '%s' listening on %s", self.db.db_name, self.address)
+
+
+    '''
+    Stop accepting followers, ship what is left of the log to the connected ones and disconnect them.
+    '''
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        # accept() does not return on close, a last connection wakes it up.
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+        self.thread.join()
+        self.thread = None
+        self.listener.close()
+        with self.lock:
+            threads = [follower["thread"] for follower in self.followers.values()]
+        for thread in threads:
+            thread.join(self.heartbeat_interval + 5)
+        self.db.wal.retain_segment = None
+
+
+    '''
+    Accept followers until stopped, each one is served by its own thread.
+    '''
+    def accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, AuthenticationError) as e:
+                if self.stop_event.is_set():
+                    break
+                logger.warning("Refused a follower: %s", e)
+                continue
+            if self.stop_event.is_set():
+                conn.close()
+                break
+            with self.lock:
+                follower_id = self.next_id
+                self.next_id += 1
+                follower = {"address": self.listener.last_accepted, "state": "sync", "position": None,
+                            "records": 0, "caught_up_at": time.time()}
+                follower["thread"] = threading.Thread(target=self.serve_follower, args=(follower_id, conn), daemon=True)
+                self.followers[follower_id] = follower
+            follower["thread"].start()
+
+
+    '''
+    Serve one follower until it disconnects or the leader stops.
+    '''
+    def serve_follower(self, follower_id, conn):
+        follower = self.followers[follower_id]
+        wal = self.db.wal
+        try:
+            _, position = conn.recv()
+            logger.info("Follower %s connected from position %s", follower["address"], format_position(position))
+            last_send = 0.0
+            while True:
+                if position is None:
+                    position = self.full_sync(conn, follower)
+                    # The first log message right after the snapshot tells the follower how far the log got meanwhile.
+                    last_send = 0.0
+                seq = wal.written_seq
+                records, next_position = wal.read_since(position, self.batch_size)
+                if next_position is None:
+                    if wal.log_file is None:
+                        break
+                    logger.warning("Log of follower %s at %s was truncated, starting a full sync",
+                                   follower["address"], format_position(position))
+                    position = None
+                    continue
+                end = wal.position()
+                if records or next_position != position or time.monotonic() - last_send >= self.heartbeat_interval:
+                    conn.send(("log", records, next_position, end))
+                    last_send = time.monotonic()
+                    self.shipped(follower, next_position, len(records), next_position >= end)
+                position = next_position
+                if len(records) == self.batch_size:
+                    continue
+                if self.stop_event.is_set():
+                    break
+                wal.wait_for_records(seq, min(self.heartbeat_interval, 0.1))
+        except (EOFError, OSError) as e:
+            logger.info("Follower %s disconnected: %s", follower["address"], e)
+        finally:
+            conn.close()
+            with self.lock:
+                del self.followers[follower_id]
+            self.update_retention()
+
+
+    '''
+    Send a snapshot of the database to a follower.
+    The data is copied under the read side of the database lock together with the WAL position, writes hold the
+    write side while they log and apply, so the snapshot reflects exactly the log up to that position.
+    Only the copy blocks writers, the rows are sent once the lock is released.
+        Returns:
+            tuple: The WAL position the snapshot reflects.
+    '''
+    def full_sync(self, conn, follower):
+        db = self.db
+        start = time.perf_counter()
+        with db.lock.read():
+            position = db.wal.position()
+            rows = [(key, copy_value(value), db.expiry.get(key)) for key, value in db.data.items()]
+        follower.update(state="sync", position=position)
+        self.update_retention()
+        conn.send(("snapshot", position, len(rows)))
+        for i in range(0, len(rows), SYNC_CHUNK):
+            conn.send(("rows", rows[i:i + SYNC_CHUNK]))
+        conn.send(("synced",))
+        with self.lock:
+            self.full_syncs += 1
+        db.metrics.observe("replication_full_sync", time.perf_counter() - start)
+        logger.info("Full sync of %d keys to follower %s done", len(rows), follower["address"])
+        return position
+
+
+    '''
+    Record what was shipped to a follower and keep the log it still needs.
+    '''
+    def shipped(self, follower, position, records, caught_up):
+        with self.lock:
+            follower.update(state="online", position=position, records=follower["records"] + records)
+            if caught_up:
+                follower["caught_up_at"] = time.time()
+            self.shipped_records += records
+        if records:
+            self.db.metrics.incr("replication_shipped_records", records)
+        self.update_retention()
+
+
+    '''
+    Keep the oldest segment a connected follower is reading from out of WAL truncation.
+    '''
+    def update_retention(self):
+        with self.lock:
+            segments = [follower["position"][0] for follower in self.followers.values() if follower["position"]]
+        self.db.wal.retain_segment = min(segments) if segments else None
+
+
+    '''
+    Return the state of replication for info().
+        Returns:
+            dict: Role, address, counters and, per connected follower, its state, the position shipped to it and
+                  its lag in seconds, 0 if it has the end of the log, else how long ago it last had it.
+    '''
+    def info(self):
+        now = time.time()
+        end = self.db.wal.position()
+        with self.lock:
+            info = {
+                "role": "leader",
+                "address": str(self.address),
+                "connected_followers": len(self.followers),
+                "shipped_records": self.shipped_records,
+                "full_syncs": self.full_syncs,
+            }
+            for number, follower in enumerate(self.followers.values()):
+                info[f"follower{number}"] = {
+                    "address": str(follower["address"]),
+                    "state": follower["state"],
+                    "position": format_position(follower["position"]),
+                    "records": follower["records"],
+                    "lag_seconds": 0.0 if follower["position"] and follower["position"] >= end
+                                   else round(now - follower["caught_up_at"], 3),
+                }
+        return info
@@ -0,0 +1,273 @@
+import array,mmap,os,struct,sys
+from utilities.serializer.Compression import BlockWriter, BlockFile
+
+
+'''
+On-disk format of BinarySimpleDB, all integers little-endian.
+    header        : magic (8s) | key count n (Q) | offsets of the six regions below (6Q)
+    key offsets   : n + 1 Q, key i is keys[key_offsets[i]:key_offsets[i + 1]]
+    value offsets : n + 1 Q, value i is values[value_offsets[i]:value_offsets[i + 1]]
+    expiries      : n d, expiry epoch of key i, 0 for no TTL
+    value types   : n B, encoding of value i
+    keys          : the key bytes sorted by key, concatenated
+    values        : the encoded values, concatenated
+The index is stored column by column, so it is loaded with a few bulk array conversions, and since keys are
+sorted a key can also be found by binary search straight on the mapped file. A value is a single slice of the mapping.
+A file starting with COMPRESSED_MAGIC holds the values region as compressed blocks, see Compression, and the value
+offsets point into the uncompressed values. Every value is written whole into one block, so reading a key only
+decompresses that block, and the index is not compressed so loading a file costs the same as without compression.
+'''
+MAGIC = b"SDBBIN2\x00"
+COMPRESSED_MAGIC = b"SDBBIN2Z"
+HEADER = struct.Struct("<8sQQQQQQQ")
+OFFSET = struct.Struct("<Q")
+OFFSET_PAIR = struct.Struct("<QQ")
+
+TYPE_STR = 0
+TYPE_INT = 1
+TYPE_BYTES = 2
+TYPE_FLOAT = 3
+TYPE_HASH = 4
+TYPE_LIST = 5
+
+# Items of a hash (field, value, field, value...) or a list are stored as item size (I) | item bytes.
+ITEM_SIZE = struct.Struct("<I")
+
+
+'''
+Convert a little-endian array read from or written to a file to or from the native byte order.
+'''
+def to_little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+'''
+Encode a value for the values region.
+    Returns:
+        tuple: (value type, encoded bytes).
+'''
+def encode_value(value):
+    if isinstance(value, bool):
+        return TYPE_STR, str(value).encode()
+    if isinstance(value, int):
+        return TYPE_INT, str(value).encode()
+    if isinstance(value, float):
+        return TYPE_FLOAT, repr(value).encode()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return TYPE_BYTES, bytes(value)
+    if isinstance(value, dict):
+        return TYPE_HASH, encode_items(item for pair in value.items() for item in pair)
+    if isinstance(value, list):
+        return TYPE_LIST, encode_items(value)
+    return TYPE_STR, str(value).encode()
+
+
+'''
+Encode the items of a hash or list as size-prefixed strings.
+'''
+def encode_items(items):
+    parts = []
+    for item in items:
+        raw = str(item).encode()
+        parts.append(ITEM_SIZE.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+'''
+Decode items encoded by encode_items.
+'''
+def decode_items(raw):
+    items = []
+    position = 0
+    while position < len(raw):
+        size, = ITEM_SIZE.unpack_from(raw, position)
+        position += ITEM_SIZE.size
+        items.append(str(raw[position:position + size], 'utf-8'))
+        position += size
+    return items
+
+
+'''
+Decode a value read from the values region.
+'''
+def decode_value(value_type, raw):
+    if value_type == TYPE_STR:
+        return str(raw, 'utf-8')
+    if value_type == TYPE_INT:
+        return int(raw)
+    if value_type == TYPE_FLOAT:
+        return float(raw)
+    if value_type == TYPE_BYTES:
+        return bytes(raw)
+    if value_type == TYPE_HASH:
+        items = decode_items(raw)
+        return dict(zip(items[::2], items[1::2]))
+    if value_type == TYPE_LIST:
+        return decode_items(raw)
+    raise ValueError(f"Unknown value type {value_type}")
+
+
+'''
+Write a database file.
+    Args:
+        file_name (str): Path of the file to write.
+        records (iterable): (key, value type, encoded value, expiry epoch or 0) tuples, in any order.
+        codec (str): Codec the values region is compressed with, 'none' to store it as it is.
+        sync (bool): fsync the file before it is closed.
+'''
+def write_database(file_name, records, codec="none", sync=False):
+    records = sorted(((key.encode(), value_type, raw, expiry) for key, value_type, raw, expiry in records),
+                     key=lambda record: record[0])
+    count = len(records)
+    key_offsets = array.array('Q', [0])
+    value_offsets = array.array('Q', [0])
+    for key, _, raw, _ in records:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(raw))
+    expiries = array.array('d', (record[3] or 0.0 for record in records))
+    value_types = bytes(record[1] for record in records)
+
+    key_offsets_at = HEADER.size
+    value_offsets_at = key_offsets_at + 8 * (count + 1)
+    expiries_at = value_offsets_at + 8 * (count + 1)
+    types_at = expiries_at + 8 * count
+    keys_at = types_at + count
+    values_at = keys_at + key_offsets[-1]
+    with open(file_name, 'wb') as f:
+        magic = MAGIC if codec == "none" else COMPRESSED_MAGIC
+        f.write(HEADER.pack(magic, count, key_offsets_at, value_offsets_at, expiries_at, types_at, keys_at, values_at))
+        f.write(to_little_endian(key_offsets).tobytes())
+        f.write(to_little_endian(value_offsets).tobytes())
+        f.write(to_little_endian(expiries).tobytes())
+        f.write(value_types)
+        f.write(b"".join(record[0] for record in records))
+        values = f if codec == "none" else BlockWriter(f, codec)
+        for record in records:
+            values.write(record[2])
+        values.flush()
+        if sync:
+            os.fsync(f.fileno())
+
+
+'''
+Read-only view of a database file through a memory mapping.
+Nothing but the header, and the block headers of compressed values, is read when it is opened, keys and values
+are sliced out of the mapping on demand.
+'''
+class BinaryReader:
+
+    '''
+    Open and map a database file.
+        Args:
+            file_name (str): Path of the file.
+        Raises:
+            ValueError: If the file is not in this format, e.g. a pickle written by an older version.
+    '''
+    def __init__(self, file_name):
+        self.file = open(file_name, 'rb')
+        self.map = None
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            self.close()
+            raise ValueError(f"'{file_name}' is not a SimpleDB binary database")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self.key_offsets_at, self.value_offsets_at, self.expiries_at,
+         self.types_at, self.keys_at, self.values_at) = HEADER.unpack_from(self.map, 0)
+        if magic not in (MAGIC, COMPRESSED_MAGIC):
+            self.close()
+            raise ValueError(f"'{file_name}' is not a SimpleDB binary database")
+        self.values = BlockFile(self.map, self.values_at) if magic == COMPRESSED_MAGIC else None
+
+
+    '''
+    Return the key bytes at a position.
+    '''
+    def key_bytes(self, position):
+        start, end = OFFSET_PAIR.unpack_from(self.map, self.key_offsets_at + 8 * position)
+        return self.map[self.keys_at + start:self.keys_at + end]
+
+
+    '''
+    Return the key at a position.
+    '''
+    def key(self, position):
+        return self.key_bytes(position).decode()
+
+
+    '''
+    Find a key by binary search over the sorted keys.
+        Returns:
+            int: The position of the key, or None if it is not in the file.
+    '''
+    def find(self, key):
+        target = key.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.key_bytes(low) == target:
+            return low
+        return None
+
+
+    '''
+    Return the (value type, raw bytes) at a position without decoding it.
+    '''
+    def raw_value(self, position):
+        start, end = OFFSET_PAIR.unpack_from(self.map, self.value_offsets_at + 8 * position)
+        if self.values is not None:
+            return self.map[self.types_at + position], self.values.read(start, end)
+        return self.map[self.types_at + position], self.map[self.values_at + start:self.values_at + end]
+
+
+    '''
+    Decode the value at a position.
+    '''
+    def value(self, position):
+        return decode_value(*self.raw_value(position))
+
+
+    '''
+    Return the expiry epoch at a position, None if the key has no TTL.
+    '''
+    def expiry(self, position):
+        return struct.unpack_from("<d", self.map, self.expiries_at + 8 * position)[0] or None
+
+
+    '''
+    Return all keys in file order, decoded with bulk conversions and without touching the values.
+    '''
+    def keys(self):
+        offsets = array.array('Q')
+        offsets.frombytes(self.map[self.key_offsets_at:self.value_offsets_at])
+        offsets = to_little_endian(offsets).tolist()
+        blob = self.map[self.keys_at:self.values_at]
+        if blob.isascii():
+            text = blob.decode('ascii')
+            return list(map(text.__getitem__, map(slice, offsets, offsets[1:])))
+        return [blob[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+
+    '''
+    Return (position, expiry epoch) for every key that has a TTL.
+    '''
+    def expiries(self):
+        expiries = array.array('d')
+        expiries.frombytes(self.map[self.expiries_at:self.types_at])
+        return [(position, expiry) for position, expiry in enumerate(to_little_endian(expiries)) if expiry]
+
+
+    '''
+    Unmap and close the file.
+    '''
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
@@ -0,0 +1,348 @@
+import bisect,io,lzma,struct,zlib
+
+
+'''
+Codecs a database can compress its snapshot files and closed WAL segments with.
+    none - files are written as they are.
+    zlib - DEFLATE, fast enough to keep up with snapshots.
+    lzma - smaller files for more CPU time, for databases that are mostly read.
+'''
+CODECS = ("none", "zlib", "lzma")
+CODEC_IDS = {"zlib": 1, "lzma": 2}
+CODEC_NAMES = {code: name for name, code in CODEC_IDS.items()}
+LEVELS = {"zlib": 6, "lzma": 1}
+
+'''
+Layout of a compressed file.
+    magic (5s) | codec id (B)
+followed by blocks, each one:
+    compressed size (I) | uncompressed size (I) | crc32 of the compressed bytes (I) | compressed bytes
+A block is cut once BLOCK_SIZE bytes were written, between two write calls, so a record written with a single
+write, such as a line of a txt snapshot or a value of a binary file, is read back by decompressing its block only.
+'''
+MAGIC = b"SDBZ\x01"
+FILE_HEADER = struct.Struct("<5sB")
+BLOCK = struct.Struct("<III")
+BLOCK_SIZE = 64 * 1024
+
+
+'''
+Compress a block with a codec.
+'''
+def compress(codec, data):
+    if codec == "zlib":
+        return zlib.compress(data, LEVELS["zlib"])
+    if codec == "lzma":
+        return lzma.compress(data, preset=LEVELS["lzma"])
+    raise ValueError(f"Unknown compression codec '{codec}', expected one of {CODECS}")
+
+
+'''
+Decompress a block compressed with a codec.
+'''
+def decompress(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    raise ValueError(f"Unknown compression codec '{codec}', expected one of {CODECS}")
+
+
+'''
+Check that a codec name is supported.
+    Raises:
+        ValueError: If it is not one of CODECS.
+'''
+def check_codec(codec):
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec '{codec}', expected one of {CODECS}")
+
+
+'''
+Return the codec of a file header, 'none' if the bytes do not start a compressed file.
+    Raises:
+        ValueError: If the file is compressed with a codec this version does not know.
+'''
+def header_codec(header):
+    if len(header) < FILE_HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return "none"
+    codec_id = header[len(MAGIC)]
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f"Unknown compression codec id {codec_id}")
+    return CODEC_NAMES[codec_id]
+
+
+'''
+Return the codec an existing file was written with, 'none' for a plain file.
+'''
+def file_codec(name):
+    with open(name, 'rb') as f:
+        return header_codec(f.read(FILE_HEADER.size))
+
+
+'''
+Writable binary stream compressing what is written to it into blocks, see the layout above.
+Nothing is written for a block until BLOCK_SIZE bytes were buffered, flush or close write the pending block.
+'''
+class BlockWriter(io.RawIOBase):
+
+    '''
+        Args:
+            file: Binary file object the compressed blocks are written to, closed with the writer.
+            codec (str): 'zlib' or 'lzma'.
+            block_size (int): Uncompressed bytes after which a block is cut.
+    '''
+    def __init__(self, file, codec, block_size=BLOCK_SIZE):
+        self.file = file
+        self.codec = codec
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.raw_size = 0
+        self.file.write(FILE_HEADER.pack(MAGIC, CODEC_IDS[codec]))
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.block_size:
+            self.write_block()
+        return len(data)
+
+    def write_block(self):
+        if self.buffer:
+            payload = compress(self.codec, bytes(self.buffer))
+            self.file.write(BLOCK.pack(len(payload), len(self.buffer), zlib.crc32(payload)))
+            self.file.write(payload)
+            self.raw_size += len(self.buffer)
+            self.buffer.clear()
+
+    def flush(self):
+        if not self.closed:
+            self.write_block()
+            self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()
+            finally:
+                self.file.close()
+
+
+'''
+Readable binary stream decompressing a compressed file block by block.
+Seeking forward skips whole blocks by their uncompressed size without decompressing them, so reading a WAL
+segment from a checkpoint offset only decompresses the blocks after it.
+'''
+class BlockReader(io.RawIOBase):
+
+    '''
+        Args:
+            file: Binary file object positioned right after the file header, closed with the reader.
+            codec (str): The codec read from the file header.
+    '''
+    def __init__(self, file, codec):
+        self.file = file
+        self.codec = codec
+        self.block = b""
+        self.block_position = 0
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+
+    '''
+    Read the next block header, None at the end of the file.
+        Raises:
+            ValueError: If the file ends in the middle of a block.
+    '''
+    def next_block(self):
+        header = self.file.read(BLOCK.size)
+        if not header:
+            return None
+        if len(header) < BLOCK.size:
+            raise ValueError(f"Truncated block header in '{self.file.name}'")
+        return BLOCK.unpack(header)
+
+
+    '''
+    Decompress the next block into self.block.
+        Returns:
+            bool: False at the end of the file.
+        Raises:
+            ValueError: If the block is cut short or fails its crc check.
+    '''
+    def load_block(self):
+        header = self.next_block()
+        if header is None:
+            return False
+        size, raw_size, crc = header
+        payload = self.file.read(size)
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt block in '{self.file.name}'")
+        self.block = decompress(self.codec, payload)
+        self.block_position = 0
+        return True
+
+    def readinto(self, buffer):
+        if self.block_position >= len(self.block) and not self.load_block():
+            return 0
+        count = min(len(buffer), len(self.block) - self.block_position)
+        buffer[:count] = self.block[self.block_position:self.block_position + count]
+        self.block_position += count
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Compressed files only seek from the start or the current position")
+        if offset < self.position:
+            self.file.seek(FILE_HEADER.size)
+            self.block, self.block_position, self.position = b"", 0, 0
+        skip = min(offset - self.position, len(self.block) - self.block_position)
+        self.block_position += skip
+        self.position += skip
+        while self.position < offset:
+            header = self.next_block()
+            if header is None:
+                break
+            size, raw_size, _ = header
+            if self.position + raw_size <= offset:
+                self.file.seek(size, io.SEEK_CUR)
+                self.position += raw_size
+                continue
+            self.file.seek(-BLOCK.size, io.SEEK_CUR)
+            self.load_block()
+            self.block_position = offset - self.position
+            self.position = offset
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.file.close()
+
+
+'''
+Open a file that may be compressed, the drop-in replacement of open used for snapshots and WAL segments.
+Reading detects the codec from the file header, so plain files written before compression was enabled
+keep loading, and writing compresses with the given codec.
+Text is UTF-8 whether the file is compressed or not, whatever the locale.
+    Args:
+        name (str): Path of the file.
+        mode (str): 'r', 'rb', 'w' or 'wb'.
+        codec (str): Codec to write with, 'none' writes a plain file, ignored when reading.
+        newline (str, optional): Newline handling of text mode, as for open.
+    Returns:
+        A binary or text file object, usable as a context manager.
+'''
+def open_file(name, mode='r', codec="none", newline=None):
+    binary = 'b' in mode
+    if 'w' in mode:
+        if codec == "none":
+            return open(name, mode) if binary else open(name, mode, encoding='utf-8', newline=newline)
+        writer = BlockWriter(open(name, 'wb'), codec)
+        return writer if binary else io.TextIOWrapper(writer, encoding='utf-8', newline=newline, write_through=True)
+    file = open(name, 'rb')
+    codec = header_codec(file.read(FILE_HEADER.size))
+    if codec == "none":
+        file.close()
+        return open(name, mode) if binary else open(name, mode, encoding='utf-8', newline=newline)
+    reader = io.BufferedReader(BlockReader(file, codec), BLOCK_SIZE)
+    return reader if binary else io.TextIOWrapper(reader, encoding='utf-8', newline=newline)
+
+
+'''
+Random access to the uncompressed bytes of a compressed file held in memory or mapped, e.g. the values region of
+a binary database. Only the block headers are read when it is created, a read decompresses the blocks it spans
+and the last block read is cached, so reading neighbouring records decompresses their block once.
+'''
+class BlockFile:
+
+    '''
+        Args:
+            data: bytes or mmap holding the compressed file.
+            start (int): Offset of the file header in data.
+            end (int, optional): Offset where the compressed file ends, the end of data by default.
+        Raises:
+            ValueError: If data does not hold a compressed file at start.
+    '''
+    def __init__(self, data, start=0, end=None):
+        self.data = data
+        self.codec = header_codec(data[start:start + FILE_HEADER.size])
+        if self.codec == "none":
+            raise ValueError("Not a compressed file")
+        end = len(data) if end is None else end
+        self.raw_starts = [0]
+        self.offsets = []
+        position = start + FILE_HEADER.size
+        while position + BLOCK.size <= end:
+            size, raw_size, _ = BLOCK.unpack_from(data, position)
+            self.offsets.append(position)
+            self.raw_starts.append(self.raw_starts[-1] + raw_size)
+            position += BLOCK.size + size
+        self.cached = (None, b"")
+
+
+    '''
+    Return the uncompressed size of the file.
+    '''
+    def __len__(self):
+        return self.raw_starts[-1]
+
+
+    '''
+    Return the uncompressed content of a block.
+        Raises:
+            ValueError: If the block fails its crc check.
+    '''
+    def block(self, number):
+        cached_number, content = self.cached
+        if cached_number == number:
+            return content
+        position = self.offsets[number]
+        size, _, crc = BLOCK.unpack_from(self.data, position)
+        payload = self.data[position + BLOCK.size:position + BLOCK.size + size]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt block {number}")
+        content = decompress(self.codec, payload)
+        self.cached = (number, content)
+        return content
+
+
+    '''
+    Return the uncompressed bytes from start to end.
+    '''
+    def read(self, start, end):
+        if start >= end:
+            return b""
+        number = bisect.bisect_right(self.raw_starts, start) - 1
+        parts = []
+        while start < end and number < len(self.offsets):
+            block_start = self.raw_starts[number]
+            content = self.block(number)
+            parts.append(content[start - block_start:end - block_start])
+            start = self.raw_starts[number + 1]
+            number += 1
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+
+
+    '''
+    Yield (uncompressed offset, content) for every block in order.
+    '''
+    def blocks(self):
+        for number in range(len(self.offsets)):
+            yield self.raw_starts[number], self.block(number)
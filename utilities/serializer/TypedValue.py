@@ -0,0 +1,152 @@
+import sys
+
+
+'''
+Value types of simpleDB.
+    string - str, or int for an int-encoded counter written by incr/incrby, reported as 'string' like in Redis
+    hash   - dict of field -> str
+    list   - list of str
+Counters stay ints in memory and in every persistence format, so incrby never parses or formats a string.
+'''
+TYPE_NAMES = {str: "string", int: "string", dict: "hash", list: "list"}
+
+ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+UNESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+
+# A single empty field, which would otherwise be written as the empty text of no fields at all. escape never makes it.
+EMPTY_FIELD = "\\e"
+
+
+'''
+Raised by an operation on a key holding another type of value, e.g. hset on a list.
+'''
+class WrongTypeError(TypeError):
+
+    def __init__(self, message="Operation against a key holding the wrong kind of value"):
+        super().__init__(message)
+
+
+'''
+Return the type name of a value: 'string', 'hash' or 'list'.
+'''
+def type_name(value):
+    return TYPE_NAMES.get(type(value), "string")
+
+
+'''
+Check that a stored value has the expected type.
+    Args:
+        value: The stored value, None if the key does not exist.
+        expected (type): dict or list.
+    Raises:
+        WrongTypeError: If the key holds another type.
+'''
+def check_type(value, expected):
+    if value is not None and type(value) is not expected:
+        raise WrongTypeError()
+
+
+'''
+Escape tabs, newlines and backslashes, so a string can be stored in a tab-separated, line-based file.
+'''
+def escape(text):
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        return "".join(ESCAPES.get(char, char) for char in text)
+    return text
+
+
+'''
+Undo escape.
+'''
+def unescape(text):
+    if "\\" not in text:
+        return text
+    out = []
+    chars = iter(text)
+    for char in chars:
+        out.append(UNESCAPES.get(next(chars, "\\"), "\\") if char == "\\" else char)
+    return "".join(out)
+
+
+'''
+Encode a list of strings as one line of escaped, tab-separated fields, no fields make an empty text.
+'''
+def encode_fields(fields):
+    fields = [escape(str(field)) for field in fields]
+    if fields == [""]:
+        return EMPTY_FIELD
+    return "\t".join(fields)
+
+
+'''
+Decode a line made by encode_fields.
+'''
+def decode_fields(text):
+    if text == EMPTY_FIELD:
+        return [""]
+    return [unescape(field) for field in text.split("\t")] if text else []
+
+
+'''
+Encode a value as a type tag and an escaped text, the value format of the txt database file and the WAL.
+    Returns:
+        tuple: (tag, text) with tag 's', 'i', 'h' or 'l'.
+'''
+def encode_text(value):
+    if type(value) is str:
+        return "s", escape(value)
+    if isinstance(value, dict):
+        return "h", encode_fields(item for pair in value.items() for item in pair)
+    if isinstance(value, list):
+        return "l", encode_fields(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return "i", str(value)
+    return "s", escape(str(value))
+
+
+'''
+Decode a value encoded by encode_text.
+'''
+def decode_text(tag, text):
+    if tag == "s":
+        return unescape(text)
+    if tag == "i":
+        return int(text)
+    if tag == "h":
+        fields = decode_fields(text)
+        return dict(zip(fields[::2], fields[1::2]))
+    if tag == "l":
+        return decode_fields(text)
+    raise ValueError(f"Unknown value type tag '{tag}'")
+
+
+'''
+Return a copy of a hash or list value so it can be restored after in-place updates, other values are immutable.
+'''
+def copy_value(value):
+    if isinstance(value, (dict, list)):
+        return value.copy()
+    return value
+
+
+'''
+Approximate memory held by a value, including the items of a hash or list.
+'''
+def value_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(field) + sys.getsizeof(item) for field, item in value.items())
+    elif isinstance(value, list):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+'''
+Resolve Redis-style inclusive list indexes, negative indexes count from the end.
+    Returns:
+        slice: The slice selecting the items from start to stop included.
+'''
+def list_slice(length, start, stop):
+    start = max(start + length if start < 0 else start, 0)
+    stop = stop + length if stop < 0 else stop
+    return slice(start, max(min(stop, length - 1) + 1, start))
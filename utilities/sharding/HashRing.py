@@ -0,0 +1,70 @@
+import bisect,hashlib
+
+
+'''
+Hash a string to a 64-bit ring position.
+The hash is stable across processes and runs, unlike the builtin hash, so the placement of keys survives restarts.
+'''
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+'''
+Consistent hash ring.
+Every node is placed on the ring at `replicas` virtual points and a key belongs to the first point at or after its
+own hash. Adding a node only takes over the keys falling right before its points, about 1/(n + 1) of the keyspace,
+while every other key keeps its node.
+'''
+class HashRing:
+
+    '''
+    Initialize the ring.
+        Args:
+            nodes (iterable): Node names to place on the ring.
+            replicas (int): Virtual points per node, more points spread the keys more evenly.
+    '''
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+
+    '''
+    Place a node on the ring.
+    '''
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            point = ring_hash(f"{node}#{replica}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+
+    '''
+    Remove a node from the ring, its keys fall to the next nodes on the ring.
+    '''
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+
+    '''
+    Return the node owning a key.
+        Raises:
+            LookupError: If the ring has no nodes.
+    '''
+    def get(self, key):
+        if not self.points:
+            raise LookupError("The hash ring has no nodes")
+        index = bisect.bisect_left(self.points, ring_hash(key))
+        return self.owners[index if index < len(self.points) else 0]